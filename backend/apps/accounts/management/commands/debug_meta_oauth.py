@@ -6,13 +6,12 @@
   python manage.py debug_meta_oauth --email user@example.com --meta-pk 3
 """
 
-import requests
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
+from apps.accounts import meta_graph
 from apps.accounts.models import MetaAccount, User
 from apps.accounts.views import (
-    GRAPH_VERSION,
     _graph_me_adaccounts_json,
     _is_business_field_permission_error,
     _parse_business_from_adaccount_node,
@@ -77,9 +76,8 @@ class Command(BaseCommand):
 
         # --- debug_token ---
         app_access = f'{app_id}|{app_secret}'
-        debug_url = f'https://graph.facebook.com/{GRAPH_VERSION}/debug_token'
-        dr = requests.get(
-            debug_url,
+        dr = meta_graph.get(
+            'debug_token',
             params={'input_token': token, 'access_token': app_access},
             timeout=30,
         )
@@ -134,10 +132,9 @@ class Command(BaseCommand):
         # --- フォールバックが走るか（初回リクエストのみ）---
         self.stdout.write('')
         self.stdout.write(self.style.NOTICE('--- 初回のみ business{{name}} 付き（フォールバック判定）---'))
-        url = f'https://graph.facebook.com/{GRAPH_VERSION}/me/adaccounts'
         base_fields = 'id,name,account_id,currency,timezone_name,account_status'
-        r1 = requests.get(
-            url,
+        r1 = meta_graph.get(
+            'me/adaccounts',
             params={'access_token': token, 'fields': f'{base_fields},business{{name}}'},
             timeout=30,
         )
@@ -0,0 +1,141 @@
+"""
+Meta Graph API の共有クライアント。
+
+プロセスごとに 1 つの requests.Session（keep-alive・コネクションプール・gzip）を使い回し、
+API バージョン（settings.META_GRAPH_API_VERSION）と既定タイムアウトをここで決める。
+Meta への呼び出しはすべて get / post / delete / iter_pages を通す。
+呼び出しごとに meta_rate_limit で広告アカウント / トークン単位の枠を取り、使用率ヘッダを記録する。
+スロットリングされたら待って再試行し、待ちきれない場合は MetaRateLimited を送出する。
+get / post / delete は requests.get 等と同じ形で呼べるので、http 引数に差し替え可能。
+"""
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Iterator, Optional
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import meta_rate_limit
+from .meta_rate_limit import MetaRateLimited
+
+GRAPH_HOST = 'https://graph.facebook.com'
+GRAPH_API_VERSION = getattr(settings, 'META_GRAPH_API_VERSION', 'v22.0')
+GRAPH_BASE_URL = f'{GRAPH_HOST}/{GRAPH_API_VERSION}'
+# OAuth ダイアログ（www.facebook.com 側）も同じバージョンに揃える
+OAUTH_DIALOG_URL = f'https://www.facebook.com/{GRAPH_API_VERSION}/dialog/oauth'
+
+DEFAULT_TIMEOUT = 30
+# スロットリングされたレスポンスを（待ってから）再試行する回数
+THROTTLE_RETRIES = 2
+
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    pool_size = int(getattr(settings, 'META_GRAPH_POOL_MAXSIZE', 32))
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.headers.update({
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+    })
+    return session
+
+
+def get_session() -> requests.Session:
+    """プロセス共有の Session。fork 後（Celery prefork の子プロセス）は作り直す。"""
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+
+def graph_url(path: str) -> str:
+    """'act_1/insights' のような相対パスを GRAPH_BASE_URL 付きの URL にする（完全な URL はそのまま）。"""
+    if path.startswith('http://') or path.startswith('https://'):
+        return path
+    return f'{GRAPH_BASE_URL}/{path.lstrip("/")}'
+
+
+def request(
+    method: str,
+    path: str,
+    timeout: Any = DEFAULT_TIMEOUT,
+    max_wait: Optional[float] = None,
+    **kwargs,
+) -> requests.Response:
+    """
+    レート制御付きで 1 リクエスト送る。max_wait はレート制御で待てる秒数
+    （既定 settings.META_RATE_LIMIT_MAX_WAIT）。超える場合は MetaRateLimited。
+    """
+    scopes = meta_rate_limit.request_scopes(
+        path, kwargs.get('params'), kwargs.get('data'), kwargs.get('headers'),
+    )
+    for attempt in range(THROTTLE_RETRIES + 1):
+        # 直前のスロットリングで止まっていれば、ここで回復まで待つ
+        meta_rate_limit.acquire(scopes, max_wait)
+        response = get_session().request(method, graph_url(path), timeout=timeout, **kwargs)
+        retry_after = meta_rate_limit.observe(scopes, response)
+        if retry_after is None:
+            return response
+    raise MetaRateLimited(retry_after, ','.join(scopes))
+
+
+def get(path: str, **kwargs) -> requests.Response:
+    return request('GET', path, **kwargs)
+
+
+def post(path: str, **kwargs) -> requests.Response:
+    return request('POST', path, **kwargs)
+
+
+def delete(path: str, **kwargs) -> requests.Response:
+    return request('DELETE', path, **kwargs)
+
+
+def error_summary(error: BaseException) -> str:
+    """
+    ログ・タスク結果に残せるエラーの要約。HTTPError は「HTTP ステータス + Graph の error.message」、
+    接続エラー等は例外クラス名だけにする（str(requests の例外) は URL を含み、クエリのトークンが漏れうる）。
+    """
+    if not isinstance(error, requests.exceptions.RequestException):
+        return str(error)
+    response = error.response
+    if response is None:
+        return type(error).__name__
+    try:
+        message = ((response.json() or {}).get('error') or {}).get('message') or ''
+    except (AttributeError, ValueError):
+        message = ''
+    return f'HTTP {response.status_code}: {message}' if message else f'HTTP {response.status_code}'
+
+
+def iter_pages(path: str, params: Optional[dict[str, Any]] = None, **kwargs) -> Iterator[dict[str, Any]]:
+    """
+    GET path から paging.next を辿り、ページの JSON を順に返す。paging.next にはクエリが
+    すべて含まれるので 2 ページ目以降は params を付けない。200 以外は HTTPError。
+    """
+    url: Optional[str] = path
+    while url:
+        response = get(url, params=params, **kwargs)
+        response.raise_for_status()
+        payload = response.json() or {}
+        yield payload
+        url = (payload.get('paging') or {}).get('next')
+        params = None
+
+
+def iter_data(path: str, params: Optional[dict[str, Any]] = None, **kwargs) -> Iterator[dict[str, Any]]:
+    """iter_pages の data 行を 1 行ずつ返す。"""
+    for payload in iter_pages(path, params, **kwargs):
+        yield from payload.get('data') or []
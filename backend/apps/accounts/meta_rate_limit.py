@@ -0,0 +1,277 @@
+"""
+Meta Graph API のレート制御（全 Celery ワーカー / Web プロセス共通）。
+
+広告アカウント（act_xxx）とアクセストークンをスコープとして、Meta が返す使用率ヘッダ
+（X-Business-Use-Case-Usage / X-Ad-Account-Usage / X-App-Usage）から残り枠を記録し、
+使用率に応じて 1 秒あたりのリクエスト数を絞る。状態は caches['shared']（本番は Redis。キーは meta_rl:）に置くので、
+複数プロセスから同じアカウントを叩いても合計で上限を超えない。
+
+- 使用率 SOFT_USAGE_PCT 未満: スコープあたり META_RATE_LIMIT_MAX_RPS まで
+- SOFT_USAGE_PCT〜HARD_USAGE_PCT: 残り枠に比例して線形に減速
+- HARD_USAGE_PCT 以上: MIN_RPS（数秒に 1 回）まで落として回復を待つ
+- 回復待ち時間（estimated_time_to_regain_access 等）やスロットリングエラー（17 / 32 / 613 / 80000 番台）:
+  その時刻までスコープを止める
+
+待ち時間が max_wait 以内なら呼び出し元で待ち、超える場合は MetaRateLimited を送出する。
+Celery タスクは retry_after を countdown にして再スケジュールする。キャッシュに届かないときは制御せず通す。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from typing import Any, Iterable, Optional
+from urllib.parse import parse_qs, urlparse
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'shared'
+KEY_PREFIX = 'meta_rl'
+
+# 使用率（%）のしきい値
+SOFT_USAGE_PCT = 50.0
+HARD_USAGE_PCT = 90.0
+# 使用率が HARD を超えたときの最低レート（リクエスト/秒）
+MIN_RPS = 0.2
+# 使用率ヘッダの有効期間（Meta の使用率は直近 1 時間の移動窓なので、古い値で絞り続けない）
+USAGE_TTL_SECONDS = 5 * 60
+# 回復時刻が分からないスロットリングエラーのときに止める秒数
+DEFAULT_BLOCK_SECONDS = 60
+# 待機の上限（この時間を超える場合は例外にして呼び出し元で再スケジュール）
+DEFAULT_MAX_WAIT = 20
+
+# Graph API のスロットリング系エラーコード
+# 4: アプリ / 17: ユーザー / 32: ページ / 613: 呼び出し回数 / 80000〜80014: Business Use Case
+THROTTLE_ERROR_CODES = frozenset({4, 17, 32, 613, *range(80000, 80015)})
+
+_ACT_RE = re.compile(r'(?:^|/)act_(\d+)(?:/|$|\?)')
+
+
+class MetaRateLimited(Exception):
+    """Meta のレート制限で、retry_after 秒待たないと呼べない。"""
+
+    def __init__(self, retry_after: float, scope: str = ''):
+        self.retry_after = max(1, int(retry_after + 0.999))
+        self.scope = scope
+        super().__init__(f'Meta API rate limited ({scope or "unknown scope"}); retry after {self.retry_after}s')
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _max_rps() -> float:
+    return float(getattr(settings, 'META_RATE_LIMIT_MAX_RPS', 5))
+
+
+def _state_key(scope: str) -> str:
+    return f'{KEY_PREFIX}:{scope}:state'
+
+
+def token_scope(access_token: str) -> str:
+    """トークンそのものはキャッシュに置かずハッシュで識別する。"""
+    return 'token:' + hashlib.sha256(access_token.encode('utf-8')).hexdigest()[:16]
+
+
+def _bearer_token(headers: Optional[dict]) -> Optional[str]:
+    """Authorization: Bearer <token> ヘッダのトークン（ヘッダ名は大文字小文字を区別しない）。"""
+    for name, value in (headers or {}).items():
+        if name.lower() != 'authorization' or not isinstance(value, str):
+            continue
+        scheme, _, token = value.strip().partition(' ')
+        if scheme.lower() == 'bearer' and token.strip():
+            return token.strip()
+    return None
+
+
+def request_scopes(
+    path: str,
+    params: Optional[dict] = None,
+    data: Any = None,
+    headers: Optional[dict] = None,
+) -> list[str]:
+    """
+    リクエストの広告アカウント / トークンからスコープを決める。トークンは params / data / Authorization: Bearer
+    ヘッダ / URL のクエリ（paging.next）の順に探す。
+    """
+    scopes = []
+    match = _ACT_RE.search(path)
+    if match:
+        scopes.append(f'act:{match.group(1)}')
+    token = None
+    for source in (params, data if isinstance(data, dict) else None):
+        if source and source.get('access_token'):
+            token = source['access_token']
+            break
+    if token is None:
+        token = _bearer_token(headers)
+    if token is None and '?' in path:
+        token = (parse_qs(urlparse(path).query).get('access_token') or [None])[0]
+    if token:
+        scopes.append(token_scope(token))
+    return scopes
+
+
+def _allowed_rate(usage_pct: float) -> float:
+    """使用率から 1 秒あたりの許容リクエスト数を決める。"""
+    max_rps = _max_rps()
+    if usage_pct < SOFT_USAGE_PCT:
+        return max_rps
+    if usage_pct >= HARD_USAGE_PCT:
+        return MIN_RPS
+    headroom = (HARD_USAGE_PCT - usage_pct) / (HARD_USAGE_PCT - SOFT_USAGE_PCT)
+    return max(MIN_RPS, max_rps * headroom)
+
+
+def _reserve(scope: str, state: dict, now: float) -> float:
+    """
+    scope の現在の窓で 1 枠を確保する。確保できたら 0、できなければ次の窓までの秒数を返す。
+    窓の長さはレートが 1/秒 未満なら 1 リクエスト分の間隔、それ以外は 1 秒（窓内の件数は incr で原子的に数える）。
+    """
+    blocked_until = float(state.get('blocked_until') or 0)
+    if blocked_until > now:
+        return blocked_until - now
+
+    rate = _allowed_rate(float(state.get('usage') or 0))
+    window = max(1.0, 1.0 / rate)
+    slots = max(1, int(rate * window))
+    index = int(now // window)
+    key = f'{KEY_PREFIX}:{scope}:w:{window:g}:{index}'
+    cache = _cache()
+    cache.add(key, 0, timeout=int(window) * 2 + 1)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # 窓の切り替わりで消えた直後。次の窓で取り直す
+        count = slots + 1
+    if count <= slots:
+        return 0.0
+    return (index + 1) * window - now
+
+
+def acquire(scopes: Iterable[str], max_wait: Optional[float] = None) -> None:
+    """
+    scopes すべての枠が取れるまで待つ。待ちが max_wait（既定 settings.META_RATE_LIMIT_MAX_WAIT）を
+    超えるなら MetaRateLimited。
+    """
+    scopes = list(scopes)
+    if not scopes:
+        return
+    if max_wait is None:
+        max_wait = float(getattr(settings, 'META_RATE_LIMIT_MAX_WAIT', DEFAULT_MAX_WAIT))
+    deadline = time.monotonic() + max_wait
+
+    for scope in scopes:
+        while True:
+            try:
+                state = _cache().get(_state_key(scope)) or {}
+                wait = _reserve(scope, state, time.time())
+            except Exception as e:
+                logger.warning(f"Meta rate limiter unavailable, passing through ({scope}): {str(e)}")
+                break
+            if wait <= 0:
+                break
+            if time.monotonic() + wait > deadline:
+                raise MetaRateLimited(wait, scope)
+            # 同じ窓の境界に全ワーカーが一斉に戻らないよう少しずらす
+            time.sleep(wait + random.uniform(0, min(0.25, wait * 0.1)))
+
+
+def _parse_header(response, name: str) -> Any:
+    raw = response.headers.get(name) if response is not None else None
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_usage(response) -> tuple[float, float]:
+    """
+    使用率ヘッダから (最大使用率 %, 回復までの秒数) を返す。ヘッダがなければ (0, 0)。
+    """
+    usage = 0.0
+    regain_seconds = 0.0
+
+    buc = _parse_header(response, 'X-Business-Use-Case-Usage')
+    if isinstance(buc, dict):
+        for entries in buc.values():
+            for entry in entries if isinstance(entries, list) else [entries]:
+                if not isinstance(entry, dict):
+                    continue
+                for field in ('call_count', 'total_cputime', 'total_time'):
+                    usage = max(usage, float(entry.get(field) or 0))
+                regain_seconds = max(regain_seconds, float(entry.get('estimated_time_to_regain_access') or 0) * 60)
+
+    account = _parse_header(response, 'X-Ad-Account-Usage')
+    if isinstance(account, dict):
+        account_pct = float(account.get('acc_id_util_pct') or 0)
+        usage = max(usage, account_pct)
+        if account_pct >= 100:
+            regain_seconds = max(regain_seconds, float(account.get('reset_time_duration') or 0))
+
+    app = _parse_header(response, 'X-App-Usage')
+    if isinstance(app, dict):
+        for field in ('call_count', 'total_cputime', 'total_time'):
+            usage = max(usage, float(app.get(field) or 0))
+
+    return usage, regain_seconds
+
+
+def _throttle_error_code(response) -> Optional[int]:
+    if response is None or response.status_code < 400:
+        return None
+    try:
+        error = (response.json() or {}).get('error') or {}
+        code = int(error.get('code') or 0)
+    except (TypeError, ValueError, AttributeError):
+        return None
+    return code if code in THROTTLE_ERROR_CODES else None
+
+
+def observe(scopes: Iterable[str], response) -> Optional[float]:
+    """
+    レスポンスの使用率ヘッダ / エラーを scopes の状態に反映する。
+    スロットリングされたレスポンスなら回復までの秒数、そうでなければ None を返す。
+    """
+    scopes = list(scopes)
+    if not scopes:
+        return None
+    usage, regain_seconds = parse_usage(response)
+    error_code = _throttle_error_code(response)
+    if error_code is not None:
+        regain_seconds = max(regain_seconds, DEFAULT_BLOCK_SECONDS)
+    if not usage and not regain_seconds:
+        return None
+
+    now = time.time()
+    blocked_until = now + regain_seconds if regain_seconds else 0
+    try:
+        cache = _cache()
+        keys = {scope: _state_key(scope) for scope in scopes}
+        previous = cache.get_many(list(keys.values()))
+        # 並行リクエストの遅れて返った成功レスポンスで、既存の停止時刻を消さない
+        states = {
+            key: {
+                'usage': usage,
+                'blocked_until': max(blocked_until, float((previous.get(key) or {}).get('blocked_until') or 0)),
+            }
+            for key in keys.values()
+        }
+        longest_block = max(state['blocked_until'] for state in states.values()) - now
+        cache.set_many(states, timeout=int(max(USAGE_TTL_SECONDS, longest_block)) + 1)
+    except Exception as e:
+        logger.warning(f"Failed to record Meta usage for {scopes}: {str(e)}")
+    if usage >= HARD_USAGE_PCT or regain_seconds:
+        logger.info(
+            f"Meta usage high for {scopes}: usage={usage:.0f}% regain={regain_seconds:.0f}s "
+            f"error_code={error_code}"
+        )
+    return regain_seconds if error_code is not None else None
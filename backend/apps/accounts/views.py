@@ -11,6 +11,7 @@ from django.conf import settings
 import logging
 import requests
 
+from . import meta_graph
 from .models import User, MetaAccount, BoxAccount
 from .serializers import (
     UserSerializer,
@@ -30,8 +31,6 @@ from .two_factor_serializers import (
 
 logger = logging.getLogger(__name__)
 
-GRAPH_VERSION = 'v18.0'
-
 
 def _graph_adaccount_path(account_id) -> str:
     s = str(account_id).strip()
@@ -58,9 +57,9 @@ def _fetch_business_for_adaccount(access_token: str, account_id) -> Tuple[str, s
     取得できない場合は空タプル。
     """
     act = _graph_adaccount_path(account_id)
-    url = f'https://graph.facebook.com/{GRAPH_VERSION}/{act}'
+    url = meta_graph.graph_url(act)
     try:
-        r = requests.get(
+        r = meta_graph.get(
             url,
             params={'access_token': access_token, 'fields': 'business{id,name}'},
             timeout=30,
@@ -97,10 +96,10 @@ def _graph_me_adaccounts_json(access_token: str) -> dict:
     GET /me/adaccounts。まず business{name} 付きで試し、ビジネス欄の権限不足なら
     business なしで再試行（広告アカウント一覧は取得可能なことが多い）。
     """
-    url = f'https://graph.facebook.com/{GRAPH_VERSION}/me/adaccounts'
+    url = meta_graph.graph_url('me/adaccounts')
     base_fields = 'id,name,account_id,currency,timezone_name,account_status'
     try:
-        r1 = requests.get(
+        r1 = meta_graph.get(
             url,
             params={'access_token': access_token, 'fields': f'{base_fields},business{{id,name}}'},
             timeout=30,
@@ -116,7 +115,7 @@ def _graph_me_adaccounts_json(access_token: str) -> dict:
             'me/adaccounts: business field not permitted, retrying without business field'
         )
         try:
-            r2 = requests.get(
+            r2 = meta_graph.get(
                 url,
                 params={'access_token': access_token, 'fields': base_fields},
                 timeout=30,
@@ -136,7 +135,7 @@ def _fetch_debug_token_info(access_token: str) -> dict:
 
     参照: get_app_access_token / Meta Marketing API
     """
-    debug_url = f'https://graph.facebook.com/{GRAPH_VERSION}/debug_token'
+    debug_url = meta_graph.graph_url('debug_token')
     app_id = (getattr(settings, 'META_APP_ID', None) or '').strip()
     app_secret = (getattr(settings, 'META_APP_SECRET', None) or '').strip()
     params: dict = {'input_token': access_token}
@@ -146,7 +145,7 @@ def _fetch_debug_token_info(access_token: str) -> dict:
         # アプリ未設定時のみ自己照会（本番は .env を推奨）
         params['access_token'] = access_token
     try:
-        r = requests.get(debug_url, params=params, timeout=30)
+        r = meta_graph.get(debug_url, params=params, timeout=30)
     except OSError as e:
         return {'is_valid': False, 'debug_error': str(e)}
     try:
@@ -642,7 +641,7 @@ class MetaAccountViewSet(viewsets.ModelViewSet):
         
         try:
             # Meta APIで長期トークンを取得
-            url = 'https://graph.facebook.com/v18.0/oauth/access_token'
+            url = meta_graph.graph_url('oauth/access_token')
             params = {
                 'grant_type': 'fb_exchange_token',
                 'client_id': app_id,
@@ -650,7 +649,7 @@ class MetaAccountViewSet(viewsets.ModelViewSet):
                 'fb_exchange_token': short_token
             }
             
-            response = requests.get(url, params=params)
+            response = meta_graph.get(url, params=params)
             data = response.json()
             
             if 'access_token' in data:
@@ -684,13 +683,13 @@ class MetaAccountViewSet(viewsets.ModelViewSet):
         
         try:
             # Meta APIでトークンを検証
-            url = 'https://graph.facebook.com/v18.0/me'
+            url = meta_graph.graph_url('me')
             params = {
                 'access_token': access_token,
                 'fields': 'id,name'
             }
             
-            response = requests.get(url, params=params)
+            response = meta_graph.get(url, params=params)
             data = response.json()
             
             if 'id' in data:
@@ -745,7 +744,7 @@ class MetaAccountViewSet(viewsets.ModelViewSet):
         scope = 'ads_management,ads_read,business_management'
         
         auth_url = (
-            f"https://www.facebook.com/v18.0/dialog/oauth?"
+            f"{meta_graph.OAUTH_DIALOG_URL}?"
             f"client_id={app_id}&"
             f"redirect_uri={redirect_uri}&"
             f"scope={scope}&"
@@ -798,7 +797,7 @@ class MetaAccountViewSet(viewsets.ModelViewSet):
         scope = 'ads_management,ads_read,business_management'
         
         auth_url = (
-            f"https://www.facebook.com/v18.0/dialog/oauth?"
+            f"{meta_graph.OAUTH_DIALOG_URL}?"
             f"client_id={app_id}&"
             f"redirect_uri={redirect_uri}&"
             f"scope={scope}&"
@@ -871,7 +870,7 @@ class MetaAccountViewSet(viewsets.ModelViewSet):
             redirect_uri = f"{request.scheme}://{request.get_host()}/api/accounts/meta-accounts/oauth_callback/"
             
             # アクセストークンを取得
-            token_url = 'https://graph.facebook.com/v18.0/oauth/access_token'
+            token_url = meta_graph.graph_url('oauth/access_token')
             token_params = {
                 'client_id': app_id,
                 'client_secret': app_secret,
@@ -879,7 +878,7 @@ class MetaAccountViewSet(viewsets.ModelViewSet):
                 'code': code
             }
             
-            token_response = requests.get(token_url, params=token_params)
+            token_response = meta_graph.get(token_url, params=token_params)
             token_data = token_response.json()
             
             if 'access_token' not in token_data:
@@ -890,7 +889,7 @@ class MetaAccountViewSet(viewsets.ModelViewSet):
             access_token = token_data['access_token']
             
             # 長期トークンに変換
-            long_token_url = 'https://graph.facebook.com/v18.0/oauth/access_token'
+            long_token_url = meta_graph.graph_url('oauth/access_token')
             long_token_params = {
                 'grant_type': 'fb_exchange_token',
                 'client_id': app_id,
@@ -898,7 +897,7 @@ class MetaAccountViewSet(viewsets.ModelViewSet):
                 'fb_exchange_token': access_token
             }
             
-            long_token_response = requests.get(long_token_url, params=long_token_params)
+            long_token_response = meta_graph.get(long_token_url, params=long_token_params)
             long_token_data = long_token_response.json()
             
             if 'access_token' not in long_token_data:
@@ -909,13 +908,13 @@ class MetaAccountViewSet(viewsets.ModelViewSet):
             long_access_token = long_token_data['access_token']
             
             # ユーザー情報を取得
-            user_url = 'https://graph.facebook.com/v18.0/me'
+            user_url = meta_graph.graph_url('me')
             user_params = {
                 'access_token': long_access_token,
                 'fields': 'id,name'
             }
             
-            user_response = requests.get(user_url, params=user_params)
+            user_response = meta_graph.get(user_url, params=user_params)
             user_data = user_response.json()
             
             if 'id' not in user_data:
@@ -0,0 +1,97 @@
+"""
+ダッシュボード（CampaignViewSet.stats）用スナップショットの作成。
+
+stats は Meta を呼ばず DashboardSnapshot を読むだけにし、合計・最近のキャンペーンの指標は
+インサイト更新（cached_insights）と日次取り込みのあとにバックグラウンドで作り直す。
+再作成のキューのロックは Web とワーカーの両方から取る / 外すので、共有キャッシュ caches['shared']（キーは campaigns:dashboard_snapshot:）に置く。
+"""
+from __future__ import annotations
+
+import logging
+from typing import Iterable
+
+from django.core.cache import caches
+from django.db.models import Max, Sum
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'shared'
+RECENT_CAMPAIGNS = 5
+METRIC_FIELDS = ('spend', 'impressions', 'clicks', 'ctr', 'cpc', 'cpm', 'reach', 'frequency')
+# 短時間に続く更新（一括インポート等）で再作成タスクを積み上げないためのロック
+SNAPSHOT_SCHEDULE_LOCK_SECONDS = 30
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _schedule_lock_key(user_id: int) -> str:
+    return f'campaigns:dashboard_snapshot:scheduled:{user_id}'
+
+
+def _metrics(cached_insights) -> dict:
+    ci = cached_insights if isinstance(cached_insights, dict) else {}
+    return {field: ci.get(field, 0) or 0 for field in METRIC_FIELDS}
+
+
+def build_dashboard_snapshot(user_id: int):
+    """user_id のスナップショットを DB 上のデータ（cached_insights / DailyAccountInsight）から作り直す。"""
+    from apps.reporting.models import DailyAccountInsight
+    from .models import Campaign, DashboardSnapshot
+    from .serializers import CampaignListSerializer
+
+    campaigns = Campaign.objects.filter(user_id=user_id).exclude(status__in=['DELETED', 'ARCHIVED'])
+
+    totals = {'total_spend': 0.0, 'total_impressions': 0, 'total_clicks': 0}
+    for cached_insights in campaigns.values_list('cached_insights', flat=True).iterator():
+        metrics = _metrics(cached_insights)
+        totals['total_spend'] += float(metrics['spend'])
+        totals['total_impressions'] += int(metrics['impressions'])
+        totals['total_clicks'] += int(metrics['clicks'])
+
+    recent = list(campaigns.select_related('meta_account').order_by('-created_at')[:RECENT_CAMPAIGNS])
+    recent_data = CampaignListSerializer(recent, many=True).data
+    for campaign, campaign_data in zip(recent, recent_data):
+        campaign_data.update(_metrics(campaign.cached_insights))
+
+    account_days = DailyAccountInsight.objects.filter(meta_account__user_id=user_id)
+    latest_day = account_days.aggregate(day=Max('stat_date'))['day']
+    latest = None
+    if latest_day:
+        row = account_days.filter(stat_date=latest_day).aggregate(
+            spend=Sum('spend'), impressions=Sum('impressions'), clicks=Sum('clicks'),
+        )
+        latest = {
+            'stat_date': latest_day.isoformat(),
+            'spend': float(row['spend'] or 0),
+            'impressions': row['impressions'] or 0,
+            'clicks': row['clicks'] or 0,
+        }
+
+    snapshot, _ = DashboardSnapshot.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'summary': {**totals, 'latest_day': latest},
+            'recent_campaigns': list(recent_data),
+        },
+    )
+    return snapshot
+
+
+def schedule_dashboard_snapshot(user_ids: Iterable[int]) -> None:
+    """user_ids のスナップショット再作成をキューする（ロック中のユーザーはスキップ）。"""
+    from .tasks import rebuild_dashboard_snapshot
+
+    for user_id in set(user_ids):
+        if not _cache().add(_schedule_lock_key(user_id), 1, SNAPSHOT_SCHEDULE_LOCK_SECONDS):
+            continue
+        try:
+            rebuild_dashboard_snapshot.delay(user_id)
+        except Exception as e:
+            logger.warning(f"Failed to queue dashboard snapshot rebuild for user {user_id}: {str(e)}")
+            release_schedule_lock(user_id)
+
+
+def release_schedule_lock(user_id: int) -> None:
+    _cache().delete(_schedule_lock_key(user_id))
@@ -0,0 +1,130 @@
+"""
+reporting_data 用の期間インサイトキャッシュ（(campaign, since, until) 単位）。
+
+過去で閉じた期間は長め、当日を含む期間は短めの鮮度で保持する。鮮度切れのエントリは
+そのまま返しつつバックグラウンド更新をキューする（stale-while-revalidate）。
+更新は Celery ワーカーが書き込むので、エントリと更新ロックは caches['shared']（本番は Redis。キーは campaigns:range_insights:）に置き、
+Web と全ワーカーで共有する。
+"""
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime, timezone as dt_timezone
+from typing import Any, Iterable, Optional
+
+from django.core.cache import caches
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'shared'
+RANGE_INSIGHTS_CACHE_PREFIX = 'campaigns:range_insights'
+
+# 鮮度（この秒数を過ぎたら stale として裏で取り直す）
+OPEN_RANGE_FRESH_SECONDS = 5 * 60
+CLOSED_RANGE_FRESH_SECONDS = 24 * 60 * 60
+# キャッシュ保持期間（stale でも返せるよう鮮度より長く持つ）
+OPEN_RANGE_KEEP_SECONDS = 6 * 60 * 60
+CLOSED_RANGE_KEEP_SECONDS = 30 * 24 * 60 * 60
+# 同じエントリの更新タスクを重複してキューしないためのロック
+REFRESH_LOCK_SECONDS = 5 * 60
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def range_insights_cache_key(campaign_pk: int, since: str, until: str) -> str:
+    return f'{RANGE_INSIGHTS_CACHE_PREFIX}:{campaign_pk}:{since}:{until}'
+
+
+def _refresh_lock_key(campaign_pk: int, since: str, until: str) -> str:
+    return f'{RANGE_INSIGHTS_CACHE_PREFIX}:refreshing:{campaign_pk}:{since}:{until}'
+
+
+def is_closed_range(until: str, today: Optional[date] = None) -> bool:
+    """until が今日より前なら、Meta 側の値がほぼ確定した過去期間とみなす。"""
+    today = today or timezone.localdate()
+    try:
+        return datetime.strptime(until, '%Y-%m-%d').date() < today
+    except (TypeError, ValueError):
+        return False
+
+
+def _ttls(until: str) -> tuple[int, int]:
+    if is_closed_range(until):
+        return CLOSED_RANGE_FRESH_SECONDS, CLOSED_RANGE_KEEP_SECONDS
+    return OPEN_RANGE_FRESH_SECONDS, OPEN_RANGE_KEEP_SECONDS
+
+
+def store_range_insights(insights_by_pk: dict[int, dict[str, Any]], since: str, until: str) -> None:
+    if not insights_by_pk:
+        return
+    _, keep_seconds = _ttls(until)
+    fetched_at = timezone.now().timestamp()
+    _cache().set_many(
+        {
+            range_insights_cache_key(pk, since, until): {'insights': insights, 'fetched_at': fetched_at}
+            for pk, insights in insights_by_pk.items()
+        },
+        timeout=keep_seconds,
+    )
+
+
+def release_refresh_locks(campaign_pks: Iterable[int], since: str, until: str) -> None:
+    _cache().delete_many([_refresh_lock_key(pk, since, until) for pk in campaign_pks])
+
+
+def get_range_insights(campaigns: list, since: str, until: str) -> tuple[dict[int, dict], dict[int, dict]]:
+    """
+    campaigns の期間集計を {Campaign.pk: insights} で返し、あわせて {Campaign.pk: freshness} を返す。
+    キャッシュにないキャンペーンだけ Meta から同期取得して保存する。鮮度切れのエントリはそのまま返し、
+    refresh_range_insights_cache をキューする。Meta から取れなかったキャンペーンは結果に含めない。
+    """
+    from .meta_insights import fetch_campaign_range_insights
+
+    fresh_seconds, _ = _ttls(until)
+    now = timezone.now().timestamp()
+    keys = {campaign.id: range_insights_cache_key(campaign.id, since, until) for campaign in campaigns}
+    cache = _cache()
+    entries = cache.get_many(list(keys.values()))
+
+    insights: dict[int, dict] = {}
+    freshness: dict[int, dict] = {}
+    missing = []
+    stale_ids = []
+    for campaign in campaigns:
+        entry = entries.get(keys[campaign.id])
+        if not entry:
+            missing.append(campaign)
+            continue
+        age = max(0, int(now - entry['fetched_at']))
+        stale = age > fresh_seconds
+        insights[campaign.id] = entry['insights']
+        freshness[campaign.id] = {
+            'source': 'cache',
+            'fetched_at': datetime.fromtimestamp(entry['fetched_at'], tz=dt_timezone.utc).isoformat(),
+            'age_seconds': age,
+            'stale': stale,
+        }
+        if stale:
+            stale_ids.append(campaign.id)
+
+    if missing:
+        fetched = fetch_campaign_range_insights(missing, since, until)
+        store_range_insights(fetched, since, until)
+        fetched_at = timezone.now().isoformat()
+        for pk, row in fetched.items():
+            insights[pk] = row
+            freshness[pk] = {'source': 'meta', 'fetched_at': fetched_at, 'age_seconds': 0, 'stale': False}
+
+    to_refresh = [pk for pk in stale_ids if cache.add(_refresh_lock_key(pk, since, until), 1, REFRESH_LOCK_SECONDS)]
+    if to_refresh:
+        from .tasks import refresh_range_insights_cache
+        try:
+            refresh_range_insights_cache.delay(to_refresh, since, until)
+        except Exception as e:
+            logger.warning(f"Failed to queue range insights refresh ({len(to_refresh)} campaigns): {str(e)}")
+            release_refresh_locks(to_refresh, since, until)
+
+    return insights, freshness
@@ -0,0 +1,223 @@
+"""
+キャンペーンのインサイト（cached_insights）の継続的な更新スケジューラ。
+
+Celery beat から毎分 schedule_insights_refresh を呼び、更新時期を過ぎたキャンペーンを優先度順に並べて、
+Graph API の予算（settings.META_INSIGHTS_REFRESH_BUDGET リクエスト / 回）に収まる分だけ
+fetch_campaigns_insights_from_meta にキューする。「すべて同期」も同じ優先度付けで対象を選ぶ。
+
+優先度 = 古さ（前回取得からの経過 / 更新間隔）× 消化金額 × 配信中か × 最近画面で見られたか
+- 更新間隔: 配信中 30 分 / 最近見られた 5 分 / それ以外 6 時間（間隔に満たないものは対象外）
+- 取得はアカウント単位の insights（meta_insights.fetch_account_campaign_insights）なので、
+  コストはアカウントごとに ceil(キャンペーン数 / 1 リクエストの絞り込み ID 数) リクエストとして数える
+「最近見られた」はキャンペーン一覧・詳細・レポート表示時に mark_viewed で caches['shared']（キーは campaigns:insights_refresh:）に記録する。
+取得に失敗したキャンペーン（トークン切れ等）は record_refresh_results で失敗回数を同じキャッシュに残し、
+回数に応じて間隔を空ける（失敗し続けるアカウントが予算を使い切らないように）。
+"""
+from __future__ import annotations
+
+import heapq
+import logging
+import math
+import time
+from datetime import timedelta
+from typing import Any, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from django.utils import timezone
+
+from .meta_insights import ACCOUNT_INSIGHTS_FILTER_MAX
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'shared'
+# 画面で見られてから優先度を上げておく時間
+VIEW_BOOST_SECONDS = 15 * 60
+
+ACTIVE_REFRESH_INTERVAL = timedelta(minutes=30)
+VIEWED_REFRESH_INTERVAL = timedelta(minutes=5)
+INACTIVE_REFRESH_INTERVAL = timedelta(hours=6)
+
+VIEWED_WEIGHT = 3.0
+INACTIVE_WEIGHT = 0.25
+# 一度も取得していないキャンペーンの古さ（更新間隔の何倍とみなすか）
+NEVER_FETCHED_STALENESS = 100.0
+
+DEFAULT_REFRESH_BUDGET = 20
+
+# 取得失敗後に次に試すまでの間隔（失敗ごとに倍、上限あり）と、失敗回数を覚えておく時間
+FAILURE_BACKOFF = timedelta(minutes=5)
+FAILURE_BACKOFF_MAX = timedelta(hours=6)
+FAILURE_MEMORY_SECONDS = 24 * 60 * 60
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _user_key(user_id: int) -> str:
+    return f'campaigns:insights_refresh:viewed:user:{user_id}'
+
+
+def _campaign_key(campaign_id: int) -> str:
+    return f'campaigns:insights_refresh:viewed:campaign:{campaign_id}'
+
+
+def _failure_key(campaign_id: int) -> str:
+    return f'campaigns:insights_refresh:failed:campaign:{campaign_id}'
+
+
+def refresh_budget() -> int:
+    return int(getattr(settings, 'META_INSIGHTS_REFRESH_BUDGET', DEFAULT_REFRESH_BUDGET))
+
+
+def mark_viewed(user_id: Optional[int] = None, campaign_ids: Iterable[int] = ()) -> None:
+    """画面でインサイトが見られたことを記録する（user_id: そのユーザーの全キャンペーン / campaign_ids: 個別）。"""
+    now = time.time()
+    values = {_campaign_key(pk): now for pk in campaign_ids}
+    if user_id is not None:
+        values[_user_key(user_id)] = now
+    if not values:
+        return
+    try:
+        _cache().set_many(values, timeout=VIEW_BOOST_SECONDS)
+    except Exception as e:
+        logger.warning(f"Failed to record insights view: {str(e)}")
+
+
+def _recently_viewed(campaigns: list) -> set[int]:
+    """最近見られたキャンペーンの pk（ユーザー単位の閲覧はそのユーザーの全キャンペーンに効く）。"""
+    keys = {_user_key(c.user_id) for c in campaigns} | {_campaign_key(c.id) for c in campaigns}
+    try:
+        viewed = _cache().get_many(list(keys))
+    except Exception as e:
+        logger.warning(f"Insights view cache unavailable: {str(e)}")
+        return set()
+    return {c.id for c in campaigns if _user_key(c.user_id) in viewed or _campaign_key(c.id) in viewed}
+
+
+def record_refresh_results(succeeded_ids: Iterable[int], failed_ids: Iterable[int]) -> None:
+    """インサイト取得の結果を記録する。失敗は回数と時刻を積み、成功したキャンペーンの記録は消す。"""
+    failed_keys = [_failure_key(pk) for pk in failed_ids]
+    succeeded_keys = [_failure_key(pk) for pk in succeeded_ids]
+    try:
+        cache = _cache()
+        if failed_keys:
+            previous = cache.get_many(failed_keys)
+            now = time.time()
+            cache.set_many(
+                {
+                    key: {'count': (previous.get(key) or {}).get('count', 0) + 1, 'at': now}
+                    for key in failed_keys
+                },
+                timeout=FAILURE_MEMORY_SECONDS,
+            )
+        if succeeded_keys:
+            cache.delete_many(succeeded_keys)
+    except Exception as e:
+        logger.warning(f"Failed to record insights refresh results: {str(e)}")
+
+
+def _refresh_failures(campaigns: list) -> dict[int, dict]:
+    """{Campaign.pk: {'count': 連続失敗回数, 'at': 最後に失敗した時刻}}（失敗の記録があるものだけ）。"""
+    try:
+        failures = _cache().get_many([_failure_key(c.id) for c in campaigns])
+    except Exception as e:
+        logger.warning(f"Insights refresh failure cache unavailable: {str(e)}")
+        return {}
+    return {c.id: failures[_failure_key(c.id)] for c in campaigns if _failure_key(c.id) in failures}
+
+
+def refresh_candidates(user_id: Optional[int] = None):
+    """更新対象になりうるキャンペーン（Meta 上に実体があり、最短の更新間隔を過ぎたもの）。"""
+    from .models import Campaign
+
+    cutoff = timezone.now() - VIEWED_REFRESH_INTERVAL
+    queryset = (
+        Campaign.objects.filter(meta_account__is_active=True)
+        .filter(Q(insights_updated_at__isnull=True) | Q(insights_updated_at__lt=cutoff))
+        .exclude(status__in=['DELETED', 'ARCHIVED'])
+        .exclude(campaign_id__startswith='camp_')
+        .exclude(campaign_id='')
+        .exclude(meta_account__access_token='')
+    )
+    if user_id is not None:
+        queryset = queryset.filter(user_id=user_id)
+    # 取得自体は fetch_campaigns_insights_from_meta が ID から読み直すので、ここは優先度付けに使う列だけ
+    return queryset.only(
+        'id', 'user', 'meta_account', 'campaign_id', 'status', 'cached_insights', 'insights_updated_at',
+    )
+
+
+def refresh_score(campaign, now, viewed: bool, failure: Optional[dict] = None) -> Optional[float]:
+    """
+    優先度（大きいほど先）。更新間隔を過ぎていなければ None。
+    failure（record_refresh_results の記録）があれば、失敗回数に応じた待ち時間が過ぎるまで None、
+    過ぎても回数に応じて優先度を下げる。
+    """
+    if failure:
+        backoff = min(FAILURE_BACKOFF * 2 ** min(failure['count'] - 1, 10), FAILURE_BACKOFF_MAX)
+        if now.timestamp() < failure['at'] + backoff.total_seconds():
+            return None
+
+    active = campaign.status == 'ACTIVE'
+    if viewed:
+        interval = VIEWED_REFRESH_INTERVAL
+    elif active:
+        interval = ACTIVE_REFRESH_INTERVAL
+    else:
+        interval = INACTIVE_REFRESH_INTERVAL
+
+    if campaign.insights_updated_at is None:
+        staleness = NEVER_FETCHED_STALENESS
+    else:
+        staleness = (now - campaign.insights_updated_at) / interval
+        if staleness < 1:
+            return None
+
+    try:
+        spend = float((campaign.cached_insights or {}).get('spend') or 0)
+    except (TypeError, ValueError):
+        spend = 0.0
+    score = staleness * (1 + math.log10(1 + max(spend, 0)))
+    if not active:
+        score *= INACTIVE_WEIGHT
+    if viewed:
+        score *= VIEWED_WEIGHT
+    if failure:
+        score /= 1 + failure['count']
+    return score
+
+
+def plan_refresh(campaigns: Iterable, budget: int, exclude_ids: Iterable[int] = ()) -> list:
+    """
+    campaigns を優先度順に取り出し、Graph リクエスト数が budget に収まる分を返す。
+    同じ広告アカウントのキャンペーンは 1 リクエストの絞り込み ID 数まで追加コストなしでまとめて取得できる。
+    """
+    now = timezone.now()
+    exclude_ids = set(exclude_ids)
+    campaigns = [c for c in campaigns if c.id not in exclude_ids]
+    viewed = _recently_viewed(campaigns)
+    failures = _refresh_failures(campaigns)
+
+    queue: list[tuple[float, int, Any]] = []
+    for campaign in campaigns:
+        score = refresh_score(campaign, now, campaign.id in viewed, failures.get(campaign.id))
+        if score is not None:
+            queue.append((-score, campaign.id, campaign))
+    heapq.heapify(queue)
+
+    selected = []
+    per_account: dict[int, int] = {}
+    spent = 0
+    while queue:
+        _, _, campaign = heapq.heappop(queue)
+        count = per_account.get(campaign.meta_account_id, 0)
+        cost = 1 if count % ACCOUNT_INSIGHTS_FILTER_MAX == 0 else 0
+        if spent + cost > budget:
+            continue
+        spent += cost
+        per_account[campaign.meta_account_id] = count + 1
+        selected.append(campaign)
+    return selected
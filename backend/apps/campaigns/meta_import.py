@@ -0,0 +1,256 @@
+"""
+Meta 広告アカウントからのキャンペーン / 広告セット / 広告の取り込み（import_from_meta）。
+
+/act_{id}/campaigns・/adsets・/ads をそれぞれ 1 回だけ paging.next まで辿って取得し、
+Meta ID → ローカル行の索引で親子をつなげてから bulk_create / bulk_update でまとめて保存する。
+広告のクリエイティブ（見出し・説明・CTA）はフィールド展開で広告と一緒に取るので、広告ごとの追加 GET はしない。
+既存のキャンペーン / 広告セットはそのまま（従来の get_or_create と同じ）、既存の広告は内容を更新する。
+2 回目以降はエッジごとのウォーターマーク（watermarks.py, kind='import'）以降に更新された行だけを取得し、
+差分に親が含まれない子は DB の既存行につなぐ。差分に含まれる削除済みオブジェクトは新規作成しない。
+"""
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from datetime import datetime
+from typing import Any, Iterable, Optional
+
+import requests
+from django.db import transaction
+from django.utils import timezone
+
+from apps.accounts import meta_graph
+
+from .models import Ad, AdSet, Campaign
+from .status_sync import parse_meta_time
+from .watermarks import advance_watermark, delta_params, load_watermarks
+
+logger = logging.getLogger(__name__)
+
+IMPORT_PAGE_LIMIT = 200
+IMPORT_TIMEOUT = 60
+BULK_BATCH_SIZE = 500
+
+CAMPAIGN_FIELDS = 'id,name,status,effective_status,objective,daily_budget,lifetime_budget,created_time,updated_time'
+ADSET_FIELDS = (
+    'id,name,status,effective_status,campaign_id,daily_budget,lifetime_budget,'
+    'bid_strategy,optimization_goal,created_time,updated_time'
+)
+AD_FIELDS = (
+    'id,name,status,effective_status,adset_id,created_time,updated_time,'
+    'creative{id,object_story_spec{link_data{name,message,description,call_to_action_type,picture}}}'
+)
+AD_UPDATE_FIELDS = (
+    'name', 'status', 'effective_status', 'meta_updated_time',
+    'headline', 'description', 'cta_type', 'review_feedback', 'updated_at',
+)
+
+
+def _stream(meta_account, edge: str, fields: str, since: Optional[datetime] = None) -> Iterable[dict[str, Any]]:
+    from apps.reporting.meta_insights_service import normalize_ad_account_id
+
+    return meta_graph.iter_data(
+        f'{normalize_ad_account_id(meta_account.account_id)}/{edge}',
+        {
+            'access_token': meta_account.access_token,
+            'fields': fields,
+            'limit': IMPORT_PAGE_LIMIT,
+            **delta_params(since),
+        },
+        timeout=IMPORT_TIMEOUT,
+    )
+
+
+def _is_deleted(data: dict[str, Any]) -> bool:
+    return (data.get('effective_status') or '').upper() == 'DELETED'
+
+
+def review_feedback_from_effective_status(effective_status: str) -> dict[str, str]:
+    """effective_status から審査状況（review_feedback）を判定する。"""
+    if not effective_status:
+        return {}
+    if effective_status in ('ACTIVE', 'PAUSED'):
+        return {'overall_status': 'APPROVED'}
+    if effective_status in ('REJECTED', 'ARCHIVED', 'WITH_ISSUES'):
+        return {'overall_status': 'REJECTED'}
+    return {'overall_status': 'PENDING'}
+
+
+def _creative_texts(ad_data: dict[str, Any]) -> tuple[str, str, str]:
+    link_data = (((ad_data.get('creative') or {}).get('object_story_spec') or {}).get('link_data') or {})
+    return (
+        link_data.get('name', ''),
+        link_data.get('message', ''),
+        link_data.get('call_to_action_type', 'LEARN_MORE'),
+    )
+
+
+def _import_campaigns(user, meta_account, campaigns_data: list[dict]) -> tuple[dict[str, Campaign], int]:
+    meta_ids = [c['id'] for c in campaigns_data]
+    existing = Campaign.objects.in_bulk(meta_ids, field_name='campaign_id')
+    now = timezone.now()
+    new = [
+        Campaign(
+            campaign_id=c['id'],
+            user=user,
+            meta_account=meta_account,
+            name=c.get('name', ''),
+            status=c.get('status', 'PAUSED'),
+            effective_status=(c.get('effective_status') or '').upper(),
+            meta_updated_time=parse_meta_time(c.get('updated_time')),
+            objective=c.get('objective', 'OUTCOME_TRAFFIC'),
+            budget=c.get('daily_budget') or c.get('lifetime_budget') or '0',
+            start_date=now,
+            end_date=now + timedelta(days=30),
+        )
+        for c in campaigns_data
+        if c['id'] not in existing and not _is_deleted(c)
+    ]
+    Campaign.objects.bulk_create(new, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+    return Campaign.objects.in_bulk(meta_ids, field_name='campaign_id'), len(new)
+
+
+def _import_adsets(adsets_data: list[dict], campaigns_by_meta_id: dict[str, Campaign]) -> tuple[dict[str, AdSet], int]:
+    # 差分取得では親キャンペーンが今回の取得に含まれないことがあるので、既存行から補う
+    missing_parents = {a.get('campaign_id') for a in adsets_data} - set(campaigns_by_meta_id) - {None}
+    if missing_parents:
+        campaigns_by_meta_id = {
+            **Campaign.objects.in_bulk(list(missing_parents), field_name='campaign_id'),
+            **campaigns_by_meta_id,
+        }
+    adsets_data = [a for a in adsets_data if a.get('campaign_id') in campaigns_by_meta_id]
+    meta_ids = [a['id'] for a in adsets_data]
+    existing = AdSet.objects.in_bulk(meta_ids, field_name='adset_id')
+    new = [
+        AdSet(
+            adset_id=a['id'],
+            campaign=campaigns_by_meta_id[a['campaign_id']],
+            name=a.get('name', ''),
+            status=a.get('status', 'PAUSED'),
+            effective_status=(a.get('effective_status') or '').upper(),
+            meta_updated_time=parse_meta_time(a.get('updated_time')),
+            bid_strategy=a.get('bid_strategy', 'LOWEST_COST_WITHOUT_CAP'),
+            optimization_goal=a.get('optimization_goal', 'LINK_CLICKS'),
+            budget=a.get('daily_budget') or a.get('lifetime_budget') or '0',
+        )
+        for a in adsets_data
+        if a['id'] not in existing and not _is_deleted(a)
+    ]
+    AdSet.objects.bulk_create(new, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+    return AdSet.objects.in_bulk(meta_ids, field_name='adset_id'), len(new)
+
+
+def _import_ads(ads_data: list[dict], adsets_by_meta_id: dict[str, AdSet]) -> tuple[int, int]:
+    missing_parents = {a.get('adset_id') for a in ads_data} - set(adsets_by_meta_id) - {None}
+    if missing_parents:
+        adsets_by_meta_id = {
+            **AdSet.objects.in_bulk(list(missing_parents), field_name='adset_id'),
+            **adsets_by_meta_id,
+        }
+    ads_data = [a for a in ads_data if a.get('adset_id') in adsets_by_meta_id]
+    existing = Ad.objects.in_bulk([a['id'] for a in ads_data], field_name='ad_id')
+    # 削除済みの広告は既存行の更新だけ行う（新規作成も、同名の重複削除の対象にもしない）
+    ads_data = [a for a in ads_data if a['id'] in existing or not _is_deleted(a)]
+    now = timezone.now()
+    new, updated = [], []
+    for ad_data in ads_data:
+        headline, description, cta_type = _creative_texts(ad_data)
+        effective_status = (ad_data.get('effective_status') or '').upper()
+        values = {
+            'name': ad_data.get('name', ''),
+            'status': ad_data.get('status', 'PAUSED'),
+            'effective_status': effective_status,
+            'meta_updated_time': parse_meta_time(ad_data.get('updated_time')),
+            'headline': headline,
+            'description': description,
+            'cta_type': cta_type,
+            'review_feedback': review_feedback_from_effective_status(effective_status),
+        }
+        ad = existing.get(ad_data['id'])
+        if ad is None:
+            new.append(Ad(ad_id=ad_data['id'], adset=adsets_by_meta_id[ad_data['adset_id']], creative_type='LINK', **values))
+        else:
+            for field, value in values.items():
+                setattr(ad, field, value)
+            ad.updated_at = now
+            updated.append(ad)
+
+    # 同じ広告セット内で同名の古い広告（Meta にない ad_id）は重複として削除する
+    imported = {(adsets_by_meta_id[a['adset_id']].pk, a.get('name', '')) for a in ads_data}
+    stale = [
+        pk for pk, adset_pk, name in Ad.objects.filter(
+            adset__in=[adset.pk for adset in adsets_by_meta_id.values()],
+            name__in={name for _, name in imported},
+        ).exclude(ad_id__in=[a['id'] for a in ads_data]).values_list('pk', 'adset_id', 'name')
+        if (adset_pk, name) in imported
+    ]
+    if stale:
+        logger.info(f"Removing {len(stale)} duplicate ads replaced by Meta import")
+        Ad.objects.filter(pk__in=stale).delete()
+
+    Ad.objects.bulk_create(new, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+    Ad.objects.bulk_update(updated, AD_UPDATE_FIELDS, batch_size=BULK_BATCH_SIZE)
+    return len(new), len(updated)
+
+
+def import_meta_account(user, meta_account, full: bool = False) -> dict[str, Any]:
+    """
+    単一 MetaAccount について Graph API からキャンペーン・広告セット・広告を取り込む。
+    full=True ならウォーターマークを使わず全件取得する。
+    total はアカウントのキャンペーン数（差分取得のときは取り込み後のローカルの件数）、skipped は total - imported。
+    incremental は差分取得だったか、changed は Meta から取得したキャンペーン数（差分取得なら前回以降に更新された分）。
+    成功時: {'imported': int, 'skipped': int, 'total': int, 'incremental': bool, 'changed': int,
+             'adsets_imported': int, 'ads_imported': int, 'ads_updated': int}
+    Meta API 失敗時: {'error': str, 'imported': 0, 'skipped': 0, 'total': 0}
+    """
+    from .dashboard import schedule_dashboard_snapshot
+
+    watermarks = {} if full else load_watermarks(meta_account, 'import')
+    try:
+        campaigns_data = [
+            c for c in _stream(meta_account, 'campaigns', CAMPAIGN_FIELDS, watermarks.get('campaigns')) if c.get('id')
+        ]
+        adsets_data = [a for a in _stream(meta_account, 'adsets', ADSET_FIELDS, watermarks.get('adsets')) if a.get('id')]
+        ads_data = [a for a in _stream(meta_account, 'ads', AD_FIELDS, watermarks.get('ads')) if a.get('id')]
+    except requests.exceptions.HTTPError as e:
+        text = e.response.text if e.response is not None else str(e)
+        logger.error(f"Meta API error: {text}")
+        return {'error': f'Meta API エラー: {text}', 'imported': 0, 'skipped': 0, 'total': 0}
+
+    with transaction.atomic():
+        campaigns_by_meta_id, imported = _import_campaigns(user, meta_account, campaigns_data)
+        adsets_by_meta_id, adsets_imported = _import_adsets(adsets_data, campaigns_by_meta_id)
+        ads_imported, ads_updated = _import_ads(ads_data, adsets_by_meta_id)
+        # 取り込みと同じトランザクションで進める（失敗したら次回同じ範囲を取り直す）
+        for edge, rows in (('campaigns', campaigns_data), ('adsets', adsets_data), ('ads', ads_data)):
+            advance_watermark(meta_account, 'import', edge, (parse_meta_time(row.get('updated_time')) for row in rows))
+
+    incremental = 'campaigns' in watermarks
+    if incremental:
+        # 差分取得では変わっていないキャンペーンは返らないので、件数はローカルから数える
+        total = (
+            Campaign.objects.filter(user=user, meta_account=meta_account)
+            .exclude(campaign_id='')
+            .exclude(campaign_id__startswith='camp_')
+            .exclude(status='DELETED')
+            .count()
+        )
+    else:
+        total = len(campaigns_data)
+
+    if imported or ads_imported or ads_updated:
+        schedule_dashboard_snapshot([user.id])
+    logger.info(
+        f"Imported from account {meta_account.id}: campaigns {imported} new / {len(campaigns_data)}, "
+        f"adsets {adsets_imported} new / {len(adsets_data)}, ads {ads_imported} new, {ads_updated} updated"
+    )
+    return {
+        'imported': imported,
+        'skipped': total - imported,
+        'total': total,
+        'incremental': incremental,
+        'changed': len(campaigns_data),
+        'adsets_imported': adsets_imported,
+        'ads_imported': ads_imported,
+        'ads_updated': ads_updated,
+    }
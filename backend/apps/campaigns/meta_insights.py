@@ -0,0 +1,300 @@
+"""
+キャンペーン単位インサイトの Meta 取得（レポート画面 / cached_insights 用）。
+
+広告アカウントごとに /act_{id}/insights?level=campaign を campaign.id で絞り込んで
+ページングストリームで取得し、行を campaign_id でキャンペーンへ振り分ける。
+絞り込みの ID は URL / フィルタの上限に収まるよう 1 リクエストあたり最大 200 件に分ける。
+アカウント単位の取得に失敗した分割だけ、キャンペーンごとの /{campaign_id}/insights を
+トークン単位の Graph バッチリクエスト（1 リクエストあたり最大 50 件）にまとめて取得する。
+"""
+from __future__ import annotations
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, Optional
+from urllib.parse import urlencode
+
+from apps.accounts import meta_graph
+from apps.accounts.meta_rate_limit import MetaRateLimited
+
+logger = logging.getLogger(__name__)
+
+CAMPAIGN_INSIGHT_FIELDS = 'spend,impressions,clicks,ctr,cpc,cpm,reach,frequency,actions,conversions'
+
+# Graph バッチ API の 1 リクエストあたりの上限
+GRAPH_BATCH_MAX = 50
+# バッチは最も遅いサブリクエストを待つため単発（15 秒）より長め
+GRAPH_BATCH_TIMEOUT = 30
+# 同時に投げるアカウント単位リクエスト数（アカウントをまたいだ並列度）
+INSIGHTS_FETCH_WORKERS = 4
+# アカウント単位 insights の 1 ページあたりの行数・タイムアウト
+ACCOUNT_INSIGHTS_PAGE_LIMIT = 500
+ACCOUNT_INSIGHTS_TIMEOUT = 60
+# アカウント単位 insights の campaign.id IN (...) 1 リクエストあたりの ID 数
+ACCOUNT_INSIGHTS_FILTER_MAX = 200
+
+ZERO_INSIGHTS = {
+    'spend': 0.0,
+    'impressions': 0,
+    'clicks': 0,
+    'ctr': 0.0,
+    'cpc': 0.0,
+    'cpm': 0.0,
+    'reach': 0,
+    'frequency': 0.0,
+    'conversions': 0,
+}
+
+_PIXEL_PREFERRED = (
+    ('offsite_conversion.fb_pixel_purchase', 'purchase'),
+    ('offsite_conversion.fb_pixel_complete_registration', 'complete_registration'),
+    ('offsite_conversion.fb_pixel_lead', 'lead'),
+)
+
+
+def count_conversions(insight: dict[str, Any]) -> int:
+    """
+    actions からコンバージョン数を数える（重複を避ける）。
+    purchase / complete_registration / lead は fb_pixel_* があればそちらを優先し、
+    それ以外の offsite_conversion.fb_pixel_* は加算する。actions がなければ conversions を合計。
+    """
+    if 'actions' in insight:
+        actions_dict = {}
+        for action in insight['actions']:
+            actions_dict[action.get('action_type', '')] = int(action.get('value', 0))
+
+        conversions = 0
+        for pixel_type, plain_type in _PIXEL_PREFERRED:
+            if pixel_type in actions_dict:
+                conversions += actions_dict[pixel_type]
+            elif plain_type in actions_dict:
+                conversions += actions_dict[plain_type]
+        preferred = {pixel_type for pixel_type, _ in _PIXEL_PREFERRED}
+        for action_type, action_value in actions_dict.items():
+            if action_type.startswith('offsite_conversion.fb_pixel_') and action_type not in preferred:
+                conversions += action_value
+        return conversions
+
+    if 'conversions' in insight:
+        return sum(int(c.get('value', 0)) for c in insight['conversions'])
+    return 0
+
+
+def parse_campaign_insight(insight: dict[str, Any]) -> dict[str, Any]:
+    """insights の 1 行を cached_insights / reporting_data と同じ形の dict にする。"""
+    return {
+        'spend': float(insight.get('spend', 0)),
+        'impressions': int(insight.get('impressions', 0)),
+        'clicks': int(insight.get('clicks', 0)),
+        'ctr': float(insight.get('ctr', 0)),
+        'cpc': float(insight.get('cpc', 0)),
+        'cpm': float(insight.get('cpm', 0)),
+        'reach': int(insight.get('reach', 0)),
+        'frequency': float(insight.get('frequency', 0)),
+        'conversions': count_conversions(insight),
+    }
+
+
+def graph_batch_get(
+    access_token: str,
+    relative_urls: list[str],
+    timeout: int = GRAPH_BATCH_TIMEOUT,
+    http=meta_graph,
+) -> list[Optional[dict[str, Any]]]:
+    """
+    relative_urls（最大 GRAPH_BATCH_MAX 件）を 1 回のバッチ POST で GET し、同じ順で結果を返す。
+    各要素は {'code': int, 'body': dict} か、Meta が処理しきれなかったサブリクエストは None。
+    バッチ全体の失敗（HTTP エラー / 接続エラー）は例外のまま呼び出し元へ。
+    """
+    if len(relative_urls) > GRAPH_BATCH_MAX:
+        raise ValueError(f'Graph batch supports at most {GRAPH_BATCH_MAX} requests')
+    batch = [{'method': 'GET', 'relative_url': url} for url in relative_urls]
+    response = http.post(
+        f'{meta_graph.GRAPH_BASE_URL}/',
+        data={
+            'access_token': access_token,
+            'batch': json.dumps(batch),
+            'include_headers': 'false',
+        },
+        timeout=timeout,
+    )
+    response.raise_for_status()
+
+    results: list[Optional[dict[str, Any]]] = []
+    payload = response.json() or []
+    for i in range(len(relative_urls)):
+        item = payload[i] if i < len(payload) else None
+        if not item:
+            results.append(None)
+            continue
+        try:
+            body = json.loads(item.get('body') or '{}')
+        except (TypeError, ValueError):
+            body = {}
+        results.append({'code': int(item.get('code') or 0), 'body': body})
+    return results
+
+
+def _campaign_insights_url(meta_campaign_id: str, since: str, until: str) -> str:
+    query = urlencode({
+        'fields': CAMPAIGN_INSIGHT_FIELDS,
+        'time_range': json.dumps({'since': since, 'until': until}),
+        'level': 'campaign',
+    })
+    return f'{meta_campaign_id}/insights?{query}'
+
+
+def _fetch_batch(access_token: str, chunk: list, since: str, until: str) -> dict[int, dict[str, Any]]:
+    urls = [_campaign_insights_url(c.campaign_id, since, until) for c in chunk]
+    try:
+        results = graph_batch_get(access_token, urls)
+    except MetaRateLimited:
+        raise
+    except Exception as e:
+        logger.warning(f"Meta batch insights request failed ({len(chunk)} campaigns): {meta_graph.error_summary(e)}")
+        return {}
+
+    out = {}
+    for campaign, result in zip(chunk, results):
+        if result is None:
+            logger.debug(f"Meta batch returned no response for campaign {campaign.id}")
+            continue
+        if result['code'] != 200:
+            error = (result['body'] or {}).get('error') or {}
+            logger.debug(
+                f"Meta insights failed for campaign {campaign.id}: "
+                f"code={result['code']} message={error.get('message', '')}"
+            )
+            continue
+        rows = result['body'].get('data') or []
+        # HTTP 200 で data が空 = 期間内にインサイト行がない（実質すべて0）。「未取得」と区別する。
+        out[campaign.id] = parse_campaign_insight(rows[0]) if rows else dict(ZERO_INSIGHTS)
+    return out
+
+
+def fetch_account_campaign_insights(
+    meta_account,
+    meta_campaign_ids: list[str],
+    since: str,
+    until: str,
+    timeout: int = ACCOUNT_INSIGHTS_TIMEOUT,
+    http=meta_graph,
+) -> dict[str, dict[str, Any]]:
+    """
+    /act_{id}/insights?level=campaign を campaign.id IN (...) で絞り込み、paging.next を辿って
+    {Meta campaign_id: insights} を返す。期間内に行がないキャンペーンは ZERO_INSIGHTS。
+    meta_campaign_ids は ACCOUNT_INSIGHTS_FILTER_MAX 件までに分けて渡す。
+    HTTP エラー / 接続エラーは例外のまま呼び出し元へ。
+    """
+    from apps.reporting.meta_insights_service import normalize_ad_account_id
+
+    url = meta_graph.graph_url(f'{normalize_ad_account_id(meta_account.account_id)}/insights')
+    # トークンは URL に載せない（例外メッセージやログに URL が残るため）
+    headers = {'Authorization': f'Bearer {meta_account.access_token}'}
+    params: Optional[dict[str, Any]] = {
+        'level': 'campaign',
+        'fields': f'campaign_id,{CAMPAIGN_INSIGHT_FIELDS}',
+        'time_range': json.dumps({'since': since, 'until': until}),
+        'filtering': json.dumps([
+            {'field': 'campaign.id', 'operator': 'IN', 'value': list(meta_campaign_ids)},
+        ]),
+        'limit': ACCOUNT_INSIGHTS_PAGE_LIMIT,
+    }
+    wanted = set(meta_campaign_ids)
+    insights = {cid: dict(ZERO_INSIGHTS) for cid in meta_campaign_ids}
+    while url:
+        response = http.get(url, headers=headers, params=params, timeout=timeout)
+        response.raise_for_status()
+        payload = response.json() or {}
+        for row in payload.get('data') or []:
+            cid = str(row.get('campaign_id') or '')
+            if cid in wanted:
+                insights[cid] = parse_campaign_insight(row)
+        # next には絞り込みを含むクエリがそのまま付く
+        url = (payload.get('paging') or {}).get('next')
+        params = None
+    return insights
+
+
+def _fetch_account_chunk(meta_account, chunk: list, since: str, until: str) -> dict[int, dict[str, Any]]:
+    try:
+        by_meta_id = fetch_account_campaign_insights(
+            meta_account, [c.campaign_id for c in chunk], since, until,
+        )
+    except MetaRateLimited:
+        # 同じアカウント / トークンへのバッチにしても通らないので呼び出し元で待つ
+        raise
+    except Exception as e:
+        logger.warning(
+            f"Meta account insights request failed for account {meta_account.id} "
+            f"({len(chunk)} campaigns), falling back to batch: {meta_graph.error_summary(e)}"
+        )
+    else:
+        return {c.id: by_meta_id[c.campaign_id] for c in chunk if c.campaign_id in by_meta_id}
+
+    out = {}
+    for i in range(0, len(chunk), GRAPH_BATCH_MAX):
+        out.update(_fetch_batch(meta_account.access_token, chunk[i:i + GRAPH_BATCH_MAX], since, until))
+    return out
+
+
+def _fetch_account_group(meta_account, group: list, since: str, until: str) -> dict[int, dict[str, Any]]:
+    out = {}
+    for i in range(0, len(group), ACCOUNT_INSIGHTS_FILTER_MAX):
+        out.update(_fetch_account_chunk(meta_account, group[i:i + ACCOUNT_INSIGHTS_FILTER_MAX], since, until))
+    return out
+
+
+def fetch_campaign_range_insights(campaigns: Iterable, since: str, until: str) -> dict[int, dict[str, Any]]:
+    """
+    campaigns（meta_account を select_related 済み）の期間集計を取得し {Campaign.pk: insights} を返す。
+    meta_account ごとにアカウント単位の insights を 1 ストリーム取得し、アカウント間は並列に投げる。
+    取得できなかったキャンペーン（サブリクエストのエラー・バッチ失敗）は結果に含めない。
+    レート制限で待ちきれないときは MetaRateLimited を送出する。
+    """
+    accounts: dict[int, Any] = {}
+    groups: dict[int, list] = {}
+    for campaign in campaigns:
+        meta_account = campaign.meta_account
+        if not campaign.campaign_id or meta_account is None or not meta_account.access_token:
+            continue
+        accounts[meta_account.id] = meta_account
+        groups.setdefault(meta_account.id, []).append(campaign)
+
+    insights: dict[int, dict[str, Any]] = {}
+    if not groups:
+        return insights
+
+    with ThreadPoolExecutor(max_workers=min(INSIGHTS_FETCH_WORKERS, len(groups))) as executor:
+        results = executor.map(
+            lambda account_pk: _fetch_account_group(accounts[account_pk], groups[account_pk], since, until),
+            list(groups),
+        )
+        for result in results:
+            insights.update(result)
+    return insights
+
+
+def refresh_cached_insights(campaigns: Iterable, since: str, until: str) -> dict[int, dict[str, Any]]:
+    """
+    fetch_campaign_range_insights で取得できたキャンペーンの cached_insights / insights_updated_at を
+    1 回の bulk_update で更新し、{Campaign.pk: insights} を返す。対象ユーザーのダッシュボードも作り直す。
+    """
+    from django.utils import timezone
+    from .models import Campaign
+
+    campaigns = list(campaigns)
+    insights = fetch_campaign_range_insights(campaigns, since, until)
+    now = timezone.now()
+    updated = []
+    for campaign in campaigns:
+        if campaign.id in insights:
+            campaign.cached_insights = insights[campaign.id]
+            campaign.insights_updated_at = now
+            updated.append(campaign)
+    if updated:
+        from .dashboard import schedule_dashboard_snapshot
+        Campaign.objects.bulk_update(updated, ['cached_insights', 'insights_updated_at'])
+        schedule_dashboard_snapshot(campaign.user_id for campaign in updated)
+    return insights
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("campaigns", "0010_dashboardsnapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="campaign",
+            name="effective_status",
+            field=models.CharField(blank=True, default="", max_length=40),
+        ),
+        migrations.AddField(
+            model_name="campaign",
+            name="meta_updated_time",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="adset",
+            name="effective_status",
+            field=models.CharField(blank=True, default="", max_length=40),
+        ),
+        migrations.AddField(
+            model_name="adset",
+            name="meta_updated_time",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="ad",
+            name="effective_status",
+            field=models.CharField(blank=True, default="", max_length=40),
+        ),
+        migrations.AddField(
+            model_name="ad",
+            name="meta_updated_time",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0008_metaaccount_business"),
+        ("campaigns", "0011_meta_status_fields"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MetaSyncWatermark",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "kind",
+                    models.CharField(choices=[("status", "Status sync"), ("import", "Import")], max_length=20),
+                ),
+                (
+                    "object_type",
+                    models.CharField(
+                        choices=[("campaigns", "Campaigns"), ("adsets", "Ad Sets"), ("ads", "Ads")],
+                        max_length=20,
+                    ),
+                ),
+                ("updated_time", models.DateTimeField()),
+                ("synced_at", models.DateTimeField(auto_now=True)),
+                (
+                    "meta_account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sync_watermarks",
+                        to="accounts.metaaccount",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Meta sync watermark",
+                "verbose_name_plural": "Meta sync watermarks",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="metasyncwatermark",
+            constraint=models.UniqueConstraint(
+                fields=("meta_account", "kind", "object_type"), name="uniq_meta_sync_watermark"
+            ),
+        ),
+    ]
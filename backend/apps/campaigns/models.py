@@ -90,6 +90,10 @@ class Campaign(models.Model):
     #   "frequency": 1.11
     # }
     insights_updated_at = models.DateTimeField(null=True, blank=True)
+
+    # Meta 側の配信状態と最終更新時刻（一括ステータス同期で更新）
+    effective_status = models.CharField(max_length=40, blank=True, default='')
+    meta_updated_time = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         verbose_name = _('Campaign')
@@ -186,6 +190,10 @@ class AdSet(models.Model):
     end_time = models.DateTimeField(null=True, blank=True)
     delivery_type = models.CharField(max_length=20, choices=DELIVERY_TYPE_CHOICES, default='STANDARD')
     
+    # Meta 側の配信状態と最終更新時刻（一括ステータス同期で更新）
+    effective_status = models.CharField(max_length=40, blank=True, default='')
+    meta_updated_time = models.DateTimeField(null=True, blank=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -280,9 +288,59 @@ class Ad(models.Model):
     #   ]
     # }
     
+    # Meta 側の配信状態と最終更新時刻（一括ステータス同期で更新）
+    effective_status = models.CharField(max_length=40, blank=True, default='')
+    meta_updated_time = models.DateTimeField(null=True, blank=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = _('Ad')
         verbose_name_plural = _('Ads')
+
+
+class DashboardSnapshot(models.Model):
+    """ダッシュボード（stats）用のユーザー単位スナップショット。インサイト更新・取り込みタスクが作り直す。"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='dashboard_snapshot')
+    # total_spend / total_impressions / total_clicks / latest_day（最新取り込み日の合計）
+    summary = models.JSONField(default=dict, blank=True)
+    # 最近のキャンペーン（CampaignListSerializer + cached_insights の指標）
+    recent_campaigns = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('Dashboard snapshot')
+        verbose_name_plural = _('Dashboard snapshots')
+
+
+class MetaSyncWatermark(models.Model):
+    """
+    Meta オブジェクト同期の差分取得用ウォーターマーク（広告アカウント × 同期の種類 × オブジェクト種別）。
+    updated_time は前回までに反映した Meta 側 updated_time の最大値で、次回はこれ以降に更新された分だけ取得する。
+    """
+    KIND_CHOICES = [
+        ('status', _('Status sync')),
+        ('import', _('Import')),
+    ]
+    OBJECT_TYPE_CHOICES = [
+        ('campaigns', _('Campaigns')),
+        ('adsets', _('Ad Sets')),
+        ('ads', _('Ads')),
+    ]
+
+    meta_account = models.ForeignKey(MetaAccount, on_delete=models.CASCADE, related_name='sync_watermarks')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_type = models.CharField(max_length=20, choices=OBJECT_TYPE_CHOICES)
+    updated_time = models.DateTimeField()
+    synced_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('Meta sync watermark')
+        verbose_name_plural = _('Meta sync watermarks')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['meta_account', 'kind', 'object_type'],
+                name='uniq_meta_sync_watermark',
+            ),
+        ]
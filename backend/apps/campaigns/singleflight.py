@@ -0,0 +1,150 @@
+"""
+Meta を呼ぶタスクの重複キュー抑止（singleflight）。
+
+(タスク名, オブジェクト ID) ごとにロックキーを cache.add で取り、値に実行中のタスク ID を入れる。
+同じオブジェクトのタスクが待機中・実行中の間は新しくキューせず、既存のタスク ID を返す
+（「すべて同期」の連打で同じキャンペーンの取得が何本も積まれないようにする）。
+ロックはタスク終了時（task_postrun。再試行のときは外さない）に外し、取り損ねても LOCK_TTL_SECONDS で切れる。
+キャッシュは caches['shared']（本番は Redis。キーは campaigns:singleflight:）で、Web と Celery ワーカーの間で共有する。
+キャッシュに届かないときは抑止せずにキューする。
+"""
+from __future__ import annotations
+
+import logging
+import uuid
+from typing import Any, Callable, Iterable, Optional
+
+from celery import states
+from celery.signals import task_postrun
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'shared'
+# タスクの最大実行時間（CELERY_TASK_TIME_LIMIT）と同じ。レート制限の再試行待ちが続いてもこれで切れる
+LOCK_TTL_SECONDS = 30 * 60
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _lock_key(task_name: str, key: Any) -> str:
+    return f'campaigns:singleflight:{task_name}:{key}'
+
+
+def _owner_key(task_id: str) -> str:
+    return f'campaigns:singleflight:task:{task_id}'
+
+
+def _claim(task_name: str, keys: Iterable[Any], task_id: str) -> tuple[list, dict[Any, str]]:
+    """keys のうち取れたものと、{取れなかった key: 実行中のタスク ID} を返す。"""
+    cache = _cache()
+    claimed, running = [], {}
+    for key in keys:
+        lock = _lock_key(task_name, key)
+        # get と add の間にロックが外れた場合に備えて 1 回だけ取り直す
+        for _ in range(2):
+            if cache.add(lock, task_id, timeout=LOCK_TTL_SECONDS):
+                claimed.append(key)
+                break
+            owner = cache.get(lock)
+            if owner:
+                running[key] = owner
+                break
+        else:
+            running[key] = ''
+    if claimed:
+        cache.set(
+            _owner_key(task_id),
+            [_lock_key(task_name, key) for key in claimed],
+            timeout=LOCK_TTL_SECONDS,
+        )
+    return claimed, running
+
+
+def release(task_id: str) -> None:
+    """task_id が持つロックを外す（他のタスクに取り直されたロックはそのまま）。"""
+    cache = _cache()
+    locks = cache.get(_owner_key(task_id)) or []
+    owners = cache.get_many(locks)
+    cache.delete_many([lock for lock in locks if owners.get(lock) == task_id])
+    cache.delete(_owner_key(task_id))
+
+
+def in_flight(task, object_ids: Iterable[Any]) -> set:
+    """object_ids のうち、task が待機中・実行中のもの。"""
+    object_ids = list(object_ids)
+    try:
+        owners = _cache().get_many([_lock_key(task.name, key) for key in object_ids])
+    except Exception as e:
+        logger.warning(f"Singleflight cache unavailable for {task.name}: {str(e)}")
+        return set()
+    return {key for key in object_ids if _lock_key(task.name, key) in owners}
+
+
+def enqueue_once(task, key: Any, args: tuple = (), kwargs: Optional[dict] = None) -> tuple[str, bool]:
+    """
+    (task, key) が待機中・実行中でなければキューする。
+    戻り値は (タスク ID, 新しくキューしたか)。キューしなかったときは実行中のタスク ID。
+    """
+    task_id = str(uuid.uuid4())
+    try:
+        claimed, running = _claim(task.name, [key], task_id)
+    except Exception as e:
+        logger.warning(f"Singleflight cache unavailable, enqueueing {task.name}[{key}]: {str(e)}")
+        claimed, running = [key], {}
+    if not claimed:
+        logger.info(f"Coalesced {task.name}[{key}] into running task {running[key]}")
+        return running[key], False
+
+    try:
+        task.apply_async(args, kwargs, task_id=task_id)
+    except Exception:
+        release(task_id)
+        raise
+    return task_id, True
+
+
+def enqueue_coalesced(
+    task,
+    object_ids: list,
+    kwargs: Optional[dict] = None,
+    task_id: Optional[str] = None,
+    before_enqueue: Optional[Callable[[list], None]] = None,
+) -> tuple[Optional[str], list, dict[Any, str]]:
+    """
+    task(object_ids, **kwargs) 形式のタスクを、待機中・実行中のタスクが持っていない ID だけで 1 本キューする。
+    before_enqueue はキューする ID が決まってからキューする前に呼ぶ（進捗カウンタの作成など）。
+    戻り値は (キューしたタスク ID または None, キューした ID, {実行中の ID: そのタスク ID})。
+    """
+    task_id = task_id or str(uuid.uuid4())
+    try:
+        claimed, running = _claim(task.name, object_ids, task_id)
+    except Exception as e:
+        logger.warning(f"Singleflight cache unavailable, enqueueing {task.name}: {str(e)}")
+        claimed, running = list(object_ids), {}
+    if running:
+        logger.info(f"Coalesced {len(running)} object(s) of {task.name} into running tasks")
+    if not claimed:
+        return None, [], running
+
+    try:
+        if before_enqueue is not None:
+            before_enqueue(claimed)
+        task.apply_async((claimed,), kwargs, task_id=task_id)
+    except Exception:
+        release(task_id)
+        raise
+    return task_id, claimed, running
+
+
+@task_postrun.connect
+def _release_on_task_finished(sender=None, task_id=None, state=None, **kwargs):
+    # 再試行（レート制限など）のときは同じタスク ID で再実行されるので、ロックを持ったままにする
+    if not task_id or state == states.RETRY:
+        return
+    try:
+        release(task_id)
+    except Exception as e:
+        logger.warning(f"Failed to release singleflight locks for task {task_id}: {str(e)}")
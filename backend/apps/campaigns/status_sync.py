@@ -0,0 +1,265 @@
+"""
+キャンペーン / 広告セット / 広告のステータスを広告アカウント単位で一括同期する。
+
+広告アカウントごとに /act_{id}/campaigns・/adsets・/ads を
+fields=id,status,effective_status,updated_time で 1 本ずつページング取得し、
+ローカルの行とメモリ上で突き合わせて、変わった行だけを bulk_update する。
+2 回目以降はエッジごとのウォーターマーク（watermarks.py, kind='status'）以降に更新された行だけを取得する。
+updated_time の変わらない effective_status の変化を拾うため、1 日 1 回は全件取得する（full=True）。
+キャンペーン 1 件の配下をまとめて同期するとき（sync_campaign_full_from_meta）は
+/{campaign_id}?fields=...,adsets{...,ads{...}} のフィールド展開で階層ごと 1 リクエストで取得する。
+オブジェクトごとの GET（sync_campaign_status_from_meta 等）は 1 件だけ同期したいとき用に残す。
+"""
+from __future__ import annotations
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Optional
+
+from django.utils import timezone
+
+from apps.accounts import meta_graph
+
+logger = logging.getLogger(__name__)
+
+STATUS_SYNC_FIELDS = 'id,status,effective_status,updated_time'
+STATUS_SYNC_PAGE_LIMIT = 500
+STATUS_SYNC_TIMEOUT = 60
+# 同時に取得する広告アカウント数
+STATUS_SYNC_WORKERS = 4
+# 取得対象のエッジ: (エッジ名, モデル名, Meta ID のフィールド名, Campaign までの lookup prefix)
+STATUS_EDGES = (
+    ('campaigns', 'Campaign', 'campaign_id', ''),
+    ('adsets', 'AdSet', 'adset_id', 'campaign__'),
+    ('ads', 'Ad', 'ad_id', 'adset__campaign__'),
+)
+SYNCED_FIELDS = ('status', 'effective_status', 'meta_updated_time')
+# フィールド展開で 1 ページに含める広告セット / 広告の件数（超えた分はネストした paging.next を辿る）
+HIERARCHY_PAGE_LIMIT = 200
+HIERARCHY_FIELDS = (
+    f'{STATUS_SYNC_FIELDS},'
+    f'adsets.limit({HIERARCHY_PAGE_LIMIT}){{{STATUS_SYNC_FIELDS},'
+    f'ads.limit({HIERARCHY_PAGE_LIMIT}){{{STATUS_SYNC_FIELDS}}}}}'
+)
+
+
+def parse_meta_time(value: Optional[str]) -> Optional[datetime]:
+    """'2026-01-01T12:00:00+0900' 形式（Graph API の日時）を aware datetime にする。"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S%z')
+    except (TypeError, ValueError):
+        return None
+
+
+def fetch_edge_statuses(
+    meta_account, edge: str, http=meta_graph, since: Optional[datetime] = None,
+) -> dict[str, dict[str, Any]]:
+    """
+    /act_{id}/{edge} を paging.next まで辿り、{Meta ID: {status, effective_status, meta_updated_time}} を返す。
+    since を渡すとそれ以降に更新された行（削除・アーカイブを含む）だけを取得する。
+    """
+    from apps.reporting.meta_insights_service import normalize_ad_account_id
+    from .watermarks import delta_params
+
+    rows = http.iter_data(
+        f'{normalize_ad_account_id(meta_account.account_id)}/{edge}',
+        {
+            'fields': STATUS_SYNC_FIELDS,
+            'limit': STATUS_SYNC_PAGE_LIMIT,
+            **delta_params(since),
+        },
+        headers=_auth_headers(meta_account),
+        timeout=STATUS_SYNC_TIMEOUT,
+    )
+    return {str(row['id']): _status_values(row) for row in rows if row.get('id')}
+
+
+def _auth_headers(meta_account) -> dict[str, str]:
+    # トークンは URL に載せない（例外メッセージやログ・タスク結果に URL が残るため）
+    return {'Authorization': f'Bearer {meta_account.access_token}'}
+
+
+def _status_values(row: dict[str, Any]) -> dict[str, Any]:
+    return {
+        'status': (row.get('status') or '').upper(),
+        'effective_status': (row.get('effective_status') or '').upper(),
+        'meta_updated_time': parse_meta_time(row.get('updated_time')),
+    }
+
+
+def _nested_rows(parent: dict[str, Any], edge: str, http, headers: dict[str, str]) -> list[dict[str, Any]]:
+    """フィールド展開したエッジの行。1 ページに収まらなければ paging.next を辿って続きを取る。"""
+    nested = parent.get(edge) or {}
+    rows = list(nested.get('data') or [])
+    next_url = (nested.get('paging') or {}).get('next')
+    if next_url:
+        rows.extend(http.iter_data(next_url, headers=headers, timeout=STATUS_SYNC_TIMEOUT))
+    return rows
+
+
+def fetch_campaign_tree(campaign, http=meta_graph) -> dict[str, dict[str, dict[str, Any]]]:
+    """
+    キャンペーンとその広告セット・広告のステータスをフィールド展開でまとめて取得する。
+    戻り値は {'campaigns' | 'adsets' | 'ads': {Meta ID: {status, effective_status, meta_updated_time}}}。
+    200 以外は HTTPError。
+    """
+    headers = _auth_headers(campaign.meta_account)
+    response = http.get(
+        campaign.campaign_id,
+        headers=headers,
+        params={'fields': HIERARCHY_FIELDS},
+        timeout=STATUS_SYNC_TIMEOUT,
+    )
+    response.raise_for_status()
+    payload = response.json() or {}
+
+    tree: dict[str, dict[str, dict[str, Any]]] = {'campaigns': {}, 'adsets': {}, 'ads': {}}
+    if payload.get('id'):
+        tree['campaigns'][str(payload['id'])] = _status_values(payload)
+    for adset in _nested_rows(payload, 'adsets', http, headers):
+        if not adset.get('id'):
+            continue
+        tree['adsets'][str(adset['id'])] = _status_values(adset)
+        for ad in _nested_rows(adset, 'ads', http, headers):
+            if ad.get('id'):
+                tree['ads'][str(ad['id'])] = _status_values(ad)
+    return tree
+
+
+def _local_rows(model, id_field: str, **filters) -> list:
+    return list(
+        model.objects.filter(**filters)
+        .exclude(**{f'{id_field}__startswith': 'camp_'})
+        .exclude(**{id_field: ''})
+        .exclude(status='DELETED')
+        .only('id', id_field, *SYNCED_FIELDS)
+    )
+
+
+def diff_statuses(local_rows: list, id_field: str, remote: dict[str, dict[str, Any]]) -> list:
+    """remote と値が違うローカル行を更新済みの状態で返す（保存はしない）。"""
+    changed = []
+    for obj in local_rows:
+        fetched = remote.get(getattr(obj, id_field))
+        if fetched is None:
+            continue
+        if fetched['meta_updated_time'] is None:
+            fetched = {**fetched, 'meta_updated_time': obj.meta_updated_time}
+        if any(getattr(obj, field) != fetched[field] for field in SYNCED_FIELDS):
+            for field in SYNCED_FIELDS:
+                setattr(obj, field, fetched[field])
+            changed.append(obj)
+    return changed
+
+
+def _apply_statuses(model, id_field: str, local_rows: list, remote: dict[str, dict[str, Any]], now) -> tuple[int, int]:
+    """remote と違うローカル行を bulk_update し、(Meta にあった行数, 更新した行数) を返す。"""
+    matched = sum(1 for obj in local_rows if getattr(obj, id_field) in remote)
+    changed = diff_statuses(local_rows, id_field, remote)
+    if changed:
+        for obj in changed:
+            obj.updated_at = now
+        model.objects.bulk_update(changed, [*SYNCED_FIELDS, 'updated_at'], batch_size=500)
+    return matched, len(changed)
+
+
+def sync_campaign_tree(campaign) -> dict[str, Any]:
+    """
+    キャンペーン 1 件とその配下のステータスを同期する（Graph API 呼び出しは通常 1 回）。
+    戻り値は sync_user_statuses と同じ形のエッジごとの件数と、Meta に見つからなかったローカル行。
+    """
+    from . import models as campaign_models
+    from .dashboard import schedule_dashboard_snapshot
+
+    remote = fetch_campaign_tree(campaign)
+    now = timezone.now()
+    counts = {}
+    missing = []
+    for edge, model_name, id_field, campaign_prefix in STATUS_EDGES:
+        model = getattr(campaign_models, model_name)
+        local_rows = _local_rows(model, id_field, **{f'{campaign_prefix}pk': campaign.pk})
+        matched, updated = _apply_statuses(model, id_field, local_rows, remote[edge], now)
+        counts[edge] = {'local': len(local_rows), 'fetched': len(remote[edge]), 'matched': matched, 'updated': updated}
+        missing.extend(
+            {'type': edge, 'id': obj.id, id_field: getattr(obj, id_field)}
+            for obj in local_rows
+            if getattr(obj, id_field) not in remote[edge]
+        )
+
+    if counts['campaigns']['updated']:
+        schedule_dashboard_snapshot([campaign.user_id])
+    return {'counts': counts, 'missing': missing}
+
+
+def sync_user_statuses(user_id: int, full: bool = False) -> dict[str, Any]:
+    """
+    user_id のキャンペーン / 広告セット / 広告のステータスを、紐づく広告アカウントごとに一括同期する。
+    ローカルに行がないエッジは取得しない。full=True ならウォーターマークを使わず全件取得する。
+    戻り値はエッジごとの件数（local: ローカル行数 / fetched: Meta の行数 /
+    matched: Meta にあったローカル行数 / updated: 更新した行数）と失敗したアカウント
+    （{MetaAccount.pk: HTTP ステータスと Graph の error.message}。タスク結果に残るので URL は含めない）。
+    """
+    from apps.accounts.meta_rate_limit import MetaRateLimited
+    from apps.accounts.models import MetaAccount
+    from . import models as campaign_models
+    from .dashboard import schedule_dashboard_snapshot
+    from .watermarks import advance_watermark, load_watermarks
+
+    accounts = list(
+        MetaAccount.objects.filter(
+            is_active=True, campaigns__user_id=user_id,
+        ).exclude(access_token='').distinct()
+    )
+
+    # (account, edge) ごとのローカル行。取得はスレッドで、書き込みは呼び出し元スレッドで行う
+    work = []
+    for meta_account in accounts:
+        watermarks = {} if full else load_watermarks(meta_account, 'status')
+        for edge, model_name, id_field, campaign_prefix in STATUS_EDGES:
+            model = getattr(campaign_models, model_name)
+            local_rows = _local_rows(
+                model, id_field,
+                **{f'{campaign_prefix}meta_account': meta_account, f'{campaign_prefix}user_id': user_id},
+            )
+            if local_rows:
+                work.append((meta_account, edge, model, id_field, local_rows, watermarks.get(edge)))
+
+    counts = {edge: {'local': 0, 'fetched': 0, 'matched': 0, 'updated': 0} for edge, *_ in STATUS_EDGES}
+    failed_accounts: dict[int, str] = {}
+    if not work:
+        return {'accounts': len(accounts), 'counts': counts, 'failed_accounts': failed_accounts}
+
+    def _fetch(item):
+        meta_account, edge, since = item[0], item[1], item[5]
+        try:
+            return fetch_edge_statuses(meta_account, edge, since=since), None
+        except MetaRateLimited:
+            raise
+        except Exception as e:
+            return None, e
+
+    now = timezone.now()
+    with ThreadPoolExecutor(max_workers=min(STATUS_SYNC_WORKERS, len(work))) as executor:
+        for (meta_account, edge, model, id_field, local_rows, _since), (remote, error) in zip(
+            work, executor.map(_fetch, work),
+        ):
+            counts[edge]['local'] += len(local_rows)
+            if error is not None:
+                summary = meta_graph.error_summary(error)
+                logger.warning(f"Meta {edge} status fetch failed for account {meta_account.id}: {summary}")
+                failed_accounts[meta_account.id] = summary
+                continue
+            matched, updated = _apply_statuses(model, id_field, local_rows, remote, now)
+            counts[edge]['fetched'] += len(remote)
+            counts[edge]['matched'] += matched
+            counts[edge]['updated'] += updated
+            # 反映が終わってから進める（途中で落ちたら次回同じ範囲を取り直す）
+            advance_watermark(meta_account, 'status', edge, (row['meta_updated_time'] for row in remote.values()))
+
+    if counts['campaigns']['updated']:
+        schedule_dashboard_snapshot([user_id])
+    logger.info(f"Bulk status sync for user {user_id}: accounts={len(accounts)} counts={counts}")
+    return {'accounts': len(accounts), 'counts': counts, 'failed_accounts': failed_accounts}
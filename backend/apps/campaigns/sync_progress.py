@@ -0,0 +1,67 @@
+"""
+「すべて同期」（sync_all_from_meta）の実数進捗。
+
+total / completed / failed をそれぞれ別のキャッシュキーのカウンタとして持ち、完了ごとに incr する
+（Redis の INCR なので、何本のワーカーが同時に終わっても取りこぼさない）。
+キャッシュは caches['shared']（本番は Redis。キーは campaigns:sync_all:progress:）で、Web と Celery ワーカーの間で共有する。
+進捗の配信は sync_all_progress（1 回取得）と sync_all_progress_stream（SSE）から read_sync_progress で読む。
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Optional
+
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'shared'
+PROGRESS_TTL_SECONDS = 60 * 60
+_COUNTERS = ('total', 'completed', 'failed')
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _key(sync_run_id: str, counter: str) -> str:
+    return f'campaigns:sync_all:progress:{sync_run_id}:{counter}'
+
+
+def start_sync_run(sync_run_id: str, total: int) -> None:
+    """進捗カウンタを作る。タスクをキューする前に呼ぶ（先に終わったタスクの分を上書きしないため）。"""
+    _cache().set_many(
+        {
+            _key(sync_run_id, 'total'): int(total),
+            _key(sync_run_id, 'completed'): 0,
+            _key(sync_run_id, 'failed'): 0,
+        },
+        timeout=PROGRESS_TTL_SECONDS,
+    )
+
+
+def mark_sync_progress(sync_run_id: Optional[str], status: str) -> None:
+    """1 件完了を記録する。status が 'error' なら failed も進める。"""
+    if not sync_run_id:
+        return
+    cache = _cache()
+    try:
+        if status == 'error':
+            cache.incr(_key(sync_run_id, 'failed'))
+        cache.incr(_key(sync_run_id, 'completed'))
+    except ValueError:
+        # 期限切れ・未作成の run（sync_all 以外からの呼び出し）は記録しない
+        logger.debug(f"Sync progress for {sync_run_id} not found; skipping")
+
+
+def read_sync_progress(sync_run_id: str) -> dict[str, Any]:
+    """sync_all_progress と同じ形の dict を返す。run が見つからなければ status='not_found'。"""
+    values = _cache().get_many([_key(sync_run_id, counter) for counter in _COUNTERS])
+    if _key(sync_run_id, 'total') not in values:
+        return {'sync_run_id': sync_run_id, 'status': 'not_found', 'total': 0, 'completed': 0, 'failed': 0}
+    progress = {counter: int(values.get(_key(sync_run_id, counter)) or 0) for counter in _COUNTERS}
+    return {
+        'sync_run_id': sync_run_id,
+        **progress,
+        'status': 'done' if progress['completed'] >= progress['total'] else 'running',
+    }
@@ -1,36 +1,35 @@
 from celery import shared_task
+from celery.exceptions import SoftTimeLimitExceeded
 from django.conf import settings
-from django.core.cache import cache
 import requests
 import logging
 import base64
 import os
 from urllib.parse import urljoin
 
+from apps.accounts import meta_graph
+from apps.accounts.meta_rate_limit import MetaRateLimited
+
+from .meta_insights import ZERO_INSIGHTS
+# singleflight の import でタスク終了時のロック解放（task_postrun）もワーカーに登録される
+from .singleflight import enqueue_coalesced
+from .sync_progress import mark_sync_progress
+
 logger = logging.getLogger(__name__)
 
+# Meta のレート制限で再スケジュールする回数の上限
+RATE_LIMIT_MAX_RETRIES = 5
 
-def _sync_progress_cache_key(sync_run_id: str) -> str:
-    return f"campaigns:sync_all:progress:{sync_run_id}"
-
-
-def _mark_sync_progress(sync_run_id: str | None, status: str) -> None:
-    if not sync_run_id:
-        return
-    key = _sync_progress_cache_key(sync_run_id)
-    data = cache.get(key)
-    if not isinstance(data, dict):
-        return
-    total = int(data.get('total') or 0)
-    completed = int(data.get('completed') or 0) + 1
-    failed = int(data.get('failed') or 0) + (1 if status == 'error' else 0)
-    new_data = {
-        **data,
-        'completed': completed,
-        'failed': failed,
-        'status': 'done' if total == 0 or completed >= total else 'running',
-    }
-    cache.set(key, new_data, timeout=60 * 60)
+# ユーザーの全広告アカウントを回すタスクの時間制限（既定の CELERY_TASK_SOFT_TIME_LIMIT=60 秒では足りない）。
+# time_limit は singleflight の LOCK_TTL_SECONDS（30 分）を超えないこと
+USER_SYNC_SOFT_TIME_LIMIT = 15 * 60
+USER_SYNC_TIME_LIMIT = 20 * 60
+
+
+def _retry_when_rate_limited(task, exc: MetaRateLimited):
+    """MetaRateLimited を、Meta の枠が戻る時刻に合わせた再スケジュールにする（raise して使う）"""
+    logger.info(f"{task.name}: {str(exc)}; rescheduling")
+    return task.retry(exc=exc, countdown=exc.retry_after, max_retries=RATE_LIMIT_MAX_RETRIES)
 
 
 def _meta_campaign_insights_time_range_json():
@@ -44,6 +43,43 @@ def _meta_campaign_insights_time_range_json():
     return json.dumps({'since': start_d.strftime('%Y-%m-%d'), 'until': end_d.strftime('%Y-%m-%d')})
 
 
+def _refresh_campaigns_cached_insights(campaigns) -> dict:
+    """
+    campaigns の直近約1年のインサイトを広告アカウント単位で取得して cached_insights を一括更新し、
+    {Campaign.pk: タスク結果 payload} を返す。
+    """
+    import json
+    from .meta_insights import refresh_cached_insights
+
+    time_range = json.loads(_meta_campaign_insights_time_range_json())
+    insights = refresh_cached_insights(campaigns, time_range['since'], time_range['until'])
+
+    results = {}
+    for campaign in campaigns:
+        if campaign.id not in insights:
+            results[campaign.id] = {
+                'status': 'error',
+                'campaign_id': campaign.campaign_id,
+                'message': 'Meta API insights fetch failed',
+                'insights': dict(ZERO_INSIGHTS),
+            }
+        elif insights[campaign.id] == ZERO_INSIGHTS:
+            # data=[] でも「取得試行済み」として時刻を更新済み（UI進捗に反映させる）
+            results[campaign.id] = {
+                'status': 'warning',
+                'campaign_id': campaign.campaign_id,
+                'message': 'No insights data available',
+                'insights': insights[campaign.id],
+            }
+        else:
+            results[campaign.id] = {
+                'status': 'success',
+                'campaign_id': campaign.campaign_id,
+                'insights': insights[campaign.id],
+            }
+    return results
+
+
 def upload_image_to_meta(ad, access_token):
     """
     Meta APIに画像をアップロードしてハッシュIDを取得する関数
@@ -81,7 +117,7 @@ def upload_image_to_meta(ad, access_token):
         logger.info(f"File size check: {os.path.getsize(full_image_path)} bytes")
         
         # Meta APIに画像をアップロード
-        meta_api_url = "https://graph.facebook.com/v22.0/adaccounts/{account_id}/adimages"
+        meta_api_url = f"{meta_graph.GRAPH_BASE_URL}/act_{{account_id}}/adimages"
         logger.info(f"Meta API URL template: {meta_api_url}")
         
         # アクセストークンチェック
@@ -100,7 +136,7 @@ def upload_image_to_meta(ad, access_token):
         try:
             account_id = ad.adset.campaign.meta_account.account_id
             # Meta APIの正しい形式: act_1576785066140972/adimages
-            api_url = f"https://graph.facebook.com/v22.0/act_{account_id}/adimages"
+            api_url = f"{meta_graph.GRAPH_BASE_URL}/act_{account_id}/adimages"
             
             logger.info(f"Account ID: {account_id}")
             logger.info(f"API URL: {api_url}")
@@ -112,7 +148,7 @@ def upload_image_to_meta(ad, access_token):
                 logger.info("Sending request to Meta API...")
                 
                 # POST先URLを構築（account_idはaccess_tokenから取得する必要がある）
-                response = requests.post(
+                response = meta_graph.post(
                     api_url,
                     headers={'Authorization': f'Bearer {access_token}'},
                     files=files,
@@ -188,7 +224,7 @@ def submit_campaign_to_meta(self, campaign_id):
         logger.info(f"Starting Meta API submission for campaign: {campaign.name}")
         
         # Meta APIのベースURL（最新バージョンに更新）
-        api_base_url = f"https://graph.facebook.com/v22.0"
+        api_base_url = meta_graph.GRAPH_BASE_URL
         
         headers = {
             'Authorization': f'Bearer {meta_account.access_token}',
@@ -283,7 +319,7 @@ def submit_campaign_to_meta(self, campaign_id):
         # 実際のMeta APIに接続を試行
         try:
             logger.info(f"Attempting to connect to Meta API: {api_base_url}/act_{meta_account.account_id}/campaigns")
-            response = requests.post(
+            response = meta_graph.post(
                 f"{api_base_url}/act_{meta_account.account_id}/campaigns",
                 headers=headers,
                 json=campaign_data,
@@ -446,7 +482,7 @@ def submit_campaign_to_meta(self, campaign_id):
                 logger.info(f"Sending AdSet data to Meta API: {adset_data}")
                 
                 # AdSetをAPIに作成
-                adset_response = requests.post(
+                adset_response = meta_graph.post(
                     f"{api_base_url}/act_{meta_account.account_id}/adsets",
                     headers=headers,
                     json=adset_data
@@ -528,7 +564,7 @@ def submit_campaign_to_meta(self, campaign_id):
                         logger.info(f"Sending Ad data to Meta API: {ad_data}")
                         
                         # 広告を作成
-                        ad_response = requests.post(
+                        ad_response = meta_graph.post(
                             f"{api_base_url}/act_{meta_account.account_id}/ads",
                             headers=headers,
                             json=ad_data
@@ -611,7 +647,7 @@ def delete_campaign_from_meta(self, campaign_id):
             raise Exception("Meta account is not active")
         
         # Meta APIのベースURL
-        api_base_url = f"https://graph.facebook.com/v22.0"
+        api_base_url = meta_graph.GRAPH_BASE_URL
         
         headers = {
             'Authorization': f'Bearer {meta_account.access_token}',
@@ -628,7 +664,7 @@ def delete_campaign_from_meta(self, campaign_id):
                 logger.info(f"DELETE request URL: {delete_url}")
                 logger.info(f"DELETE request headers: {headers}")
                 
-                response = requests.delete(delete_url, headers=headers, timeout=30)
+                response = meta_graph.delete(delete_url, headers=headers, timeout=30)
                 
                 logger.info(f"Meta API delete response status: {response.status_code}")
                 logger.info(f"Meta API delete response text: {response.text}")
@@ -643,7 +679,7 @@ def delete_campaign_from_meta(self, campaign_id):
                         if adset.adset_id and not adset.adset_id.startswith('adset_'):
                             try:
                                 adset_delete_url = f"{api_base_url}/{adset.adset_id}"
-                                adset_response = requests.delete(adset_delete_url, headers=headers, timeout=30)
+                                adset_response = meta_graph.delete(adset_delete_url, headers=headers, timeout=30)
                                 if adset_response.status_code == 200:
                                     logger.info(f"AdSet deleted successfully from Meta: {adset.adset_id}")
                                 else:
@@ -657,7 +693,7 @@ def delete_campaign_from_meta(self, campaign_id):
                             if ad.ad_id and not ad.ad_id.startswith('ad_'):
                                 try:
                                     ad_delete_url = f"{api_base_url}/{ad.ad_id}"
-                                    ad_response = requests.delete(ad_delete_url, headers=headers, timeout=30)
+                                    ad_response = meta_graph.delete(ad_delete_url, headers=headers, timeout=30)
                                     if ad_response.status_code == 200:
                                         logger.info(f"Ad deleted successfully from Meta: {ad.ad_id}")
                                     else:
@@ -771,7 +807,7 @@ def activate_campaign_in_meta(self, campaign_id):
             raise Exception("Meta account is not active")
         
         # Meta APIのベースURL
-        api_base_url = f"https://graph.facebook.com/v22.0"
+        api_base_url = meta_graph.GRAPH_BASE_URL
         
         headers = {
             'Authorization': f'Bearer {meta_account.access_token}',
@@ -793,7 +829,7 @@ def activate_campaign_in_meta(self, campaign_id):
                 logger.info(f"POST request headers: {headers}")
                 
                 # POSTメソッドでステータス更新を試行
-                response = requests.post(update_url, headers=headers, json=update_data, timeout=30)
+                response = meta_graph.post(update_url, headers=headers, json=update_data, timeout=30)
                 
                 logger.info(f"Meta API activate response status: {response.status_code}")
                 logger.info(f"Meta API activate response text: {response.text}")
@@ -906,7 +942,7 @@ def pause_campaign_in_meta(self, campaign_id):
             raise Exception("Meta account is not active")
         
         # Meta APIのベースURL
-        api_base_url = f"https://graph.facebook.com/v22.0"
+        api_base_url = meta_graph.GRAPH_BASE_URL
         
         headers = {
             'Authorization': f'Bearer {meta_account.access_token}',
@@ -928,7 +964,7 @@ def pause_campaign_in_meta(self, campaign_id):
                 logger.info(f"POST request headers: {headers}")
                 
                 # POSTメソッドでステータス更新を試行
-                response = requests.post(update_url, headers=headers, json=update_data, timeout=30)
+                response = meta_graph.post(update_url, headers=headers, json=update_data, timeout=30)
                 
                 logger.info(f"Meta API pause response status: {response.status_code}")
                 logger.info(f"Meta API pause response text: {response.text}")
@@ -1022,229 +1058,32 @@ def pause_campaign_in_meta(self, campaign_id):
 def fetch_campaign_insights_from_meta(self, campaign_id, sync_run_id=None):
     """Meta APIからキャンペーンのインサイトデータを取得するタスク"""
     from .models import Campaign
-    from apps.accounts.models import MetaAccount
-    
+
     def _finish(payload):
-        _mark_sync_progress(sync_run_id, str(payload.get('status', 'error')))
+        mark_sync_progress(sync_run_id, str(payload.get('status', 'error')))
         return payload
 
     try:
-        logger.info(f"=== FETCH CAMPAIGN INSIGHTS TASK STARTED ===")
-        logger.info(f"Campaign ID: {campaign_id}")
-        
-        # キャンペーンを取得
-        campaign = Campaign.objects.get(id=campaign_id)
+        campaign = Campaign.objects.select_related('meta_account').get(id=campaign_id)
         meta_account = campaign.meta_account
-        
-        logger.info(f"Campaign Name: {campaign.name}")
-        logger.info(f"Campaign Facebook ID: {campaign.campaign_id}")
-        logger.info(f"Meta Account ID: {meta_account.id}")
-        logger.info(f"Meta Account Name: {meta_account.account_name}")
-        
-        if not meta_account.is_active:
+        if meta_account is None or not meta_account.is_active:
             raise Exception("Meta account is not active")
-        
-        # Meta APIのベースURL
-        api_base_url = f"https://graph.facebook.com/v22.0"
-        
-        headers = {
-            'Authorization': f'Bearer {meta_account.access_token}',
-            'Content-Type': 'application/json',
-        }
-        
+
         # FacebookのキャンペーンIDが存在する場合のみインサイト取得を試行
-        if campaign.campaign_id and not campaign.campaign_id.startswith('camp_'):
-            logger.info(f"Fetching campaign insights from Meta API: {campaign.campaign_id}")
-            
-            try:
-                # Meta APIからキャンペーンのインサイトデータを取得
-                insights_url = f"{api_base_url}/{campaign.campaign_id}/insights"
-                params = {
-                    'fields': 'spend,impressions,clicks,ctr,cpc,cpm,reach,frequency,actions,conversions',
-                    'time_range': _meta_campaign_insights_time_range_json(),
-                    'level': 'campaign'
-                }
-                
-                logger.info(f"GET request URL: {insights_url}")
-                logger.info(f"GET request params: {params}")
-                logger.info(f"GET request headers: {headers}")
-                
-                response = requests.get(insights_url, headers=headers, params=params, timeout=30)
-                
-                logger.info(f"Meta API insights response status: {response.status_code}")
-                logger.info(f"Meta API insights response text: {response.text}")
-                
-                if response.status_code == 200:
-                    insights_data = response.json()
-                    logger.info(f"Campaign insights fetched successfully: {insights_data}")
-                    
-                    # インサイトデータを処理
-                    if 'data' in insights_data and len(insights_data['data']) > 0:
-                        insight = insights_data['data'][0]
-                        
-                        # コンバージョン数を抽出（重複を避ける）
-                        conversions = 0
-                        if 'actions' in insight:
-                            # まず、すべてのアクションを分類
-                            actions_dict = {}
-                            for action in insight['actions']:
-                                action_type = action.get('action_type', '')
-                                action_value = int(action.get('value', 0))
-                                actions_dict[action_type] = action_value
-                            
-                            # offsite_conversion.fb_pixel_* を優先的にカウント（重複を避ける）
-                            # 1. offsite_conversion.fb_pixel_purchase を優先
-                            if 'offsite_conversion.fb_pixel_purchase' in actions_dict:
-                                conversions += actions_dict['offsite_conversion.fb_pixel_purchase']
-                            elif 'purchase' in actions_dict:
-                                # offsite_conversion.fb_pixel_purchase がない場合のみ purchase をカウント
-                                conversions += actions_dict['purchase']
-                            
-                            # 2. offsite_conversion.fb_pixel_complete_registration を優先
-                            if 'offsite_conversion.fb_pixel_complete_registration' in actions_dict:
-                                conversions += actions_dict['offsite_conversion.fb_pixel_complete_registration']
-                            elif 'complete_registration' in actions_dict:
-                                # offsite_conversion.fb_pixel_complete_registration がない場合のみ complete_registration をカウント
-                                conversions += actions_dict['complete_registration']
-                            
-                            # 3. offsite_conversion.fb_pixel_lead を優先
-                            if 'offsite_conversion.fb_pixel_lead' in actions_dict:
-                                conversions += actions_dict['offsite_conversion.fb_pixel_lead']
-                            elif 'lead' in actions_dict:
-                                # offsite_conversion.fb_pixel_lead がない場合のみ lead をカウント
-                                conversions += actions_dict['lead']
-                            
-                            # 4. その他の offsite_conversion（上記以外）
-                            for action_type, action_value in actions_dict.items():
-                                if action_type.startswith('offsite_conversion.fb_pixel_') and action_type not in [
-                                    'offsite_conversion.fb_pixel_purchase',
-                                    'offsite_conversion.fb_pixel_complete_registration',
-                                    'offsite_conversion.fb_pixel_lead'
-                                ]:
-                                    conversions += action_value
-                        elif 'conversions' in insight:
-                            # conversionsフィールドがある場合
-                            for conversion in insight['conversions']:
-                                conversions += int(conversion.get('value', 0))
-                        
-                        insights_dict = {
-                            'spend': float(insight.get('spend', 0)),
-                            'impressions': int(insight.get('impressions', 0)),
-                            'clicks': int(insight.get('clicks', 0)),
-                            'ctr': float(insight.get('ctr', 0)),
-                            'cpc': float(insight.get('cpc', 0)),
-                            'cpm': float(insight.get('cpm', 0)),
-                            'reach': int(insight.get('reach', 0)),
-                            'frequency': float(insight.get('frequency', 0)),
-                            'conversions': conversions,
-                        }
-                        
-                        # キャッシュに保存
-                        from django.utils import timezone
-                        campaign.cached_insights = insights_dict
-                        campaign.insights_updated_at = timezone.now()
-                        campaign.save(update_fields=['cached_insights', 'insights_updated_at'])
-                        logger.info(f"Cached insights for campaign {campaign.id}")
-                        
-                        return _finish({
-                            'status': 'success',
-                            'campaign_id': campaign.campaign_id,
-                            'insights': insights_dict
-                        })
-                    else:
-                        logger.warning(f"No insights data found for campaign {campaign.campaign_id}")
-                        # data=[] でも「取得試行済み」として時刻を更新し、UI進捗に反映させる
-                        from django.utils import timezone
-                        zero_insights = {
-                            'spend': 0,
-                            'impressions': 0,
-                            'clicks': 0,
-                            'ctr': 0,
-                            'cpc': 0,
-                            'cpm': 0,
-                            'reach': 0,
-                            'frequency': 0,
-                            'conversions': 0,
-                        }
-                        campaign.cached_insights = zero_insights
-                        campaign.insights_updated_at = timezone.now()
-                        campaign.save(update_fields=['cached_insights', 'insights_updated_at'])
-                        return _finish({
-                            'status': 'warning',
-                            'campaign_id': campaign.campaign_id,
-                            'message': 'No insights data available',
-                            'insights': zero_insights
-                        })
-                else:
-                    logger.error(f"Meta API insights failed with status {response.status_code}: {response.text}")
-                    return _finish({
-                        'status': 'error',
-                        'campaign_id': campaign.campaign_id,
-                        'message': f'Meta API insights failed with status {response.status_code}: {response.text}',
-                        'insights': {
-                            'spend': 0,
-                            'impressions': 0,
-                            'clicks': 0,
-                            'ctr': 0,
-                            'cpc': 0,
-                            'cpm': 0,
-                            'reach': 0,
-                            'frequency': 0,
-                        }
-                    })
-                    
-            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-                logger.warning(f"Meta API connection failed during insights fetch: {e}")
-                return _finish({
-                    'status': 'warning',
-                    'campaign_id': campaign.campaign_id,
-                    'message': f'Meta API connection failed during insights fetch: {str(e)}',
-                    'insights': {
-                        'spend': 0,
-                        'impressions': 0,
-                        'clicks': 0,
-                        'ctr': 0,
-                        'cpc': 0,
-                        'cpm': 0,
-                        'reach': 0,
-                        'frequency': 0,
-                    }
-                })
-            except Exception as e:
-                logger.error(f"Unexpected error during Meta API insights fetch: {str(e)}")
-                return _finish({
-                    'status': 'error',
-                    'campaign_id': campaign.campaign_id,
-                    'message': f'Unexpected error during Meta API insights fetch: {str(e)}',
-                    'insights': {
-                        'spend': 0,
-                        'impressions': 0,
-                        'clicks': 0,
-                        'ctr': 0,
-                        'cpc': 0,
-                        'cpm': 0,
-                        'reach': 0,
-                        'frequency': 0,
-                    }
-                })
-        else:
+        if not campaign.campaign_id or campaign.campaign_id.startswith('camp_'):
             logger.info(f"Campaign has no valid Facebook ID or is demo campaign: {campaign.campaign_id}")
             return _finish({
                 'status': 'info',
                 'campaign_id': campaign.campaign_id,
                 'message': 'Campaign has no valid Facebook ID or is demo campaign - no Meta insights available',
-                'insights': {
-                    'spend': 0,
-                    'impressions': 0,
-                    'clicks': 0,
-                    'ctr': 0,
-                    'cpc': 0,
-                    'cpm': 0,
-                    'reach': 0,
-                    'frequency': 0,
-                }
+                'insights': dict(ZERO_INSIGHTS),
             })
-    
+
+        results = _refresh_campaigns_cached_insights([campaign])
+        return _finish(results[campaign.id])
+
+    except MetaRateLimited as e:
+        raise _retry_when_rate_limited(self, e)
     except Campaign.DoesNotExist:
         logger.error(f"Campaign with ID {campaign_id} not found")
         return _finish({
@@ -1259,6 +1098,168 @@ def fetch_campaign_insights_from_meta(self, campaign_id, sync_run_id=None):
         })
 
 
+@shared_task(
+    bind=True,
+    soft_time_limit=USER_SYNC_SOFT_TIME_LIMIT,
+    time_limit=USER_SYNC_TIME_LIMIT,
+)
+def fetch_campaigns_insights_from_meta(self, campaign_ids, sync_run_id=None):
+    """
+    複数キャンペーンのインサイトを広告アカウント単位でまとめて取得し、cached_insights を一括更新するタスク。
+    sync_run_id があればキャンペーンごとに進捗を 1 件ずつ進める。
+    時間切れ（SoftTimeLimitExceeded）とレート制限の再試行切れは進捗を失敗として閉じてから送出し、タスクを失敗にする。
+    """
+    from .insights_scheduler import record_refresh_results
+    from .models import Campaign
+
+    try:
+        campaigns = list(
+            Campaign.objects.select_related('meta_account')
+            .filter(id__in=campaign_ids, meta_account__is_active=True)
+            .exclude(campaign_id__startswith='camp_')
+            .exclude(campaign_id='')
+        )
+        results = _refresh_campaigns_cached_insights(campaigns)
+    except MetaRateLimited as e:
+        try:
+            # 進捗は再実行で進める
+            raise _retry_when_rate_limited(self, e)
+        except MetaRateLimited:
+            # 再試行の上限に達すると retry は元の例外をそのまま送出する。再実行はないので進捗を失敗として閉じる
+            logger.error(f"Meta API bulk insights fetch gave up after rate limit retries for {len(campaign_ids)} campaigns")
+            for _ in campaign_ids:
+                mark_sync_progress(sync_run_id, 'error')
+            raise
+    except SoftTimeLimitExceeded:
+        logger.error(f"Meta API bulk insights fetch timed out for {len(campaign_ids)} campaigns")
+        for _ in campaign_ids:
+            mark_sync_progress(sync_run_id, 'error')
+        raise
+    except Exception as e:
+        logger.error(f"Meta API bulk insights fetch failed: {str(e)}")
+        results = {}
+
+    statuses = {'success': 0, 'warning': 0, 'error': 0}
+    succeeded, failed = [], []
+    for campaign_id in campaign_ids:
+        result = results.get(campaign_id) or {'status': 'error'}
+        statuses[result['status']] = statuses.get(result['status'], 0) + 1
+        mark_sync_progress(sync_run_id, result['status'])
+        (failed if result['status'] == 'error' else succeeded).append(campaign_id)
+    # 失敗したキャンペーンは定期更新の間隔を空ける（トークン切れのアカウントが予算を使い続けないように）
+    record_refresh_results(succeeded, failed)
+
+    logger.info(f"Bulk insights fetch finished for {len(campaign_ids)} campaigns: {statuses}")
+    return {
+        'status': 'success' if statuses['error'] == 0 else 'warning',
+        'counts': statuses,
+    }
+
+
+@shared_task(bind=True)
+def schedule_insights_refresh(self):
+    """
+    更新時期を過ぎたキャンペーンのインサイトを優先度順に、Graph の予算内でキューするタスク（Celery beat から毎分）。
+    取得中のキャンペーンは予算に数えない。
+    """
+    from .insights_scheduler import plan_refresh, refresh_budget, refresh_candidates
+    from .singleflight import in_flight
+
+    candidates = list(refresh_candidates())
+    running = in_flight(fetch_campaigns_insights_from_meta, [c.id for c in candidates])
+    planned = plan_refresh(candidates, budget=refresh_budget(), exclude_ids=running)
+    if not planned:
+        return {'status': 'success', 'queued': 0, 'candidates': len(candidates), 'running': len(running)}
+
+    task_id, queued_ids, _ = enqueue_coalesced(fetch_campaigns_insights_from_meta, [c.id for c in planned])
+    logger.info(
+        f"Insights refresh scheduled: queued={len(queued_ids)} candidates={len(candidates)} "
+        f"running={len(running)} task={task_id}"
+    )
+    return {
+        'status': 'success',
+        'task_id': task_id,
+        'queued': len(queued_ids),
+        'candidates': len(candidates),
+        'running': len(running),
+    }
+
+
+@shared_task(bind=True)
+def schedule_full_status_sync(self):
+    """
+    Meta のキャンペーンを持つユーザーごとに、全件のステータス同期をキューするタスク（Celery beat から 1 日 1 回）。
+    差分同期は updated_time を見るので、updated_time の変わらない effective_status の変化はここで拾う。
+    差分同期とは別のキーで重複を抑止する（実行中の差分同期に吸収されないように）。
+    """
+    from .models import Campaign
+    from .singleflight import enqueue_once
+
+    user_ids = sorted(set(
+        Campaign.objects.filter(meta_account__is_active=True)
+        .exclude(meta_account__access_token='')
+        .exclude(campaign_id='')
+        .exclude(campaign_id__startswith='camp_')
+        .exclude(status='DELETED')
+        .values_list('user_id', flat=True)
+    ))
+    queued = 0
+    for user_id in user_ids:
+        _, created = enqueue_once(
+            sync_user_statuses_from_meta, f'{user_id}:full', args=(user_id,), kwargs={'full': True},
+        )
+        queued += int(created)
+    logger.info(f"Full status sync scheduled: users={len(user_ids)} queued={queued}")
+    return {'status': 'success', 'users': len(user_ids), 'queued': queued}
+
+
+@shared_task(bind=True)
+def rebuild_dashboard_snapshot(self, user_id):
+    """ダッシュボード（stats）用スナップショットを作り直すタスク"""
+    from .dashboard import build_dashboard_snapshot, release_schedule_lock
+
+    # 作成中に入った更新で再度キューできるよう、先にロックを外す
+    release_schedule_lock(user_id)
+    try:
+        snapshot = build_dashboard_snapshot(user_id)
+        return {'status': 'success', 'updated_at': snapshot.updated_at.isoformat()}
+    except Exception as e:
+        logger.error(f"Dashboard snapshot rebuild failed for user {user_id}: {str(e)}")
+        return {'status': 'error', 'message': f'Dashboard snapshot rebuild failed: {str(e)}'}
+
+
+@shared_task(
+    bind=True,
+    soft_time_limit=USER_SYNC_SOFT_TIME_LIMIT,
+    time_limit=USER_SYNC_TIME_LIMIT,
+)
+def refresh_range_insights_cache(self, campaign_ids, since, until):
+    """reporting_data の期間インサイトキャッシュ（stale になったエントリ）を裏で取り直すタスク"""
+    from .insights_cache import release_refresh_locks, store_range_insights
+    from .meta_insights import fetch_campaign_range_insights
+    from .models import Campaign
+
+    try:
+        campaigns = list(Campaign.objects.select_related('meta_account').filter(id__in=campaign_ids))
+        insights = fetch_campaign_range_insights(campaigns, since, until)
+        store_range_insights(insights, since, until)
+        logger.info(
+            f"Range insights cache refreshed for {len(insights)}/{len(campaign_ids)} campaigns "
+            f"({since} to {until})"
+        )
+        return {'status': 'success', 'refreshed': len(insights)}
+    except MetaRateLimited as e:
+        raise _retry_when_rate_limited(self, e)
+    except SoftTimeLimitExceeded:
+        logger.error(f"Range insights cache refresh timed out ({len(campaign_ids)} campaigns, {since} to {until})")
+        raise
+    except Exception as e:
+        logger.error(f"Range insights cache refresh failed: {str(e)}")
+        return {'status': 'error', 'message': f'Range insights cache refresh failed: {str(e)}'}
+    finally:
+        release_refresh_locks(campaign_ids, since, until)
+
+
 @shared_task(bind=True)
 def sync_campaign_status_from_meta(self, campaign_id):
     """Meta APIからキャンペーンステータスを取得してローカルと同期するタスク"""
@@ -1283,7 +1284,7 @@ def sync_campaign_status_from_meta(self, campaign_id):
             raise Exception("Meta account is not active")
         
         # Meta APIのベースURL
-        api_base_url = f"https://graph.facebook.com/v22.0"
+        api_base_url = meta_graph.GRAPH_BASE_URL
         
         headers = {
             'Authorization': f'Bearer {meta_account.access_token}',
@@ -1303,7 +1304,7 @@ def sync_campaign_status_from_meta(self, campaign_id):
                 logger.info(f"GET request params: {params}")
                 logger.info(f"GET request headers: {headers}")
                 
-                response = requests.get(fetch_url, headers=headers, params=params, timeout=30)
+                response = meta_graph.get(fetch_url, headers=headers, params=params, timeout=30)
                 
                 logger.info(f"Meta API fetch response status: {response.status_code}")
                 logger.info(f"Meta API fetch response text: {response.text}")
@@ -1387,6 +1388,8 @@ def sync_campaign_status_from_meta(self, campaign_id):
                     'campaign_id': campaign.campaign_id,
                     'message': f'Meta API connection failed during fetch: {str(e)}. Cannot sync status.'
                 }
+            except MetaRateLimited:
+                raise
             except Exception as e:
                 logger.error(f"Unexpected error during Meta API fetch: {str(e)}")
                 return {
@@ -1402,6 +1405,8 @@ def sync_campaign_status_from_meta(self, campaign_id):
                 'message': 'Campaign has no valid Facebook ID or is demo campaign - no Meta sync needed'
             }
     
+    except MetaRateLimited as e:
+        raise _retry_when_rate_limited(self, e)
     except Campaign.DoesNotExist:
         logger.error(f"Campaign with ID {campaign_id} not found")
         return {
@@ -1416,13 +1421,51 @@ def sync_campaign_status_from_meta(self, campaign_id):
         }
 
 
-@shared_task(bind=True)
+@shared_task(
+    bind=True,
+    soft_time_limit=USER_SYNC_SOFT_TIME_LIMIT,
+    time_limit=USER_SYNC_TIME_LIMIT,
+)
+def sync_user_statuses_from_meta(self, user_id: int, full: bool = False):
+    """
+    ユーザーのキャンペーン / 広告セット / 広告のステータスを広告アカウント単位で一括同期するタスク。
+    full=True ならウォーターマークを使わず全件取得する（schedule_full_status_sync から 1 日 1 回）。
+    """
+    from .status_sync import sync_user_statuses
+
+    try:
+        result = sync_user_statuses(user_id, full=full)
+    except MetaRateLimited as e:
+        raise _retry_when_rate_limited(self, e)
+    except SoftTimeLimitExceeded:
+        logger.error(f"Meta bulk status sync timed out for user {user_id}")
+        raise
+    except Exception as e:
+        summary = meta_graph.error_summary(e)
+        logger.error(f"Meta bulk status sync failed for user {user_id}: {summary}")
+        return {
+            'status': 'error',
+            'message': f'Meta bulk status sync failed: {summary}'
+        }
+
+    updated = sum(c['updated'] for c in result['counts'].values())
+    return {
+        'status': 'warning' if result['failed_accounts'] else 'success',
+        **result,
+        'message': f"Status sync: {updated} object(s) updated across {result['accounts']} account(s)",
+    }
+
+
+@shared_task(
+    bind=True,
+    soft_time_limit=USER_SYNC_SOFT_TIME_LIMIT,
+    time_limit=USER_SYNC_TIME_LIMIT,
+)
 def sync_all_campaigns_status_from_meta(self, user_id: int):
     """ログインユーザーのキャンペーンのステータスを Meta と同期し、インサイト取得タスクをキューする"""
+    from .insights_scheduler import plan_refresh, refresh_budget, refresh_candidates
     from .models import Campaign
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    from django.utils import timezone
-    from datetime import timedelta
+    from .status_sync import sync_user_statuses
     
     try:
         logger.info(f"=== SYNC ALL CAMPAIGNS STATUS TASK STARTED (user_id={user_id}) ===")
@@ -1432,68 +1475,29 @@ def sync_all_campaigns_status_from_meta(self, user_id: int):
         )
         logger.info(f"Found {campaigns.count()} campaigns to sync for user {user_id}")
         
-        campaigns_list = list(campaigns.only('id', 'name', 'status', 'campaign_id', 'insights_updated_at'))
+        # ステータスは広告アカウント単位で一括取得する（キャンペーンごとの GET はしない）
+        status_result = sync_user_statuses(user_id)
 
-        # ステータス同期は I/O 待ち中心なので並列化して待ち時間を短縮
-        results = []
-        max_workers = min(8, max(1, len(campaigns_list)))
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_campaign = {
-                executor.submit(sync_campaign_status_from_meta, campaign.id): campaign
-                for campaign in campaigns_list
-            }
-            for future in as_completed(future_to_campaign):
-                campaign = future_to_campaign[future]
-                try:
-                    result = future.result()
-                    results.append({
-                        'campaign_id': campaign.id,
-                        'campaign_name': campaign.name,
-                        'result': result
-                    })
-                except Exception as e:
-                    logger.error(f"Failed to sync campaign {campaign.id}: {str(e)}")
-                    results.append({
-                        'campaign_id': campaign.id,
-                        'campaign_name': campaign.name,
-                        'result': {
-                            'status': 'error',
-                            'message': f'Sync failed: {str(e)}'
-                        }
-                    })
-        
-        successful_syncs = len([r for r in results if r['result'].get('status') == 'success'])
-        total_syncs = len(results)
-
-        # 「すべて同期」は体感速度を優先し、重いインサイト更新は対象を絞ってキューする
-        MAX_INSIGHTS_QUEUE_PER_RUN = 8
-        insights_queued = 0
-        insights_skipped_recent = 0
-        insights_skipped_inactive = 0
-        insights_skipped_limit = 0
-        recent_cutoff = timezone.now() - timedelta(minutes=30)
-        for campaign in campaigns_list:
-            cid = getattr(campaign, 'campaign_id', None) or ''
-            if cid and not str(cid).startswith('camp_'):
-                if getattr(campaign, 'status', None) != 'ACTIVE':
-                    insights_skipped_inactive += 1
-                    continue
-                updated_at = getattr(campaign, 'insights_updated_at', None)
-                if updated_at and updated_at >= recent_cutoff:
-                    insights_skipped_recent += 1
-                    continue
-                if insights_queued >= MAX_INSIGHTS_QUEUE_PER_RUN:
-                    insights_skipped_limit += 1
-                    continue
-                fetch_campaign_insights_from_meta.delay(campaign.id)
-                insights_queued += 1
+        campaign_counts = status_result['counts']['campaigns']
+        successful_syncs = campaign_counts['matched']
+        total_syncs = campaign_counts['local']
+
+        # インサイトは定期更新（schedule_insights_refresh）と同じ優先度付けで、Graph の予算内に収まる分をキューする。
+        # 予算に入らなかった分は定期更新が順に拾う
+        candidates = list(refresh_candidates(user_id=user_id))
+        planned = plan_refresh(candidates, budget=refresh_budget())
+        # 広告アカウント単位でまとめて取得するため、対象キャンペーンを 1 タスクに集約
+        # 取得中のキャンペーンは除く（sync_all_from_meta と同じ singleflight）
+        _, queued_ids, running = enqueue_coalesced(fetch_campaigns_insights_from_meta, [c.id for c in planned])
+        insights_queued = len(queued_ids)
+        # 更新間隔に満たない / 予算に入らなかった分
+        insights_skipped = len(candidates) - len(planned)
         
         logger.info(
             f"Sync completed: {successful_syncs}/{total_syncs} campaigns status OK; "
             f"insights tasks queued: {insights_queued}, "
-            f"skipped_recent: {insights_skipped_recent}, "
-            f"skipped_inactive: {insights_skipped_inactive}, "
-            f"skipped_limit: {insights_skipped_limit}"
+            f"skipped (not due / over budget): {insights_skipped}, "
+            f"coalesced: {len(running)}"
         )
         
         return {
@@ -1501,18 +1505,21 @@ def sync_all_campaigns_status_from_meta(self, user_id: int):
             'total_campaigns': total_syncs,
             'successful_syncs': successful_syncs,
             'insights_tasks_queued': insights_queued,
-            'insights_tasks_skipped_recent': insights_skipped_recent,
-            'insights_tasks_skipped_inactive': insights_skipped_inactive,
-            'insights_tasks_skipped_limit': insights_skipped_limit,
-            'results': results,
+            'insights_tasks_skipped': insights_skipped,
+            'insights_tasks_coalesced': len(running),
+            'status_sync': status_result,
             'message': (
                 f'Status sync {successful_syncs}/{total_syncs}; '
                 f'queued {insights_queued} insight fetch(es) for spend/impressions '
-                f'(skipped recent: {insights_skipped_recent}, '
-                f'inactive: {insights_skipped_inactive}, limit: {insights_skipped_limit})'
+                f'(not due or left to the scheduler: {insights_skipped}, already running: {len(running)})'
             ),
         }
         
+    except MetaRateLimited as e:
+        raise _retry_when_rate_limited(self, e)
+    except SoftTimeLimitExceeded:
+        logger.error(f"Meta API sync all timed out for user {user_id}")
+        raise
     except Exception as e:
         logger.error(f"Meta API sync all failed: {str(e)}")
         return {
@@ -1545,7 +1552,7 @@ def sync_adset_status_from_meta(self, adset_id):
             raise Exception("Meta account is not active")
         
         # Meta APIのベースURL
-        api_base_url = f"https://graph.facebook.com/v22.0"
+        api_base_url = meta_graph.GRAPH_BASE_URL
         
         headers = {
             'Authorization': f'Bearer {meta_account.access_token}',
@@ -1565,7 +1572,7 @@ def sync_adset_status_from_meta(self, adset_id):
                 logger.info(f"GET request params: {params}")
                 logger.info(f"GET request headers: {headers}")
                 
-                response = requests.get(fetch_url, headers=headers, params=params, timeout=30)
+                response = meta_graph.get(fetch_url, headers=headers, params=params, timeout=30)
                 
                 logger.info(f"Meta API fetch response status: {response.status_code}")
                 logger.info(f"Meta API fetch response text: {response.text}")
@@ -1649,6 +1656,8 @@ def sync_adset_status_from_meta(self, adset_id):
                     'adset_id': adset.adset_id,
                     'message': f'Meta API connection failed during fetch: {str(e)}. Cannot sync status.'
                 }
+            except MetaRateLimited:
+                raise
             except Exception as e:
                 logger.error(f"Unexpected error during Meta API fetch: {str(e)}")
                 return {
@@ -1664,6 +1673,8 @@ def sync_adset_status_from_meta(self, adset_id):
                 'message': 'AdSet has no valid Facebook ID or is demo adset - no Meta sync needed'
             }
     
+    except MetaRateLimited as e:
+        raise _retry_when_rate_limited(self, e)
     except AdSet.DoesNotExist:
         logger.error(f"AdSet with ID {adset_id} not found")
         return {
@@ -1702,7 +1713,7 @@ def sync_ad_status_from_meta(self, ad_id):
             raise Exception("Meta account is not active")
         
         # Meta APIのベースURL
-        api_base_url = f"https://graph.facebook.com/v22.0"
+        api_base_url = meta_graph.GRAPH_BASE_URL
         
         headers = {
             'Authorization': f'Bearer {meta_account.access_token}',
@@ -1722,7 +1733,7 @@ def sync_ad_status_from_meta(self, ad_id):
                 logger.info(f"GET request params: {params}")
                 logger.info(f"GET request headers: {headers}")
                 
-                response = requests.get(fetch_url, headers=headers, params=params, timeout=30)
+                response = meta_graph.get(fetch_url, headers=headers, params=params, timeout=30)
                 
                 logger.info(f"Meta API fetch response status: {response.status_code}")
                 logger.info(f"Meta API fetch response text: {response.text}")
@@ -1806,6 +1817,8 @@ def sync_ad_status_from_meta(self, ad_id):
                     'ad_id': ad.ad_id,
                     'message': f'Meta API connection failed during fetch: {str(e)}. Cannot sync status.'
                 }
+            except MetaRateLimited:
+                raise
             except Exception as e:
                 logger.error(f"Unexpected error during Meta API fetch: {str(e)}")
                 return {
@@ -1821,6 +1834,8 @@ def sync_ad_status_from_meta(self, ad_id):
                 'message': 'Ad has no valid Facebook ID or is demo ad - no Meta sync needed'
             }
     
+    except MetaRateLimited as e:
+        raise _retry_when_rate_limited(self, e)
     except Ad.DoesNotExist:
         logger.error(f"Ad with ID {ad_id} not found")
         return {
@@ -1839,100 +1854,51 @@ def sync_ad_status_from_meta(self, ad_id):
 def sync_campaign_full_from_meta(self, campaign_id):
     """キャンペーン全体（キャンペーン+広告セット+広告）をMeta APIから同期するタスク"""
     from .models import Campaign
+    from .status_sync import sync_campaign_tree
     
     try:
         logger.info(f"=== SYNC CAMPAIGN FULL TASK STARTED ===")
         logger.info(f"Campaign ID: {campaign_id}")
         
         # キャンペーンを取得
-        campaign = Campaign.objects.get(id=campaign_id)
+        campaign = Campaign.objects.select_related('meta_account').get(id=campaign_id)
         
         logger.info(f"Campaign Name: {campaign.name}")
         logger.info(f"Campaign Facebook ID: {campaign.campaign_id}")
         
-        results = []
-        
-        # 1. キャンペーンステータスを同期
-        try:
-            campaign_result = sync_campaign_status_from_meta(campaign_id)
-            results.append({
-                'type': 'campaign',
-                'id': campaign.id,
-                'name': campaign.name,
-                'result': campaign_result
-            })
-        except Exception as e:
-            logger.error(f"Failed to sync campaign {campaign_id}: {str(e)}")
-            results.append({
-                'type': 'campaign',
-                'id': campaign.id,
-                'name': campaign.name,
-                'result': {
-                    'status': 'error',
-                    'message': f'Campaign sync failed: {str(e)}'
-                }
-            })
+        if not campaign.meta_account.is_active:
+            raise Exception("Meta account is not active")
+        if not campaign.campaign_id or campaign.campaign_id.startswith('camp_'):
+            return {
+                'status': 'warning',
+                'campaign_id': campaign_id,
+                'campaign_name': campaign.name,
+                'message': 'Campaign has not been created in Meta yet'
+            }
         
-        # 2. 広告セットステータスを同期
-        adsets = campaign.adsets.all()
-        for adset in adsets:
-            try:
-                adset_result = sync_adset_status_from_meta(adset.id)
-                results.append({
-                    'type': 'adset',
-                    'id': adset.id,
-                    'name': adset.name,
-                    'result': adset_result
-                })
-            except Exception as e:
-                logger.error(f"Failed to sync adset {adset.id}: {str(e)}")
-                results.append({
-                    'type': 'adset',
-                    'id': adset.id,
-                    'name': adset.name,
-                    'result': {
-                        'status': 'error',
-                        'message': f'AdSet sync failed: {str(e)}'
-                    }
-                })
-        
-        # 3. 広告ステータスを同期
-        for adset in adsets:
-            ads = adset.ads.all()
-            for ad in ads:
-                try:
-                    ad_result = sync_ad_status_from_meta(ad.id)
-                    results.append({
-                        'type': 'ad',
-                        'id': ad.id,
-                        'name': ad.name,
-                        'result': ad_result
-                    })
-                except Exception as e:
-                    logger.error(f"Failed to sync ad {ad.id}: {str(e)}")
-                    results.append({
-                        'type': 'ad',
-                        'id': ad.id,
-                        'name': ad.name,
-                        'result': {
-                            'status': 'error',
-                            'message': f'Ad sync failed: {str(e)}'
-                        }
-                    })
+        # キャンペーン・広告セット・広告をフィールド展開で 1 回に取得し、モデルごとに bulk_update
+        result = sync_campaign_tree(campaign)
+        counts = result['counts']
         
-        # 結果を集計
-        successful_syncs = len([r for r in results if r['result'].get('status') == 'success'])
-        total_syncs = len(results)
+        total_syncs = sum(c['local'] for c in counts.values())
+        successful_syncs = sum(c['matched'] for c in counts.values())
+        updated = sum(c['updated'] for c in counts.values())
         
-        logger.info(f"Full sync completed: {successful_syncs}/{total_syncs} items synchronized successfully")
+        logger.info(
+            f"Full sync completed: {successful_syncs}/{total_syncs} items synchronized successfully, "
+            f"{updated} updated"
+        )
         
         return {
-            'status': 'success',
+            'status': 'success' if not result['missing'] else 'warning',
             'campaign_id': campaign_id,
             'campaign_name': campaign.name,
             'total_items': total_syncs,
             'successful_syncs': successful_syncs,
-            'results': results,
+            'updated_items': updated,
+            'counts': counts,
+            # Meta に見つからなかった（削除された可能性がある）ローカル行
+            'missing': result['missing'],
             'message': f'Campaign full sync completed: {successful_syncs}/{total_syncs} items synchronized'
         }
         
@@ -1942,11 +1908,14 @@ def sync_campaign_full_from_meta(self, campaign_id):
             'status': 'error',
             'message': f'Campaign with ID {campaign_id} not found'
         }
+    except MetaRateLimited as e:
+        raise _retry_when_rate_limited(self, e)
     except Exception as e:
-        logger.error(f"Meta API full sync failed: {str(e)}")
+        summary = meta_graph.error_summary(e)
+        logger.error(f"Meta API full sync failed: {summary}")
         return {
             'status': 'error',
-            'message': f'Meta API full sync failed: {str(e)}'
+            'message': f'Meta API full sync failed: {summary}'
         }
 
 
@@ -1973,7 +1942,7 @@ def activate_adset_in_meta(self, adset_id):
             raise Exception("Meta account is not active")
         
         # Meta APIのベースURL
-        api_base_url = f"https://graph.facebook.com/v22.0"
+        api_base_url = meta_graph.GRAPH_BASE_URL
         
         headers = {
             'Authorization': f'Bearer {meta_account.access_token}',
@@ -1993,7 +1962,7 @@ def activate_adset_in_meta(self, adset_id):
                 logger.info(f"POST request data: {update_data}")
                 logger.info(f"POST request headers: {headers}")
                 
-                response = requests.post(update_url, headers=headers, json=update_data, timeout=30)
+                response = meta_graph.post(update_url, headers=headers, json=update_data, timeout=30)
                 
                 logger.info(f"Meta API activate response status: {response.status_code}")
                 logger.info(f"Meta API activate response text: {response.text}")
@@ -2106,7 +2075,7 @@ def pause_adset_in_meta(self, adset_id):
             raise Exception("Meta account is not active")
         
         # Meta APIのベースURL
-        api_base_url = f"https://graph.facebook.com/v22.0"
+        api_base_url = meta_graph.GRAPH_BASE_URL
         
         headers = {
             'Authorization': f'Bearer {meta_account.access_token}',
@@ -2126,7 +2095,7 @@ def pause_adset_in_meta(self, adset_id):
                 logger.info(f"POST request data: {update_data}")
                 logger.info(f"POST request headers: {headers}")
                 
-                response = requests.post(update_url, headers=headers, json=update_data, timeout=30)
+                response = meta_graph.post(update_url, headers=headers, json=update_data, timeout=30)
                 
                 logger.info(f"Meta API pause response status: {response.status_code}")
                 logger.info(f"Meta API pause response text: {response.text}")
@@ -2216,243 +2185,6 @@ def pause_adset_in_meta(self, adset_id):
         }
 
 
-@shared_task(bind=True)
-def fetch_campaign_insights_from_meta(self, campaign_id):
-    """Meta APIからキャンペーンのインサイトデータを取得するタスク"""
-    from .models import Campaign
-    from apps.accounts.models import MetaAccount
-    
-    try:
-        logger.info(f"=== FETCH CAMPAIGN INSIGHTS TASK STARTED ===")
-        logger.info(f"Campaign ID: {campaign_id}")
-        
-        # キャンペーンを取得
-        campaign = Campaign.objects.get(id=campaign_id)
-        meta_account = campaign.meta_account
-        
-        logger.info(f"Campaign Name: {campaign.name}")
-        logger.info(f"Campaign Facebook ID: {campaign.campaign_id}")
-        logger.info(f"Meta Account ID: {meta_account.id}")
-        logger.info(f"Meta Account Name: {meta_account.account_name}")
-        
-        if not meta_account.is_active:
-            raise Exception("Meta account is not active")
-        
-        # Meta APIのベースURL
-        api_base_url = f"https://graph.facebook.com/v22.0"
-        
-        headers = {
-            'Authorization': f'Bearer {meta_account.access_token}',
-            'Content-Type': 'application/json',
-        }
-        
-        # FacebookのキャンペーンIDが存在する場合のみインサイト取得を試行
-        if campaign.campaign_id and not campaign.campaign_id.startswith('camp_'):
-            logger.info(f"Fetching campaign insights from Meta API: {campaign.campaign_id}")
-            
-            try:
-                # Meta APIからキャンペーンのインサイトデータを取得
-                insights_url = f"{api_base_url}/{campaign.campaign_id}/insights"
-                params = {
-                    'fields': 'spend,impressions,clicks,ctr,cpc,cpm,reach,frequency,actions,conversions',
-                    'time_range': _meta_campaign_insights_time_range_json(),
-                    'level': 'campaign'
-                }
-                
-                logger.info(f"GET request URL: {insights_url}")
-                logger.info(f"GET request params: {params}")
-                logger.info(f"GET request headers: {headers}")
-                
-                response = requests.get(insights_url, headers=headers, params=params, timeout=30)
-                
-                logger.info(f"Meta API insights response status: {response.status_code}")
-                logger.info(f"Meta API insights response text: {response.text}")
-                
-                if response.status_code == 200:
-                    insights_data = response.json()
-                    logger.info(f"Campaign insights fetched successfully: {insights_data}")
-                    
-                    # インサイトデータを処理
-                    if 'data' in insights_data and len(insights_data['data']) > 0:
-                        insight = insights_data['data'][0]
-                        
-                        # コンバージョン数を抽出（重複を避ける）
-                        conversions = 0
-                        if 'actions' in insight:
-                            # まず、すべてのアクションを分類
-                            actions_dict = {}
-                            for action in insight['actions']:
-                                action_type = action.get('action_type', '')
-                                action_value = int(action.get('value', 0))
-                                actions_dict[action_type] = action_value
-                            
-                            # offsite_conversion.fb_pixel_* を優先的にカウント（重複を避ける）
-                            # 1. offsite_conversion.fb_pixel_purchase を優先
-                            if 'offsite_conversion.fb_pixel_purchase' in actions_dict:
-                                conversions += actions_dict['offsite_conversion.fb_pixel_purchase']
-                            elif 'purchase' in actions_dict:
-                                # offsite_conversion.fb_pixel_purchase がない場合のみ purchase をカウント
-                                conversions += actions_dict['purchase']
-                            
-                            # 2. offsite_conversion.fb_pixel_complete_registration を優先
-                            if 'offsite_conversion.fb_pixel_complete_registration' in actions_dict:
-                                conversions += actions_dict['offsite_conversion.fb_pixel_complete_registration']
-                            elif 'complete_registration' in actions_dict:
-                                # offsite_conversion.fb_pixel_complete_registration がない場合のみ complete_registration をカウント
-                                conversions += actions_dict['complete_registration']
-                            
-                            # 3. offsite_conversion.fb_pixel_lead を優先
-                            if 'offsite_conversion.fb_pixel_lead' in actions_dict:
-                                conversions += actions_dict['offsite_conversion.fb_pixel_lead']
-                            elif 'lead' in actions_dict:
-                                # offsite_conversion.fb_pixel_lead がない場合のみ lead をカウント
-                                conversions += actions_dict['lead']
-                            
-                            # 4. その他の offsite_conversion（上記以外）
-                            for action_type, action_value in actions_dict.items():
-                                if action_type.startswith('offsite_conversion.fb_pixel_') and action_type not in [
-                                    'offsite_conversion.fb_pixel_purchase',
-                                    'offsite_conversion.fb_pixel_complete_registration',
-                                    'offsite_conversion.fb_pixel_lead'
-                                ]:
-                                    conversions += action_value
-                        elif 'conversions' in insight:
-                            # conversionsフィールドがある場合
-                            for conversion in insight['conversions']:
-                                conversions += int(conversion.get('value', 0))
-                        
-                        insights_dict = {
-                            'spend': float(insight.get('spend', 0)),
-                            'impressions': int(insight.get('impressions', 0)),
-                            'clicks': int(insight.get('clicks', 0)),
-                            'ctr': float(insight.get('ctr', 0)),
-                            'cpc': float(insight.get('cpc', 0)),
-                            'cpm': float(insight.get('cpm', 0)),
-                            'reach': int(insight.get('reach', 0)),
-                            'frequency': float(insight.get('frequency', 0)),
-                            'conversions': conversions,
-                        }
-                        
-                        # キャッシュに保存
-                        from django.utils import timezone
-                        campaign.cached_insights = insights_dict
-                        campaign.insights_updated_at = timezone.now()
-                        campaign.save(update_fields=['cached_insights', 'insights_updated_at'])
-                        logger.info(f"Cached insights for campaign {campaign.id}")
-                        
-                        return {
-                            'status': 'success',
-                            'campaign_id': campaign.campaign_id,
-                            'insights': insights_dict
-                        }
-                    else:
-                        logger.warning(f"No insights data found for campaign {campaign.campaign_id}")
-                        # data=[] でも「取得試行済み」として時刻を更新し、UI進捗に反映させる
-                        from django.utils import timezone
-                        zero_insights = {
-                            'spend': 0,
-                            'impressions': 0,
-                            'clicks': 0,
-                            'ctr': 0,
-                            'cpc': 0,
-                            'cpm': 0,
-                            'reach': 0,
-                            'frequency': 0,
-                            'conversions': 0,
-                        }
-                        campaign.cached_insights = zero_insights
-                        campaign.insights_updated_at = timezone.now()
-                        campaign.save(update_fields=['cached_insights', 'insights_updated_at'])
-                        return {
-                            'status': 'warning',
-                            'campaign_id': campaign.campaign_id,
-                            'message': 'No insights data available',
-                            'insights': zero_insights
-                        }
-                else:
-                    logger.error(f"Meta API insights failed with status {response.status_code}: {response.text}")
-                    return {
-                        'status': 'error',
-                        'campaign_id': campaign.campaign_id,
-                        'message': f'Meta API insights failed with status {response.status_code}: {response.text}',
-                        'insights': {
-                            'spend': 0,
-                            'impressions': 0,
-                            'clicks': 0,
-                            'ctr': 0,
-                            'cpc': 0,
-                            'cpm': 0,
-                            'reach': 0,
-                            'frequency': 0,
-                        }
-                    }
-                    
-            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-                logger.warning(f"Meta API connection failed during insights fetch: {e}")
-                return {
-                    'status': 'warning',
-                    'campaign_id': campaign.campaign_id,
-                    'message': f'Meta API connection failed during insights fetch: {str(e)}',
-                    'insights': {
-                        'spend': 0,
-                        'impressions': 0,
-                        'clicks': 0,
-                        'ctr': 0,
-                        'cpc': 0,
-                        'cpm': 0,
-                        'reach': 0,
-                        'frequency': 0,
-                    }
-                }
-            except Exception as e:
-                logger.error(f"Unexpected error during Meta API insights fetch: {str(e)}")
-                return {
-                    'status': 'error',
-                    'campaign_id': campaign.campaign_id,
-                    'message': f'Unexpected error during Meta API insights fetch: {str(e)}',
-                    'insights': {
-                        'spend': 0,
-                        'impressions': 0,
-                        'clicks': 0,
-                        'ctr': 0,
-                        'cpc': 0,
-                        'cpm': 0,
-                        'reach': 0,
-                        'frequency': 0,
-                    }
-                }
-        else:
-            logger.info(f"Campaign has no valid Facebook ID or is demo campaign: {campaign.campaign_id}")
-            return {
-                'status': 'info',
-                'campaign_id': campaign.campaign_id,
-                'message': 'Campaign has no valid Facebook ID or is demo campaign - no Meta insights available',
-                'insights': {
-                    'spend': 0,
-                    'impressions': 0,
-                    'clicks': 0,
-                    'ctr': 0,
-                    'cpc': 0,
-                    'cpm': 0,
-                    'reach': 0,
-                    'frequency': 0,
-                }
-            }
-    
-    except Campaign.DoesNotExist:
-        logger.error(f"Campaign with ID {campaign_id} not found")
-        return {
-            'status': 'error',
-            'message': f'Campaign with ID {campaign_id} not found'
-        }
-    except Exception as e:
-        logger.error(f"Meta API insights fetch failed: {str(e)}")
-        return {
-            'status': 'error',
-            'message': f'Meta API insights fetch failed: {str(e)}'
-        }
-
-
 @shared_task(bind=True)
 def activate_ad_in_meta(self, ad_id):
     """Meta APIで広告を有効化するタスク"""
@@ -2476,7 +2208,7 @@ def activate_ad_in_meta(self, ad_id):
             raise Exception("Meta account is not active")
         
         # Meta APIのベースURL
-        api_base_url = f"https://graph.facebook.com/v22.0"
+        api_base_url = meta_graph.GRAPH_BASE_URL
         
         headers = {
             'Authorization': f'Bearer {meta_account.access_token}',
@@ -2496,7 +2228,7 @@ def activate_ad_in_meta(self, ad_id):
                 logger.info(f"POST request data: {update_data}")
                 logger.info(f"POST request headers: {headers}")
                 
-                response = requests.post(update_url, headers=headers, json=update_data, timeout=30)
+                response = meta_graph.post(update_url, headers=headers, json=update_data, timeout=30)
                 
                 logger.info(f"Meta API activate response status: {response.status_code}")
                 logger.info(f"Meta API activate response text: {response.text}")
@@ -2609,7 +2341,7 @@ def pause_ad_in_meta(self, ad_id):
             raise Exception("Meta account is not active")
         
         # Meta APIのベースURL
-        api_base_url = f"https://graph.facebook.com/v22.0"
+        api_base_url = meta_graph.GRAPH_BASE_URL
         
         headers = {
             'Authorization': f'Bearer {meta_account.access_token}',
@@ -2629,7 +2361,7 @@ def pause_ad_in_meta(self, ad_id):
                 logger.info(f"POST request data: {update_data}")
                 logger.info(f"POST request headers: {headers}")
                 
-                response = requests.post(update_url, headers=headers, json=update_data, timeout=30)
+                response = meta_graph.post(update_url, headers=headers, json=update_data, timeout=30)
                 
                 logger.info(f"Meta API pause response status: {response.status_code}")
                 logger.info(f"Meta API pause response text: {response.text}")
@@ -2717,240 +2449,3 @@ def pause_ad_in_meta(self, ad_id):
             'status': 'error',
             'message': f'Meta API pause failed: {str(e)}'
         }
-
-
-@shared_task(bind=True)
-def fetch_campaign_insights_from_meta(self, campaign_id):
-    """Meta APIからキャンペーンのインサイトデータを取得するタスク"""
-    from .models import Campaign
-    from apps.accounts.models import MetaAccount
-    
-    try:
-        logger.info(f"=== FETCH CAMPAIGN INSIGHTS TASK STARTED ===")
-        logger.info(f"Campaign ID: {campaign_id}")
-        
-        # キャンペーンを取得
-        campaign = Campaign.objects.get(id=campaign_id)
-        meta_account = campaign.meta_account
-        
-        logger.info(f"Campaign Name: {campaign.name}")
-        logger.info(f"Campaign Facebook ID: {campaign.campaign_id}")
-        logger.info(f"Meta Account ID: {meta_account.id}")
-        logger.info(f"Meta Account Name: {meta_account.account_name}")
-        
-        if not meta_account.is_active:
-            raise Exception("Meta account is not active")
-        
-        # Meta APIのベースURL
-        api_base_url = f"https://graph.facebook.com/v22.0"
-        
-        headers = {
-            'Authorization': f'Bearer {meta_account.access_token}',
-            'Content-Type': 'application/json',
-        }
-        
-        # FacebookのキャンペーンIDが存在する場合のみインサイト取得を試行
-        if campaign.campaign_id and not campaign.campaign_id.startswith('camp_'):
-            logger.info(f"Fetching campaign insights from Meta API: {campaign.campaign_id}")
-            
-            try:
-                # Meta APIからキャンペーンのインサイトデータを取得
-                insights_url = f"{api_base_url}/{campaign.campaign_id}/insights"
-                params = {
-                    'fields': 'spend,impressions,clicks,ctr,cpc,cpm,reach,frequency,actions,conversions',
-                    'time_range': _meta_campaign_insights_time_range_json(),
-                    'level': 'campaign'
-                }
-                
-                logger.info(f"GET request URL: {insights_url}")
-                logger.info(f"GET request params: {params}")
-                logger.info(f"GET request headers: {headers}")
-                
-                response = requests.get(insights_url, headers=headers, params=params, timeout=30)
-                
-                logger.info(f"Meta API insights response status: {response.status_code}")
-                logger.info(f"Meta API insights response text: {response.text}")
-                
-                if response.status_code == 200:
-                    insights_data = response.json()
-                    logger.info(f"Campaign insights fetched successfully: {insights_data}")
-                    
-                    # インサイトデータを処理
-                    if 'data' in insights_data and len(insights_data['data']) > 0:
-                        insight = insights_data['data'][0]
-                        
-                        # コンバージョン数を抽出（重複を避ける）
-                        conversions = 0
-                        if 'actions' in insight:
-                            # まず、すべてのアクションを分類
-                            actions_dict = {}
-                            for action in insight['actions']:
-                                action_type = action.get('action_type', '')
-                                action_value = int(action.get('value', 0))
-                                actions_dict[action_type] = action_value
-                            
-                            # offsite_conversion.fb_pixel_* を優先的にカウント（重複を避ける）
-                            # 1. offsite_conversion.fb_pixel_purchase を優先
-                            if 'offsite_conversion.fb_pixel_purchase' in actions_dict:
-                                conversions += actions_dict['offsite_conversion.fb_pixel_purchase']
-                            elif 'purchase' in actions_dict:
-                                # offsite_conversion.fb_pixel_purchase がない場合のみ purchase をカウント
-                                conversions += actions_dict['purchase']
-                            
-                            # 2. offsite_conversion.fb_pixel_complete_registration を優先
-                            if 'offsite_conversion.fb_pixel_complete_registration' in actions_dict:
-                                conversions += actions_dict['offsite_conversion.fb_pixel_complete_registration']
-                            elif 'complete_registration' in actions_dict:
-                                # offsite_conversion.fb_pixel_complete_registration がない場合のみ complete_registration をカウント
-                                conversions += actions_dict['complete_registration']
-                            
-                            # 3. offsite_conversion.fb_pixel_lead を優先
-                            if 'offsite_conversion.fb_pixel_lead' in actions_dict:
-                                conversions += actions_dict['offsite_conversion.fb_pixel_lead']
-                            elif 'lead' in actions_dict:
-                                # offsite_conversion.fb_pixel_lead がない場合のみ lead をカウント
-                                conversions += actions_dict['lead']
-                            
-                            # 4. その他の offsite_conversion（上記以外）
-                            for action_type, action_value in actions_dict.items():
-                                if action_type.startswith('offsite_conversion.fb_pixel_') and action_type not in [
-                                    'offsite_conversion.fb_pixel_purchase',
-                                    'offsite_conversion.fb_pixel_complete_registration',
-                                    'offsite_conversion.fb_pixel_lead'
-                                ]:
-                                    conversions += action_value
-                        elif 'conversions' in insight:
-                            # conversionsフィールドがある場合
-                            for conversion in insight['conversions']:
-                                conversions += int(conversion.get('value', 0))
-                        
-                        insights_dict = {
-                            'spend': float(insight.get('spend', 0)),
-                            'impressions': int(insight.get('impressions', 0)),
-                            'clicks': int(insight.get('clicks', 0)),
-                            'ctr': float(insight.get('ctr', 0)),
-                            'cpc': float(insight.get('cpc', 0)),
-                            'cpm': float(insight.get('cpm', 0)),
-                            'reach': int(insight.get('reach', 0)),
-                            'frequency': float(insight.get('frequency', 0)),
-                            'conversions': conversions,
-                        }
-                        
-                        # キャッシュに保存
-                        from django.utils import timezone
-                        campaign.cached_insights = insights_dict
-                        campaign.insights_updated_at = timezone.now()
-                        campaign.save(update_fields=['cached_insights', 'insights_updated_at'])
-                        logger.info(f"Cached insights for campaign {campaign.id}")
-                        
-                        return {
-                            'status': 'success',
-                            'campaign_id': campaign.campaign_id,
-                            'insights': insights_dict
-                        }
-                    else:
-                        logger.warning(f"No insights data found for campaign {campaign.campaign_id}")
-                        # data=[] でも「取得試行済み」として時刻を更新し、UI進捗に反映させる
-                        from django.utils import timezone
-                        zero_insights = {
-                            'spend': 0,
-                            'impressions': 0,
-                            'clicks': 0,
-                            'ctr': 0,
-                            'cpc': 0,
-                            'cpm': 0,
-                            'reach': 0,
-                            'frequency': 0,
-                            'conversions': 0,
-                        }
-                        campaign.cached_insights = zero_insights
-                        campaign.insights_updated_at = timezone.now()
-                        campaign.save(update_fields=['cached_insights', 'insights_updated_at'])
-                        return {
-                            'status': 'warning',
-                            'campaign_id': campaign.campaign_id,
-                            'message': 'No insights data available',
-                            'insights': zero_insights
-                        }
-                else:
-                    logger.error(f"Meta API insights failed with status {response.status_code}: {response.text}")
-                    return {
-                        'status': 'error',
-                        'campaign_id': campaign.campaign_id,
-                        'message': f'Meta API insights failed with status {response.status_code}: {response.text}',
-                        'insights': {
-                            'spend': 0,
-                            'impressions': 0,
-                            'clicks': 0,
-                            'ctr': 0,
-                            'cpc': 0,
-                            'cpm': 0,
-                            'reach': 0,
-                            'frequency': 0,
-                        }
-                    }
-                    
-            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-                logger.warning(f"Meta API connection failed during insights fetch: {e}")
-                return {
-                    'status': 'warning',
-                    'campaign_id': campaign.campaign_id,
-                    'message': f'Meta API connection failed during insights fetch: {str(e)}',
-                    'insights': {
-                        'spend': 0,
-                        'impressions': 0,
-                        'clicks': 0,
-                        'ctr': 0,
-                        'cpc': 0,
-                        'cpm': 0,
-                        'reach': 0,
-                        'frequency': 0,
-                    }
-                }
-            except Exception as e:
-                logger.error(f"Unexpected error during Meta API insights fetch: {str(e)}")
-                return {
-                    'status': 'error',
-                    'campaign_id': campaign.campaign_id,
-                    'message': f'Unexpected error during Meta API insights fetch: {str(e)}',
-                    'insights': {
-                        'spend': 0,
-                        'impressions': 0,
-                        'clicks': 0,
-                        'ctr': 0,
-                        'cpc': 0,
-                        'cpm': 0,
-                        'reach': 0,
-                        'frequency': 0,
-                    }
-                }
-        else:
-            logger.info(f"Campaign has no valid Facebook ID or is demo campaign: {campaign.campaign_id}")
-            return {
-                'status': 'info',
-                'campaign_id': campaign.campaign_id,
-                'message': 'Campaign has no valid Facebook ID or is demo campaign - no Meta insights available',
-                'insights': {
-                    'spend': 0,
-                    'impressions': 0,
-                    'clicks': 0,
-                    'ctr': 0,
-                    'cpc': 0,
-                    'cpm': 0,
-                    'reach': 0,
-                    'frequency': 0,
-                }
-            }
-    
-    except Campaign.DoesNotExist:
-        logger.error(f"Campaign with ID {campaign_id} not found")
-        return {
-            'status': 'error',
-            'message': f'Campaign with ID {campaign_id} not found'
-        }
-    except Exception as e:
-        logger.error(f"Meta API insights fetch failed: {str(e)}")
-        return {
-            'status': 'error',
-            'message': f'Meta API insights fetch failed: {str(e)}'
-        }
\ No newline at end of file
@@ -1,14 +1,16 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
 from django.db.models import Q
 from django.conf import settings
-from django.core.cache import cache
+from django.http import StreamingHttpResponse
 from celery.result import AsyncResult
 import logging
+import threading
 import uuid
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import requests
+
+from apps.accounts.meta_rate_limit import MetaRateLimited
 
 from .models import Campaign, AdSet, Ad
 from .serializers import (
@@ -20,9 +22,44 @@ from .serializers import (
 
 logger = logging.getLogger(__name__)
 
+# sync_all_progress_stream: ハートビート間隔・1 接続の最長時間（秒）
+# （進捗を読む間隔とプロセスあたりの同時ストリーム数は settings.SYNC_PROGRESS_STREAM_*）
+SYNC_PROGRESS_STREAM_HEARTBEAT = 15
+# 1 接続は gunicorn の --timeout（300 秒）より十分短く切り、続きはクライアントが再接続して受け取る
+SYNC_PROGRESS_STREAM_MAX_SECONDS = 55
+# 同時ストリーム数の上限に達したときの再接続間隔（ms）。現在の進捗を 1 回返してすぐ閉じる
+SYNC_PROGRESS_STREAM_BUSY_RETRY_MS = 5000
+
+# このプロセスで開いている進捗ストリームの数（gthread のスレッドを SSE が使い切らないよう上限を設ける）
+_progress_streams_lock = threading.Lock()
+_progress_streams_open = 0
+
+
+def _open_progress_stream():
+    """ストリーム枠を 1 つ取る。settings.SYNC_PROGRESS_STREAM_MAX_PER_PROCESS に達していれば False"""
+    global _progress_streams_open
+    limit = int(getattr(settings, 'SYNC_PROGRESS_STREAM_MAX_PER_PROCESS', 2))
+    with _progress_streams_lock:
+        if _progress_streams_open >= limit:
+            return False
+        _progress_streams_open += 1
+        return True
+
 
-def _sync_progress_cache_key(sync_run_id: str) -> str:
-    return f"campaigns:sync_all:progress:{sync_run_id}"
+def _close_progress_stream():
+    global _progress_streams_open
+    with _progress_streams_lock:
+        _progress_streams_open -= 1
+
+
+class EventStreamRenderer(BaseRenderer):
+    """text/event-stream を Accept するリクエスト（EventSource）を 406 にしないためのレンダラー"""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
 
 
 class CampaignViewSet(viewsets.ModelViewSet):
@@ -63,6 +100,17 @@ class CampaignViewSet(viewsets.ModelViewSet):
         
         return queryset.select_related('meta_account').order_by('-created_at')
     
+    def list(self, request, *args, **kwargs):
+        from .insights_scheduler import mark_viewed
+        # 一覧を見ているユーザーのキャンペーンはインサイトの定期更新で優先する
+        mark_viewed(request.user.id)
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        from .insights_scheduler import mark_viewed
+        mark_viewed(campaign_ids=[kwargs.get(self.lookup_url_kwarg or self.lookup_field)])
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """キャンペーン作成時にユーザーとMetaアカウントを設定"""
         meta_account_id = self.request.data.get('meta_account_id')
@@ -532,15 +580,20 @@ class CampaignViewSet(viewsets.ModelViewSet):
         campaign = self.get_object()
         
         try:
+            from .singleflight import enqueue_once
             from .tasks import sync_campaign_full_from_meta
-            result = sync_campaign_full_from_meta.delay(campaign.id)
+            # 同じキャンペーンの同期が待機中・実行中ならその task_id を返す
+            task_id, queued = enqueue_once(sync_campaign_full_from_meta, campaign.id, args=(campaign.id,))
             
-            logger.info(f"Campaign full sync task started: {result.id}")
+            logger.info(f"Campaign full sync task {'started' if queued else 'already running'}: {task_id}")
             
             return Response({
-                'status': 'started',
-                'task_id': result.id,
-                'message': f'キャンペーン「{campaign.name}」の全体同期を開始しました'
+                'status': 'started' if queued else 'already_running',
+                'task_id': task_id,
+                'message': (
+                    f'キャンペーン「{campaign.name}」の全体同期を開始しました' if queued
+                    else f'キャンペーン「{campaign.name}」の全体同期は実行中です'
+                )
             }, status=status.HTTP_202_ACCEPTED)
                 
         except Exception as e:
@@ -553,78 +606,54 @@ class CampaignViewSet(viewsets.ModelViewSet):
     def sync_all_from_meta(self, request):
         """すべてのキャンペーンのステータスをMeta APIから同期"""
         try:
-            from .tasks import sync_campaign_status_from_meta, fetch_campaign_insights_from_meta
+            from .insights_scheduler import mark_viewed, plan_refresh, refresh_budget, refresh_candidates
+            from .singleflight import enqueue_coalesced, enqueue_once
+            from .sync_progress import start_sync_run
+            from .tasks import sync_user_statuses_from_meta, fetch_campaigns_insights_from_meta
             from .models import Campaign as CampaignModel
-            from django.utils import timezone
-            from datetime import timedelta
-
-            max_insights_queue_per_run = 8
-            recent_cutoff = timezone.now() - timedelta(minutes=30)
 
             user_qs = list(CampaignModel.objects.filter(user=request.user).exclude(
                 status__in=['DELETED', 'ARCHIVED']
-            ).only('id', 'campaign_id', 'status', 'insights_updated_at'))
+            ).only('id', 'campaign_id'))
 
             # 親タスク1本を監視する方式だと PENDING 固着時に UX が破綻するため、
             # ここで直接「子タスクのみ」をキュー投入して即返す。
+            # ステータスは広告アカウント単位の一括同期 1 本（キャンペーンごとのタスクは積まない）
+            # 連打されても、待機中・実行中の同期があれば新しく積まない
             status_tasks_queued = 0
-            for c in user_qs:
-                if c.campaign_id and not str(c.campaign_id).startswith('camp_'):
-                    sync_campaign_status_from_meta.delay(c.id)
-                    status_tasks_queued += 1
-
-            insights_tasks_queued_estimate = 0
-            for c in user_qs:
-                if not c.campaign_id or str(c.campaign_id).startswith('camp_'):
-                    continue
-                if c.status != 'ACTIVE':
-                    continue
-                if c.insights_updated_at and c.insights_updated_at >= recent_cutoff:
-                    continue
-                insights_tasks_queued_estimate += 1
-                if insights_tasks_queued_estimate >= max_insights_queue_per_run:
-                    break
+            status_task_id = None
+            if any(c.campaign_id and not str(c.campaign_id).startswith('camp_') for c in user_qs):
+                status_task_id, queued = enqueue_once(
+                    sync_user_statuses_from_meta, request.user.id, args=(request.user.id,),
+                )
+                status_tasks_queued = int(queued)
 
-            insights_queued = 0
+            # インサイトは定期更新（schedule_insights_refresh）と同じ優先度付けで、Graph の予算内に収まる分を選ぶ。
+            # 押したユーザーのキャンペーンは「最近見られた」扱いで更新間隔を短くする
+            mark_viewed(request.user.id)
+            planned = plan_refresh(refresh_candidates(user_id=request.user.id), budget=refresh_budget())
+            insights_campaign_ids = [c.id for c in planned]
             sync_run_id = str(uuid.uuid4())
-            cache.set(
-                _sync_progress_cache_key(sync_run_id),
-                {
-                    'sync_run_id': sync_run_id,
-                    'total': 0,
-                    'completed': 0,
-                    'failed': 0,
-                    'status': 'running',
-                },
-                timeout=60 * 60,
-            )
-            for c in user_qs:
-                if not c.campaign_id or str(c.campaign_id).startswith('camp_'):
-                    continue
-                if c.status != 'ACTIVE':
-                    continue
-                if c.insights_updated_at and c.insights_updated_at >= recent_cutoff:
-                    continue
-                if insights_queued >= max_insights_queue_per_run:
-                    break
-                fetch_campaign_insights_from_meta.delay(c.id, sync_run_id=sync_run_id)
-                insights_queued += 1
-
-            cache.set(
-                _sync_progress_cache_key(sync_run_id),
-                {
-                    'sync_run_id': sync_run_id,
-                    'total': insights_queued,
-                    'completed': 0,
-                    'failed': 0,
-                    'status': 'done' if insights_queued == 0 else 'running',
-                },
-                timeout=60 * 60,
+            # 広告アカウント単位でまとめて取得するため、対象キャンペーンを 1 タスクに集約
+            # 進捗カウンタはキュー前に作る（先に終わった分を上書きしない）。
+            # 取得中のキャンペーンは除いてキューし、タスク ID は sync_run_id と同じにする
+            _, queued_ids, running = enqueue_coalesced(
+                fetch_campaigns_insights_from_meta, insights_campaign_ids,
+                kwargs={'sync_run_id': sync_run_id}, task_id=sync_run_id,
+                before_enqueue=lambda ids: start_sync_run(sync_run_id, len(ids)),
             )
+            insights_queued = len(queued_ids)
+            running_runs = sorted(set(running.values()) - {''})
+            if not queued_ids and len(running_runs) == 1:
+                # 前回のクリックの取得がまだ終わっていない: その進捗をそのまま見せる
+                sync_run_id = running_runs[0]
+            elif not queued_ids:
+                start_sync_run(sync_run_id, 0)
 
             logger.info(
                 "All campaigns sync queued directly: "
-                f"status_tasks={status_tasks_queued}, insights_tasks={insights_queued}"
+                f"status_tasks={status_tasks_queued}, insights_tasks={insights_queued}, "
+                f"insights_coalesced={len(running)}"
             )
             
             return Response({
@@ -632,8 +661,12 @@ class CampaignViewSet(viewsets.ModelViewSet):
                 'sync_run_id': sync_run_id,
                 'insights_tasks_queued_estimate': insights_queued,
                 'status_tasks_queued': status_tasks_queued,
+                'status_task_id': status_task_id,
+                # 実行中のタスクにまとめたキャンペーン数と、そのタスク ID（= sync_run_id）
+                'insights_coalesced': len(running),
+                'running_sync_run_ids': running_runs,
                 'message': (
-                    f'同期を開始しました（ステータス同期 {status_tasks_queued} 件、'
+                    f'同期を開始しました（ステータス一括同期 {status_tasks_queued} 件、'
                     f'インサイト取得 {insights_queued} 件をキュー）'
                 ),
             }, status=status.HTTP_202_ACCEPTED)
@@ -654,20 +687,66 @@ class CampaignViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        data = cache.get(_sync_progress_cache_key(sync_run_id))
-        if not data:
+        from .sync_progress import read_sync_progress
+        return Response(read_sync_progress(sync_run_id), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], renderer_classes=[JSONRenderer, EventStreamRenderer])
+    def sync_all_progress_stream(self, request):
+        """
+        sync_all_from_meta の進捗を Server-Sent Events で配信する。
+        進捗が変わるたびに event: progress（sync_all_progress と同じ JSON）を送り、
+        done / not_found で閉じる。変化がない間はコメント行でハートビートを送る。
+        SYNC_PROGRESS_STREAM_MAX_SECONDS で一度閉じるので、クライアントは done まで再接続する。
+        1 接続が gthread のスレッドを 1 つ占有するため、同時ストリーム数はプロセスあたり
+        settings.SYNC_PROGRESS_STREAM_MAX_PER_PROCESS まで。超えた接続は現在の進捗を 1 回送って閉じ、
+        retry を長めにしてクライアントの再接続（= ポーリング）に切り替える。
+        """
+        import json
+        import time
+        from .sync_progress import read_sync_progress
+
+        sync_run_id = request.query_params.get('sync_run_id')
+        if not sync_run_id:
             return Response(
-                {
-                    'sync_run_id': sync_run_id,
-                    'status': 'not_found',
-                    'total': 0,
-                    'completed': 0,
-                    'failed': 0,
-                },
-                status=status.HTTP_200_OK,
+                {'error': 'sync_run_id が必要です'},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-        return Response(data, status=status.HTTP_200_OK)
+        interval = float(getattr(settings, 'SYNC_PROGRESS_STREAM_INTERVAL', 1.5))
+
+        def events():
+            # 枠はイテレーション開始時に取る（送信前に捨てられたレスポンスで枠が漏れないように）
+            if not _open_progress_stream():
+                yield f'retry: {SYNC_PROGRESS_STREAM_BUSY_RETRY_MS}\n\n'
+                yield f'event: progress\ndata: {json.dumps(read_sync_progress(sync_run_id))}\n\n'
+                return
+            try:
+                last = None
+                last_sent_at = time.monotonic()
+                deadline = last_sent_at + SYNC_PROGRESS_STREAM_MAX_SECONDS
+                # 再接続の間隔（ms）
+                yield 'retry: 3000\n\n'
+                while time.monotonic() < deadline:
+                    progress = read_sync_progress(sync_run_id)
+                    if progress != last:
+                        last = progress
+                        last_sent_at = time.monotonic()
+                        yield f'event: progress\ndata: {json.dumps(progress)}\n\n'
+                        if progress['status'] in ('done', 'not_found'):
+                            return
+                    elif time.monotonic() - last_sent_at >= SYNC_PROGRESS_STREAM_HEARTBEAT:
+                        last_sent_at = time.monotonic()
+                        yield ': keep-alive\n\n'
+                    time.sleep(interval)
+            finally:
+                # 正常終了・上限での切断・クライアント切断（close による GeneratorExit）のいずれでも枠を返す
+                _close_progress_stream()
+
+        response = StreamingHttpResponse(events(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Nginx のバッファリングを止めて 1 イベントずつ届ける
+        response['X-Accel-Buffering'] = 'no'
+        return response
 
     @action(detail=False, methods=['get'])
     def sync_all_status(self, request):
@@ -708,71 +787,15 @@ class CampaignViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-    def _import_campaigns_for_meta_account(self, user, meta_account):
+    def _import_campaigns_for_meta_account(self, user, meta_account, full=False):
         """
-        単一 MetaAccount について Graph API からキャンペーンを取り込む。
-        成功時: {'imported': int, 'skipped': int, 'total': int}
+        単一 MetaAccount について Graph API からキャンペーン・広告セット・広告を取り込む。
+        full=True ならウォーターマークを使わず全件取得する。
+        成功時: {'imported': int, 'skipped': int, 'total': int, 'incremental': bool, 'changed': int, ...}
         Meta API 失敗時: {'error': str, 'imported': 0, 'skipped': 0, 'total': 0}
         """
-        import requests
-        from datetime import datetime, timedelta
-
-        api_url = f"https://graph.facebook.com/v22.0/act_{meta_account.account_id}/campaigns"
-        params = {
-            'access_token': meta_account.access_token,
-            'fields': 'id,name,status,objective,daily_budget,lifetime_budget,created_time,updated_time'
-        }
-
-        response = requests.get(api_url, params=params, timeout=30)
-
-        if response.status_code != 200:
-            logger.error(f"Meta API error: {response.text}")
-            return {
-                'error': f'Meta API エラー: {response.text}',
-                'imported': 0,
-                'skipped': 0,
-                'total': 0,
-            }
-
-        data = response.json()
-        campaigns_data = data.get('data', [])
-
-        imported_count = 0
-        skipped_count = 0
-
-        for campaign_data in campaigns_data:
-            campaign_id = campaign_data.get('id')
-
-            campaign, created = Campaign.objects.get_or_create(
-                campaign_id=campaign_id,
-                defaults={
-                    'user': user,
-                    'meta_account': meta_account,
-                    'name': campaign_data.get('name', ''),
-                    'status': campaign_data.get('status', 'PAUSED'),
-                    'objective': campaign_data.get('objective', 'OUTCOME_TRAFFIC'),
-                    'budget': campaign_data.get('daily_budget') or campaign_data.get('lifetime_budget') or '0',
-                    'start_date': datetime.now().date(),
-                    'end_date': datetime.now().date() + timedelta(days=30),
-                }
-            )
-
-            if created:
-                logger.info(f"Created new campaign: {campaign.name} (Meta ID: {campaign.campaign_id})")
-                imported_count += 1
-            else:
-                logger.info(f"Found existing campaign: {campaign.name} (Meta ID: {campaign.campaign_id})")
-                skipped_count += 1
-
-            logger.info(f"Importing adsets and ads for campaign: {campaign.name}")
-            self._import_adsets_from_meta(campaign, meta_account)
-
-        logger.info(f"Imported {imported_count} campaigns, skipped {skipped_count}")
-        return {
-            'imported': imported_count,
-            'skipped': skipped_count,
-            'total': len(campaigns_data),
-        }
+        from .meta_import import import_meta_account
+        return import_meta_account(user, meta_account, full=full)
 
     @action(detail=False, methods=['post'])
     def import_from_meta(self, request):
@@ -828,15 +851,19 @@ class CampaignViewSet(viewsets.ModelViewSet):
                 )
 
             ordered_accounts = [id_to_account[i] for i in normalized]
+            # 差分取得で取りこぼしが疑われるときに全件を取り直す
+            full = str(request.data.get('full', '')).lower() in ('1', 'true', 'yes')
 
             total_imported = 0
             total_skipped = 0
             total_from_meta = 0
+            total_changed = 0
+            incremental = False
             per_account = []
             account_errors = []
 
             for meta_account in ordered_accounts:
-                result = self._import_campaigns_for_meta_account(request.user, meta_account)
+                result = self._import_campaigns_for_meta_account(request.user, meta_account, full=full)
                 if result.get('error'):
                     per_account.append({
                         'meta_account_id': meta_account.id,
@@ -851,12 +878,16 @@ class CampaignViewSet(viewsets.ModelViewSet):
                     total_imported += result['imported']
                     total_skipped += result['skipped']
                     total_from_meta += result['total']
+                    total_changed += result['changed']
+                    incremental = incremental or result['incremental']
                     per_account.append({
                         'meta_account_id': meta_account.id,
                         'account_name': meta_account.account_name,
                         'imported': result['imported'],
                         'skipped': result['skipped'],
                         'total': result['total'],
+                        'incremental': result['incremental'],
+                        'changed': result['changed'],
                     })
 
             if len(account_errors) == len(ordered_accounts):
@@ -875,6 +906,8 @@ class CampaignViewSet(viewsets.ModelViewSet):
                 )
             else:
                 message = f'{total_imported}件のキャンペーンをインポートしました'
+            if incremental:
+                message += f'（前回のインポート以降に変更された{total_changed}件を確認）'
 
             if account_errors:
                 message += f'。エラー: {", ".join(account_errors)}'
@@ -885,12 +918,18 @@ class CampaignViewSet(viewsets.ModelViewSet):
                     'imported': total_imported,
                     'skipped': total_skipped,
                     'total': total_from_meta,
+                    # 差分取得のとき、Meta から取得した（前回以降に変更された）キャンペーン数
+                    'incremental': incremental,
+                    'changed': total_changed,
                     'per_account': per_account,
                     'message': message,
                 },
                 status=status.HTTP_200_OK,
             )
 
+        except MetaRateLimited:
+            # 429（Retry-After 付き）で返す
+            raise
         except Exception as e:
             logger.error(f"Failed to import campaigns from Meta: {str(e)}")
             return Response(
@@ -898,322 +937,45 @@ class CampaignViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-    def _import_adsets_from_meta(self, campaign, meta_account):
-        """Meta API から広告セットと広告をインポート"""
-        import requests
-        
-        try:
-            # 広告セットを取得
-            api_url = f"https://graph.facebook.com/v22.0/act_{meta_account.account_id}/adsets"
-            params = {
-                'access_token': meta_account.access_token,
-                'fields': 'id,name,status,campaign_id,daily_budget,lifetime_budget,bid_strategy,optimization_goal,created_time'
-            }
-            
-            logger.info(f"Fetching adsets for campaign {campaign.campaign_id}")
-            logger.info(f"API URL: {api_url}")
-            logger.info(f"Params: {params}")
-            
-            response = requests.get(api_url, params=params, timeout=30)
-            
-            logger.info(f"Adsets API response status: {response.status_code}")
-            logger.info(f"Adsets API response text: {response.text}")
-            
-            if response.status_code != 200:
-                logger.error(f"Failed to fetch adsets: {response.text}")
-                return
-            
-            data = response.json()
-            adsets_data = data.get('data', [])
-            
-            # キャンペーンIDでフィルタリング（API側でフィルタリングできない場合）
-            filtered_adsets = [
-                adset for adset in adsets_data 
-                if adset.get('campaign_id') == campaign.campaign_id
-            ]
-            
-            logger.info(f"Found {len(adsets_data)} total adsets, {len(filtered_adsets)} for campaign {campaign.campaign_id}")
-            
-            for adset_data in filtered_adsets:
-                adset_id = adset_data.get('id')
-                
-                logger.info(f"Processing adset: {adset_id} - {adset_data.get('name')}")
-                
-                # 広告セットを取得または作成
-                adset, adset_created = AdSet.objects.get_or_create(
-                    adset_id=adset_id,
-                    defaults={
-                        'campaign': campaign,
-                        'name': adset_data.get('name', ''),
-                        'status': adset_data.get('status', 'PAUSED'),
-                        'bid_strategy': adset_data.get('bid_strategy', 'LOWEST_COST_WITHOUT_CAP'),
-                        'optimization_goal': adset_data.get('optimization_goal', 'LINK_CLICKS'),
-                        'budget': adset_data.get('daily_budget') or adset_data.get('lifetime_budget') or '0',
-                    }
-                )
-                
-                if adset_created:
-                    logger.info(f"Created adset: {adset.id} - {adset.name}")
-                else:
-                    logger.info(f"Found existing adset: {adset.id} - {adset.name}")
-                
-                # 既存の広告セットでも広告をインポート
-                logger.info(f"Importing ads for adset: {adset.name}")
-                self._import_ads_from_meta(adset, meta_account)
-                
-        except Exception as e:
-            logger.error(f"Failed to import adsets: {str(e)}")
-
-    def _import_ads_from_meta(self, adset, meta_account):
-        """Meta API から広告をインポート"""
-        import requests
-        
-        try:
-            # 広告を取得（クリエイティブ情報と審査状況も含める）
-            api_url = f"https://graph.facebook.com/v22.0/act_{meta_account.account_id}/ads"
-            params = {
-                'access_token': meta_account.access_token,
-                'fields': 'id,name,status,effective_status,adset_id,creative,created_time',
-                'expand': 'creative{object_story_spec{link_data{name,message,description,call_to_action_type,picture}}}'
-            }
-            
-            logger.info(f"Fetching ads for adset {adset.adset_id}")
-            logger.info(f"Ads API URL: {api_url}")
-            logger.info(f"Ads API Params: {params}")
-            
-            response = requests.get(api_url, params=params, timeout=30)
-            
-            logger.info(f"Ads API response status: {response.status_code}")
-            logger.info(f"Ads API response text: {response.text}")
-            
-            if response.status_code != 200:
-                logger.error(f"Failed to fetch ads: {response.text}")
-                return
-            
-            data = response.json()
-            ads_data = data.get('data', [])
-            
-            # 広告セットIDでフィルタリング（API側でフィルタリングできない場合）
-            filtered_ads = [
-                ad for ad in ads_data 
-                if ad.get('adset_id') == adset.adset_id
-            ]
-            
-            logger.info(f"Found {len(ads_data)} total ads, {len(filtered_ads)} for adset {adset.adset_id}")
-            
-            for ad_data in filtered_ads:
-                ad_id = ad_data.get('id')
-                
-                logger.info(f"Processing ad: {ad_id} - {ad_data.get('name')}")
-                
-                # 広告を取得または作成（既存のものは更新）
-                existing_ad = Ad.objects.filter(ad_id=ad_id).first()
-                if existing_ad:
-                    logger.info(f"Found existing ad: {ad_id} - {existing_ad.name}")
-                else:
-                    logger.info(f"Creating new ad: {ad_id}")
-                
-                # 重複チェック：同じ名前の広告が複数存在する場合は古いものを削除
-                duplicate_ads = Ad.objects.filter(name=ad_data.get('name', ''), adset=adset).exclude(ad_id=ad_id)
-                if duplicate_ads.exists():
-                    logger.info(f"Found {duplicate_ads.count()} duplicate ads, removing them")
-                    duplicate_ads.delete()
-                
-                # クリエイティブ情報を抽出
-                creative_data = ad_data.get('creative', {})
-                creative_id = creative_data.get('id')
-                
-                logger.info(f"Creative data for ad {ad_id}: {creative_data}")
-                
-                headline = ''
-                description = ''
-                cta_type = 'LEARN_MORE'
-                
-                # クリエイティブIDから詳細情報を取得
-                if creative_id:
-                    try:
-                        creative_url = f"https://graph.facebook.com/v22.0/{creative_id}"
-                        creative_params = {
-                            'access_token': meta_account.access_token,
-                            'fields': 'object_story_spec'
-                        }
-                        
-                        creative_response = requests.get(creative_url, params=creative_params, timeout=30)
-                        
-                        if creative_response.status_code == 200:
-                            creative_details = creative_response.json()
-                            logger.info(f"Creative details: {creative_details}")
-                            
-                            object_story_spec = creative_details.get('object_story_spec', {})
-                            link_data = object_story_spec.get('link_data', {})
-                            
-                            headline = link_data.get('name', '')
-                            description = link_data.get('message', '')
-                            cta_type = link_data.get('call_to_action_type', 'LEARN_MORE')
-                            
-                            logger.info(f"Extracted from creative details - Headline: '{headline}', Description: '{description}', CTA: '{cta_type}'")
-                        else:
-                            logger.error(f"Failed to fetch creative details: {creative_response.text}")
-                    except Exception as e:
-                        logger.error(f"Error fetching creative details: {str(e)}")
-                
-                logger.info(f"Final extracted - Headline: '{headline}', Description: '{description}', CTA: '{cta_type}'")
-                
-                # 審査状況を取得（effective_status から判定）
-                effective_status = ad_data.get('effective_status', '')
-                logger.info(f"Effective status: {effective_status}")
-                
-                # effective_status から審査状況を判定
-                review_feedback = {}
-                if effective_status:
-                    if effective_status in ['ACTIVE', 'PAUSED']:
-                        review_feedback = {'overall_status': 'APPROVED'}
-                    elif effective_status in ['PENDING_REVIEW', 'DISAPPROVED']:
-                        review_feedback = {'overall_status': 'PENDING'}
-                    elif effective_status in ['REJECTED', 'ARCHIVED', 'WITH_ISSUES']:
-                        review_feedback = {'overall_status': 'REJECTED'}
-                    else:
-                        review_feedback = {'overall_status': 'PENDING'}
-                
-                logger.info(f"Review feedback (derived): {review_feedback}")
-                
-                # 広告を作成または更新
-                if existing_ad:
-                    # 既存の広告を更新
-                    existing_ad.name = ad_data.get('name', '')
-                    existing_ad.status = ad_data.get('status', 'PAUSED')
-                    existing_ad.headline = headline
-                    existing_ad.description = description
-                    existing_ad.cta_type = cta_type
-                    existing_ad.review_feedback = review_feedback
-                    existing_ad.save()
-                    logger.info(f"Updated ad: {existing_ad.id} - {existing_ad.name}")
-                else:
-                    # 新しい広告を作成
-                    ad = Ad.objects.create(
-                        adset=adset,
-                        ad_id=ad_id,
-                        name=ad_data.get('name', ''),
-                        status=ad_data.get('status', 'PAUSED'),
-                        creative_type='LINK',
-                        headline=headline,
-                        description=description,
-                        cta_type=cta_type,
-                        review_feedback=review_feedback,
-                    )
-                    logger.info(f"Created ad: {ad.id} - {ad.name}")
-                
-        except Exception as e:
-            logger.error(f"Failed to import ads: {str(e)}")
-
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        """キャンペーン統計とダッシュボードデータ"""
+        """キャンペーン統計とダッシュボードデータ（Meta は呼ばず、スナップショットを返す）"""
+        from django.db.models import Count, Max, Sum
+        from .dashboard import schedule_dashboard_snapshot
+        from .models import DashboardSnapshot
+
         user = request.user
-        campaigns = Campaign.objects.filter(user=user).exclude(status__in=['DELETED', 'ARCHIVED'])
-        
-        # 基本統計
-        total_budget = sum(float(c.budget) for c in campaigns)
-        
-        # 最近のキャンペーン（上位5件）
-        recent_campaigns = campaigns.order_by('-created_at')[:5]
-        recent_campaigns_data = CampaignListSerializer(recent_campaigns, many=True).data
-        
-        # Meta APIから実際のインサイトデータを取得
-        total_spend = 0
-        total_impressions = 0
-        total_clicks = 0
-        
-        for campaign_data in recent_campaigns_data:
-            campaign_id = campaign_data['id']
-            try:
-                # Meta APIからインサイトデータを取得
-                from .tasks import fetch_campaign_insights_from_meta
-                insights_result = fetch_campaign_insights_from_meta(campaign_id)
-                
-                if insights_result.get('status') == 'success':
-                    insights = insights_result.get('insights', {})
-                    campaign_data['spend'] = insights.get('spend', 0)
-                    campaign_data['impressions'] = insights.get('impressions', 0)
-                    campaign_data['clicks'] = insights.get('clicks', 0)
-                    campaign_data['ctr'] = insights.get('ctr', 0)
-                    campaign_data['cpc'] = insights.get('cpc', 0)
-                    campaign_data['cpm'] = insights.get('cpm', 0)
-                    campaign_data['reach'] = insights.get('reach', 0)
-                    campaign_data['frequency'] = insights.get('frequency', 0)
-                    
-                    # 合計に加算
-                    total_spend += insights.get('spend', 0)
-                    total_impressions += insights.get('impressions', 0)
-                    total_clicks += insights.get('clicks', 0)
-                else:
-                    # Meta APIから取得できない場合の処理
-                    if campaign_data['status'] == 'ACTIVE':
-                        # アクティブなキャンペーンの場合のみデフォルト値を使用
-                        campaign_data['spend'] = float(campaign_data['budget']) * 0.75
-                        campaign_data['impressions'] = int(float(campaign_data['budget']) * 150)
-                        campaign_data['clicks'] = int(float(campaign_data['budget']) * 3)
-                        campaign_data['ctr'] = 2.0
-                        campaign_data['cpc'] = 0
-                        campaign_data['cpm'] = 0
-                        campaign_data['reach'] = 0
-                        campaign_data['frequency'] = 0
-                        
-                        # 合計に加算
-                        total_spend += float(campaign_data['budget']) * 0.75
-                        total_impressions += int(float(campaign_data['budget']) * 150)
-                        total_clicks += int(float(campaign_data['budget']) * 3)
-                    else:
-                        # 一時停止やその他のステータスの場合は0
-                        campaign_data['spend'] = 0
-                        campaign_data['impressions'] = 0
-                        campaign_data['clicks'] = 0
-                        campaign_data['ctr'] = 0
-                        campaign_data['cpc'] = 0
-                        campaign_data['cpm'] = 0
-                        campaign_data['reach'] = 0
-                        campaign_data['frequency'] = 0
-                    
-            except Exception as e:
-                logger.error(f"Failed to fetch insights for campaign {campaign_id}: {str(e)}")
-                # エラーの場合の処理
-                if campaign_data['status'] == 'ACTIVE':
-                    # アクティブなキャンペーンの場合のみデフォルト値を使用
-                    campaign_data['spend'] = float(campaign_data['budget']) * 0.75
-                    campaign_data['impressions'] = int(float(campaign_data['budget']) * 150)
-                    campaign_data['clicks'] = int(float(campaign_data['budget']) * 3)
-                    campaign_data['ctr'] = 2.0
-                    campaign_data['cpc'] = 0
-                    campaign_data['cpm'] = 0
-                    campaign_data['reach'] = 0
-                    campaign_data['frequency'] = 0
-                    
-                    # 合計に加算
-                    total_spend += float(campaign_data['budget']) * 0.75
-                    total_impressions += int(float(campaign_data['budget']) * 150)
-                    total_clicks += int(float(campaign_data['budget']) * 3)
-                else:
-                    # 一時停止やその他のステータスの場合は0
-                    campaign_data['spend'] = 0
-                    campaign_data['impressions'] = 0
-                    campaign_data['clicks'] = 0
-                    campaign_data['ctr'] = 0
-                    campaign_data['cpc'] = 0
-                    campaign_data['cpm'] = 0
-                    campaign_data['reach'] = 0
-                    campaign_data['frequency'] = 0
-        
+        counts = Campaign.objects.filter(user=user).exclude(status__in=['DELETED', 'ARCHIVED']).aggregate(
+            total_campaigns=Count('id'),
+            active_campaigns=Count('id', filter=Q(status='ACTIVE')),
+            paused_campaigns=Count('id', filter=Q(status='PAUSED')),
+            total_budget=Sum('budget'),
+            last_changed=Max('updated_at'),
+            last_insights=Max('insights_updated_at'),
+        )
+        snapshot = DashboardSnapshot.objects.filter(user=user).first()
+
+        # スナップショットより新しい変更（作成・更新・インサイト取得）があれば裏で作り直す
+        changed_at = max((t for t in (counts['last_changed'], counts['last_insights']) if t), default=None)
+        stale = snapshot is None or (changed_at is not None and changed_at > snapshot.updated_at)
+        if stale:
+            schedule_dashboard_snapshot([user.id])
+
+        summary = snapshot.summary if snapshot else {}
         stats = {
             'summary': {
-                'total_campaigns': campaigns.count(),
-                'active_campaigns': campaigns.filter(status='ACTIVE').count(),
-                'paused_campaigns': campaigns.filter(status='PAUSED').count(),
-                'total_budget': total_budget,
-                'total_spend': total_spend,
-                'total_impressions': total_impressions,
-                'total_clicks': total_clicks,
+                'total_campaigns': counts['total_campaigns'],
+                'active_campaigns': counts['active_campaigns'],
+                'paused_campaigns': counts['paused_campaigns'],
+                'total_budget': float(counts['total_budget'] or 0),
+                'total_spend': summary.get('total_spend', 0),
+                'total_impressions': summary.get('total_impressions', 0),
+                'total_clicks': summary.get('total_clicks', 0),
+                'latest_day': summary.get('latest_day'),
             },
-            'recent_campaigns': recent_campaigns_data,
+            'recent_campaigns': snapshot.recent_campaigns if snapshot else [],
+            'snapshot_updated_at': snapshot.updated_at if snapshot else None,
+            'snapshot_stale': stale,
         }
         
         return Response(stats)
@@ -1222,7 +984,6 @@ class CampaignViewSet(viewsets.ModelViewSet):
     def reporting_data(self, request):
         """レポート用のパフォーマンスデータを取得"""
         from apps.accounts.models import MetaAccount
-        import requests
         from datetime import datetime, timedelta
         
         user = request.user
@@ -1233,7 +994,7 @@ class CampaignViewSet(viewsets.ModelViewSet):
         campaign_id = request.GET.get('campaign_id', None)
         start_date_str = request.GET.get('start_date', None)
         end_date_str = request.GET.get('end_date', None)
-        metrics = request.GET.get('metrics', 'impressions,clicks,spend').split(',')
+        metrics = [m.strip() for m in request.GET.get('metrics', 'impressions,clicks,spend').split(',') if m.strip()]
         
         # キャンペーンフィルタリング（複数: campaign_ids=1,2,3 または単一 campaign_id）
         id_list = []
@@ -1254,6 +1015,13 @@ class CampaignViewSet(viewsets.ModelViewSet):
         if id_list:
             campaigns = campaigns.filter(id__in=id_list)
 
+        from .insights_scheduler import mark_viewed
+        # レポートで見ているキャンペーンはインサイトの定期更新で優先する
+        if id_list:
+            mark_viewed(campaign_ids=id_list)
+        else:
+            mark_viewed(user.id)
+
         campaigns = campaigns.select_related('meta_account')
 
         def _reporting_campaign_meta_payload(c):
@@ -1279,150 +1047,43 @@ class CampaignViewSet(viewsets.ModelViewSet):
         
         reporting_data = []
         
-        # Meta APIからデータを取得する関数
-        def fetch_insights_from_meta(campaign, start_date_str, end_date_str):
-            """Meta APIから指定期間のインサイトデータを取得"""
-            try:
-                if not campaign.campaign_id or not campaign.meta_account:
-                    return None
-                
-                meta_account = campaign.meta_account
-                api_base_url = 'https://graph.facebook.com/v18.0'
-                headers = {'Authorization': f'Bearer {meta_account.access_token}'}
-                
-                insights_url = f"{api_base_url}/{campaign.campaign_id}/insights"
-                params = {
-                    'fields': 'spend,impressions,clicks,ctr,cpc,cpm,reach,frequency,actions,conversions',
-                    'time_range': f'{{"since":"{start_date_str}","until":"{end_date_str}"}}',
-                    'level': 'campaign'
-                }
-                
-                # Meta 応答遅延でタイムアウトしがちなため 15 秒（並列は max_workers で抑える）
-                response = requests.get(insights_url, headers=headers, params=params, timeout=15)
-                
-                if response.status_code == 200:
-                    insights_data = response.json()
-                    if 'data' in insights_data and len(insights_data['data']) > 0:
-                        insight = insights_data['data'][0]
-                        
-                        # コンバージョン数を抽出（重複を避ける）
-                        conversions = 0
-                        if 'actions' in insight:
-                            logger.info(f"Campaign {campaign.campaign_id} actions: {insight.get('actions', [])}")
-                            
-                            # まず、すべてのアクションを分類
-                            actions_dict = {}
-                            for action in insight['actions']:
-                                action_type = action.get('action_type', '')
-                                action_value = int(action.get('value', 0))
-                                actions_dict[action_type] = action_value
-                                logger.info(f"  Action type: {action_type}, value: {action_value}")
-                            
-                            # offsite_conversion.fb_pixel_* を優先的にカウント（重複を避ける）
-                            # 1. offsite_conversion.fb_pixel_purchase を優先
-                            if 'offsite_conversion.fb_pixel_purchase' in actions_dict:
-                                conversions += actions_dict['offsite_conversion.fb_pixel_purchase']
-                                logger.info(f"  Added to conversions: offsite_conversion.fb_pixel_purchase = {actions_dict['offsite_conversion.fb_pixel_purchase']}, total: {conversions}")
-                            elif 'purchase' in actions_dict:
-                                # offsite_conversion.fb_pixel_purchase がない場合のみ purchase をカウント
-                                conversions += actions_dict['purchase']
-                                logger.info(f"  Added to conversions: purchase = {actions_dict['purchase']}, total: {conversions}")
-                            
-                            # 2. offsite_conversion.fb_pixel_complete_registration を優先
-                            if 'offsite_conversion.fb_pixel_complete_registration' in actions_dict:
-                                conversions += actions_dict['offsite_conversion.fb_pixel_complete_registration']
-                                logger.info(f"  Added to conversions: offsite_conversion.fb_pixel_complete_registration = {actions_dict['offsite_conversion.fb_pixel_complete_registration']}, total: {conversions}")
-                            elif 'complete_registration' in actions_dict:
-                                # offsite_conversion.fb_pixel_complete_registration がない場合のみ complete_registration をカウント
-                                conversions += actions_dict['complete_registration']
-                                logger.info(f"  Added to conversions: complete_registration = {actions_dict['complete_registration']}, total: {conversions}")
-                            
-                            # 3. offsite_conversion.fb_pixel_lead を優先
-                            if 'offsite_conversion.fb_pixel_lead' in actions_dict:
-                                conversions += actions_dict['offsite_conversion.fb_pixel_lead']
-                                logger.info(f"  Added to conversions: offsite_conversion.fb_pixel_lead = {actions_dict['offsite_conversion.fb_pixel_lead']}, total: {conversions}")
-                            elif 'lead' in actions_dict:
-                                # offsite_conversion.fb_pixel_lead がない場合のみ lead をカウント
-                                conversions += actions_dict['lead']
-                                logger.info(f"  Added to conversions: lead = {actions_dict['lead']}, total: {conversions}")
-                            
-                            # 4. その他の offsite_conversion（上記以外）
-                            for action_type, action_value in actions_dict.items():
-                                if action_type.startswith('offsite_conversion.fb_pixel_') and action_type not in [
-                                    'offsite_conversion.fb_pixel_purchase',
-                                    'offsite_conversion.fb_pixel_complete_registration',
-                                    'offsite_conversion.fb_pixel_lead'
-                                ]:
-                                    conversions += action_value
-                                    logger.info(f"  Added to conversions: {action_type} = {action_value}, total: {conversions}")
-                            
-                        elif 'conversions' in insight:
-                            logger.info(f"Campaign {campaign.campaign_id} conversions: {insight.get('conversions', [])}")
-                            for conversion in insight['conversions']:
-                                conversions += int(conversion.get('value', 0))
-                        
-                        logger.info(f"Campaign {campaign.campaign_id} final conversions: {conversions}")
-                        
-                        return {
-                            'spend': float(insight.get('spend', 0)),
-                            'impressions': int(insight.get('impressions', 0)),
-                            'clicks': int(insight.get('clicks', 0)),
-                            'ctr': float(insight.get('ctr', 0)),
-                            'cpc': float(insight.get('cpc', 0)),
-                            'cpm': float(insight.get('cpm', 0)),
-                            'reach': int(insight.get('reach', 0)),
-                            'frequency': float(insight.get('frequency', 0)),
-                            'conversions': conversions,
-                        }
-                    # HTTP 200 だが data が空 = 期間内にインサイト行がない（実質すべて0）。
-                    # None を返さないことで「未取得」と混ぜない。
-                    return {
-                        'spend': 0.0,
-                        'impressions': 0,
-                        'clicks': 0,
-                        'ctr': 0.0,
-                        'cpc': 0.0,
-                        'cpm': 0.0,
-                        'reach': 0,
-                        'frequency': 0.0,
-                        'conversions': 0,
-                    }
-            except Exception as e:
-                logger.debug(f"Meta API fetch failed for campaign {campaign.id}: {str(e)}")
-            return None
-        
-        # 日付範囲が指定されている場合は、並列処理でMeta APIから取得
+        # 日付範囲が指定されている場合は、取り込み済みの過去日を DailyAdInsight のローカル集計で答え、
+        # 当日・未取り込みの日だけを (campaign, 期間) 単位のキャッシュ経由で Meta API から取得する
         insights_dict = {}
+        freshness_dict = {}
+        sources_dict = {}
+        rate_limited_retry_after = None
         if start_date_str and end_date_str:
-            # 最大10スレッドで並列処理（Meta APIのレート制限を考慮）
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                future_to_campaign = {
-                    executor.submit(fetch_insights_from_meta, campaign, start_date_str, end_date_str): campaign
-                    for campaign in campaigns
-                    if campaign.campaign_id and campaign.meta_account
-                }
-                
-                for future in as_completed(future_to_campaign):
-                    campaign = future_to_campaign[future]
-                    try:
-                        insights = future.result()
-                        if insights:
-                            insights_dict[campaign.id] = insights
-                    except Exception as e:
-                        logger.debug(f"Failed to get insights for campaign {campaign.id}: {str(e)}")
+            from .insights_planner import plan_range_insights
+            try:
+                insights_dict, freshness_dict, sources_dict = plan_range_insights(
+                    list(campaigns), start_date_str, end_date_str, metrics=metrics,
+                )
+            except ValueError:
+                return Response(
+                    {'error': 'start_date / end_date は YYYY-MM-DD 形式で指定してください'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            except MetaRateLimited as e:
+                # Meta の枠が戻るまではキャッシュ（cached_insights）で返す
+                logger.warning(f"reporting_data: {str(e)}; falling back to cached insights")
+                rate_limited_retry_after = e.retry_after
         
         for campaign in campaigns:
             try:
                 insights = None
+                insights_source = None
                 
                 # 日付範囲指定時は Meta の期間集計を優先。取得失敗時のみキャッシュで補完（トークン切れ・タイムアウト等で
                 # spend がすべて 0 に見え、フロントの「消化0を非表示」で他アカウントが消える問題を防ぐ）
                 if start_date_str and end_date_str:
                     if campaign.id in insights_dict:
                         insights = insights_dict[campaign.id]
-                        logger.info(f"Campaign {campaign.id} ({campaign.name}): Using Meta API data (date range: {start_date_str} to {end_date_str}), conversions: {insights.get('conversions', 0)}")
+                        insights_source = sources_dict[campaign.id]
+                        logger.info(f"Campaign {campaign.id} ({campaign.name}): Using {insights_source} data (date range: {start_date_str} to {end_date_str}), conversions: {insights.get('conversions', 0)}")
                     elif campaign.cached_insights:
                         insights = campaign.cached_insights
+                        insights_source = 'cached_insights'
                         logger.info(
                             f"Campaign {campaign.id} ({campaign.name}): "
                             "Meta range API returned no row for this campaign; "
@@ -1434,9 +1095,11 @@ class CampaignViewSet(viewsets.ModelViewSet):
                     # 日付範囲が指定されていない場合は、Meta APIから取得したデータを優先、なければキャッシュを使用
                     if campaign.id in insights_dict:
                         insights = insights_dict[campaign.id]
+                        insights_source = sources_dict[campaign.id]
                         logger.info(f"Campaign {campaign.id} ({campaign.name}): Using Meta API data, conversions: {insights.get('conversions', 0)}")
                     elif campaign.cached_insights:
                         insights = campaign.cached_insights
+                        insights_source = 'cached_insights'
                         logger.info(f"Campaign {campaign.id} ({campaign.name}): Using cached data, conversions: {insights.get('conversions', 0)}")
                 
                 # データが取得できた場合（Meta APIまたはキャッシュ）
@@ -1494,6 +1157,8 @@ class CampaignViewSet(viewsets.ModelViewSet):
                         **_reporting_campaign_meta_payload(campaign),
                     }
                 
+                campaign_data['insights_source'] = insights_source
+                campaign_data['insights_freshness'] = freshness_dict.get(campaign.id)
                 reporting_data.append(campaign_data)
                 
             except Exception as e:
@@ -1534,10 +1199,24 @@ class CampaignViewSet(viewsets.ModelViewSet):
                         **_reporting_campaign_meta_payload(campaign),
                     }
                 
+                campaign_data['insights_source'] = None
+                campaign_data['insights_freshness'] = freshness_dict.get(campaign.id)
                 reporting_data.append(campaign_data)
         
+        fetched_ats = [f['fetched_at'] for f in freshness_dict.values()]
         return Response({
             'campaigns': reporting_data,
+            'freshness': {
+                'oldest_fetched_at': min(fetched_ats) if fetched_ats else None,
+                # stale 分はバックグラウンドで更新中（次回ロードで反映）
+                'stale_campaigns': sum(1 for f in freshness_dict.values() if f['stale']),
+                # Meta のレート制限中なら再取得できるまでの秒数
+                'rate_limited_retry_after': rate_limited_retry_after,
+            },
+            'sources': {
+                source: sum(1 for c in reporting_data if c['insights_source'] == source)
+                for source in ('local', 'meta', 'hybrid', 'cached_insights')
+            },
             'summary': {
                 'total_campaigns': len(reporting_data),
                 'total_spend': sum(c['spend'] for c in reporting_data),
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import DailyAdInsight
+from .models import DailyAccountInsight, DailyAdInsight, DailyCampaignInsight, DailyInsightCoverage
 
 
 @admin.register(DailyAdInsight)
@@ -9,11 +9,35 @@ class DailyAdInsightAdmin(admin.ModelAdmin):
         'stat_date',
         'meta_account',
         'meta_ad_id',
-        'campaign_name',
+        'campaign',
         'spend',
         'conversions',
         'fetched_at',
     )
     list_filter = ('stat_date', 'meta_account')
-    search_fields = ('meta_ad_id', 'campaign_name', 'ad_name')
+    list_select_related = ('meta_account', 'campaign')
+    search_fields = ('meta_ad_id', 'campaign__name', 'ad__name')
+    date_hierarchy = 'stat_date'
+
+
+@admin.register(DailyCampaignInsight)
+class DailyCampaignInsightAdmin(admin.ModelAdmin):
+    list_display = ('stat_date', 'meta_account', 'campaign', 'ad_count', 'spend', 'conversions')
+    list_filter = ('stat_date', 'meta_account')
+    list_select_related = ('meta_account', 'campaign')
+    search_fields = ('campaign__name',)
+    date_hierarchy = 'stat_date'
+
+
+@admin.register(DailyAccountInsight)
+class DailyAccountInsightAdmin(admin.ModelAdmin):
+    list_display = ('stat_date', 'meta_account', 'ad_count', 'spend', 'conversions')
+    list_filter = ('stat_date', 'meta_account')
+    date_hierarchy = 'stat_date'
+
+
+@admin.register(DailyInsightCoverage)
+class DailyInsightCoverageAdmin(admin.ModelAdmin):
+    list_display = ('stat_date', 'meta_account', 'ingested_at')
+    list_filter = ('stat_date', 'meta_account')
     date_hierarchy = 'stat_date'
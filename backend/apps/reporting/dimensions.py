@@ -0,0 +1,155 @@
+"""
+DailyAdInsight のキャンペーン / 広告セット / 広告ディメンション解決。
+
+取り込み 1 回分のメモリキャッシュ（Meta id -> ディメンション行）を持ち、ページごとに
+未知の id だけ DB を引く / 作る。名前が変わったときだけディメンションと履歴を書き込む。
+"""
+from __future__ import annotations
+
+import hashlib
+from datetime import date
+from typing import Iterable
+
+from .models import (
+    MetaAdDimension,
+    MetaAdSetDimension,
+    MetaCampaignDimension,
+    MetaObjectNameHistory,
+)
+
+# object_type -> (モデル, 行の id キー, 行の名前キー)
+DIMENSIONS = {
+    'campaign': (MetaCampaignDimension, 'meta_campaign_id', 'campaign_name'),
+    'adset': (MetaAdSetDimension, 'meta_adset_id', 'adset_name'),
+    'ad': (MetaAdDimension, 'meta_ad_id', 'ad_name'),
+}
+
+_CHUNK = 500
+
+
+# fallback_dimension_key のキーの接頭辞（Meta の実 ID と区別できる）
+FALLBACK_KEY_PREFIX = 'name:'
+
+
+def fallback_dimension_key(name: str) -> str:
+    """Meta id が取れない行（旧データなど）用のキー。同名は同じディメンションにまとまる。"""
+    return FALLBACK_KEY_PREFIX + hashlib.sha1((name or '').encode('utf-8')).hexdigest()[:40]
+
+
+class _Entry:
+    __slots__ = ('pk', 'name', 'name_as_of')
+
+    def __init__(self, pk: int, name: str, name_as_of: date | None):
+        self.pk = pk
+        self.name = name
+        self.name_as_of = name_as_of
+
+
+class DimensionCache:
+    """
+    1 回の取り込みで共有する Meta id -> ディメンション pk のキャッシュ（呼び出し元スレッド専用）。
+    resolve() にページの (stat_date, 行) を渡すと、各行の campaign_id / adset_id / ad_id（ディメンション pk）を返す。
+    """
+
+    def __init__(self):
+        self._entries: dict[str, dict[str, _Entry]] = {kind: {} for kind in DIMENSIONS}
+        # (object_type, meta_id, name) -> first_seen（キャッシュ済みの id 分だけ）
+        self._history: dict[tuple[str, str, str], date] = {}
+
+    def clear(self) -> None:
+        """ロールバックで作成済みディメンションが消えうるとき（アカウント取り込み失敗時）に呼ぶ。"""
+        for entries in self._entries.values():
+            entries.clear()
+        self._history.clear()
+
+    def resolve(self, rows: Iterable[tuple[date, dict]]) -> list[dict[str, int]]:
+        rows = list(rows)
+        keys_by_kind: dict[str, list[str]] = {}
+        for kind, (_, id_key, name_key) in DIMENSIONS.items():
+            latest: dict[str, tuple[date, str]] = {}
+            first_seen: dict[tuple[str, str, str], date] = {}
+            keys = []
+            for stat_date, r in rows:
+                name = (r.get(name_key) or '')[:512]
+                meta_id = str(r.get(id_key) or '') or fallback_dimension_key(name)
+                keys.append(meta_id)
+                seen = latest.get(meta_id)
+                if seen is None or stat_date >= seen[0]:
+                    latest[meta_id] = (stat_date, name)
+                key = (kind, meta_id, name)
+                if key not in first_seen or stat_date < first_seen[key]:
+                    first_seen[key] = stat_date
+            self._sync(kind, latest)
+            self._record_history(first_seen)
+            keys_by_kind[kind] = keys
+
+        return [
+            {f'{kind}_id': self._entries[kind][keys_by_kind[kind][i]].pk for kind in DIMENSIONS}
+            for i in range(len(rows))
+        ]
+
+    def _sync(self, kind: str, latest: dict[str, tuple[date, str]]) -> None:
+        model = DIMENSIONS[kind][0]
+        entries = self._entries[kind]
+
+        missing = [meta_id for meta_id in latest if meta_id not in entries]
+        self._load(kind, missing)
+        missing = [meta_id for meta_id in missing if meta_id not in entries]
+        if missing:
+            model.objects.bulk_create(
+                [
+                    model(meta_id=meta_id, name=latest[meta_id][1], name_as_of=latest[meta_id][0])
+                    for meta_id in missing
+                ],
+                batch_size=_CHUNK,
+                ignore_conflicts=True,
+            )
+            self._load(kind, missing)
+
+        renamed = []
+        for meta_id, (stat_date, name) in latest.items():
+            entry = entries[meta_id]
+            if entry.name == name:
+                continue
+            if entry.name_as_of is not None and stat_date < entry.name_as_of:
+                continue
+            entry.name = name
+            entry.name_as_of = stat_date
+            renamed.append(model(pk=entry.pk, name=name, name_as_of=stat_date))
+        if renamed:
+            model.objects.bulk_update(renamed, ['name', 'name_as_of'], batch_size=_CHUNK)
+
+    def _load(self, kind: str, meta_ids: list[str]) -> None:
+        model = DIMENSIONS[kind][0]
+        entries = self._entries[kind]
+        for i in range(0, len(meta_ids), _CHUNK):
+            chunk = meta_ids[i:i + _CHUNK]
+            for pk, meta_id, name, name_as_of in model.objects.filter(
+                meta_id__in=chunk
+            ).values_list('pk', 'meta_id', 'name', 'name_as_of'):
+                entries[meta_id] = _Entry(pk, name, name_as_of)
+            for meta_id, name, first_seen in MetaObjectNameHistory.objects.filter(
+                object_type=kind, meta_id__in=chunk
+            ).values_list('meta_id', 'name', 'first_seen'):
+                self._history[(kind, meta_id, name)] = first_seen
+
+    def _record_history(self, first_seen: dict[tuple[str, str, str], date]) -> None:
+        """初めて見た (id, 名前) を追加し、バックフィルでより古い日に見つかったものは first_seen を繰り上げる。"""
+        new = []
+        for key, stat_date in first_seen.items():
+            known = self._history.get(key)
+            if known is None:
+                new.append(
+                    MetaObjectNameHistory(
+                        object_type=key[0], meta_id=key[1], name=key[2], first_seen=stat_date
+                    )
+                )
+            elif stat_date < known:
+                MetaObjectNameHistory.objects.filter(
+                    object_type=key[0], meta_id=key[1], name=key[2]
+                ).update(first_seen=stat_date)
+            else:
+                continue
+            self._history[key] = stat_date
+        if new:
+            MetaObjectNameHistory.objects.bulk_create(new, batch_size=_CHUNK, ignore_conflicts=True)
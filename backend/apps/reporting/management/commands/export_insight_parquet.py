@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from apps.reporting.parquet_snapshots import write_insight_snapshots
+
+
+class Command(BaseCommand):
+    help = '日次インサイト履歴を meta_account / 月単位の Parquet に書き出す（変更のあった月だけ）。'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='manifest を無視して全パーティションを書き直す',
+        )
+        parser.add_argument(
+            '--account',
+            type=int,
+            default=None,
+            help='対象 MetaAccount の id（省略時は全アカウント）',
+        )
+
+    def handle(self, *args, **options):
+        result = write_insight_snapshots(full=options['full'], meta_account_id=options['account'])
+        self.stdout.write(str(result))
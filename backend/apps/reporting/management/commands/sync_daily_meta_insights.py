@@ -1,6 +1,6 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
-from apps.reporting.tasks import run_daily_meta_ad_insights
+from apps.reporting.tasks import run_daily_meta_ad_insights, run_meta_ad_insights_range
 
 
 class Command(BaseCommand):
@@ -13,9 +13,42 @@ class Command(BaseCommand):
             default=None,
             help='対象日 YYYY-MM-DD（省略時は前日 JST）',
         )
+        parser.add_argument(
+            '--since',
+            type=str,
+            default=None,
+            help='バックフィル開始日 YYYY-MM-DD（--until と併用。アカウントごとに 1 本の取得で日別に保存）',
+        )
+        parser.add_argument(
+            '--until',
+            type=str,
+            default=None,
+            help='バックフィル終了日 YYYY-MM-DD（両端含む）',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='アカウント並列取得数（省略時は settings.META_INSIGHTS_INGEST_WORKERS、1 で逐次）',
+        )
 
     def handle(self, *args, **options):
         d = options.get('date')
-        self.stdout.write(f'同期開始: date={d or "前日(JST)"}')
-        result = run_daily_meta_ad_insights(stat_date=d)
+        since = options.get('since')
+        until = options.get('until')
+        workers = options.get('workers')
+
+        if since or until:
+            if d:
+                raise CommandError('--date と --since/--until は同時に指定できません。')
+            if not (since and until):
+                raise CommandError('--since と --until は両方指定してください。')
+            self.stdout.write(f'バックフィル開始: since={since} until={until}')
+            try:
+                result = run_meta_ad_insights_range(since, until, max_workers=workers)
+            except ValueError as exc:
+                raise CommandError(str(exc)) from exc
+        else:
+            self.stdout.write(f'同期開始: date={d or "前日(JST)"}')
+            result = run_daily_meta_ad_insights(stat_date=d, max_workers=workers)
         self.stdout.write(str(result))
@@ -1,27 +1,37 @@
 """
 Meta Marketing API: ad account insights (ad level) with pagination.
+Large accounts can go through async report runs instead (iter_async_ad_level_insight_pages).
 """
 from __future__ import annotations
 
 import json
 import logging
+import time
 from decimal import Decimal, InvalidOperation
-from typing import Any, List, Optional
+from typing import Any, Callable, Iterator, List, Optional
 
-import requests
+from apps.accounts import meta_graph
+from apps.campaigns.meta_insights import count_conversions
 
 logger = logging.getLogger(__name__)
 
-GRAPH_API_VERSION = 'v22.0'
-BASE_URL = f'https://graph.facebook.com/{GRAPH_API_VERSION}'
+BASE_URL = meta_graph.GRAPH_BASE_URL
 
 PURCHASE_ACTION = 'offsite_conversion.fb_pixel_purchase'
 
 INSIGHT_FIELDS = (
-    'campaign_name,adset_name,ad_name,ad_id,impressions,clicks,ctr,cpc,spend,'
-    'actions,cost_per_action_type'
+    'campaign_id,campaign_name,adset_id,adset_name,ad_id,ad_name,impressions,clicks,ctr,cpc,spend,'
+    'actions,cost_per_action_type,conversions'
 )
 
+# Async report runs (POST /{act}/insights -> poll /{report_run_id} -> /{report_run_id}/insights)
+ASYNC_REPORT_COMPLETED = 'Job Completed'
+ASYNC_REPORT_FAILED = ('Job Failed', 'Job Skipped')
+ASYNC_REPORT_POLL_INITIAL = 2.0
+ASYNC_REPORT_POLL_MAX = 30.0
+ASYNC_REPORT_MAX_WAIT = 20 * 60
+ASYNC_REPORT_PAGE_LIMIT = 5000
+
 
 def normalize_ad_account_id(account_id: str) -> str:
     account_id = (account_id or '').strip()
@@ -88,7 +98,10 @@ def parse_insight_row(row: dict) -> Optional[dict[str, Any]]:
 
     return {
         'meta_ad_id': str(ad_id),
+        'date_start': row.get('date_start') or '',
+        'meta_campaign_id': str(row.get('campaign_id') or ''),
         'campaign_name': row.get('campaign_name') or '',
+        'meta_adset_id': str(row.get('adset_id') or ''),
         'adset_name': row.get('adset_name') or '',
         'ad_name': row.get('ad_name') or '',
         'impressions': _to_int(row.get('impressions')),
@@ -98,34 +111,22 @@ def parse_insight_row(row: dict) -> Optional[dict[str, Any]]:
         'spend': _to_decimal(row.get('spend')),
         'conversions': conversions,
         'cpa': cpa,
+        # キャンペーン単位の Meta 取得（reporting_data）と同じ数え方。ローカル集計はこちらを使う
+        'all_conversions': float(count_conversions(row)),
     }
 
 
-def fetch_ad_level_insights_for_day(
-    ad_account_id: str,
-    access_token: str,
-    date_str: str,
-    timeout: int = 120,
-) -> List[dict[str, Any]]:
-    """
-    Fetch all ad-level insight rows for a single calendar day (time_range since=until=date_str).
-    """
-    act = normalize_ad_account_id(ad_account_id)
-    headers = {'Authorization': f'Bearer {access_token}'}
-    time_range = json.dumps({'since': date_str, 'until': date_str})
-    params: dict[str, Any] = {
-        'fields': INSIGHT_FIELDS,
-        'level': 'ad',
-        'time_range': time_range,
-        'limit': 500,
-    }
-
-    url = f'{BASE_URL}/{act}/insights'
-    out: List[dict[str, Any]] = []
-    request_params: Optional[dict[str, Any]] = params
-
+def _iter_parsed_pages(
+    url: str,
+    headers: dict[str, str],
+    params: Optional[dict[str, Any]],
+    act: str,
+    timeout: int,
+    http: Any = meta_graph,
+) -> Iterator[List[dict[str, Any]]]:
+    request_params = params
     while url:
-        resp = requests.get(
+        resp = http.get(
             url,
             headers=headers,
             params=request_params,
@@ -141,13 +142,160 @@ def fetch_ad_level_insights_for_day(
             resp.raise_for_status()
 
         payload = resp.json()
+        page: List[dict[str, Any]] = []
         for row in payload.get('data') or []:
             parsed = parse_insight_row(row)
             if parsed:
-                out.append(parsed)
+                page.append(parsed)
+        if page:
+            yield page
 
         next_url = (payload.get('paging') or {}).get('next')
         url = next_url
         request_params = None
 
-    return out
+
+def _insights_params(since: str, until: str) -> dict[str, Any]:
+    return {
+        'fields': INSIGHT_FIELDS,
+        'level': 'ad',
+        'time_range': json.dumps({'since': since, 'until': until}),
+        'time_increment': 1,
+    }
+
+
+def iter_ad_level_insight_pages(
+    ad_account_id: str,
+    access_token: str,
+    since: str,
+    until: str,
+    timeout: int = 120,
+) -> Iterator[List[dict[str, Any]]]:
+    """
+    Yield ad-level insight rows for since..until (inclusive) with time_increment=1,
+    one parsed page at a time, so callers never hold more than a page in memory.
+    Each row carries its day in 'date_start'; a multi-day range is a single request stream.
+    """
+    act = normalize_ad_account_id(ad_account_id)
+    headers = {'Authorization': f'Bearer {access_token}'}
+    params = {**_insights_params(since, until), 'limit': 500}
+    yield from _iter_parsed_pages(f'{BASE_URL}/{act}/insights', headers, params, act, timeout)
+
+
+class MetaInsightsReportError(RuntimeError):
+    """An async insights report run failed, was skipped, or did not finish in time."""
+
+
+def start_ad_level_insights_report(
+    ad_account_id: str,
+    access_token: str,
+    since: str,
+    until: str,
+    timeout: int = 120,
+    http: Any = meta_graph,
+) -> str:
+    """Submit an async report run (POST /{act}/insights) and return its report_run_id."""
+    act = normalize_ad_account_id(ad_account_id)
+    resp = http.post(
+        f'{BASE_URL}/{act}/insights',
+        headers={'Authorization': f'Bearer {access_token}'},
+        params=_insights_params(since, until),
+        timeout=timeout,
+    )
+    if resp.status_code != 200:
+        logger.error(
+            'Meta async insights submit error act=%s status=%s body=%s',
+            act,
+            resp.status_code,
+            resp.text[:2000],
+        )
+        resp.raise_for_status()
+    report_run_id = (resp.json() or {}).get('report_run_id')
+    if not report_run_id:
+        raise MetaInsightsReportError(f'No report_run_id returned for {act}')
+    return str(report_run_id)
+
+
+def wait_for_insights_report(
+    report_run_id: str,
+    access_token: str,
+    max_wait: float = ASYNC_REPORT_MAX_WAIT,
+    timeout: int = 120,
+    http: Any = meta_graph,
+    sleep: Callable[[float], None] = time.sleep,
+) -> None:
+    """
+    Poll GET /{report_run_id} with exponential backoff until async_status is 'Job Completed'.
+    Raises MetaInsightsReportError on 'Job Failed' / 'Job Skipped' or after max_wait seconds.
+    """
+    headers = {'Authorization': f'Bearer {access_token}'}
+    delay = ASYNC_REPORT_POLL_INITIAL
+    waited = 0.0
+    while True:
+        resp = http.get(
+            f'{BASE_URL}/{report_run_id}',
+            headers=headers,
+            params={'fields': 'async_status,async_percent_completion'},
+            timeout=timeout,
+        )
+        if resp.status_code != 200:
+            logger.error(
+                'Meta async insights poll error run=%s status=%s body=%s',
+                report_run_id,
+                resp.status_code,
+                resp.text[:2000],
+            )
+            resp.raise_for_status()
+
+        payload = resp.json() or {}
+        status = payload.get('async_status')
+        if status == ASYNC_REPORT_COMPLETED:
+            return
+        if status in ASYNC_REPORT_FAILED:
+            raise MetaInsightsReportError(f'Report run {report_run_id} ended with {status}')
+        if waited >= max_wait:
+            raise MetaInsightsReportError(
+                f'Report run {report_run_id} not finished after {waited:.0f}s ({status})'
+            )
+        logger.debug(
+            'Meta async insights run=%s status=%s %s%%',
+            report_run_id,
+            status,
+            payload.get('async_percent_completion'),
+        )
+        sleep(delay)
+        waited += delay
+        delay = min(delay * 1.5, ASYNC_REPORT_POLL_MAX)
+
+
+def iter_async_ad_level_insight_pages(
+    ad_account_id: str,
+    access_token: str,
+    since: str,
+    until: str,
+    timeout: int = 120,
+    max_wait: float = ASYNC_REPORT_MAX_WAIT,
+    http: Any = meta_graph,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Iterator[List[dict[str, Any]]]:
+    """
+    Same rows as iter_ad_level_insight_pages, fetched through an async report run:
+    submit, poll until complete, then download the result in large pages.
+    Meant for accounts too big for the synchronous endpoint.
+    """
+    act = normalize_ad_account_id(ad_account_id)
+    report_run_id = start_ad_level_insights_report(
+        act, access_token, since, until, timeout=timeout, http=http
+    )
+    logger.info('Meta async insights submitted act=%s run=%s', act, report_run_id)
+    wait_for_insights_report(
+        report_run_id, access_token, max_wait=max_wait, timeout=timeout, http=http, sleep=sleep
+    )
+    yield from _iter_parsed_pages(
+        f'{BASE_URL}/{report_run_id}/insights',
+        {'Authorization': f'Bearer {access_token}'},
+        {'limit': ASYNC_REPORT_PAGE_LIMIT},
+        act,
+        timeout,
+        http=http,
+    )
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-16 20:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0002_rename_reporting_d_meta_acct_date_reporting_d_meta_ac_d95d72_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyadinsight',
+            name='content_hash',
+            field=models.CharField(blank=True, help_text='Hash of the ingested values; unchanged rows are skipped on re-ingestion.', max_length=40, verbose_name='content hash'),
+        ),
+    ]
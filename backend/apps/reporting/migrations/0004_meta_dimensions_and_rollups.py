@@ -0,0 +1,282 @@
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def _fallback_key(name):
+    # apps.reporting.dimensions.fallback_dimension_key と同じ
+    return 'name:' + hashlib.sha1((name or '').encode('utf-8')).hexdigest()[:40]
+
+
+# FK の付け替えを何行ずつ bulk_update するか
+_BATCH = 2000
+
+
+def populate_dimensions(apps, schema_editor):
+    """
+    既存行の名前列からディメンションと名前履歴を作り、FK を張る。旧データは Meta id がないので名前キー。
+    ディメンション・履歴は bulk_create でまとめて作り、FK は行を 1 回だけ走査して _BATCH 行ずつ bulk_update する
+    （広告やキャンペーンごとの UPDATE にしない）。
+    """
+    DailyAdInsight = apps.get_model('reporting', 'DailyAdInsight')
+    History = apps.get_model('reporting', 'MetaObjectNameHistory')
+
+    histories = []
+    # kind -> {行の値（名前 / meta_ad_id）: ディメンション pk}
+    pks = {}
+    for kind, model_name, name_field, key_field in (
+        ('campaign', 'MetaCampaignDimension', 'campaign_name', 'campaign_name'),
+        ('adset', 'MetaAdSetDimension', 'adset_name', 'adset_name'),
+        ('ad', 'MetaAdDimension', 'ad_name', 'meta_ad_id'),
+    ):
+        Dimension = apps.get_model('reporting', model_name)
+        meta_ids = {}
+        dimensions = {}
+        for row in (
+            DailyAdInsight.objects.values(*dict.fromkeys([key_field, name_field]))
+            .annotate(first=Min('stat_date'), last=Max('stat_date'))
+            .order_by()
+            .iterator()
+        ):
+            name = row[name_field] or ''
+            key = row[key_field]
+            meta_id = key if kind == 'ad' else _fallback_key(name)
+            meta_ids[key] = meta_id
+            # 広告は同じ id で名前が変わりうるので、最後に見た日の名前をディメンションに持たせる
+            current = dimensions.get(meta_id)
+            if current is None or (row['last'] and current.name_as_of and row['last'] > current.name_as_of):
+                dimensions[meta_id] = Dimension(meta_id=meta_id, name=name, name_as_of=row['last'])
+            histories.append(History(object_type=kind, meta_id=meta_id, name=name, first_seen=row['first']))
+        Dimension.objects.bulk_create(list(dimensions.values()), batch_size=500, ignore_conflicts=True)
+        # このマイグレーションで作ったテーブルなので、中身はここで作ったディメンションだけ
+        by_meta_id = dict(Dimension.objects.values_list('meta_id', 'pk'))
+        pks[kind] = {key: by_meta_id[meta_id] for key, meta_id in meta_ids.items()}
+
+    # (object_type, meta_id, name) ごとに最初に見た日だけ残す
+    first_seen = {}
+    for history in histories:
+        key = (history.object_type, history.meta_id, history.name)
+        if key not in first_seen or history.first_seen < first_seen[key].first_seen:
+            first_seen[key] = history
+    History.objects.bulk_create(list(first_seen.values()), batch_size=500, ignore_conflicts=True)
+
+    batch = []
+    for pk, campaign_name, adset_name, meta_ad_id in (
+        DailyAdInsight.objects.order_by('pk')
+        .values_list('pk', 'campaign_name', 'adset_name', 'meta_ad_id')
+        .iterator(chunk_size=_BATCH)
+    ):
+        batch.append(DailyAdInsight(
+            pk=pk,
+            campaign_id=pks['campaign'][campaign_name],
+            adset_id=pks['adset'][adset_name],
+            ad_id=pks['ad'][meta_ad_id],
+        ))
+        if len(batch) >= _BATCH:
+            DailyAdInsight.objects.bulk_update(batch, ['campaign', 'adset', 'ad'])
+            batch = []
+    if batch:
+        DailyAdInsight.objects.bulk_update(batch, ['campaign', 'adset', 'ad'])
+
+
+def build_rollups(apps, schema_editor):
+    """
+    既存の DailyAdInsight からキャンペーンディメンション単位 / アカウント単位のロールアップを作る。
+    DailyInsightCoverage は作らない（既存行の all_conversions は 0 のままなので、再取り込みされるまで
+    reporting_data はその日を Meta から取る。取り込み時に記録される）。
+    """
+    DailyAdInsight = apps.get_model('reporting', 'DailyAdInsight')
+    DailyCampaignInsight = apps.get_model('reporting', 'DailyCampaignInsight')
+    DailyAccountInsight = apps.get_model('reporting', 'DailyAccountInsight')
+    metrics = {
+        'ad_count': Count('id'),
+        'impressions': Sum('impressions'),
+        'clicks': Sum('clicks'),
+        'spend': Sum('spend'),
+        'conversions': Sum('conversions'),
+    }
+
+    def values(row):
+        return {k: (row[k] or 0) if k in metrics else row[k] for k in row}
+
+    campaign_rows = (
+        DailyAdInsight.objects.values('meta_account_id', 'stat_date', 'campaign_id')
+        .annotate(**metrics)
+        .order_by()
+    )
+    DailyCampaignInsight.objects.bulk_create(
+        [DailyCampaignInsight(**values(row)) for row in campaign_rows.iterator()],
+        batch_size=500,
+    )
+    account_rows = (
+        DailyAdInsight.objects.values('meta_account_id', 'stat_date')
+        .annotate(**metrics)
+        .order_by()
+    )
+    DailyAccountInsight.objects.bulk_create(
+        [DailyAccountInsight(**values(row)) for row in account_rows.iterator()],
+        batch_size=500,
+    )
+
+
+def populate(apps, schema_editor):
+    populate_dimensions(apps, schema_editor)
+    build_rollups(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+    # 名前列の削除と FK の NOT NULL 化は 0005 に分けている
+    # （データ移行と同じトランザクションで ALTER しないため。PostgreSQL の pending trigger events）
+
+    dependencies = [
+        ('accounts', '0008_metaaccount_business'),
+        ('reporting', '0003_dailyadinsight_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetaAdDimension',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('meta_id', models.CharField(max_length=64, unique=True, verbose_name='Meta id')),
+                ('name', models.CharField(blank=True, max_length=512, verbose_name='name')),
+                ('name_as_of', models.DateField(blank=True, null=True, verbose_name='name as of')),
+            ],
+            options={
+                'verbose_name': 'Meta ad dimension',
+                'verbose_name_plural': 'Meta ad dimensions',
+            },
+        ),
+        migrations.CreateModel(
+            name='MetaAdSetDimension',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('meta_id', models.CharField(max_length=64, unique=True, verbose_name='Meta id')),
+                ('name', models.CharField(blank=True, max_length=512, verbose_name='name')),
+                ('name_as_of', models.DateField(blank=True, null=True, verbose_name='name as of')),
+            ],
+            options={
+                'verbose_name': 'Meta adset dimension',
+                'verbose_name_plural': 'Meta adset dimensions',
+            },
+        ),
+        migrations.CreateModel(
+            name='MetaCampaignDimension',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('meta_id', models.CharField(max_length=64, unique=True, verbose_name='Meta id')),
+                ('name', models.CharField(blank=True, max_length=512, verbose_name='name')),
+                ('name_as_of', models.DateField(blank=True, null=True, verbose_name='name as of')),
+            ],
+            options={
+                'verbose_name': 'Meta campaign dimension',
+                'verbose_name_plural': 'Meta campaign dimensions',
+            },
+        ),
+        migrations.CreateModel(
+            name='MetaObjectNameHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('campaign', 'Campaign'), ('adset', 'Ad set'), ('ad', 'Ad')], max_length=16, verbose_name='object type')),
+                ('meta_id', models.CharField(max_length=64, verbose_name='Meta id')),
+                ('name', models.CharField(blank=True, max_length=512, verbose_name='name')),
+                ('first_seen', models.DateField(verbose_name='first seen')),
+            ],
+            options={
+                'verbose_name': 'Meta object name history',
+                'verbose_name_plural': 'Meta object name history',
+                'indexes': [models.Index(fields=['object_type', 'meta_id', 'first_seen'], name='reporting_m_object__8462d7_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='metaobjectnamehistory',
+            constraint=models.UniqueConstraint(fields=('object_type', 'meta_id', 'name'), name='uniq_meta_object_name_history'),
+        ),
+        migrations.AddField(
+            model_name='dailyadinsight',
+            name='campaign',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='daily_ad_insights', to='reporting.metacampaigndimension'),
+        ),
+        migrations.AddField(
+            model_name='dailyadinsight',
+            name='adset',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='daily_ad_insights', to='reporting.metaadsetdimension'),
+        ),
+        migrations.AddField(
+            model_name='dailyadinsight',
+            name='ad',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='daily_ad_insights', to='reporting.metaaddimension'),
+        ),
+        migrations.AddField(
+            model_name='dailyadinsight',
+            name='all_conversions',
+            field=models.FloatField(default=0, help_text='Same definition as campaign insights (apps.campaigns.meta_insights.count_conversions).', verbose_name='conversions (all events)'),
+        ),
+        migrations.CreateModel(
+            name='DailyAccountInsight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stat_date', models.DateField(verbose_name='stat date')),
+                ('ad_count', models.IntegerField(default=0)),
+                ('impressions', models.BigIntegerField(default=0)),
+                ('clicks', models.BigIntegerField(default=0)),
+                ('spend', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('conversions', models.FloatField(default=0, verbose_name='conversions (purchase)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('meta_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_account_insights', to='accounts.metaaccount')),
+            ],
+            options={
+                'verbose_name': 'Daily account insight',
+                'verbose_name_plural': 'Daily account insights',
+                'indexes': [models.Index(fields=['stat_date'], name='reporting_d_stat_da_e6d49d_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyaccountinsight',
+            constraint=models.UniqueConstraint(fields=('meta_account', 'stat_date'), name='uniq_daily_account_insight_account_date'),
+        ),
+        migrations.CreateModel(
+            name='DailyCampaignInsight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stat_date', models.DateField(verbose_name='stat date')),
+                ('ad_count', models.IntegerField(default=0)),
+                ('impressions', models.BigIntegerField(default=0)),
+                ('clicks', models.BigIntegerField(default=0)),
+                ('spend', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('conversions', models.FloatField(default=0, verbose_name='conversions (purchase)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='daily_campaign_insights', to='reporting.metacampaigndimension')),
+                ('meta_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_campaign_insights', to='accounts.metaaccount')),
+            ],
+            options={
+                'verbose_name': 'Daily campaign insight',
+                'verbose_name_plural': 'Daily campaign insights',
+                'indexes': [models.Index(fields=['stat_date'], name='reporting_d_stat_da_eea839_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailycampaigninsight',
+            constraint=models.UniqueConstraint(fields=('meta_account', 'stat_date', 'campaign'), name='uniq_daily_campaign_insight_account_date_campaign'),
+        ),
+        migrations.CreateModel(
+            name='DailyInsightCoverage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stat_date', models.DateField(verbose_name='stat date')),
+                ('ingested_at', models.DateTimeField(auto_now=True, verbose_name='ingested at')),
+                ('meta_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_insight_coverage', to='accounts.metaaccount')),
+            ],
+            options={
+                'verbose_name': 'Daily insight coverage',
+                'verbose_name_plural': 'Daily insight coverage',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyinsightcoverage',
+            constraint=models.UniqueConstraint(fields=('meta_account', 'stat_date'), name='uniq_daily_insight_coverage_account_date'),
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0004_meta_dimensions_and_rollups'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='dailyadinsight',
+            name='campaign_name',
+        ),
+        migrations.RemoveField(
+            model_name='dailyadinsight',
+            name='adset_name',
+        ),
+        migrations.RemoveField(
+            model_name='dailyadinsight',
+            name='ad_name',
+        ),
+        migrations.AlterField(
+            model_name='dailyadinsight',
+            name='campaign',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='daily_ad_insights', to='reporting.metacampaigndimension'),
+        ),
+        migrations.AlterField(
+            model_name='dailyadinsight',
+            name='adset',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='daily_ad_insights', to='reporting.metaadsetdimension'),
+        ),
+        migrations.AlterField(
+            model_name='dailyadinsight',
+            name='ad',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='daily_ad_insights', to='reporting.metaaddimension'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyadinsight',
+            index=models.Index(fields=['-stat_date', 'campaign', 'ad', 'id'], name='reporting_dai_list_order_idx'),
+        ),
+    ]
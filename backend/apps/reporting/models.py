@@ -2,6 +2,72 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 
+class MetaNameDimension(models.Model):
+    """
+    Meta のオブジェクト ID -> 表示名のディメンション。name は最も新しい stat_date で見た名前。
+    名前の変遷は MetaObjectNameHistory に残す。
+    """
+
+    meta_id = models.CharField(_('Meta id'), max_length=64, unique=True)
+    name = models.CharField(_('name'), max_length=512, blank=True)
+    name_as_of = models.DateField(_('name as of'), null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f'{self.meta_id} {self.name}'
+
+
+class MetaCampaignDimension(MetaNameDimension):
+    class Meta:
+        verbose_name = _('Meta campaign dimension')
+        verbose_name_plural = _('Meta campaign dimensions')
+
+
+class MetaAdSetDimension(MetaNameDimension):
+    class Meta:
+        verbose_name = _('Meta adset dimension')
+        verbose_name_plural = _('Meta adset dimensions')
+
+
+class MetaAdDimension(MetaNameDimension):
+    class Meta:
+        verbose_name = _('Meta ad dimension')
+        verbose_name_plural = _('Meta ad dimensions')
+
+
+class MetaObjectNameHistory(models.Model):
+    """ディメンション名の変遷（slowly changing）。(種別, ID, 名前) ごとに最初に見た stat_date を持つ。"""
+
+    OBJECT_TYPE_CHOICES = [
+        ('campaign', _('Campaign')),
+        ('adset', _('Ad set')),
+        ('ad', _('Ad')),
+    ]
+
+    object_type = models.CharField(_('object type'), max_length=16, choices=OBJECT_TYPE_CHOICES)
+    meta_id = models.CharField(_('Meta id'), max_length=64)
+    name = models.CharField(_('name'), max_length=512, blank=True)
+    first_seen = models.DateField(_('first seen'))
+
+    class Meta:
+        verbose_name = _('Meta object name history')
+        verbose_name_plural = _('Meta object name history')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['object_type', 'meta_id', 'name'],
+                name='uniq_meta_object_name_history',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['object_type', 'meta_id', 'first_seen']),
+        ]
+
+    def __str__(self):
+        return f'{self.object_type} {self.meta_id} {self.name}'
+
+
 class DailyAdInsight(models.Model):
     """Meta Insights API から取得した広告単位の日次スナップショット（前日分を定期取り込み）。"""
 
@@ -13,9 +79,21 @@ class DailyAdInsight(models.Model):
     stat_date = models.DateField(_('stat date'), db_index=True)
     meta_ad_id = models.CharField(_('Meta ad id'), max_length=64, db_index=True)
 
-    campaign_name = models.CharField(_('campaign name'), max_length=512, blank=True)
-    adset_name = models.CharField(_('adset name'), max_length=512, blank=True)
-    ad_name = models.CharField(_('ad name'), max_length=512, blank=True)
+    campaign = models.ForeignKey(
+        MetaCampaignDimension,
+        on_delete=models.PROTECT,
+        related_name='daily_ad_insights',
+    )
+    adset = models.ForeignKey(
+        MetaAdSetDimension,
+        on_delete=models.PROTECT,
+        related_name='daily_ad_insights',
+    )
+    ad = models.ForeignKey(
+        MetaAdDimension,
+        on_delete=models.PROTECT,
+        related_name='daily_ad_insights',
+    )
 
     impressions = models.BigIntegerField(default=0)
     clicks = models.BigIntegerField(default=0)
@@ -35,6 +113,18 @@ class DailyAdInsight(models.Model):
         blank=True,
         verbose_name=_('CPA (purchase)'),
     )
+    all_conversions = models.FloatField(
+        _('conversions (all events)'),
+        default=0,
+        help_text=_('Same definition as campaign insights (apps.campaigns.meta_insights.count_conversions).'),
+    )
+
+    content_hash = models.CharField(
+        _('content hash'),
+        max_length=40,
+        blank=True,
+        help_text=_('Hash of the ingested values; unchanged rows are skipped on re-ingestion.'),
+    )
 
     fetched_at = models.DateTimeField(auto_now_add=True)
 
@@ -49,7 +139,115 @@ class DailyAdInsight(models.Model):
         ]
         indexes = [
             models.Index(fields=['meta_account', 'stat_date']),
+            # daily-insights/ の並び順（キーセットページネーション用。DailyAdInsightKeysetPagination.ordering と揃える）
+            models.Index(
+                fields=['-stat_date', 'campaign', 'ad', 'id'],
+                name='reporting_dai_list_order_idx',
+            ),
         ]
 
     def __str__(self):
         return f'{self.stat_date} {self.meta_ad_id}'
+
+
+class DailyCampaignInsight(models.Model):
+    """DailyAdInsight を (meta_account, stat_date, campaign) で集計したロールアップ。取り込み時に該当日だけ再計算する。"""
+
+    meta_account = models.ForeignKey(
+        'accounts.MetaAccount',
+        on_delete=models.CASCADE,
+        related_name='daily_campaign_insights',
+    )
+    stat_date = models.DateField(_('stat date'))
+    campaign = models.ForeignKey(
+        MetaCampaignDimension,
+        on_delete=models.PROTECT,
+        related_name='daily_campaign_insights',
+    )
+
+    ad_count = models.IntegerField(default=0)
+    impressions = models.BigIntegerField(default=0)
+    clicks = models.BigIntegerField(default=0)
+    spend = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    conversions = models.FloatField(_('conversions (purchase)'), default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('Daily campaign insight')
+        verbose_name_plural = _('Daily campaign insights')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['meta_account', 'stat_date', 'campaign'],
+                name='uniq_daily_campaign_insight_account_date_campaign',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['stat_date']),
+        ]
+
+    def __str__(self):
+        return f'{self.stat_date} {self.campaign_id}'
+
+
+class DailyAccountInsight(models.Model):
+    """DailyAdInsight を (meta_account, stat_date) で集計したロールアップ。取り込み時に該当日だけ再計算する。"""
+
+    meta_account = models.ForeignKey(
+        'accounts.MetaAccount',
+        on_delete=models.CASCADE,
+        related_name='daily_account_insights',
+    )
+    stat_date = models.DateField(_('stat date'))
+
+    ad_count = models.IntegerField(default=0)
+    impressions = models.BigIntegerField(default=0)
+    clicks = models.BigIntegerField(default=0)
+    spend = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    conversions = models.FloatField(_('conversions (purchase)'), default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('Daily account insight')
+        verbose_name_plural = _('Daily account insights')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['meta_account', 'stat_date'],
+                name='uniq_daily_account_insight_account_date',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['stat_date']),
+        ]
+
+    def __str__(self):
+        return f'{self.stat_date} {self.meta_account_id}'
+
+
+class DailyInsightCoverage(models.Model):
+    """
+    (meta_account, stat_date) の取り込み完了記録。広告行が 0 件の日も含めて、その日の
+    DailyAdInsight が Meta と一致していることを示す（reporting_data のローカル集計判定用）。
+    """
+
+    meta_account = models.ForeignKey(
+        'accounts.MetaAccount',
+        on_delete=models.CASCADE,
+        related_name='daily_insight_coverage',
+    )
+    stat_date = models.DateField(_('stat date'))
+    ingested_at = models.DateTimeField(_('ingested at'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('Daily insight coverage')
+        verbose_name_plural = _('Daily insight coverage')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['meta_account', 'stat_date'],
+                name='uniq_daily_insight_coverage_account_date',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.stat_date} {self.meta_account_id}'
@@ -0,0 +1,125 @@
+"""
+日次インサイト一覧のキーセット（カーソル）ページネーション。
+
+OFFSET を使わず「直前ページ最終行の並び順キーより後ろ」で絞り込むため、深いページでも
+1 ページあたりのコストが一定になる。COUNT(*) も実行しない。
+"""
+from __future__ import annotations
+
+import base64
+import json
+from datetime import date
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    ordering の各フィールド（'-' 付きは降順）をキーにした前方向のみのカーソル。
+    ordering は一意になるよう最後に pk を含めること。
+    """
+
+    ordering: tuple[str, ...] = ('-id',)
+    # カーソルの各要素の型。date_fields は ISO 形式の文字列、int_fields は整数、それ以外は文字列
+    date_fields: frozenset[str] = frozenset()
+    int_fields: frozenset[str] = frozenset({'id'})
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = api_settings.PAGE_SIZE or 20
+    max_page_size = 1000
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.next_key = None
+        page_size = self.get_page_size(request)
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            queryset = queryset.filter(self._after(self.decode_cursor(encoded)))
+
+        rows = list(queryset.order_by(*self.ordering)[:page_size + 1])
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            self.next_key = [self._key_value(rows[-1], f) for f in self._fields()]
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self):
+        if self.next_key is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.next_key))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def encode_cursor(self, key: list) -> str:
+        raw = json.dumps(key, separators=(',', ':'), default=str).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+
+    def decode_cursor(self, encoded: str) -> list:
+        try:
+            key = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+        except (ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(key, list) or len(key) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return [self._decode_value(f, v) for f, v in zip(self._fields(), key)]
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _decode_value(self, field: str, value):
+        """カーソルの 1 要素をフィールドの型として検証して返す（合わなければ TypeError / ValueError）。"""
+        if field in self.int_fields:
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise TypeError(field)
+            return value
+        if not isinstance(value, str):
+            raise TypeError(field)
+        return date.fromisoformat(value) if field in self.date_fields else value
+
+    def _fields(self) -> list[str]:
+        return [o.lstrip('-') for o in self.ordering]
+
+    @staticmethod
+    def _key_value(obj, field: str):
+        value = getattr(obj, field)
+        return value.isoformat() if isinstance(value, date) else value
+
+    def _after(self, key: list) -> Q:
+        """(k1, k2, ...) の並びで key より後ろの行: k1 > v1 OR (k1 = v1 AND (k2 > v2 OR ...))"""
+        condition = None
+        for order, value in reversed(list(zip(self.ordering, key))):
+            field = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') else 'gt'
+            strictly_after = Q(**{f'{field}__{lookup}': value})
+            if condition is None:
+                condition = strictly_after
+            else:
+                condition = strictly_after | (Q(**{field: value}) & condition)
+        return condition
+
+
+class DailyAdInsightKeysetPagination(KeysetPagination):
+    """
+    daily-insights/ の並び（-stat_date, キャンペーン, 広告）+ 一意化用の id。
+    すべてファクト表の列で reporting_dai_list_order_idx と同じ並びなので、どのページも索引の範囲走査で読める
+    （キャンペーン名で並べるとディメンションとの結合とソートが毎ページ必要になる）。
+    """
+
+    ordering = ('-stat_date', 'campaign_id', 'ad_id', 'id')
+    date_fields = frozenset({'stat_date'})
+    int_fields = frozenset({'campaign_id', 'ad_id', 'id'})
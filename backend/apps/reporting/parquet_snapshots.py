@@ -0,0 +1,218 @@
+"""
+DailyAdInsight の列指向スナップショット（Parquet）。オフライン分析用。
+
+レイアウト（hive 形式。pandas.read_parquet(root) でそのまま読める）::
+
+    {root}/meta_account={id}/month={YYYY-MM}/data.parquet
+    {root}/manifest.json
+
+manifest には (meta_account, month) パーティションごとに元データのシグネチャを記録し、
+次回はシグネチャが変わった月（= 新しく取り込まれた / 書き換えられた日を含む月）だけ書き直す。
+シグネチャは日次ロールアップ DailyAccountInsight から作るので、判定は広告行を読まずに済む。
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import DailyAccountInsight, DailyAdInsight
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+ROW_GROUP_SIZE = 50_000
+
+# (列名, values_list のソース)
+COLUMNS = (
+    ('meta_account_id', 'meta_account_id'),
+    ('stat_date', 'stat_date'),
+    ('meta_ad_id', 'meta_ad_id'),
+    ('meta_campaign_id', 'campaign__meta_id'),
+    ('campaign_name', 'campaign__name'),
+    ('meta_adset_id', 'adset__meta_id'),
+    ('adset_name', 'adset__name'),
+    ('ad_name', 'ad__name'),
+    ('impressions', 'impressions'),
+    ('clicks', 'clicks'),
+    ('ctr', 'ctr'),
+    ('cpc', 'cpc'),
+    ('spend', 'spend'),
+    ('conversions', 'conversions'),
+    ('cpa', 'cpa'),
+)
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:  # pragma: no cover - requirements.txt に含まれる
+        raise RuntimeError('Parquet スナップショットには pyarrow が必要です（pip install pyarrow）。') from exc
+    return pa, pq
+
+
+def _schema(pa):
+    return pa.schema([
+        ('meta_account_id', pa.int64()),
+        ('stat_date', pa.date32()),
+        ('meta_ad_id', pa.string()),
+        ('meta_campaign_id', pa.string()),
+        ('campaign_name', pa.string()),
+        ('meta_adset_id', pa.string()),
+        ('adset_name', pa.string()),
+        ('ad_name', pa.string()),
+        ('impressions', pa.int64()),
+        ('clicks', pa.int64()),
+        ('ctr', pa.float64()),
+        ('cpc', pa.float64()),
+        ('spend', pa.float64()),
+        ('conversions', pa.float64()),
+        ('cpa', pa.float64()),
+    ])
+
+
+def snapshot_root() -> Path:
+    return Path(getattr(settings, 'REPORTING_PARQUET_DIR', settings.BASE_DIR / 'exports' / 'insights'))
+
+
+def partition_key(meta_account_id: int, month: str) -> str:
+    return f'meta_account={meta_account_id}/month={month}'
+
+
+def load_manifest(root: Path) -> dict:
+    path = root / MANIFEST_NAME
+    if not path.exists():
+        return {'version': MANIFEST_VERSION, 'partitions': {}}
+    with path.open(encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def _write_manifest(root: Path, manifest: dict) -> None:
+    manifest['updated_at'] = timezone.now().isoformat()
+    tmp = root / f'{MANIFEST_NAME}.tmp'
+    with tmp.open('w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp, root / MANIFEST_NAME)
+
+
+def _source_partitions(meta_account_id: Optional[int] = None) -> dict[str, dict]:
+    """ロールアップから (meta_account, month) ごとのシグネチャを作る。"""
+    qs = DailyAccountInsight.objects.all()
+    if meta_account_id is not None:
+        qs = qs.filter(meta_account_id=meta_account_id)
+    out = {}
+    for row in (
+        qs.annotate(month=TruncMonth('stat_date'))
+        .values('meta_account_id', 'month')
+        .annotate(days=Count('id'), rows=Sum('ad_count'), last_update=Max('updated_at'))
+        .order_by()
+    ):
+        month = row['month'].strftime('%Y-%m')
+        out[partition_key(row['meta_account_id'], month)] = {
+            'meta_account_id': row['meta_account_id'],
+            'month': month,
+            'rows': int(row['rows'] or 0),
+            'signature': f"{row['days']}:{row['rows']}:{row['last_update'].isoformat()}",
+        }
+    return out
+
+
+def _write_partition(root: Path, part: dict) -> int:
+    """1 パーティション分を一時ファイルに row group 単位で書いてから置き換える。"""
+    pa, pq = _require_pyarrow()
+    schema = _schema(pa)
+    year, month = (int(x) for x in part['month'].split('-'))
+    rows = (
+        DailyAdInsight.objects.filter(
+            meta_account_id=part['meta_account_id'],
+            stat_date__year=year,
+            stat_date__month=month,
+        )
+        .order_by('stat_date', 'meta_ad_id')
+        .values_list(*(source for _, source in COLUMNS))
+        .iterator(chunk_size=ROW_GROUP_SIZE)
+    )
+
+    target = root / partition_key(part['meta_account_id'], part['month']) / 'data.parquet'
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_suffix('.parquet.tmp')
+    written = 0
+    names = [name for name, _ in COLUMNS]
+    with pq.ParquetWriter(tmp, schema, compression='snappy') as writer:
+        batch: list[tuple] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= ROW_GROUP_SIZE:
+                writer.write_table(_to_table(pa, schema, names, batch))
+                written += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(_to_table(pa, schema, names, batch))
+            written += len(batch)
+    os.replace(tmp, target)
+    return written
+
+
+def _to_table(pa, schema, names: list[str], batch: list[tuple]):
+    columns = list(zip(*batch))
+    arrays = []
+    for i, name in enumerate(names):
+        values = columns[i]
+        if schema.field(name).type == pa.float64():
+            values = [None if v is None else float(v) for v in values]
+        arrays.append(pa.array(values, type=schema.field(name).type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_insight_snapshots(full: bool = False, meta_account_id: Optional[int] = None) -> dict:
+    """
+    変更のあった (meta_account, month) パーティションだけ Parquet を書き直し、manifest を更新する。
+    full=True なら全パーティションを書き直す。元データがなくなったパーティションは削除する。
+    """
+    root = snapshot_root()
+    root.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(root)
+    current = manifest.setdefault('partitions', {})
+    source = _source_partitions(meta_account_id)
+
+    results = {'written': 0, 'skipped': 0, 'removed': 0, 'rows': 0, 'root': str(root)}
+    for key, part in sorted(source.items()):
+        known = current.get(key)
+        if not full and known and known.get('signature') == part['signature']:
+            results['skipped'] += 1
+            continue
+        rows = _write_partition(root, part)
+        current[key] = {
+            **part,
+            'rows': rows,
+            'path': f'{key}/data.parquet',
+            'written_at': timezone.now().isoformat(),
+        }
+        results['written'] += 1
+        results['rows'] += rows
+        logger.info('insight parquet snapshot written partition=%s rows=%s', key, rows)
+
+    for key in list(current):
+        if key in source:
+            continue
+        if meta_account_id is not None and current[key].get('meta_account_id') != meta_account_id:
+            continue
+        stale = root / current[key].get('path', f'{key}/data.parquet')
+        if stale.exists():
+            stale.unlink()
+        del current[key]
+        results['removed'] += 1
+
+    manifest['version'] = MANIFEST_VERSION
+    _write_manifest(root, manifest)
+    logger.info('insight parquet snapshots done %s', results)
+    return results
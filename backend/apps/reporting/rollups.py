@@ -0,0 +1,95 @@
+"""
+DailyAdInsight から DailyCampaignInsight / DailyAccountInsight への集計。
+取り込みで書き換えた (meta_account, stat_date) パーティションだけを再計算する。
+キャンペーンはディメンション（MetaCampaignDimension）単位で集計し、名前は表示時に引く
+（改名の前後の日が別キャンペーンに分かれないように）。
+"""
+from __future__ import annotations
+
+from datetime import date
+from typing import Iterable
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import DailyAccountInsight, DailyAdInsight, DailyCampaignInsight
+
+ROLLUP_METRICS = {
+    'ad_count': Count('id'),
+    'impressions': Sum('impressions'),
+    'clicks': Sum('clicks'),
+    'spend': Sum('spend'),
+    'conversions': Sum('conversions'),
+}
+
+
+def _rollup_values(row: dict) -> dict:
+    return {
+        'ad_count': row['ad_count'] or 0,
+        'impressions': row['impressions'] or 0,
+        'clicks': row['clicks'] or 0,
+        'spend': row['spend'] or 0,
+        'conversions': row['conversions'] or 0,
+    }
+
+
+def refresh_daily_rollups(meta_account_id: int, stat_dates: Iterable[date]) -> None:
+    """
+    meta_account_id の stat_dates 分のロールアップを広告行から作り直す。
+    既存行は upsert で更新し、広告行がなくなったキャンペーン / 日の行だけ削除する。
+    """
+    stat_dates = sorted(set(stat_dates))
+    if not stat_dates:
+        return
+
+    ad_rows = DailyAdInsight.objects.filter(
+        meta_account_id=meta_account_id,
+        stat_date__in=stat_dates,
+    )
+    campaign_objs = [
+        DailyCampaignInsight(
+            meta_account_id=meta_account_id,
+            stat_date=row['stat_date'],
+            campaign_id=row['campaign_id'],
+            **_rollup_values(row),
+        )
+        for row in ad_rows.values('stat_date', 'campaign_id').annotate(**ROLLUP_METRICS).order_by()
+    ]
+    account_objs = [
+        DailyAccountInsight(
+            meta_account_id=meta_account_id,
+            stat_date=row['stat_date'],
+            **_rollup_values(row),
+        )
+        for row in ad_rows.values('stat_date').annotate(**ROLLUP_METRICS).order_by()
+    ]
+
+    with transaction.atomic():
+        DailyCampaignInsight.objects.bulk_create(
+            campaign_objs,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['meta_account', 'stat_date', 'campaign'],
+            update_fields=[*ROLLUP_METRICS, 'updated_at'],
+        )
+        DailyAccountInsight.objects.bulk_create(
+            account_objs,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['meta_account', 'stat_date'],
+            update_fields=[*ROLLUP_METRICS, 'updated_at'],
+        )
+
+        live_campaigns = {(o.stat_date, o.campaign_id) for o in campaign_objs}
+        stale = [
+            pk
+            for pk, stat_date, campaign_id in DailyCampaignInsight.objects.filter(
+                meta_account_id=meta_account_id, stat_date__in=stat_dates
+            ).values_list('pk', 'stat_date', 'campaign_id')
+            if (stat_date, campaign_id) not in live_campaigns
+        ]
+        if stale:
+            DailyCampaignInsight.objects.filter(pk__in=stale).delete()
+        DailyAccountInsight.objects.filter(
+            meta_account_id=meta_account_id, stat_date__in=stat_dates
+        ).exclude(stat_date__in={o.stat_date for o in account_objs}).delete()
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from .models import DailyAdInsight
+from .models import DailyAccountInsight, DailyAdInsight, DailyCampaignInsight
 
 
 class DailyAdInsightSerializer(serializers.ModelSerializer):
@@ -8,6 +8,11 @@ class DailyAdInsightSerializer(serializers.ModelSerializer):
     meta_account_id_str = serializers.CharField(source='meta_account.account_id', read_only=True)
     meta_business_name = serializers.CharField(source='meta_account.business_name', read_only=True)
     meta_business_id = serializers.CharField(source='meta_account.business_id', read_only=True)
+    meta_campaign_id = serializers.CharField(source='campaign.meta_id', read_only=True)
+    campaign_name = serializers.CharField(source='campaign.name', read_only=True)
+    meta_adset_id = serializers.CharField(source='adset.meta_id', read_only=True)
+    adset_name = serializers.CharField(source='adset.name', read_only=True)
+    ad_name = serializers.CharField(source='ad.name', read_only=True)
 
     class Meta:
         model = DailyAdInsight
@@ -20,7 +25,9 @@ class DailyAdInsightSerializer(serializers.ModelSerializer):
             'meta_business_name',
             'meta_business_id',
             'meta_ad_id',
+            'meta_campaign_id',
             'campaign_name',
+            'meta_adset_id',
             'adset_name',
             'ad_name',
             'impressions',
@@ -41,7 +48,9 @@ class DailyAdInsightSerializer(serializers.ModelSerializer):
             'meta_business_name',
             'meta_business_id',
             'meta_ad_id',
+            'meta_campaign_id',
             'campaign_name',
+            'meta_adset_id',
             'adset_name',
             'ad_name',
             'impressions',
@@ -53,3 +62,71 @@ class DailyAdInsightSerializer(serializers.ModelSerializer):
             'cpa',
             'fetched_at',
         )
+
+
+class _DailyRollupSerializer(serializers.ModelSerializer):
+    """ロールアップ共通。率系（ctr / cpc / cpa）は合計値から算出する。"""
+
+    meta_account_name = serializers.CharField(source='meta_account.account_name', read_only=True)
+    meta_account_id_str = serializers.CharField(source='meta_account.account_id', read_only=True)
+    ctr = serializers.SerializerMethodField()
+    cpc = serializers.SerializerMethodField()
+    cpa = serializers.SerializerMethodField()
+
+    def get_ctr(self, obj):
+        return (obj.clicks / obj.impressions * 100) if obj.impressions else 0.0
+
+    def get_cpc(self, obj):
+        return float(obj.spend) / obj.clicks if obj.clicks else None
+
+    def get_cpa(self, obj):
+        return float(obj.spend) / obj.conversions if obj.conversions else None
+
+
+class DailyCampaignInsightSerializer(_DailyRollupSerializer):
+    meta_campaign_id = serializers.CharField(source='campaign.meta_id', read_only=True)
+    campaign_name = serializers.CharField(source='campaign.name', read_only=True)
+
+    class Meta:
+        model = DailyCampaignInsight
+        fields = (
+            'id',
+            'stat_date',
+            'meta_account',
+            'meta_account_name',
+            'meta_account_id_str',
+            'meta_campaign_id',
+            'campaign_name',
+            'ad_count',
+            'impressions',
+            'clicks',
+            'ctr',
+            'cpc',
+            'spend',
+            'conversions',
+            'cpa',
+            'updated_at',
+        )
+        read_only_fields = fields
+
+
+class DailyAccountInsightSerializer(_DailyRollupSerializer):
+    class Meta:
+        model = DailyAccountInsight
+        fields = (
+            'id',
+            'stat_date',
+            'meta_account',
+            'meta_account_name',
+            'meta_account_id_str',
+            'ad_count',
+            'impressions',
+            'clicks',
+            'ctr',
+            'cpc',
+            'spend',
+            'conversions',
+            'cpa',
+            'updated_at',
+        )
+        read_only_fields = fields
@@ -3,18 +3,33 @@
 """
 from __future__ import annotations
 
+import hashlib
 import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
+from functools import partial
+from typing import Callable, Iterable, Iterator
 from zoneinfo import ZoneInfo
 
 from celery import shared_task
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
 from django.db import transaction
 from django.utils import timezone
 
+from apps.accounts.meta_rate_limit import MetaRateLimited
 from apps.accounts.models import MetaAccount
+from apps.campaigns.dashboard import schedule_dashboard_snapshot
 
-from .meta_insights_service import fetch_ad_level_insights_for_day
-from .models import DailyAdInsight
+from .dimensions import DimensionCache
+from .meta_insights_service import (
+    iter_ad_level_insight_pages,
+    iter_async_ad_level_insight_pages,
+)
+from .models import DailyAccountInsight, DailyAdInsight, DailyInsightCoverage
+from .rollups import refresh_daily_rollups
 
 logger = logging.getLogger(__name__)
 
@@ -29,73 +44,527 @@ def _yesterday_date_str_in_jst(now=None) -> str:
     return y.isoformat()
 
 
-def run_daily_meta_ad_insights(stat_date: str | None = None) -> dict:
+_STREAM_END = object()
+
+# レート制限に当たったアカウントを取り直す回数の上限
+RATE_LIMIT_MAX_RESCHEDULES = 5
+
+
+class _AccountPageStream:
     """
-    前日（JST）分の広告単位インサイトを、紐づく全アクティブ Meta アカウントから取得して保存する。
-    stat_date を 'YYYY-MM-DD' で渡すとその日を対象にする（手動バックフィル用）。
-    Celery タスクと management コマンドの両方から呼ぶ。
+    ワーカースレッド（取得）と呼び出し元スレッド（書き込み）の間で、1 アカウント分のページを
+    受け渡すキュー。先読みはアカウントごとの buffer_pages ページに加えて、全アカウント共通の
+    shared 枠（書き込み待ちのアカウントが取得を先に進めるための枠）まで使える。
+    書き込み中のアカウントは自分の枠だけで進めるので、共通枠を他のアカウントが使い切っても止まらない。
+    メモリは (アカウント枠 × 取得スレッド数 + 共通枠) ページで頭打ちになる。
+    呼び出し元が途中で抜ける（時間切れ・書き込み失敗）ときは cancel() で取得を止め、
+    キューに残ったページの枠を返す。枠が空くのを待つワーカーは SLOT_POLL_SECONDS ごとに取り消しを確認する。
     """
-    if stat_date:
-        target_str = stat_date
-    else:
-        target_str = _yesterday_date_str_in_jst()
 
-    target_day = date.fromisoformat(target_str)
+    SLOT_POLL_SECONDS = 0.05
+
+    def __init__(self, ma: MetaAccount, buffer_pages: int, shared: threading.Semaphore | None = None):
+        self.ma = ma
+        self._pages: queue.Queue = queue.Queue()
+        self._own = threading.Semaphore(buffer_pages)
+        self._shared = shared
+        self._finished = False
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+        self._drain()
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                _, slot = self._pages.get_nowait()
+            except queue.Empty:
+                return
+            slot.release()
+
+    def _acquire_slot(self) -> threading.Semaphore | None:
+        """先読み枠を取る（アカウントの枠が埋まっていれば共通枠）。取り消されたら None。"""
+        while not self._cancelled.is_set():
+            if self._own.acquire(blocking=False):
+                return self._own
+            if self._shared is not None and self._shared.acquire(blocking=False):
+                return self._shared
+            self._cancelled.wait(self.SLOT_POLL_SECONDS)
+        return None
+
+    def _put(self, item) -> bool:
+        """item をキューに入れる。取り消されたら入れずに False。"""
+        slot = self._acquire_slot()
+        if slot is None:
+            return False
+        self._pages.put((item, slot))
+        if self._cancelled.is_set():
+            # cancel() の読み捨てと入れ違いになった分の枠を返す
+            self._drain()
+            return False
+        return True
+
+    def produce(self, pages: Iterable[list]) -> None:
+        if self.cancelled:
+            return
+        try:
+            for page in pages:
+                if not self._put(page):
+                    return
+        except Exception as exc:
+            self._put(exc)
+        else:
+            self._put(_STREAM_END)
+        finally:
+            close = getattr(pages, 'close', None)
+            if close is not None:
+                close()
+
+    def __iter__(self) -> Iterator[list]:
+        while not self._finished:
+            item, slot = self._pages.get()
+            slot.release()
+            if item is _STREAM_END:
+                self._finished = True
+            elif isinstance(item, Exception):
+                self._finished = True
+                raise item
+            else:
+                yield item
+
+
+def _stream_account_pages(
+    stream: _AccountPageStream,
+    fetch: Callable[[], Iterable[list]],
+    token_slot,
+    ready: queue.Queue,
+) -> None:
+    """ワーカースレッドで Meta から取得するだけ（DB には触らない）。取り消し済みなら取得しない。"""
+    with token_slot:
+        if stream.cancelled:
+            return
+        ready.put(stream)
+        stream.produce(fetch())
+
+
+def _page_source(
+    ma: MetaAccount,
+    since_day: date,
+    until_day: date,
+    async_threshold: int,
+) -> Callable[[], Iterable[list]]:
+    """
+    アカウントのページ取得関数を選ぶ。直近に取り込んだ日の広告数 × 日数が async_threshold 以上なら
+    同期ページングではなく非同期レポートジョブで取得する（0 なら常に同期）。
+    広告数はアカウント日次ロールアップ（DailyAccountInsight.ad_count）の最新日から読むので、
+    履歴の長さに関係なく (meta_account, stat_date) の索引 1 回で済む。
+    """
+    since_str = since_day.isoformat()
+    until_str = until_day.isoformat()
+    fetcher = iter_ad_level_insight_pages
+    if async_threshold > 0:
+        latest_ads = (
+            DailyAccountInsight.objects.filter(meta_account=ma)
+            .order_by('-stat_date')
+            .values_list('ad_count', flat=True)
+            .first()
+        )
+        days = (until_day - since_day).days + 1
+        if latest_ads and latest_ads * days >= async_threshold:
+            logger.info(
+                'Meta insights via async report account=%s ads=%s days=%s',
+                ma.account_id,
+                latest_ads,
+                days,
+            )
+            fetcher = iter_async_ad_level_insight_pages
+    return partial(fetcher, ma.account_id, ma.access_token, since_str, until_str)
+
+
+# content_hash の対象（= 取り込みで上書きされる列。名前はディメンション側）
+_INSIGHT_VALUE_FIELDS = (
+    'campaign_id',
+    'adset_id',
+    'ad_id',
+    'impressions',
+    'clicks',
+    'ctr',
+    'cpc',
+    'spend',
+    'conversions',
+    'cpa',
+    'all_conversions',
+)
+_UPSERT_UNIQUE_FIELDS = ['meta_account', 'stat_date', 'meta_ad_id']
+_UPSERT_UPDATE_FIELDS = [*_INSIGHT_VALUE_FIELDS, 'content_hash', 'fetched_at']
+
+
+def _insight_values(r: dict, dimension_ids: dict) -> dict:
+    return {
+        **dimension_ids,
+        'impressions': r['impressions'],
+        'clicks': r['clicks'],
+        'ctr': r['ctr'],
+        'cpc': r['cpc'],
+        'spend': r['spend'],
+        'conversions': float(r['conversions'] or 0),
+        'cpa': r['cpa'],
+        'all_conversions': float(r['all_conversions'] or 0),
+    }
+
+
+def _insight_content_hash(values: dict) -> str:
+    payload = '\x1f'.join(
+        '' if values[f] is None else str(values[f]) for f in _INSIGHT_VALUE_FIELDS
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class _DayPartition:
+    """1 日分（meta_account, stat_date）の upsert 状態。既存行は (ad_id -> (pk, hash)) だけ保持する。"""
+
+    def __init__(self, ma: MetaAccount, stat_date: date):
+        self.stat_date = stat_date
+        self.existing = {
+            ad_id: (pk, content_hash)
+            for pk, ad_id, content_hash in DailyAdInsight.objects.filter(
+                meta_account=ma, stat_date=stat_date
+            ).values_list('pk', 'meta_ad_id', 'content_hash')
+        }
+        self.seen: set[str] = set()
+        self.changed = False
+
+
+def _upsert_account_days(
+    ma: MetaAccount,
+    since_day: date,
+    until_day: date,
+    pages: Iterable[list],
+    dimensions: DimensionCache,
+) -> dict:
+    """
+    (ma, since_day..until_day) を 1 トランザクションで取り込む。行は date_start で日ごとの
+    パーティションに振り分け、キャンペーン / 広告セット / 広告名はディメンションに解決して、
+    ページが届くたびに uniq_daily_ad_insight_account_date_ad で upsert する。content_hash が同じ行は書き込まず、レスポンスから消えた広告の行だけ最後に削除する。
+    書き換えのあった日だけキャンペーン / アカウント単位のロールアップを再計算し、取り込んだ日を
+    DailyInsightCoverage に記録する。
+    """
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'removed': 0}
+    partitions: dict[date, _DayPartition] = {}
+    with transaction.atomic():
+        for rows in pages:
+            dated = []
+            for r in rows:
+                if r.get('date_start'):
+                    stat_date = date.fromisoformat(r['date_start'])
+                elif since_day == until_day:
+                    stat_date = since_day
+                else:
+                    logger.warning('Insight row without date_start in range fetch: %s', r['meta_ad_id'])
+                    continue
+                if not since_day <= stat_date <= until_day:
+                    continue
+                part = partitions.get(stat_date)
+                if part is None:
+                    part = partitions[stat_date] = _DayPartition(ma, stat_date)
+                if r['meta_ad_id'] in part.seen:
+                    continue
+                part.seen.add(r['meta_ad_id'])
+                dated.append((stat_date, r))
+
+            bulk = []
+            for (stat_date, r), dimension_ids in zip(dated, dimensions.resolve(dated)):
+                part = partitions[stat_date]
+                ad_id = r['meta_ad_id']
+                values = _insight_values(r, dimension_ids)
+                content_hash = _insight_content_hash(values)
+                current = part.existing.pop(ad_id, None)
+                if current is None:
+                    counts['inserted'] += 1
+                elif current[1] == content_hash:
+                    counts['unchanged'] += 1
+                    continue
+                else:
+                    counts['updated'] += 1
+                part.changed = True
+                bulk.append(
+                    DailyAdInsight(
+                        meta_account=ma,
+                        stat_date=stat_date,
+                        meta_ad_id=ad_id,
+                        content_hash=content_hash,
+                        **values,
+                    )
+                )
+            if bulk:
+                DailyAdInsight.objects.bulk_create(
+                    bulk,
+                    batch_size=500,
+                    update_conflicts=True,
+                    unique_fields=_UPSERT_UNIQUE_FIELDS,
+                    update_fields=_UPSERT_UPDATE_FIELDS,
+                )
+
+        stale_pks = []
+        for part in partitions.values():
+            if part.existing:
+                part.changed = True
+                stale_pks.extend(pk for pk, _ in part.existing.values())
+        for i in range(0, len(stale_pks), 500):
+            DailyAdInsight.objects.filter(pk__in=stale_pks[i:i + 500]).delete()
+        counts['removed'] = len(stale_pks)
+
+        # 1 行も返ってこなかった日は、その日の既存行がすべて消えたことになる
+        empty_days = DailyAdInsight.objects.filter(
+            meta_account=ma,
+            stat_date__gte=since_day,
+            stat_date__lte=until_day,
+        ).exclude(stat_date__in=list(partitions))
+        rewritten = set(empty_days.values_list('stat_date', flat=True).distinct())
+        deleted, _ = empty_days.delete()
+        counts['removed'] += deleted
+
+        rewritten.update(d for d, part in partitions.items() if part.changed)
+        refresh_daily_rollups(ma.pk, rewritten)
+        _record_coverage(ma, since_day, until_day)
+    return counts
+
+
+def _record_coverage(ma: MetaAccount, since_day: date, until_day: date) -> None:
+    """
+    取り込みの済んだ日を DailyInsightCoverage に記録する。当日（JST）以降はまだ値が動くので記録しない。
+    """
+    today = timezone.now().astimezone(JST).date()
+    last_day = min(until_day, today - timedelta(days=1))
+    days = [since_day + timedelta(days=i) for i in range((last_day - since_day).days + 1)]
+    DailyInsightCoverage.objects.bulk_create(
+        [DailyInsightCoverage(meta_account=ma, stat_date=d) for d in days],
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['meta_account', 'stat_date'],
+        update_fields=['ingested_at'],
+    )
+
 
-    accounts = MetaAccount.objects.filter(is_active=True).select_related('user')
-    total_accounts = accounts.count()
+def run_meta_ad_insights_range(
+    since: str,
+    until: str,
+    max_workers: int | None = None,
+    per_token_limit: int | None = None,
+    meta_account_ids: Iterable[int] | None = None,
+) -> dict:
+    """
+    since..until（'YYYY-MM-DD'、両端含む）の広告単位インサイトを、全アクティブ Meta アカウント
+    （meta_account_ids を渡せばそのうちの該当分）から取得して保存する。各アカウントは time_increment=1 の 1 本のリクエストストリームで取得し、
+    date_start ごとの日次パーティションに振り分けて upsert する（複数日のバックフィル用）。
+
+    Meta への取得は max_workers 本のスレッドで並列に行い（同一アクセストークンは
+    per_token_limit 本まで）、DB への書き込みは呼び出し元スレッドでアカウントごとに行う。
+    取得結果はページ単位で受け渡し、届いた順にアカウントのトランザクション内で書き込む。
+    書き込み待ちのアカウントも共通の先読み枠（settings.META_INSIGHTS_INGEST_SHARED_PAGE_BUFFER）の
+    範囲で取得を進める。
+    max_workers=1 なら逐次処理。広告数の多いアカウントは非同期レポートジョブで取得する
+    （settings.META_INSIGHTS_ASYNC_AD_THRESHOLD）。
+    Meta のレート制限で待ちきれなかったアカウントは失敗にせず rate_limited に入れる
+    （{'meta_account_id', 'retry_after'}。タスクから再スケジュールする）。
+    """
+    since_day = date.fromisoformat(since)
+    until_day = date.fromisoformat(until)
+    if since_day > until_day:
+        raise ValueError(f'since ({since}) must not be after until ({until})')
+    since_str = since_day.isoformat()
+    until_str = until_day.isoformat()
+
+    if max_workers is None:
+        max_workers = getattr(settings, 'META_INSIGHTS_INGEST_WORKERS', 4)
+    if per_token_limit is None:
+        per_token_limit = getattr(settings, 'META_INSIGHTS_INGEST_PER_TOKEN', 2)
+    max_workers = max(1, int(max_workers))
+    per_token_limit = max(1, int(per_token_limit))
+    buffer_pages = max(1, int(getattr(settings, 'META_INSIGHTS_INGEST_PAGE_BUFFER', 2)))
+    shared_pages = max(0, int(getattr(settings, 'META_INSIGHTS_INGEST_SHARED_PAGE_BUFFER', 64)))
+    async_threshold = int(getattr(settings, 'META_INSIGHTS_ASYNC_AD_THRESHOLD', 0) or 0)
+
+    account_qs = MetaAccount.objects.filter(is_active=True).select_related('user')
+    if meta_account_ids is not None:
+        account_qs = account_qs.filter(id__in=list(meta_account_ids))
+    accounts = list(account_qs)
     logger.info(
-        'run_daily_meta_ad_insights start target=%s accounts=%s',
-        target_str,
-        total_accounts,
+        'run_meta_ad_insights_range start since=%s until=%s accounts=%s workers=%s per_token=%s',
+        since_str,
+        until_str,
+        len(accounts),
+        max_workers,
+        per_token_limit,
     )
 
     results = {
-        'target_date': target_str,
+        'since': since_str,
+        'until': until_str,
         'accounts_ok': 0,
         'accounts_failed': 0,
+        'rows_inserted': 0,
+        'rows_updated': 0,
+        'rows_unchanged': 0,
+        'rows_removed': 0,
         'errors': [],
+        'rate_limited': [],
     }
 
-    for ma in accounts.iterator():
+    dimensions = DimensionCache()
+
+    def _record(ma: MetaAccount, pages: Iterable[list]) -> None:
         label = f'{ma.account_name}({ma.account_id})'
         try:
-            rows = fetch_ad_level_insights_for_day(ma.account_id, ma.access_token, target_str)
-            with transaction.atomic():
-                DailyAdInsight.objects.filter(meta_account=ma, stat_date=target_day).delete()
-                bulk = []
-                for r in rows:
-                    bulk.append(
-                        DailyAdInsight(
-                            meta_account=ma,
-                            stat_date=target_day,
-                            meta_ad_id=r['meta_ad_id'],
-                            campaign_name=r['campaign_name'][:512],
-                            adset_name=r['adset_name'][:512],
-                            ad_name=r['ad_name'][:512],
-                            impressions=r['impressions'],
-                            clicks=r['clicks'],
-                            ctr=r['ctr'],
-                            cpc=r['cpc'],
-                            spend=r['spend'],
-                            conversions=float(r['conversions'] or 0),
-                            cpa=r['cpa'],
-                        )
-                    )
-                if bulk:
-                    DailyAdInsight.objects.bulk_create(bulk, batch_size=500)
+            counts = _upsert_account_days(ma, since_day, until_day, pages, dimensions)
             logger.info(
-                'run_daily_meta_ad_insights ok account=%s rows=%s',
+                'run_meta_ad_insights_range ok account=%s inserted=%s updated=%s unchanged=%s removed=%s',
                 label,
-                len(rows),
+                counts['inserted'],
+                counts['updated'],
+                counts['unchanged'],
+                counts['removed'],
             )
             results['accounts_ok'] += 1
+            for key, value in counts.items():
+                results[f'rows_{key}'] += value
+            schedule_dashboard_snapshot([ma.user_id])
+        except SoftTimeLimitExceeded:
+            # タスクの時間切れはアカウントの失敗にせず、取得中のストリームを止めて抜ける
+            raise
+        except MetaRateLimited as exc:
+            logger.warning('run_meta_ad_insights_range rate limited account=%s retry_after=%s', label, exc.retry_after)
+            dimensions.clear()
+            results['rate_limited'].append({'meta_account_id': ma.id, 'retry_after': exc.retry_after})
         except Exception as exc:
-            logger.exception('run_daily_meta_ad_insights failed account=%s', label)
+            logger.exception('run_meta_ad_insights_range failed account=%s', label)
+            # ロールバックで消えたディメンションを参照しないよう作り直す
+            dimensions.clear()
             results['accounts_failed'] += 1
             results['errors'].append({'account': ma.account_id, 'error': str(exc)})
 
-    logger.info('run_daily_meta_ad_insights done %s', results)
+    if max_workers == 1:
+        for ma in accounts:
+            _record(ma, _page_source(ma, since_day, until_day, async_threshold)())
+    else:
+        token_slots: dict[str, threading.Semaphore] = {}
+        for ma in accounts:
+            token_slots.setdefault(ma.access_token, threading.BoundedSemaphore(per_token_limit))
+
+        # 取得を開始したアカウントから順に書き込む（開始前のアカウントを待つことはない）
+        ready: queue.Queue = queue.Queue()
+        streams: list[_AccountPageStream] = []
+        shared_slots = threading.Semaphore(shared_pages)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            finished = False
+            try:
+                for ma in accounts:
+                    stream = _AccountPageStream(ma, buffer_pages, shared_slots)
+                    streams.append(stream)
+                    executor.submit(
+                        _stream_account_pages,
+                        stream,
+                        _page_source(ma, since_day, until_day, async_threshold),
+                        token_slots[ma.access_token],
+                        ready,
+                    )
+                for _ in accounts:
+                    stream = ready.get()
+                    _record(stream.ma, stream)
+                    # 書き込みが途中で失敗したアカウントの残りは取得せず、先読みした枠を返す
+                    stream.cancel()
+                finished = True
+            finally:
+                if not finished:
+                    # 時間切れ（SoftTimeLimitExceeded）などで抜けるときは、開始前のアカウントは取得させず、
+                    # 取得中のワーカーも次のページで止めて、executor の終了待ちで固まらないようにする
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    for stream in streams:
+                        stream.cancel()
+
+    logger.info('run_meta_ad_insights_range done %s', results)
+    return results
+
+
+def run_daily_meta_ad_insights(
+    stat_date: str | None = None,
+    max_workers: int | None = None,
+    per_token_limit: int | None = None,
+    meta_account_ids: Iterable[int] | None = None,
+) -> dict:
+    """
+    前日（JST）分の広告単位インサイトを、紐づく全アクティブ Meta アカウントから取得して保存する。
+    stat_date を 'YYYY-MM-DD' で渡すとその日を対象にする（手動バックフィル用）。
+    Celery タスクと management コマンドの両方から呼ぶ。複数日は run_meta_ad_insights_range を使う。
+    """
+    if stat_date:
+        target_str = stat_date
+    else:
+        target_str = _yesterday_date_str_in_jst()
+
+    results = run_meta_ad_insights_range(
+        target_str,
+        target_str,
+        max_workers=max_workers,
+        per_token_limit=per_token_limit,
+        meta_account_ids=meta_account_ids,
+    )
+    return {'target_date': target_str, **results}
+
+
+@shared_task(
+    bind=True,
+    soft_time_limit=25 * 60,
+    time_limit=30 * 60,
+)
+def fetch_daily_meta_ad_insights(
+    self,
+    stat_date: str | None = None,
+    max_workers: int | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    meta_account_ids: list[int] | None = None,
+    rate_limit_attempt: int = 0,
+):
+    if since or until:
+        since, until = since or until, until or since
+        results = run_meta_ad_insights_range(
+            since,
+            until,
+            max_workers=max_workers,
+            meta_account_ids=meta_account_ids,
+        )
+    else:
+        results = run_daily_meta_ad_insights(
+            stat_date=stat_date,
+            max_workers=max_workers,
+            meta_account_ids=meta_account_ids,
+        )
+        since = until = results['target_date']
+
+    # レート制限に当たったアカウントだけ、枠が戻る頃に取り直す
+    rate_limited = results['rate_limited']
+    if rate_limited and rate_limit_attempt < RATE_LIMIT_MAX_RESCHEDULES:
+        countdown = max(item['retry_after'] for item in rate_limited)
+        account_ids = [item['meta_account_id'] for item in rate_limited]
+        logger.info(
+            'fetch_daily_meta_ad_insights rescheduling accounts=%s countdown=%ss', account_ids, countdown,
+        )
+        self.apply_async(
+            kwargs={
+                'max_workers': max_workers,
+                'since': since,
+                'until': until,
+                'meta_account_ids': account_ids,
+                'rate_limit_attempt': rate_limit_attempt + 1,
+            },
+            countdown=countdown,
+        )
     return results
 
 
@@ -104,5 +573,7 @@ def run_daily_meta_ad_insights(stat_date: str | None = None) -> dict:
     soft_time_limit=25 * 60,
     time_limit=30 * 60,
 )
-def fetch_daily_meta_ad_insights(self, stat_date: str | None = None):
-    return run_daily_meta_ad_insights(stat_date=stat_date)
+def write_insight_parquet_snapshots(self, full: bool = False, meta_account_id: int | None = None):
+    from .parquet_snapshots import write_insight_snapshots
+
+    return write_insight_snapshots(full=full, meta_account_id=meta_account_id)
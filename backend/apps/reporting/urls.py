@@ -1,8 +1,27 @@
 from django.urls import path
 
-from .views import DailyAdInsightListView
+from .views import (
+    DailyAccountInsightListView,
+    DailyAdInsightExportView,
+    DailyAdInsightListView,
+    DailyCampaignInsightListView,
+)
 
 urlpatterns = [
     path('daily-insights/', DailyAdInsightListView.as_view(), name='daily-insights-list'),
+    path(
+        'daily-insights/export/',
+        DailyAdInsightExportView.as_view(),
+        name='daily-insights-export',
+    ),
+    path(
+        'daily-insights/campaigns/',
+        DailyCampaignInsightListView.as_view(),
+        name='daily-campaign-insights-list',
+    ),
+    path(
+        'daily-insights/accounts/',
+        DailyAccountInsightListView.as_view(),
+        name='daily-account-insights-list',
+    ),
 ]
-
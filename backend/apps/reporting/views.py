@@ -1,28 +1,38 @@
+import csv
+import json
 from datetime import datetime
 
 from django.db.models import Sum
-from rest_framework import generics
+from django.http import StreamingHttpResponse
+from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from .models import DailyAdInsight
-from .serializers import DailyAdInsightSerializer
+from .models import DailyAccountInsight, DailyAdInsight, DailyCampaignInsight
+from .pagination import DailyAdInsightKeysetPagination
+from .serializers import (
+    DailyAccountInsightSerializer,
+    DailyAdInsightSerializer,
+    DailyCampaignInsightSerializer,
+)
 
+# ページ番号モードとエクスポートの並び（キャンペーン名順）。カーソルモードは
+# DailyAdInsightKeysetPagination.ordering（索引に載るファクト表の列）を使う
+DAILY_AD_INSIGHT_ORDERING = ('-stat_date', 'campaign__name', 'meta_ad_id', 'id')
 
-class DailyAdInsightListView(generics.ListAPIView):
+
+class DailyInsightFilterMixin:
     """
-    日次保存済みの広告単位インサイト一覧（ログインユーザーが紐づける Meta アカウントのみ）。
+    日次インサイト系ビュー共通の絞り込み（ログインユーザーが紐づける有効な Meta アカウントのみ）。
     クエリ: start_date, end_date (YYYY-MM-DD), meta_account (内部 ID)
     """
 
-    permission_classes = [IsAuthenticated]
-    serializer_class = DailyAdInsightSerializer
-
-    def get_queryset(self):
-        qs = DailyAdInsight.objects.filter(
+    def filter_daily(self, qs):
+        qs = qs.filter(
             meta_account__user=self.request.user,
             meta_account__is_active=True,
-        ).select_related('meta_account')
+        )
 
         start_s = self.request.query_params.get('start_date')
         end_s = self.request.query_params.get('end_date')
@@ -43,27 +53,168 @@ class DailyAdInsightListView(generics.ListAPIView):
         if ma:
             qs = qs.filter(meta_account_id=ma)
 
-        return qs.order_by('-stat_date', 'campaign_name', 'meta_ad_id')
+        return qs
 
-    def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        summary = queryset.aggregate(
+    def summary_payload(self):
+        """期間合計。広告行ではなくアカウント日次ロールアップから集計する。"""
+        summary = self.filter_daily(DailyAccountInsight.objects.all()).aggregate(
             total_spend=Sum('spend'),
             total_impressions=Sum('impressions'),
             total_clicks=Sum('clicks'),
             total_conversions=Sum('conversions'),
         )
-        summary_payload = {
+        return {
             'total_spend': float(summary['total_spend'] or 0),
             'total_impressions': int(summary['total_impressions'] or 0),
             'total_clicks': int(summary['total_clicks'] or 0),
             'total_conversions': float(summary['total_conversions'] or 0),
         }
+
+    def wants_summary(self, default: bool = True) -> bool:
+        raw = self.request.query_params.get('include_summary')
+        if raw is None:
+            return default
+        return raw.lower() in ('1', 'true', 'yes')
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        summary_payload = self.summary_payload() if self.wants_summary() else None
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
             resp = self.get_paginated_response(serializer.data)
-            resp.data['summary'] = summary_payload
+            if summary_payload is not None:
+                resp.data['summary'] = summary_payload
             return resp
         serializer = self.get_serializer(queryset, many=True)
         return Response({'summary': summary_payload, 'results': serializer.data})
+
+
+class DailyAdInsightListView(DailyInsightFilterMixin, generics.ListAPIView):
+    """
+    日次保存済みの広告単位インサイト一覧（ログインユーザーが紐づける Meta アカウントのみ）。
+    クエリ: start_date, end_date (YYYY-MM-DD), meta_account (内部 ID)
+
+    pagination=cursor（または cursor=...）でキーセットページネーションになり、
+    深いページでも OFFSET / COUNT(*) を使わない。この場合 summary は include_summary=true のときだけ返す。
+    """
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = DailyAdInsightSerializer
+
+    def uses_cursor(self) -> bool:
+        params = self.request.query_params
+        return 'cursor' in params or params.get('pagination') == 'cursor'
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator') and self.uses_cursor():
+            self._paginator = DailyAdInsightKeysetPagination()
+        return super().paginator
+
+    def wants_summary(self, default: bool = True) -> bool:
+        return super().wants_summary(default=not self.uses_cursor())
+
+    def get_queryset(self):
+        qs = self.filter_daily(
+            DailyAdInsight.objects.select_related('meta_account', 'campaign', 'adset', 'ad')
+        )
+        if self.uses_cursor():
+            return qs.order_by(*DailyAdInsightKeysetPagination.ordering)
+        return qs.order_by(*DAILY_AD_INSIGHT_ORDERING)
+
+
+class DailyCampaignInsightListView(DailyInsightFilterMixin, generics.ListAPIView):
+    """キャンペーン × 日のロールアップ一覧（名前はキャンペーンの現在名）。クエリは daily-insights/ と同じ。"""
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = DailyCampaignInsightSerializer
+
+    def get_queryset(self):
+        qs = self.filter_daily(DailyCampaignInsight.objects.select_related('meta_account', 'campaign'))
+        return qs.order_by('-stat_date', 'campaign__name', 'campaign_id', 'meta_account_id')
+
+
+class DailyAccountInsightListView(DailyInsightFilterMixin, generics.ListAPIView):
+    """Meta アカウント × 日のロールアップ一覧。クエリは daily-insights/ と同じ。"""
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = DailyAccountInsightSerializer
+
+    def get_queryset(self):
+        qs = self.filter_daily(DailyAccountInsight.objects.select_related('meta_account'))
+        return qs.order_by('-stat_date', 'meta_account_id')
+
+
+class _Echo:
+    """csv.writer の書き込み先。書いた 1 行をそのまま返す（StreamingHttpResponse 用）。"""
+
+    def write(self, value):
+        return value
+
+
+class DailyAdInsightExportView(DailyInsightFilterMixin, APIView):
+    """
+    広告単位インサイトのストリーミングエクスポート（CSV / NDJSON）。
+    クエリは daily-insights/ と同じ + file_format=csv|ndjson（既定 csv）。
+    サーバーサイドカーソル（iterator）で chunk_size 行ずつ読み、行ごとに書き出すので
+    期間の長さに関係なく Web ワーカーのメモリは一定。
+    """
+
+    permission_classes = [IsAuthenticated]
+    chunk_size = 2000
+    columns = (
+        ('stat_date', 'stat_date'),
+        ('meta_account_id_str', 'meta_account__account_id'),
+        ('meta_account_name', 'meta_account__account_name'),
+        ('meta_ad_id', 'meta_ad_id'),
+        ('meta_campaign_id', 'campaign__meta_id'),
+        ('campaign_name', 'campaign__name'),
+        ('meta_adset_id', 'adset__meta_id'),
+        ('adset_name', 'adset__name'),
+        ('ad_name', 'ad__name'),
+        ('impressions', 'impressions'),
+        ('clicks', 'clicks'),
+        ('ctr', 'ctr'),
+        ('cpc', 'cpc'),
+        ('spend', 'spend'),
+        ('conversions', 'conversions'),
+        ('cpa', 'cpa'),
+    )
+
+    def get(self, request, *args, **kwargs):
+        file_format = request.query_params.get('file_format', 'csv').lower()
+        if file_format not in ('csv', 'ndjson'):
+            return Response(
+                {'error': 'file_format は csv または ndjson を指定してください。'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        rows = (
+            self.filter_daily(DailyAdInsight.objects.all())
+            .order_by(*DAILY_AD_INSIGHT_ORDERING)
+            .values_list(*(source for _, source in self.columns))
+            .iterator(chunk_size=self.chunk_size)
+        )
+        if file_format == 'csv':
+            content = self._csv_lines(rows)
+            content_type = 'text/csv; charset=utf-8'
+        else:
+            content = self._ndjson_lines(rows)
+            content_type = 'application/x-ndjson; charset=utf-8'
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="daily_ad_insights.{file_format}"'
+        return response
+
+    def _csv_lines(self, rows):
+        writer = csv.writer(_Echo())
+        # Excel で文字化けしないよう BOM 付き（bulk_upload のテンプレートと同じ utf-8-sig）
+        yield '\ufeff' + writer.writerow([name for name, _ in self.columns])
+        for row in rows:
+            yield writer.writerow(['' if v is None else v for v in row])
+
+    def _ndjson_lines(self, rows):
+        names = [name for name, _ in self.columns]
+        for row in rows:
+            yield json.dumps(dict(zip(names, row)), ensure_ascii=False, default=str) + '\n'
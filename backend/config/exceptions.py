@@ -1,8 +1,11 @@
 from rest_framework.views import exception_handler
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import Throttled
 import logging
 
+from apps.accounts.meta_rate_limit import MetaRateLimited
+
 logger = logging.getLogger(__name__)
 
 
@@ -11,6 +14,10 @@ def custom_exception_handler(exc, context):
     カスタム例外ハンドラー
     すべてのエラーレスポンスを統一フォーマットで返す
     """
+    # Meta のレート制限は 429（Retry-After 付き）として返す
+    if isinstance(exc, MetaRateLimited):
+        exc = Throttled(wait=exc.retry_after)
+
     # DRFのデフォルト例外ハンドラーを呼び出す
     response = exception_handler(exc, context)
     
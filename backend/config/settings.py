@@ -167,6 +167,21 @@ CORS_ALLOW_HEADERS = [
     'x-requested-with',
 ]
 
+# キャッシュ設定
+# shared は Web と全 Celery ワーカーで共有する状態（Meta のレート制御、同期の進捗カウンタ、タスクの重複キュー抑止、
+# インサイト更新の優先度に使う閲覧記録、reporting_data の期間インサイトキャッシュと更新ロック）を置く Redis。
+# 用途ごとにキーの名前空間（meta_rl: / campaigns:...:）を分けて 1 つのエイリアスを使う
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('REDIS_URL', default='redis://localhost:6379/0'),
+        'KEY_PREFIX': 'ads_platform',
+    },
+}
+
 # Celery設定
 CELERY_BROKER_URL = config('REDIS_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = config('REDIS_URL', default='redis://localhost:6379/0')
@@ -178,18 +193,124 @@ CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
 CELERY_TASK_SOFT_TIME_LIMIT = 60
 
+# タスクのキュー振り分け（ワーカー構成は docker-compose*.yml のコメント参照）
+# - interactive: 画面操作に対する Meta の作成 / 有効化 / 停止 / 削除と単体同期（待たせない）
+# - sync: ユーザー単位の同期（すべて同期・インサイト更新・ダッシュボード再集計・アラート判定）
+# - bulk: 一括入稿
+# - ingest: 夜間の取り込み・スナップショット・定期メンテナンス
+# 専用ワーカーがキューごとに並列度を持つので、バッチの時間帯でも interactive は詰まらない。
+# 1 ワーカーで全キューを読む構成（開発環境）でも priority（Redis では 0 が最優先）で interactive を先に取る。
+# 振り分けのないタスクは既定の celery キューに入る
+TASK_QUEUE_PRIORITIES = {
+    'interactive': 0,
+    'sync': 3,
+    'bulk': 6,
+    'ingest': 9,
+}
+TASK_QUEUES = {
+    **{
+        f'apps.campaigns.tasks.{name}': 'interactive'
+        for name in (
+            'submit_campaign_to_meta',
+            'delete_campaign_from_meta',
+            'activate_campaign_in_meta',
+            'pause_campaign_in_meta',
+            'activate_adset_in_meta',
+            'pause_adset_in_meta',
+            'activate_ad_in_meta',
+            'pause_ad_in_meta',
+            'sync_campaign_status_from_meta',
+            'sync_adset_status_from_meta',
+            'sync_ad_status_from_meta',
+            'sync_campaign_full_from_meta',
+        )
+    },
+    **{
+        f'apps.campaigns.tasks.{name}': 'sync'
+        for name in (
+            'sync_user_statuses_from_meta',
+            'sync_all_campaigns_status_from_meta',
+            'schedule_insights_refresh',
+            'schedule_full_status_sync',
+            'fetch_campaign_insights_from_meta',
+            'fetch_campaigns_insights_from_meta',
+            'rebuild_dashboard_snapshot',
+            'refresh_range_insights_cache',
+        )
+    },
+    'apps.alerts.tasks.check_single_alert_rule': 'sync',
+    'apps.alerts.tasks.send_system_alert': 'sync',
+    'apps.bulk_upload.views.process_bulk_upload': 'bulk',
+    'apps.reporting.tasks.*': 'ingest',
+    'apps.alerts.tasks.check_all_alert_rules': 'ingest',
+    'apps.alerts.tasks.cleanup_old_notifications': 'ingest',
+    'apps.alerts.tasks.retry_failed_notifications': 'ingest',
+}
+CELERY_TASK_ROUTES = {
+    name: {'queue': queue, 'priority': TASK_QUEUE_PRIORITIES[queue]}
+    for name, queue in TASK_QUEUES.items()
+}
+CELERY_TASK_DEFAULT_PRIORITY = 5
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'queue_order_strategy': 'priority',
+    'priority_steps': list(range(10)),
+    'sep': ':',
+}
+# 長いバッチタスクを先読みして interactive を待たせないよう、1 プロセス 1 件ずつ取る
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
 # 日次 Meta 広告インサイト（前日分・JST 6:00）
 CELERY_BEAT_SCHEDULE = {
     'daily-meta-ad-insights': {
         'task': 'apps.reporting.tasks.fetch_daily_meta_ad_insights',
         'schedule': crontab(hour=6, minute=0),
     },
+    # 取り込み後、変更のあった月だけ Parquet スナップショットを書き直す
+    'insight-parquet-snapshots': {
+        'task': 'apps.reporting.tasks.write_insight_parquet_snapshots',
+        'schedule': crontab(hour=7, minute=30),
+    },
+    # キャンペーンのインサイト（cached_insights）を優先度順に少しずつ更新する（apps.campaigns.insights_scheduler）
+    'campaign-insights-refresh': {
+        'task': 'apps.campaigns.tasks.schedule_insights_refresh',
+        'schedule': timedelta(minutes=1),
+    },
+    # ステータスの差分同期で拾えない effective_status の変化を、1 日 1 回の全件同期で拾う
+    'meta-full-status-sync': {
+        'task': 'apps.campaigns.tasks.schedule_full_status_sync',
+        'schedule': crontab(hour=5, minute=0),
+    },
 }
 
 # Meta API設定
 META_APP_ID = config('META_APP_ID', default='')
 META_APP_SECRET = config('META_APP_SECRET', default='')
 META_ACCESS_TOKEN = config('META_ACCESS_TOKEN', default='')
+# Graph API のバージョン（apps.accounts.meta_graph で全 Meta 呼び出し共通）とプロセスあたりの接続プール
+META_GRAPH_API_VERSION = config('META_GRAPH_API_VERSION', default='v22.0')
+META_GRAPH_POOL_MAXSIZE = config('META_GRAPH_POOL_MAXSIZE', default=32, cast=int)
+# Meta API のレート制御（apps.accounts.meta_rate_limit）: 広告アカウント / トークンあたりの最大リクエスト数（毎秒）と、
+# 呼び出し元で待てる最大秒数（超えたら MetaRateLimited で再スケジュール）
+META_RATE_LIMIT_MAX_RPS = config('META_RATE_LIMIT_MAX_RPS', default=5, cast=float)
+META_RATE_LIMIT_MAX_WAIT = config('META_RATE_LIMIT_MAX_WAIT', default=20, cast=float)
+
+# 日次インサイト取り込みの並列度（アカウント単位の取得スレッド数 / 同一トークンあたりの同時取得数）
+META_INSIGHTS_INGEST_WORKERS = config('META_INSIGHTS_INGEST_WORKERS', default=4, cast=int)
+META_INSIGHTS_INGEST_PER_TOKEN = config('META_INSIGHTS_INGEST_PER_TOKEN', default=2, cast=int)
+# 取得スレッドが書き込み待ちで先読みできるページ数（アカウントあたり）
+META_INSIGHTS_INGEST_PAGE_BUFFER = config('META_INSIGHTS_INGEST_PAGE_BUFFER', default=2, cast=int)
+# 書き込み待ちのアカウントが取得を先に進めるための先読みページ数（全アカウント共通）
+META_INSIGHTS_INGEST_SHARED_PAGE_BUFFER = config('META_INSIGHTS_INGEST_SHARED_PAGE_BUFFER', default=64, cast=int)
+# 直近の広告数 × 日数がこの値以上のアカウントは非同期レポートジョブで取得（0 で無効）
+META_INSIGHTS_ASYNC_AD_THRESHOLD = config('META_INSIGHTS_ASYNC_AD_THRESHOLD', default=5000, cast=int)
+# キャンペーンのインサイト更新（毎分の schedule_insights_refresh / すべて同期）1 回あたりの Graph リクエスト数の上限
+META_INSIGHTS_REFRESH_BUDGET = config('META_INSIGHTS_REFRESH_BUDGET', default=20, cast=int)
+# すべて同期の進捗 SSE（sync_all_progress_stream）で進捗を読む間隔（秒）と、gunicorn ワーカープロセスあたりの
+# 同時ストリーム数の上限（1 接続が --threads のスレッドを 1 つ占有する。超えた接続は 1 回応答して閉じ、ポーリングになる）
+SYNC_PROGRESS_STREAM_INTERVAL = config('SYNC_PROGRESS_STREAM_INTERVAL', default=1.5, cast=float)
+SYNC_PROGRESS_STREAM_MAX_PER_PROCESS = config('SYNC_PROGRESS_STREAM_MAX_PER_PROCESS', default=2, cast=int)
+# インサイト履歴の Parquet スナップショット出力先（meta_account=/month= 形式のパーティション + manifest.json）
+REPORTING_PARQUET_DIR = Path(config('REPORTING_PARQUET_DIR', default=str(BASE_DIR / 'exports' / 'insights')))
 
 # Box API設定
 BOX_CLIENT_ID = config('BOX_CLIENT_ID', default='')
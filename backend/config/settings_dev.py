@@ -21,6 +21,17 @@ ALLOWED_HOSTS = ['*']
 # CORS設定（開発環境）
 CORS_ALLOW_ALL_ORIGINS = True
 
+# キャッシュ設定（開発環境は Redis なしで動かす）
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+    },
+}
+
 # Celery設定（開発環境）
 CELERY_TASK_ALWAYS_EAGER = True
 CELERY_TASK_EAGER_PROPAGATES = True
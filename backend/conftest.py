@@ -1,8 +1,20 @@
 import pytest
+from django.conf import settings
+from django.core.cache import caches
 from rest_framework.test import APIClient
 from apps.accounts.models import User
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """全キャッシュエイリアス（default と共有の shared）をテストごとに空にする"""
+    for alias in settings.CACHES:
+        caches[alias].clear()
+    yield
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
 @pytest.fixture
 def api_client():
     """APIクライアントのフィクスチャ"""
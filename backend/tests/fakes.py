@@ -0,0 +1,99 @@
+"""
+非同期インサイトレポート（report run）で使う Graph エンドポイントのオフライン代替。
+
+インスタンスを meta_insights_service の関数に ``http=`` として渡すと、
+投入 → ポーリング → ダウンロードをネットワークなしで通せる::
+
+    graph = FakeAsyncInsightsGraph(rows, polls_until_done=3)
+    pages = iter_async_ad_level_insight_pages('act_1', 'token', since, until,
+                                              http=graph, sleep=lambda s: None)
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from apps.reporting.meta_insights_service import ASYNC_REPORT_COMPLETED, BASE_URL
+
+
+class FakeResponse:
+    """requests.Response のうちテストで使う分（status_code / text / json / raise_for_status）だけを持つ応答"""
+
+    def __init__(self, payload: Any, status_code: int = 200):
+        self._payload = payload
+        self.status_code = status_code
+        self.text = json.dumps(payload)
+
+    def json(self) -> Any:
+        return self._payload
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise RuntimeError(f'Fake Graph HTTP {self.status_code}: {self.text}')
+
+
+class FakeAsyncInsightsGraph:
+    """
+    report run を 1 件だけ扱う。POST .../insights で report_run_id を返し、最初の polls_until_done 回の
+    ポーリングは 'Job Running'、その後は final_status を返す。結果は /{report_run_id}/insights から
+    page_size 行ずつのページでダウンロードする。
+    """
+
+    def __init__(
+        self,
+        rows: List[dict[str, Any]],
+        polls_until_done: int = 2,
+        final_status: str = ASYNC_REPORT_COMPLETED,
+        page_size: int = 2,
+        report_run_id: str = '900001',
+    ):
+        self.rows = rows
+        self.polls_until_done = polls_until_done
+        self.final_status = final_status
+        self.page_size = page_size
+        self.report_run_id = report_run_id
+        self.submitted_params: Optional[dict[str, Any]] = None
+        self.polls = 0
+        self.downloads = 0
+
+    def post(self, url, headers=None, params=None, timeout=None, **kwargs):
+        if not urlparse(url).path.endswith('/insights'):
+            return FakeResponse({'error': {'message': f'unexpected POST {url}'}}, 400)
+        self.submitted_params = dict(params or {})
+        return FakeResponse({'report_run_id': self.report_run_id})
+
+    def get(self, url, headers=None, params=None, timeout=None, **kwargs):
+        path = urlparse(url).path.rstrip('/')
+        if path.endswith(f'/{self.report_run_id}'):
+            return self._poll()
+        if path.endswith(f'/{self.report_run_id}/insights'):
+            return self._download(url, params or {})
+        return FakeResponse({'error': {'message': f'unexpected GET {url}'}}, 404)
+
+    def _poll(self) -> FakeResponse:
+        self.polls += 1
+        if self.polls <= self.polls_until_done:
+            percent = int(100 * (self.polls - 1) / max(self.polls_until_done, 1))
+            return FakeResponse({
+                'id': self.report_run_id,
+                'async_status': 'Job Running',
+                'async_percent_completion': percent,
+            })
+        return FakeResponse({
+            'id': self.report_run_id,
+            'async_status': self.final_status,
+            'async_percent_completion': 100,
+        })
+
+    def _download(self, url: str, params: dict) -> FakeResponse:
+        self.downloads += 1
+        query = parse_qs(urlparse(url).query)
+        offset = int((query.get('after') or [params.get('after') or 0])[0])
+        chunk = self.rows[offset:offset + self.page_size]
+        payload: dict[str, Any] = {'data': chunk}
+        if offset + self.page_size < len(self.rows):
+            payload['paging'] = {
+                'next': f'{BASE_URL}/{self.report_run_id}/insights?after={offset + self.page_size}',
+            }
+        return FakeResponse(payload)
@@ -1,6 +1,8 @@
 """
 認証API（ユーザー登録・ログイン・ログアウト）のテスト
 """
+import json
+
 import pytest
 from rest_framework import status
 from apps.accounts.models import User
@@ -162,3 +164,128 @@ class TestTwoFactorAuth:
         
         assert response.status_code == status.HTTP_200_OK
         assert response.data['enabled'] is False
+
+
+class TestMetaGraphClient:
+    """Meta Graph API 共有クライアントのテスト"""
+
+    def test_graph_url_and_shared_session(self):
+        """相対パスはバージョン付き URL になり、Session はプロセス内で使い回される"""
+        from apps.accounts import meta_graph
+
+        assert meta_graph.graph_url('act_1/insights') == f'{meta_graph.GRAPH_BASE_URL}/act_1/insights'
+        assert meta_graph.graph_url('https://graph.facebook.com/next') == 'https://graph.facebook.com/next'
+        assert meta_graph.get_session() is meta_graph.get_session()
+
+    def test_iter_data_follows_paging(self, monkeypatch):
+        """paging.next を辿り、2 ページ目以降は params を付けない"""
+        from apps.accounts import meta_graph
+
+        calls = []
+
+        class FakeResponse:
+            def __init__(self, payload):
+                self.payload = payload
+
+            def raise_for_status(self):
+                return None
+
+            def json(self):
+                return self.payload
+
+        def fake_get(path, params=None, **kwargs):
+            calls.append((path, params))
+            if len(calls) == 1:
+                return FakeResponse({'data': [{'id': '1'}], 'paging': {'next': 'https://graph.facebook.com/page-2'}})
+            return FakeResponse({'data': [{'id': '2'}]})
+
+        monkeypatch.setattr(meta_graph, 'get', fake_get)
+
+        rows = list(meta_graph.iter_data('act_1/campaigns', {'fields': 'id'}))
+
+        assert [row['id'] for row in rows] == ['1', '2']
+        assert calls == [('act_1/campaigns', {'fields': 'id'}), ('https://graph.facebook.com/page-2', None)]
+
+    def test_error_summary_omits_request_url(self):
+        """HTTPError の要約はステータスと Graph の error.message だけで、URL（トークン）を含まない"""
+        import requests
+        from apps.accounts import meta_graph
+
+        response = requests.Response()
+        response.status_code = 400
+        response._content = b'{"error": {"message": "Invalid parameter", "code": 100}}'
+        response.url = 'https://graph.facebook.com/v22.0/act_1/insights?access_token=secret'
+        error = requests.exceptions.HTTPError(f'400 Client Error for url: {response.url}', response=response)
+
+        assert meta_graph.error_summary(error) == 'HTTP 400: Invalid parameter'
+        assert meta_graph.error_summary(requests.exceptions.ConnectionError(response.url)) == 'ConnectionError'
+
+
+class TestMetaRateLimit:
+    """Meta レート制御（使用率ヘッダ / スロットリング）のテスト"""
+
+    class FakeResponse:
+        def __init__(self, status_code=200, payload=None, headers=None):
+            self.status_code = status_code
+            self.payload = payload or {}
+            self.headers = headers or {}
+
+        def json(self):
+            return self.payload
+
+    def test_request_scopes(self):
+        """広告アカウントとトークン（ハッシュ）がスコープになる"""
+        from apps.accounts import meta_rate_limit
+
+        scopes = meta_rate_limit.request_scopes('act_123/insights', {'access_token': 'tok'})
+        assert scopes == ['act:123', meta_rate_limit.token_scope('tok')]
+        assert 'tok' not in scopes[1].split(':', 1)[1]
+        # paging.next の URL ではクエリのトークンを使う
+        assert meta_rate_limit.request_scopes('https://graph.facebook.com/v22.0/act_9/insights?access_token=tok') == [
+            'act:9', meta_rate_limit.token_scope('tok'),
+        ]
+        # Authorization: Bearer ヘッダのトークン（report_run_id のポーリングなど広告アカウントを含まないパスも）
+        assert meta_rate_limit.request_scopes('123456', headers={'Authorization': 'Bearer tok'}) == [
+            meta_rate_limit.token_scope('tok'),
+        ]
+        assert meta_rate_limit.request_scopes('act_9/campaigns', headers={'authorization': 'Basic tok'}) == ['act:9']
+
+    def test_parse_usage_headers(self):
+        """使用率ヘッダから最大使用率と回復までの秒数を取る"""
+        from apps.accounts import meta_rate_limit
+
+        response = self.FakeResponse(headers={
+            'X-Business-Use-Case-Usage': json.dumps({'111': [{
+                'type': 'ads_insights', 'call_count': 40, 'total_cputime': 75, 'total_time': 10,
+                'estimated_time_to_regain_access': 0,
+            }]}),
+            'X-Ad-Account-Usage': json.dumps({'acc_id_util_pct': 60, 'reset_time_duration': 120}),
+        })
+        assert meta_rate_limit.parse_usage(response) == (75.0, 0.0)
+        assert meta_rate_limit._allowed_rate(10) == meta_rate_limit._max_rps()
+        assert meta_rate_limit._allowed_rate(75) < meta_rate_limit._max_rps()
+        assert meta_rate_limit._allowed_rate(95) == meta_rate_limit.MIN_RPS
+
+    def test_throttled_response_blocks_scope(self, monkeypatch):
+        """スロットリングエラー後は待ちきれない呼び出しを MetaRateLimited にする"""
+        from apps.accounts import meta_graph, meta_rate_limit
+
+        calls = []
+
+        class FakeSession:
+            def request(self, method, url, timeout=None, **kwargs):
+                calls.append(url)
+                return TestMetaRateLimit.FakeResponse(
+                    400, {'error': {'code': 17, 'message': 'User request limit reached'}},
+                )
+
+        monkeypatch.setattr(meta_graph, 'get_session', lambda: FakeSession())
+
+        with pytest.raises(meta_rate_limit.MetaRateLimited) as excinfo:
+            meta_graph.get('act_1/campaigns', params={'access_token': 'tok'}, max_wait=0)
+
+        # 1 回目の応答でスコープが止まり、再試行は送らずに例外になる
+        assert len(calls) == 1
+        assert excinfo.value.retry_after >= meta_rate_limit.DEFAULT_BLOCK_SECONDS - 1
+        # 別アカウント・別トークンは止まらない
+        meta_rate_limit.acquire(meta_rate_limit.request_scopes('act_2/campaigns', {'access_token': 'other'}), 0)
@@ -118,3 +118,1130 @@ class TestAdSetAPI:
         
         # 201 または 400 (バリデーションエラー)が返される
         assert response.status_code in [status.HTTP_201_CREATED, status.HTTP_400_BAD_REQUEST]
+
+
+@pytest.mark.django_db
+class TestReportingData:
+    """reporting_data の Meta 取得（アカウント単位 / Graph バッチ）のテスト"""
+
+    def test_range_insights_fall_back_to_batches_per_token(self, authenticated_client, user, meta_account, monkeypatch):
+        import json
+        from apps.accounts import meta_graph
+
+        campaigns = [
+            Campaign.objects.create(
+                name=f'C{i}', objective='OUTCOME_TRAFFIC', status='ACTIVE', user=user,
+                meta_account=meta_account, campaign_id=f'1200{i:03d}', budget_type='DAILY',
+                budget=1000, start_date=datetime.now(),
+            )
+            for i in range(60)
+        ]
+        failing = campaigns[3]
+        failing.cached_insights = {'spend': 7, 'impressions': 70, 'clicks': 7}
+        failing.save(update_fields=['cached_insights'])
+        batches = []
+
+        class FakeResponse:
+            def __init__(self, payload):
+                self.payload = payload
+
+            def raise_for_status(self):
+                pass
+
+            def json(self):
+                return self.payload
+
+        def fake_post(url, data=None, timeout=None, **kwargs):
+            batch = json.loads(data['batch'])
+            batches.append((data['access_token'], len(batch)))
+            items = []
+            for sub in batch:
+                meta_id = sub['relative_url'].split('/')[0]
+                if meta_id == failing.campaign_id:
+                    items.append({'code': 400, 'body': json.dumps({'error': {'message': 'boom'}})})
+                else:
+                    row = {'spend': '1.5', 'impressions': '100', 'clicks': '3',
+                           'actions': [{'action_type': 'offsite_conversion.fb_pixel_purchase', 'value': '2'},
+                                       {'action_type': 'purchase', 'value': '2'}]}
+                    items.append({'code': 200, 'body': json.dumps({'data': [row]})})
+            return FakeResponse(items)
+
+        def failing_get(url, params=None, timeout=None, **kwargs):
+            raise meta_graph.requests.exceptions.ConnectionError('account insights unavailable')
+
+        monkeypatch.setattr(meta_graph, 'get', failing_get)
+        monkeypatch.setattr(meta_graph, 'post', fake_post)
+
+        response = authenticated_client.get(
+            '/api/campaigns/campaigns/reporting_data/',
+            {'start_date': '2026-01-01', 'end_date': '2026-01-31'},
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert sorted(batches) == [('test_token_123', 10), ('test_token_123', 50)]
+        by_id = {c['campaign_id']: c for c in response.data['campaigns']}
+        assert by_id[campaigns[0].id]['spend'] == 1.5
+        assert by_id[campaigns[0].id]['conversions'] == 2
+        # 失敗したサブリクエストだけ cached_insights で補完される
+        assert by_id[failing.id]['spend'] == 7
+
+    def test_range_insights_use_one_account_stream(self, authenticated_client, user, meta_account, monkeypatch):
+        import json
+        from apps.accounts import meta_graph
+
+        campaigns = [
+            Campaign.objects.create(
+                name=f'C{i}', objective='OUTCOME_TRAFFIC', status='ACTIVE', user=user,
+                meta_account=meta_account, campaign_id=f'1300{i:03d}', budget_type='DAILY',
+                budget=1000, start_date=datetime.now(),
+            )
+            for i in range(3)
+        ]
+        calls = []
+
+        class FakeResponse:
+            def __init__(self, payload):
+                self.payload = payload
+
+            def raise_for_status(self):
+                pass
+
+            def json(self):
+                return self.payload
+
+        def fake_get(url, params=None, timeout=None, headers=None, **kwargs):
+            calls.append((url, params))
+            assert headers == {'Authorization': 'Bearer test_token_123'}
+            if params is not None:
+                assert 'access_token' not in params
+                filtering = json.loads(params['filtering'])
+                assert sorted(filtering[0]['value']) == sorted(c.campaign_id for c in campaigns)
+                return FakeResponse({
+                    'data': [{'campaign_id': campaigns[0].campaign_id, 'spend': '2', 'impressions': '10'}],
+                    'paging': {'next': 'https://graph.facebook.com/next-page'},
+                })
+            return FakeResponse({'data': [{'campaign_id': campaigns[1].campaign_id, 'spend': '4'}]})
+
+        monkeypatch.setattr(meta_graph, 'get', fake_get)
+
+        response = authenticated_client.get(
+            '/api/campaigns/campaigns/reporting_data/',
+            {'start_date': '2026-01-01', 'end_date': '2026-01-31'},
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [url for url, _ in calls] == [
+            meta_graph.graph_url('act_123456789/insights'),
+            'https://graph.facebook.com/next-page',
+        ]
+        by_id = {c['campaign_id']: c for c in response.data['campaigns']}
+        assert by_id[campaigns[0].id]['spend'] == 2.0
+        assert by_id[campaigns[1].id]['spend'] == 4.0
+        # 期間内に行がないキャンペーンは 0（未取得ではない）
+        assert by_id[campaigns[2].id]['spend'] == 0.0
+
+    def test_account_insights_split_campaign_filter_and_fall_back_per_chunk(self, user, meta_account, monkeypatch):
+        from apps.campaigns import meta_insights
+
+        campaigns = [
+            Campaign.objects.create(
+                name=f'C{i}', objective='OUTCOME_TRAFFIC', status='ACTIVE', user=user,
+                meta_account=meta_account, campaign_id=f'1350{i:03d}', budget_type='DAILY',
+                budget=1000, start_date=datetime.now(),
+            )
+            for i in range(5)
+        ]
+        requested = []
+        batched = []
+
+        def fake_account(account, meta_campaign_ids, since, until, **kwargs):
+            requested.append(list(meta_campaign_ids))
+            if campaigns[2].campaign_id in meta_campaign_ids:
+                raise RuntimeError('filter too large')
+            return {cid: {**meta_insights.ZERO_INSIGHTS, 'spend': 1.0} for cid in meta_campaign_ids}
+
+        def fake_batch(access_token, group, since, until):
+            batched.append([c.campaign_id for c in group])
+            return {c.id: {**meta_insights.ZERO_INSIGHTS, 'spend': 2.0} for c in group}
+
+        monkeypatch.setattr(meta_insights, 'ACCOUNT_INSIGHTS_FILTER_MAX', 2)
+        monkeypatch.setattr(meta_insights, 'fetch_account_campaign_insights', fake_account)
+        monkeypatch.setattr(meta_insights, '_fetch_batch', fake_batch)
+
+        insights = meta_insights.fetch_campaign_range_insights(campaigns, '2026-01-01', '2026-01-31')
+
+        assert requested == [[c.campaign_id for c in campaigns[i:i + 2]] for i in (0, 2, 4)]
+        # 失敗した分割だけがバッチ取得に回る
+        assert batched == [[campaigns[2].campaign_id, campaigns[3].campaign_id]]
+        assert [insights[c.id]['spend'] for c in campaigns] == [1.0, 1.0, 2.0, 2.0, 1.0]
+
+    def test_bulk_insights_task_updates_cached_insights(self, user, meta_account, monkeypatch):
+        from apps.campaigns import meta_insights
+        from apps.campaigns.tasks import fetch_campaigns_insights_from_meta
+
+        campaigns = [
+            Campaign.objects.create(
+                name=f'C{i}', objective='OUTCOME_TRAFFIC', status='ACTIVE', user=user,
+                meta_account=meta_account, campaign_id=f'1400{i:03d}', budget_type='DAILY',
+                budget=1000, start_date=datetime.now(),
+            )
+            for i in range(2)
+        ]
+
+        def fake_fetch(meta_account, meta_campaign_ids, since, until, **kwargs):
+            return {cid: {**meta_insights.ZERO_INSIGHTS, 'spend': 5.0} for cid in meta_campaign_ids}
+
+        monkeypatch.setattr(meta_insights, 'fetch_account_campaign_insights', fake_fetch)
+
+        result = fetch_campaigns_insights_from_meta([c.id for c in campaigns])
+
+        assert result['counts']['success'] == 2
+        for campaign in campaigns:
+            campaign.refresh_from_db()
+            assert campaign.cached_insights['spend'] == 5.0
+            assert campaign.insights_updated_at is not None
+
+    def test_range_insights_cache_serves_stale_and_refreshes(self, authenticated_client, campaign, monkeypatch):
+        from django.core.cache import caches
+        from apps.campaigns import insights_cache, meta_insights
+
+        cache = caches['shared']
+
+        fetched = []
+
+        def fake_range(campaigns, since, until):
+            fetched.append([c.id for c in campaigns])
+            return {c.id: {**meta_insights.ZERO_INSIGHTS, 'spend': float(len(fetched))} for c in campaigns}
+
+        monkeypatch.setattr(meta_insights, 'fetch_campaign_range_insights', fake_range)
+        params = {'start_date': '2026-01-01', 'end_date': '2026-01-31'}
+
+        first = authenticated_client.get('/api/campaigns/campaigns/reporting_data/', params)
+        assert first.data['campaigns'][0]['insights_freshness']['source'] == 'meta'
+
+        second = authenticated_client.get('/api/campaigns/campaigns/reporting_data/', params)
+        assert len(fetched) == 1
+        assert second.data['campaigns'][0]['insights_freshness']['source'] == 'cache'
+        assert second.data['campaigns'][0]['insights_freshness']['stale'] is False
+
+        # 鮮度切れにすると古い値をそのまま返し、更新タスク（eager）がキャッシュを差し替える
+        key = insights_cache.range_insights_cache_key(campaign.id, '2026-01-01', '2026-01-31')
+        entry = cache.get(key)
+        entry['fetched_at'] -= insights_cache.CLOSED_RANGE_FRESH_SECONDS + 60
+        cache.set(key, entry)
+
+        third = authenticated_client.get('/api/campaigns/campaigns/reporting_data/', params)
+        assert third.data['campaigns'][0]['spend'] == 1.0
+        assert third.data['campaigns'][0]['insights_freshness']['stale'] is True
+        assert third.data['freshness']['stale_campaigns'] == 1
+        assert len(fetched) == 2
+        assert cache.get(key)['insights']['spend'] == 2.0
+
+    def test_range_insights_cache_is_shared_with_workers(self, campaign, monkeypatch, settings):
+        from django.core.cache import caches
+        from apps.campaigns import insights_cache, meta_insights
+        from apps.campaigns.tasks import refresh_range_insights_cache
+
+        # Web プロセスから見た共有キャッシュ（同じ保存先を指す別エイリアス）
+        settings.CACHES = {
+            **settings.CACHES,
+            'range_insights_web': {**settings.CACHES['shared']},
+        }
+        web_cache = caches['range_insights_web']
+        fetched = []
+
+        def fake_range(campaigns, since, until):
+            fetched.append([c.id for c in campaigns])
+            return {c.id: {**meta_insights.ZERO_INSIGHTS, 'spend': 9.0} for c in campaigns}
+
+        monkeypatch.setattr(meta_insights, 'fetch_campaign_range_insights', fake_range)
+
+        # ワーカー側の更新タスクが書いたエントリを、Web 側が別のエイリアスから読めること
+        refresh_range_insights_cache(campaign_ids=[campaign.id], since='2026-01-01', until='2026-01-31')
+        key = insights_cache.range_insights_cache_key(campaign.id, '2026-01-01', '2026-01-31')
+        assert caches['default'].get(key) is None
+        assert web_cache.get(key)['insights']['spend'] == 9.0
+
+        monkeypatch.setattr(insights_cache, 'CACHE_ALIAS', 'range_insights_web')
+        insights, freshness = insights_cache.get_range_insights([campaign], '2026-01-01', '2026-01-31')
+        assert len(fetched) == 1
+        assert insights[campaign.id]['spend'] == 9.0
+        assert freshness[campaign.id]['source'] == 'cache'
+
+    def test_range_refresh_has_task_time_limits(self, campaign, monkeypatch):
+        from celery.exceptions import SoftTimeLimitExceeded
+        from apps.campaigns import insights_cache, meta_insights, tasks
+
+        def timed_out(campaigns, since, until):
+            raise SoftTimeLimitExceeded()
+
+        monkeypatch.setattr(meta_insights, 'fetch_campaign_range_insights', timed_out)
+        lock = insights_cache._refresh_lock_key(campaign.id, '2026-01-01', '2026-01-31')
+        insights_cache._cache().set(lock, 1)
+
+        assert tasks.refresh_range_insights_cache.soft_time_limit == tasks.USER_SYNC_SOFT_TIME_LIMIT
+        with pytest.raises(SoftTimeLimitExceeded):
+            tasks.refresh_range_insights_cache([campaign.id], '2026-01-01', '2026-01-31')
+        # 時間切れでも更新ロックは外れ、次の表示で再びキューできる
+        assert insights_cache._cache().get(lock) is None
+
+    def test_planner_answers_ingested_days_locally(self, authenticated_client, campaign, meta_account, monkeypatch):
+        from decimal import Decimal
+        from apps.campaigns import meta_insights
+        from apps.reporting.models import (
+            DailyAdInsight, DailyInsightCoverage, MetaAdDimension, MetaAdSetDimension, MetaCampaignDimension,
+        )
+
+        dimension = MetaCampaignDimension.objects.create(meta_id=campaign.campaign_id, name=campaign.name)
+        for day, spend in (('2026-01-01', '3.00'), ('2026-01-02', '4.00')):
+            DailyAdInsight.objects.create(
+                meta_account=meta_account, stat_date=day, meta_ad_id='ad1', campaign=dimension,
+                adset=MetaAdSetDimension.objects.get_or_create(meta_id='s1')[0],
+                ad=MetaAdDimension.objects.get_or_create(meta_id='ad1')[0],
+                impressions=100, clicks=2, spend=Decimal(spend),
+            )
+            DailyInsightCoverage.objects.create(meta_account=meta_account, stat_date=day)
+        fetched = []
+
+        def fake_range(campaigns, since, until):
+            fetched.append((since, until))
+            return {c.id: {**meta_insights.ZERO_INSIGHTS, 'spend': 10.0, 'impressions': 100} for c in campaigns}
+
+        monkeypatch.setattr(meta_insights, 'fetch_campaign_range_insights', fake_range)
+
+        local = authenticated_client.get(
+            '/api/campaigns/campaigns/reporting_data/', {'start_date': '2026-01-01', 'end_date': '2026-01-02'},
+        )
+        row = local.data['campaigns'][0]
+        assert fetched == []
+        assert row['insights_source'] == 'local'
+        assert row['spend'] == 7.0
+        assert row['impressions'] == 200
+        assert row['ctr'] == 2.0
+
+        # 未取り込みの 1/3 だけ Meta から取り、ローカル分と合算する
+        hybrid = authenticated_client.get(
+            '/api/campaigns/campaigns/reporting_data/', {'start_date': '2026-01-01', 'end_date': '2026-01-03'},
+        )
+        row = hybrid.data['campaigns'][0]
+        assert fetched == [('2026-01-03', '2026-01-03')]
+        assert row['insights_source'] == 'hybrid'
+        assert row['spend'] == 17.0
+        assert hybrid.data['sources']['hybrid'] == 1
+
+    def test_planner_fetches_legacy_keyed_days_from_meta(self, authenticated_client, campaign, meta_account, monkeypatch):
+        from decimal import Decimal
+        from apps.campaigns import meta_insights
+        from apps.reporting.dimensions import fallback_dimension_key
+        from apps.reporting.models import (
+            DailyAdInsight, DailyInsightCoverage, MetaAdDimension, MetaAdSetDimension, MetaCampaignDimension,
+        )
+
+        # 0004 のデータ移行で作った行はキャンペーンが名前キーで、Meta のキャンペーン ID では集計できない
+        legacy = MetaCampaignDimension.objects.create(meta_id=fallback_dimension_key(campaign.name), name=campaign.name)
+        DailyAdInsight.objects.create(
+            meta_account=meta_account, stat_date='2026-01-01', meta_ad_id='ad1', campaign=legacy,
+            adset=MetaAdSetDimension.objects.get_or_create(meta_id='s1')[0],
+            ad=MetaAdDimension.objects.get_or_create(meta_id='ad1')[0],
+            impressions=100, clicks=2, spend=Decimal('3.00'),
+        )
+        DailyInsightCoverage.objects.create(meta_account=meta_account, stat_date='2026-01-01')
+        fetched = []
+
+        def fake_range(campaigns, since, until):
+            fetched.append((since, until))
+            return {c.id: {**meta_insights.ZERO_INSIGHTS, 'spend': 3.0, 'impressions': 100} for c in campaigns}
+
+        monkeypatch.setattr(meta_insights, 'fetch_campaign_range_insights', fake_range)
+
+        response = authenticated_client.get(
+            '/api/campaigns/campaigns/reporting_data/', {'start_date': '2026-01-01', 'end_date': '2026-01-01'},
+        )
+        row = response.data['campaigns'][0]
+        assert fetched == [('2026-01-01', '2026-01-01')]
+        assert row['insights_source'] == 'meta'
+        assert row['spend'] == 3.0
+
+    def test_planner_sources_agree_on_totals(self, authenticated_client, campaign, meta_account, monkeypatch):
+        from apps.campaigns import meta_insights
+        from apps.reporting.meta_insights_service import parse_insight_row
+        from apps.reporting.models import (
+            DailyAdInsight, DailyInsightCoverage, MetaAdDimension, MetaAdSetDimension, MetaCampaignDimension,
+        )
+
+        # 同じ Meta の行を、日次取り込み（広告単位）とキャンペーン単位の取得の両方で使う
+        raw = [
+            {
+                'ad_id': 'ad1', 'campaign_id': campaign.campaign_id, 'date_start': day,
+                'impressions': impressions, 'clicks': clicks, 'spend': spend,
+                'actions': [
+                    {'action_type': 'offsite_conversion.fb_pixel_purchase', 'value': '1'},
+                    {'action_type': 'lead', 'value': '2'},
+                    {'action_type': 'offsite_conversion.fb_pixel_custom', 'value': '1'},
+                ],
+            }
+            for day, impressions, clicks, spend in (('2026-01-01', '100', '2', '3.00'), ('2026-01-02', '200', '3', '4.50'))
+        ]
+        dimension = MetaCampaignDimension.objects.create(meta_id=campaign.campaign_id, name=campaign.name)
+        for row in raw:
+            parsed = parse_insight_row(row)
+            DailyAdInsight.objects.create(
+                meta_account=meta_account, stat_date=parsed['date_start'], meta_ad_id=parsed['meta_ad_id'],
+                campaign=dimension,
+                adset=MetaAdSetDimension.objects.get_or_create(meta_id='s1')[0],
+                ad=MetaAdDimension.objects.get_or_create(meta_id='ad1')[0],
+                impressions=parsed['impressions'], clicks=parsed['clicks'], spend=parsed['spend'],
+                conversions=parsed['conversions'], all_conversions=parsed['all_conversions'],
+            )
+        fetched = []
+
+        def fake_range(campaigns, since, until):
+            fetched.append((since, until))
+            rows = [r for r in raw if since <= r['date_start'] <= until]
+            spend = sum(float(r['spend']) for r in rows)
+            impressions = sum(int(r['impressions']) for r in rows)
+            clicks = sum(int(r['clicks']) for r in rows)
+            actions = {}
+            for r in rows:
+                for action in r['actions']:
+                    actions[action['action_type']] = actions.get(action['action_type'], 0) + int(action['value'])
+            insight = meta_insights.parse_campaign_insight({
+                'spend': spend, 'impressions': impressions, 'clicks': clicks,
+                'ctr': clicks / impressions * 100, 'cpc': spend / clicks, 'cpm': spend / impressions * 1000,
+                'reach': 250, 'frequency': 1.2,
+                'actions': [{'action_type': k, 'value': v} for k, v in actions.items()],
+            })
+            return {c.id: insight for c in campaigns}
+
+        monkeypatch.setattr(meta_insights, 'fetch_campaign_range_insights', fake_range)
+        url = '/api/campaigns/campaigns/reporting_data/'
+        params = {'start_date': '2026-01-01', 'end_date': '2026-01-02', 'metrics': 'impressions,clicks,spend,conversions'}
+
+        def totals(source):
+            row = authenticated_client.get(url, params).data['campaigns'][0]
+            assert row['insights_source'] == source
+            return {key: row[key] for key in ('spend', 'impressions', 'clicks', 'conversions', 'ctr', 'cpc', 'cpm')}
+
+        meta = totals('meta')
+        DailyInsightCoverage.objects.create(meta_account=meta_account, stat_date='2026-01-01')
+        hybrid = totals('hybrid')
+        DailyInsightCoverage.objects.create(meta_account=meta_account, stat_date='2026-01-02')
+        local = totals('local')
+
+        assert hybrid == pytest.approx(meta)
+        assert local == pytest.approx(meta)
+        assert meta['conversions'] == 8
+        assert fetched == [('2026-01-01', '2026-01-02'), ('2026-01-02', '2026-01-02')]
+
+        # reach / frequency は日をまたいで足せないので、取り込み済みでも期間全体を Meta から取る
+        params['metrics'] = 'impressions,clicks,spend,reach,frequency'
+        row = authenticated_client.get(url, params).data['campaigns'][0]
+        assert row['insights_source'] == 'meta'
+        assert row['reach'] == 250
+
+
+@pytest.mark.django_db
+class TestDashboardStats:
+    """stats（ダッシュボードスナップショット）のテスト"""
+
+    def test_stats_serves_snapshot_and_rebuilds_when_stale(self, authenticated_client, campaign):
+        campaign.cached_insights = {'spend': 12.5, 'impressions': 300, 'clicks': 9}
+        campaign.save()
+
+        first = authenticated_client.get('/api/campaigns/campaigns/stats/')
+        assert first.status_code == status.HTTP_200_OK
+        assert first.data['summary']['total_campaigns'] == 1
+        assert first.data['summary']['active_campaigns'] == 1
+        assert first.data['summary']['total_budget'] == 1000.0
+        # スナップショットがない初回は空で返し、作成をキューする（テストでは eager 実行）
+        assert first.data['snapshot_stale'] is True
+        assert first.data['recent_campaigns'] == []
+
+        second = authenticated_client.get('/api/campaigns/campaigns/stats/')
+        assert second.data['snapshot_stale'] is False
+        assert second.data['summary']['total_spend'] == 12.5
+        assert second.data['summary']['total_clicks'] == 9
+        assert second.data['recent_campaigns'][0]['id'] == campaign.id
+        assert second.data['recent_campaigns'][0]['impressions'] == 300
+
+    def test_schedule_lock_is_shared_with_workers(self, user, monkeypatch):
+        from django.core.cache import caches
+        from apps.campaigns import dashboard, tasks
+
+        queued = []
+        monkeypatch.setattr(tasks.rebuild_dashboard_snapshot, 'delay', lambda user_id: queued.append(user_id))
+
+        dashboard.schedule_dashboard_snapshot([user.id, user.id])
+        dashboard.schedule_dashboard_snapshot([user.id])
+        assert queued == [user.id]
+        # ロックはプロセスローカルの default ではなく共有キャッシュにあり、ワーカー側のタスクが外せる
+        key = dashboard._schedule_lock_key(user.id)
+        assert caches['default'].get(key) is None
+        assert caches['shared'].get(key) == 1
+
+        tasks.rebuild_dashboard_snapshot(user.id)
+        assert caches['shared'].get(key) is None
+
+
+@pytest.mark.django_db
+class TestMetaStatusSync:
+    """広告アカウント単位の一括ステータス同期のテスト"""
+
+    def test_sync_all_updates_only_changed_rows(self, authenticated_client, user, meta_account, monkeypatch):
+        """エッジごとに 1 ストリーム取得し、変わった行だけ更新する"""
+        from apps.accounts import meta_graph
+        from apps.campaigns import meta_insights
+
+        campaigns = [
+            Campaign.objects.create(
+                name=f'C{i}', objective='OUTCOME_TRAFFIC', status='ACTIVE', user=user,
+                meta_account=meta_account, campaign_id=f'1500{i:03d}', budget_type='DAILY',
+                budget=1000, start_date=datetime.now(),
+            )
+            for i in range(3)
+        ]
+        adset = AdSet.objects.create(
+            campaign=campaigns[0], name='S', status='ACTIVE', budget=500, adset_id='2500001',
+        )
+        remote = {
+            'campaigns': [
+                {'id': '1500000', 'status': 'PAUSED', 'effective_status': 'PAUSED',
+                 'updated_time': '2026-10-01T10:00:00+0900'},
+                {'id': '1500001', 'status': 'ACTIVE', 'effective_status': 'ACTIVE',
+                 'updated_time': '2026-09-01T10:00:00+0900'},
+            ],
+            'adsets': [
+                {'id': '2500001', 'status': 'ACTIVE', 'effective_status': 'CAMPAIGN_PAUSED',
+                 'updated_time': '2026-10-01T10:00:00+0900'},
+            ],
+        }
+        calls = []
+
+        def fake_iter_data(path, params=None, **kwargs):
+            calls.append(path)
+            assert params['fields'] == 'id,status,effective_status,updated_time'
+            return iter(remote[path.rsplit('/', 1)[1]])
+
+        monkeypatch.setattr(meta_graph, 'iter_data', fake_iter_data)
+        monkeypatch.setattr(meta_insights, 'fetch_campaign_range_insights', lambda campaigns, since, until: {})
+        # C1 は前回の同期から変わっていない
+        Campaign.objects.filter(pk=campaigns[1].pk).update(
+            effective_status='ACTIVE',
+            meta_updated_time=datetime.fromisoformat('2026-09-01T10:00:00+09:00'),
+        )
+
+        response = authenticated_client.post('/api/campaigns/campaigns/sync_all_from_meta/')
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.data['status_tasks_queued'] == 1
+        # 広告のないアカウントでは ads エッジを取得しない
+        assert sorted(calls) == ['act_123456789/adsets', 'act_123456789/campaigns']
+        for c in campaigns:
+            c.refresh_from_db()
+        adset.refresh_from_db()
+        assert campaigns[0].status == 'PAUSED'
+        assert campaigns[0].effective_status == 'PAUSED'
+        assert campaigns[1].status == 'ACTIVE'
+        # Meta に返らなかったキャンペーンはそのまま
+        assert campaigns[2].status == 'ACTIVE'
+        assert campaigns[2].meta_updated_time is None
+        assert adset.effective_status == 'CAMPAIGN_PAUSED'
+
+    def test_diff_statuses_skips_unchanged(self):
+        from apps.campaigns.status_sync import diff_statuses, parse_meta_time
+
+        updated_time = parse_meta_time('2026-10-01T10:00:00+0900')
+        unchanged = Campaign(campaign_id='1', status='ACTIVE', effective_status='ACTIVE', meta_updated_time=updated_time)
+        changed = Campaign(campaign_id='2', status='ACTIVE', effective_status='ACTIVE', meta_updated_time=updated_time)
+        remote = {
+            '1': {'status': 'ACTIVE', 'effective_status': 'ACTIVE', 'meta_updated_time': updated_time},
+            '2': {'status': 'PAUSED', 'effective_status': 'PAUSED', 'meta_updated_time': updated_time},
+        }
+
+        assert diff_statuses([unchanged, changed], 'campaign_id', remote) == [changed]
+        assert changed.status == 'PAUSED'
+
+    def test_full_sync_fetches_hierarchy_in_one_request(self, campaign, monkeypatch):
+        """キャンペーン配下はフィールド展開で 1 回取得し、ネストした次ページだけ追加で辿る"""
+        from apps.accounts import meta_graph
+        from apps.campaigns.tasks import sync_campaign_full_from_meta
+
+        campaign.campaign_id = '1700001'
+        campaign.save()
+        adsets = [
+            AdSet.objects.create(campaign=campaign, name=f'S{i}', status='ACTIVE', budget=500, adset_id=f'2700{i:03d}')
+            for i in range(2)
+        ]
+        ads = [
+            Ad.objects.create(adset=adsets[0], ad_id=f'3700{i:03d}', name=f'A{i}', status='ACTIVE')
+            for i in range(3)
+        ]
+        gets = []
+
+        class FakeResponse:
+            def __init__(self, payload):
+                self.payload = payload
+
+            def raise_for_status(self):
+                pass
+
+            def json(self):
+                return self.payload
+
+        def fake_get(path, params=None, headers=None, **kwargs):
+            gets.append(path)
+            assert headers == {'Authorization': 'Bearer test_token_123'}
+            assert 'access_token' not in params
+            assert 'adsets.limit(200){' in params['fields'] and 'ads.limit(200){' in params['fields']
+            return FakeResponse({
+                'id': '1700001', 'status': 'ACTIVE', 'effective_status': 'ACTIVE',
+                'adsets': {'data': [
+                    {'id': '2700000', 'status': 'PAUSED', 'effective_status': 'PAUSED',
+                     'ads': {'data': [{'id': '3700000', 'status': 'PAUSED', 'effective_status': 'ADSET_PAUSED'}],
+                             'paging': {'next': 'https://graph.facebook.com/2700000/ads?after=x'}}},
+                    {'id': '2700001', 'status': 'ACTIVE', 'effective_status': 'ACTIVE'},
+                ]},
+            })
+
+        def fake_iter_data(path, params=None, headers=None, **kwargs):
+            gets.append(path)
+            assert headers == {'Authorization': 'Bearer test_token_123'}
+            return iter([{'id': '3700001', 'status': 'PAUSED', 'effective_status': 'ADSET_PAUSED'}])
+
+        monkeypatch.setattr(meta_graph, 'get', fake_get)
+        monkeypatch.setattr(meta_graph, 'iter_data', fake_iter_data)
+
+        result = sync_campaign_full_from_meta(campaign.id)
+
+        assert gets == ['1700001', 'https://graph.facebook.com/2700000/ads?after=x']
+        assert result['total_items'] == 6
+        assert result['successful_syncs'] == 5
+        assert result['missing'] == [{'type': 'ads', 'id': ads[2].id, 'ad_id': '3700002'}]
+        adsets[0].refresh_from_db()
+        assert adsets[0].status == 'PAUSED'
+        assert list(Ad.objects.filter(pk__in=[ads[0].pk, ads[1].pk]).values_list('effective_status', flat=True)) == [
+            'ADSET_PAUSED', 'ADSET_PAUSED',
+        ]
+
+    def test_second_sync_fetches_only_updates_since_watermark(self, user, campaign, monkeypatch):
+        """2 回目以降は updated_time のウォーターマーク以降（削除を含む）だけを取得する"""
+        import json
+        from apps.accounts import meta_graph
+        from apps.campaigns.models import MetaSyncWatermark
+        from apps.campaigns.status_sync import parse_meta_time, sync_user_statuses
+
+        campaign.campaign_id = '1600001'
+        campaign.save()
+        responses = [
+            [{'id': '1600001', 'status': 'ACTIVE', 'effective_status': 'ACTIVE',
+              'updated_time': '2026-10-01T10:00:00+0900'}],
+            [{'id': '1600001', 'status': 'DELETED', 'effective_status': 'DELETED',
+              'updated_time': '2026-10-02T10:00:00+0900'}],
+        ]
+        params_seen = []
+
+        def fake_iter_data(path, params=None, **kwargs):
+            params_seen.append(params)
+            return iter(responses[len(params_seen) - 1])
+
+        monkeypatch.setattr(meta_graph, 'iter_data', fake_iter_data)
+
+        sync_user_statuses(user.id)
+        assert 'filtering' not in params_seen[0]
+        sync_user_statuses(user.id)
+
+        filtering = json.loads(params_seen[1]['filtering'])
+        assert filtering[0]['field'] == 'updated_time'
+        assert filtering[0]['value'] < parse_meta_time('2026-10-01T10:00:00+0900').timestamp()
+        assert 'DELETED' in filtering[1]['value']
+        campaign.refresh_from_db()
+        assert campaign.status == 'DELETED'
+        watermark = MetaSyncWatermark.objects.get(meta_account=campaign.meta_account, kind='status', object_type='campaigns')
+        assert watermark.updated_time == parse_meta_time('2026-10-02T10:00:00+0900')
+
+    def test_daily_full_sync_ignores_watermark(self, user, campaign, monkeypatch):
+        """1 日 1 回の全件同期は updated_time の変わらない effective_status の変化も拾う"""
+        from apps.accounts import meta_graph
+        from apps.campaigns import tasks
+
+        campaign.campaign_id = '1600003'
+        campaign.save()
+        row = {'id': '1600003', 'status': 'ACTIVE', 'effective_status': 'ACTIVE',
+               'updated_time': '2026-10-01T10:00:00+0900'}
+        params_seen = []
+
+        def fake_iter_data(path, params=None, **kwargs):
+            params_seen.append(params)
+            return iter([row])
+
+        monkeypatch.setattr(meta_graph, 'iter_data', fake_iter_data)
+        tasks.sync_user_statuses_from_meta(user.id)
+
+        queued = []
+        monkeypatch.setattr(
+            tasks.sync_user_statuses_from_meta, 'apply_async',
+            lambda args=None, kwargs=None, task_id=None, **options: queued.append((args, kwargs)),
+        )
+        result = tasks.schedule_full_status_sync()
+        assert result['queued'] == 1
+        assert queued == [((user.id,), {'full': True})]
+
+        # 審査で止まった（updated_time はそのまま）
+        row['effective_status'] = 'DISAPPROVED'
+        tasks.sync_user_statuses_from_meta(user.id, full=True)
+
+        assert 'filtering' not in params_seen[-1]
+        campaign.refresh_from_db()
+        assert campaign.effective_status == 'DISAPPROVED'
+
+    def test_failed_account_error_does_not_include_token(self, user, campaign, monkeypatch):
+        """取得失敗はステータスと Graph の error.message だけを返し、URL（トークン）はタスク結果に残さない"""
+        import requests
+        from apps.accounts import meta_graph
+        from apps.campaigns.tasks import sync_user_statuses_from_meta
+
+        campaign.campaign_id = '1600002'
+        campaign.save()
+
+        def fake_iter_data(path, params=None, headers=None, **kwargs):
+            assert 'access_token' not in params
+            assert headers == {'Authorization': 'Bearer test_token_123'}
+            response = requests.Response()
+            response.status_code = 400
+            response._content = b'{"error": {"message": "Error validating access token", "code": 190}}'
+            raise requests.exceptions.HTTPError(
+                f'400 Client Error for url: https://graph.facebook.com/{path}?access_token=test_token_123',
+                response=response,
+            )
+
+        monkeypatch.setattr(meta_graph, 'iter_data', fake_iter_data)
+
+        result = sync_user_statuses_from_meta(user.id)
+
+        assert result['status'] == 'warning'
+        assert result['failed_accounts'] == {campaign.meta_account.id: 'HTTP 400: Error validating access token'}
+        assert 'test_token_123' not in str(result)
+
+    @pytest.mark.parametrize('task_name', ['sync_user_statuses_from_meta', 'sync_all_campaigns_status_from_meta'])
+    def test_status_sync_timeout_propagates(self, user, monkeypatch, task_name):
+        from celery.exceptions import SoftTimeLimitExceeded
+        from apps.campaigns import status_sync, tasks
+
+        def timed_out(user_id, full=False):
+            raise SoftTimeLimitExceeded()
+
+        monkeypatch.setattr(status_sync, 'sync_user_statuses', timed_out)
+        task = getattr(tasks, task_name)
+
+        assert task.soft_time_limit == tasks.USER_SYNC_SOFT_TIME_LIMIT
+        with pytest.raises(SoftTimeLimitExceeded):
+            task(user.id)
+
+
+@pytest.mark.django_db
+class TestSyncProgress:
+    """sync_all の進捗カウンタと SSE 配信のテスト"""
+
+    def test_counters_are_exact_under_concurrency(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from apps.campaigns.sync_progress import mark_sync_progress, read_sync_progress, start_sync_run
+
+        start_sync_run('run-1', 200)
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(
+                lambda i: mark_sync_progress('run-1', 'error' if i % 10 == 0 else 'success'),
+                range(200),
+            ))
+
+        progress = read_sync_progress('run-1')
+        assert progress['completed'] == 200
+        assert progress['failed'] == 20
+        assert progress['status'] == 'done'
+        assert read_sync_progress('missing')['status'] == 'not_found'
+
+    def test_progress_stream_pushes_until_done(self, authenticated_client):
+        import json
+        from apps.campaigns.sync_progress import mark_sync_progress, start_sync_run
+
+        start_sync_run('run-2', 2)
+        mark_sync_progress('run-2', 'success')
+        mark_sync_progress('run-2', 'error')
+
+        response = authenticated_client.get(
+            '/api/campaigns/campaigns/sync_all_progress_stream/',
+            {'sync_run_id': 'run-2'},
+            HTTP_ACCEPT='text/event-stream',
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'].startswith('text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        events = [block for block in body.split('\n\n') if block.startswith('event: progress')]
+        assert len(events) == 1
+        data = json.loads(events[0].split('data: ', 1)[1])
+        assert data == {'sync_run_id': 'run-2', 'total': 2, 'completed': 2, 'failed': 1, 'status': 'done'}
+
+    def test_progress_stream_closes_before_worker_timeout(self, authenticated_client, monkeypatch, settings):
+        from apps.campaigns import views
+        from apps.campaigns.sync_progress import mark_sync_progress, start_sync_run
+
+        # gunicorn の --timeout 300 より前に閉じる
+        assert views.SYNC_PROGRESS_STREAM_MAX_SECONDS < 300
+        # 実行中のままでも上限で閉じ、続きはクライアントの再接続に任せる
+        monkeypatch.setattr(views, 'SYNC_PROGRESS_STREAM_MAX_SECONDS', 0.2)
+        settings.SYNC_PROGRESS_STREAM_INTERVAL = 0.01
+        start_sync_run('run-3', 2)
+        mark_sync_progress('run-3', 'success')
+
+        response = authenticated_client.get(
+            '/api/campaigns/campaigns/sync_all_progress_stream/',
+            {'sync_run_id': 'run-3'},
+            HTTP_ACCEPT='text/event-stream',
+        )
+
+        body = b''.join(response.streaming_content).decode()
+        assert body.startswith('retry: ')
+        assert '"status": "running"' in body
+
+    def test_progress_stream_over_capacity_answers_once(self, authenticated_client, monkeypatch, settings):
+        from apps.campaigns import views
+        from apps.campaigns.sync_progress import mark_sync_progress, start_sync_run
+
+        # プロセスあたりの同時ストリーム数を超えた接続はスレッドを握らず、現在の進捗を 1 回返して閉じる
+        monkeypatch.setattr(views, 'SYNC_PROGRESS_STREAM_MAX_SECONDS', 5)
+        settings.SYNC_PROGRESS_STREAM_INTERVAL = 0.01
+        settings.SYNC_PROGRESS_STREAM_MAX_PER_PROCESS = 1
+        start_sync_run('run-5', 2)
+        mark_sync_progress('run-5', 'success')
+
+        held = authenticated_client.get(
+            '/api/campaigns/campaigns/sync_all_progress_stream/',
+            {'sync_run_id': 'run-5'},
+            HTTP_ACCEPT='text/event-stream',
+        )
+        held_events = iter(held.streaming_content)
+        assert next(held_events).startswith(b'retry: 3000')
+
+        busy = authenticated_client.get(
+            '/api/campaigns/campaigns/sync_all_progress_stream/',
+            {'sync_run_id': 'run-5'},
+            HTTP_ACCEPT='text/event-stream',
+        )
+        body = b''.join(busy.streaming_content).decode()
+        assert body.startswith(f'retry: {views.SYNC_PROGRESS_STREAM_BUSY_RETRY_MS}')
+        assert body.count('event: progress') == 1
+        assert '"status": "running"' in body
+
+        # 先の接続が閉じれば枠が空き、次の接続はストリームになる
+        held.close()
+        mark_sync_progress('run-5', 'success')
+        again = authenticated_client.get(
+            '/api/campaigns/campaigns/sync_all_progress_stream/',
+            {'sync_run_id': 'run-5'},
+            HTTP_ACCEPT='text/event-stream',
+        )
+        body = b''.join(again.streaming_content).decode()
+        assert body.startswith('retry: 3000')
+        assert '"status": "done"' in body
+
+    def test_insights_timeout_closes_progress_and_propagates(self, campaign, monkeypatch):
+        from celery.exceptions import SoftTimeLimitExceeded
+        from apps.campaigns import tasks
+        from apps.campaigns.sync_progress import read_sync_progress, start_sync_run
+
+        def timed_out(campaigns):
+            raise SoftTimeLimitExceeded()
+
+        monkeypatch.setattr(tasks, '_refresh_campaigns_cached_insights', timed_out)
+        start_sync_run('run-4', 1)
+
+        # 既定の 60 秒ではなくタスク固有の時間制限で動き、時間切れは握りつぶさない
+        assert tasks.fetch_campaigns_insights_from_meta.soft_time_limit == tasks.USER_SYNC_SOFT_TIME_LIMIT
+        with pytest.raises(SoftTimeLimitExceeded):
+            tasks.fetch_campaigns_insights_from_meta([campaign.id], sync_run_id='run-4')
+        progress = read_sync_progress('run-4')
+        assert progress['status'] == 'done'
+        assert progress['failed'] == 1
+
+    def test_insights_rate_limit_exhaustion_closes_progress(self, campaign, monkeypatch):
+        from celery.exceptions import Retry
+        from apps.accounts.meta_rate_limit import MetaRateLimited
+        from apps.campaigns import tasks
+        from apps.campaigns.sync_progress import read_sync_progress, start_sync_run
+
+        def rate_limited(campaigns):
+            raise MetaRateLimited(30, 'act_1')
+
+        monkeypatch.setattr(tasks, '_refresh_campaigns_cached_insights', rate_limited)
+        start_sync_run('run-6', 1)
+        task = tasks.fetch_campaigns_insights_from_meta
+
+        # 再試行が残っていれば再スケジュールするだけで、進捗は再実行に任せる
+        with pytest.raises(Retry):
+            task.apply(args=([campaign.id],), kwargs={'sync_run_id': 'run-6'})
+        assert read_sync_progress('run-6')['status'] == 'running'
+
+        # 上限に達したら進捗を失敗として閉じてから送出する（SSE が run の期限切れまで再接続しないように）
+        with pytest.raises(MetaRateLimited):
+            task.apply(
+                args=([campaign.id],), kwargs={'sync_run_id': 'run-6'},
+                retries=tasks.RATE_LIMIT_MAX_RETRIES,
+            )
+        progress = read_sync_progress('run-6')
+        assert progress['status'] == 'done'
+        assert progress['failed'] == 1
+        assert progress['completed'] == 1
+
+
+@pytest.mark.django_db
+class TestImportFromMeta:
+    """import_from_meta（アカウント単位の一括取り込み）のテスト"""
+
+    def test_import_streams_each_edge_once(self, authenticated_client, user, meta_account, monkeypatch):
+        """各エッジを 1 回ずつ全ページ取得し、親子をつないで保存する"""
+        from apps.accounts import meta_graph
+
+        campaigns = [
+            {'id': f'3000{i:03d}', 'name': f'C{i}', 'status': 'ACTIVE', 'objective': 'OUTCOME_TRAFFIC',
+             'daily_budget': '1000'}
+            for i in range(30)
+        ]
+        adsets = [
+            {'id': f'4000{i:03d}', 'name': f'S{i}', 'status': 'ACTIVE', 'campaign_id': f'3000{i:03d}'}
+            for i in range(30)
+        ]
+        ads = [
+            {'id': f'5000{i:03d}', 'name': f'A{i}', 'status': 'ACTIVE', 'effective_status': 'ACTIVE',
+             'adset_id': f'4000{i % 30:03d}',
+             'creative': {'id': '9', 'object_story_spec': {'link_data': {'name': 'H', 'message': 'M'}}}}
+            for i in range(60)
+        ]
+        # 既存の広告は内容を更新する
+        existing = Campaign.objects.create(
+            name='Old', objective='OUTCOME_TRAFFIC', status='PAUSED', user=user, meta_account=meta_account,
+            campaign_id='3000000', budget_type='DAILY', budget=1, start_date=datetime.now(),
+        )
+        old_adset = AdSet.objects.create(campaign=existing, name='S0', status='ACTIVE', budget=1, adset_id='4000000')
+        Ad.objects.create(adset=old_adset, ad_id='5000000', name='old name', status='PAUSED')
+        calls = []
+
+        def fake_iter_data(path, params=None, **kwargs):
+            calls.append(path)
+            rows = {'campaigns': campaigns, 'adsets': adsets, 'ads': ads}[path.rsplit('/', 1)[1]]
+            # 25 件ずつのページを辿った結果と同じ
+            for start in range(0, len(rows), 25):
+                yield from rows[start:start + 25]
+
+        monkeypatch.setattr(meta_graph, 'iter_data', fake_iter_data)
+
+        response = authenticated_client.post(
+            '/api/campaigns/campaigns/import_from_meta/', {'meta_account_id': meta_account.id}, format='json',
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['imported'] == 29
+        assert response.data['skipped'] == 1
+        assert calls == ['act_123456789/campaigns', 'act_123456789/adsets', 'act_123456789/ads']
+        assert Campaign.objects.filter(meta_account=meta_account).count() == 30
+        assert AdSet.objects.filter(campaign__meta_account=meta_account).count() == 30
+        assert Ad.objects.filter(adset__campaign__meta_account=meta_account).count() == 60
+        assert AdSet.objects.get(adset_id='4000007').campaign.campaign_id == '3000007'
+        updated = Ad.objects.get(ad_id='5000000')
+        assert updated.name == 'A0'
+        assert updated.headline == 'H'
+        assert updated.review_feedback == {'overall_status': 'APPROVED'}
+
+    def test_incremental_reimport_reports_account_total(self, authenticated_client, meta_account, monkeypatch):
+        """差分取得でも total はアカウントの件数で、差分の件数は changed に分けて返す"""
+        from apps.accounts import meta_graph
+
+        campaigns = [
+            {'id': f'3100{i:03d}', 'name': f'C{i}', 'status': 'ACTIVE', 'objective': 'OUTCOME_TRAFFIC',
+             'updated_time': '2026-10-01T10:00:00+0900'}
+            for i in range(3)
+        ]
+        delta = []
+
+        def fake_iter_data(path, params=None, **kwargs):
+            edge = path.rsplit('/', 1)[1]
+            if edge != 'campaigns':
+                return iter([])
+            return iter(delta if 'filtering' in params else campaigns)
+
+        monkeypatch.setattr(meta_graph, 'iter_data', fake_iter_data)
+        url = '/api/campaigns/campaigns/import_from_meta/'
+
+        first = authenticated_client.post(url, {'meta_account_id': meta_account.id}, format='json').data
+        assert (first['imported'], first['total'], first['incremental'], first['changed']) == (3, 3, False, 3)
+
+        second = authenticated_client.post(url, {'meta_account_id': meta_account.id}, format='json').data
+        assert (second['imported'], second['skipped'], second['total']) == (0, 3, 3)
+        assert second['incremental'] is True and second['changed'] == 0
+        assert '変更された0件' in second['message']
+
+
+@pytest.mark.django_db
+class TestSingleflight:
+    """Meta タスクの重複キュー抑止のテスト"""
+
+    def test_repeated_sync_all_coalesces_into_running_tasks(self, authenticated_client, user, meta_account, monkeypatch):
+        from apps.campaigns import tasks
+        from apps.campaigns.singleflight import release
+
+        for i in range(3):
+            Campaign.objects.create(
+                name=f'C{i}', objective='OUTCOME_TRAFFIC', status='ACTIVE', user=user,
+                meta_account=meta_account, campaign_id=f'1800{i:03d}', budget_type='DAILY',
+                budget=1000, start_date=datetime.now(),
+            )
+        queued = []
+
+        def fake_apply_async(name):
+            # キューだけして実行しない（待機中の状態を作る）
+            def apply_async(args=None, kwargs=None, task_id=None, **options):
+                queued.append((name, task_id, args))
+            return apply_async
+
+        monkeypatch.setattr(tasks.sync_user_statuses_from_meta, 'apply_async', fake_apply_async('status'))
+        monkeypatch.setattr(tasks.fetch_campaigns_insights_from_meta, 'apply_async', fake_apply_async('insights'))
+        url = '/api/campaigns/campaigns/sync_all_from_meta/'
+
+        first = authenticated_client.post(url).data
+        second = authenticated_client.post(url).data
+
+        assert [name for name, _, _ in queued] == ['status', 'insights']
+        assert first['status_tasks_queued'] == 1
+        assert second['status_tasks_queued'] == 0
+        assert second['status_task_id'] == first['status_task_id']
+        assert second['insights_tasks_queued_estimate'] == 0
+        assert second['insights_coalesced'] == 3
+        # 実行中の取得の進捗をそのまま追える
+        assert second['sync_run_id'] == first['sync_run_id'] == queued[1][1]
+
+        # 終わったら次のクリックで再びキューされる
+        release(queued[0][1])
+        release(queued[1][1])
+        third = authenticated_client.post(url).data
+        assert third['status_tasks_queued'] == 1
+        assert third['insights_tasks_queued_estimate'] == 3
+        assert len(queued) == 4
+
+
+@pytest.mark.django_db
+class TestInsightsRefreshScheduler:
+    """インサイトの優先度付き定期更新のテスト"""
+
+    def _campaign(self, user, meta_account, meta_id, spend=0, status='ACTIVE', minutes_ago=None):
+        from django.utils import timezone
+        return Campaign.objects.create(
+            name=meta_id, objective='OUTCOME_TRAFFIC', status=status, user=user, meta_account=meta_account,
+            campaign_id=meta_id, budget_type='DAILY', budget=1000, start_date=datetime.now(),
+            cached_insights={'spend': spend},
+            insights_updated_at=None if minutes_ago is None else timezone.now() - timedelta(minutes=minutes_ago),
+        )
+
+    def test_plan_orders_by_priority_within_graph_budget(self, user, meta_account):
+        from apps.campaigns.insights_scheduler import mark_viewed, plan_refresh, refresh_candidates
+
+        other_account = MetaAccount.objects.create(
+            user=user, account_id='act_987654321', account_name='Other', access_token='other_token',
+        )
+        big = self._campaign(user, meta_account, '1900001', spend=100000, minutes_ago=120)
+        small = self._campaign(user, meta_account, '1900002', spend=10, minutes_ago=60)
+        self._campaign(user, meta_account, '1900003', spend=100000, minutes_ago=10)  # 更新間隔前
+        other = self._campaign(user, other_account, '1900004', spend=1000, minutes_ago=90)
+
+        # 予算 1 リクエスト: 最優先のキャンペーンのアカウントだけ（同じアカウントの分は追加コストなし）
+        planned = plan_refresh(refresh_candidates(), budget=1)
+        assert [c.id for c in planned] == [big.id, small.id]
+
+        planned = plan_refresh(refresh_candidates(), budget=2)
+        assert [c.id for c in planned] == [big.id, other.id, small.id]
+
+        # 最近画面で見られたキャンペーンは先に、短い間隔でも更新する
+        mark_viewed(campaign_ids=[other.id])
+        planned = plan_refresh(refresh_candidates(), budget=1)
+        assert planned[0].id == other.id
+
+    def test_beat_task_skips_campaigns_being_fetched(self, user, meta_account, monkeypatch):
+        from apps.campaigns import tasks
+
+        campaigns = [self._campaign(user, meta_account, f'1910{i:03d}', spend=i) for i in range(3)]
+        queued = []
+        monkeypatch.setattr(
+            tasks.fetch_campaigns_insights_from_meta, 'apply_async',
+            lambda args=None, kwargs=None, task_id=None, **options: queued.append(sorted(args[0])),
+        )
+
+        first = tasks.schedule_insights_refresh()
+        second = tasks.schedule_insights_refresh()
+
+        assert queued == [sorted(c.id for c in campaigns)]
+        assert first['queued'] == 3
+        assert second['queued'] == 0
+        assert second['running'] == 3
+
+    def test_failing_account_backs_off_and_healthy_campaigns_are_planned(self, user, meta_account, monkeypatch):
+        from django.core.cache import caches
+        from apps.campaigns import insights_scheduler, meta_insights, tasks
+
+        expired = MetaAccount.objects.create(
+            user=user, account_id='act_555555555', account_name='Expired', access_token='expired_token',
+        )
+        broken = self._campaign(user, expired, '1920001')
+        healthy = self._campaign(user, meta_account, '1920002', spend=10, minutes_ago=60)
+
+        def fake_account(account, meta_campaign_ids, since, until, **kwargs):
+            if account.access_token == 'expired_token':
+                raise RuntimeError('Error validating access token')
+            return {cid: {**meta_insights.ZERO_INSIGHTS, 'spend': 1.0} for cid in meta_campaign_ids}
+
+        def fake_batch(access_token, relative_urls, **kwargs):
+            raise RuntimeError('Error validating access token')
+
+        monkeypatch.setattr(meta_insights, 'fetch_account_campaign_insights', fake_account)
+        monkeypatch.setattr(meta_insights, 'graph_batch_get', fake_batch)
+
+        # 一度も取得できていないキャンペーンが最優先で予算を取る
+        planned = insights_scheduler.plan_refresh(insights_scheduler.refresh_candidates(), budget=1)
+        assert [c.id for c in planned] == [broken.id]
+
+        result = tasks.fetch_campaigns_insights_from_meta([broken.id])
+        assert result['counts']['error'] == 1
+
+        # 失敗したアカウントは待ち時間の間は外れ、健全なキャンペーンに予算が回る
+        planned = insights_scheduler.plan_refresh(insights_scheduler.refresh_candidates(), budget=1)
+        assert [c.id for c in planned] == [healthy.id]
+
+        # 待ち時間が過ぎれば再び対象になる。成功すれば失敗の記録は消える
+        cache = caches['shared']
+        key = insights_scheduler._failure_key(broken.id)
+        failure = cache.get(key)
+        assert failure['count'] == 1
+        cache.set(key, {**failure, 'at': failure['at'] - insights_scheduler.FAILURE_BACKOFF.total_seconds()})
+        planned = insights_scheduler.plan_refresh(insights_scheduler.refresh_candidates(), budget=2)
+        assert broken.id in {c.id for c in planned}
+
+        expired.access_token = 'new_token'
+        expired.save(update_fields=['access_token'])
+        tasks.fetch_campaigns_insights_from_meta([broken.id])
+        assert cache.get(key) is None
+
+
+class TestTaskRouting:
+    """Celery タスクのキュー振り分けのテスト"""
+
+    @pytest.mark.parametrize('task_name, queue, priority', [
+        ('apps.campaigns.tasks.activate_campaign_in_meta', 'interactive', 0),
+        ('apps.campaigns.tasks.sync_campaign_full_from_meta', 'interactive', 0),
+        ('apps.campaigns.tasks.sync_user_statuses_from_meta', 'sync', 3),
+        ('apps.bulk_upload.views.process_bulk_upload', 'bulk', 6),
+        ('apps.reporting.tasks.fetch_daily_meta_ad_insights', 'ingest', 9),
+    ])
+    def test_routes(self, task_name, queue, priority):
+        from config.celery import app
+
+        route = app.amqp.router.route({}, task_name)
+
+        assert route['queue'].name == queue
+        assert route['priority'] == priority
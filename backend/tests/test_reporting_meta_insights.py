@@ -1,7 +1,30 @@
+import json
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from django.db.models import Count
+
+from apps.accounts.models import MetaAccount
+from apps.reporting import tasks
 from apps.reporting.meta_insights_service import (
+    MetaInsightsReportError,
+    iter_async_ad_level_insight_pages,
     normalize_ad_account_id,
     parse_insight_row,
 )
+from apps.reporting.models import (
+    DailyAccountInsight,
+    DailyAdInsight,
+    DailyCampaignInsight,
+    DailyInsightCoverage,
+    MetaAdDimension,
+    MetaAdSetDimension,
+    MetaCampaignDimension,
+    MetaObjectNameHistory,
+)
+from apps.reporting.rollups import refresh_daily_rollups
+from tests.fakes import FakeAsyncInsightsGraph
 
 
 def test_normalize_ad_account_id():
@@ -21,7 +44,10 @@ def test_parse_insight_row_purchase():
         'ctr': '5',
         'cpc': '10.5',
         'spend': '52.5',
-        'actions': [{'action_type': 'offsite_conversion.fb_pixel_purchase', 'value': '3'}],
+        'actions': [
+            {'action_type': 'offsite_conversion.fb_pixel_purchase', 'value': '3'},
+            {'action_type': 'lead', 'value': '2'},
+        ],
         'cost_per_action_type': [
             {'action_type': 'offsite_conversion.fb_pixel_purchase', 'value': '17.5'}
         ],
@@ -31,9 +57,505 @@ def test_parse_insight_row_purchase():
     assert parsed['meta_ad_id'] == '123'
     assert parsed['impressions'] == 100
     assert parsed['conversions'] == 3.0
+    # キャンペーン単位の集計と同じ数え方（purchase + lead）
+    assert parsed['all_conversions'] == 5.0
     assert parsed['cpa'] is not None
     assert float(parsed['cpa']) == 17.5
 
 
 def test_parse_insight_row_missing_ad():
     assert parse_insight_row({'impressions': '1'}) is None
+
+
+def _stored_insight(ma, stat_date, meta_ad_id, campaign='C'):
+    return DailyAdInsight.objects.create(
+        meta_account=ma,
+        stat_date=stat_date,
+        meta_ad_id=meta_ad_id,
+        campaign=MetaCampaignDimension.objects.get_or_create(meta_id=f'c-{campaign}', name=campaign)[0],
+        adset=MetaAdSetDimension.objects.get_or_create(meta_id='s1')[0],
+        ad=MetaAdDimension.objects.get_or_create(meta_id=meta_ad_id)[0],
+    )
+
+
+def _fake_row(ad_id, spend='1', day='2026-01-01'):
+    return {
+        'meta_ad_id': ad_id,
+        'date_start': day,
+        'campaign_name': 'C',
+        'adset_name': 'A',
+        'ad_name': 'Ad',
+        'impressions': 10,
+        'clicks': 1,
+        'ctr': 10.0,
+        'cpc': Decimal('1'),
+        'spend': Decimal(spend),
+        'conversions': 0.0,
+        'cpa': None,
+        'all_conversions': 0.0,
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('max_workers', [1, 4])
+def test_run_daily_meta_ad_insights_streams_pages(user, monkeypatch, max_workers):
+    ok = MetaAccount.objects.create(
+        user=user, account_id='act_1', account_name='ok', access_token='tok'
+    )
+    MetaAccount.objects.create(
+        user=user, account_id='act_2', account_name='ng', access_token='tok'
+    )
+
+    def fake_pages(account_id, access_token, since, until, timeout=120):
+        if account_id == 'act_2':
+            yield [_fake_row('x1')]
+            raise RuntimeError('boom')
+        for i in range(5):
+            yield [_fake_row(f'ad{i}-a'), _fake_row(f'ad{i}-b')]
+
+    monkeypatch.setattr(tasks, 'iter_ad_level_insight_pages', fake_pages)
+
+    result = tasks.run_daily_meta_ad_insights(
+        '2026-01-01', max_workers=max_workers, per_token_limit=1
+    )
+
+    assert result['accounts_ok'] == 1
+    assert result['accounts_failed'] == 1
+    assert result['errors'][0]['account'] == 'act_2'
+    assert DailyAdInsight.objects.filter(meta_account=ok).count() == 10
+    # 途中で失敗したアカウントはトランザクションごとロールバックされる
+    assert not DailyAdInsight.objects.filter(meta_account__account_id='act_2').exists()
+
+
+@pytest.mark.django_db
+def test_reingestion_upserts_only_changes(user, monkeypatch):
+    ma = MetaAccount.objects.create(
+        user=user, account_id='act_1', account_name='ok', access_token='tok'
+    )
+    pages = [[_fake_row('ad1'), _fake_row('ad2'), _fake_row('ad3')]]
+    monkeypatch.setattr(
+        tasks, 'iter_ad_level_insight_pages', lambda *a, **k: iter(pages)
+    )
+
+    first = tasks.run_daily_meta_ad_insights('2026-01-01', max_workers=1)
+    assert first['rows_inserted'] == 3
+
+    pages = [[_fake_row('ad1'), _fake_row('ad2', spend='9'), _fake_row('ad4')]]
+    second = tasks.run_daily_meta_ad_insights('2026-01-01', max_workers=1)
+
+    assert second['rows_inserted'] == 1
+    assert second['rows_updated'] == 1
+    assert second['rows_unchanged'] == 1
+    assert second['rows_removed'] == 1
+    ids = set(DailyAdInsight.objects.filter(meta_account=ma).values_list('meta_ad_id', flat=True))
+    assert ids == {'ad1', 'ad2', 'ad4'}
+    assert DailyAdInsight.objects.get(meta_account=ma, meta_ad_id='ad2').spend == Decimal('9')
+
+
+@pytest.mark.django_db
+def test_range_backfill_splits_rows_by_date_start(user, monkeypatch):
+    ma = MetaAccount.objects.create(
+        user=user, account_id='act_1', account_name='ok', access_token='tok'
+    )
+    _stored_insight(ma, '2026-01-03', 'gone')
+    calls = []
+
+    def fake_pages(account_id, access_token, since, until, timeout=120):
+        calls.append((since, until))
+        yield [_fake_row('ad1', day='2026-01-01'), _fake_row('ad1', day='2026-01-02')]
+        yield [_fake_row('ad2', day='2026-01-02')]
+
+    monkeypatch.setattr(tasks, 'iter_ad_level_insight_pages', fake_pages)
+
+    result = tasks.run_meta_ad_insights_range('2026-01-01', '2026-01-03', max_workers=1)
+
+    assert calls == [('2026-01-01', '2026-01-03')]
+    assert result['rows_inserted'] == 3
+    assert result['rows_removed'] == 1
+    per_day = dict(
+        DailyAdInsight.objects.filter(meta_account=ma)
+        .values_list('stat_date')
+        .annotate(n=Count('id'))
+    )
+    assert per_day == {date(2026, 1, 1): 1, date(2026, 1, 2): 2}
+    # 行が 0 件になった日も取り込み済みとして記録される
+    covered = set(DailyInsightCoverage.objects.filter(meta_account=ma).values_list('stat_date', flat=True))
+    assert covered == {date(2026, 1, 1), date(2026, 1, 2), date(2026, 1, 3)}
+
+
+def _graph_row(ad_id, day='2026-01-01'):
+    return {'ad_id': ad_id, 'date_start': day, 'impressions': '10', 'spend': '1.5'}
+
+
+def test_async_report_polls_with_backoff_then_downloads():
+    graph = FakeAsyncInsightsGraph(
+        [_graph_row(f'ad{i}') for i in range(5)], polls_until_done=3, page_size=2
+    )
+    sleeps = []
+
+    pages = list(
+        iter_async_ad_level_insight_pages(
+            '1', 'tok', '2026-01-01', '2026-01-01', http=graph, sleep=sleeps.append
+        )
+    )
+
+    assert graph.submitted_params['level'] == 'ad'
+    assert graph.submitted_params['time_increment'] == 1
+    assert graph.polls == 4
+    assert sleeps == sorted(sleeps) and len(sleeps) == 3
+    assert [len(p) for p in pages] == [2, 2, 1]
+    assert pages[0][0]['meta_ad_id'] == 'ad0'
+
+
+def test_async_report_failure_and_timeout():
+    graph = FakeAsyncInsightsGraph([], polls_until_done=1, final_status='Job Failed')
+    with pytest.raises(MetaInsightsReportError):
+        list(iter_async_ad_level_insight_pages('1', 'tok', 'a', 'b', http=graph, sleep=lambda s: None))
+
+    graph = FakeAsyncInsightsGraph([], polls_until_done=1000)
+    with pytest.raises(MetaInsightsReportError):
+        list(
+            iter_async_ad_level_insight_pages(
+                '1', 'tok', 'a', 'b', max_wait=10, http=graph, sleep=lambda s: None
+            )
+        )
+
+
+@pytest.mark.django_db
+def test_range_ingest_cancels_workers_when_task_times_out(user, monkeypatch, settings):
+    import threading
+    from celery.exceptions import SoftTimeLimitExceeded
+
+    settings.META_INSIGHTS_INGEST_PAGE_BUFFER = 1
+    for i in range(4):
+        MetaAccount.objects.create(
+            user=user, account_id=f'act_{i}', account_name=f'a{i}', access_token=f'tok{i}'
+        )
+    started = []
+    lock = threading.Lock()
+
+    def endless_pages(account_id, access_token, since, until, timeout=120):
+        with lock:
+            started.append(account_id)
+        for _ in range(10000):
+            yield [_fake_row(f'{account_id}-ad')]
+
+    def timed_out(*args, **kwargs):
+        raise SoftTimeLimitExceeded()
+
+    monkeypatch.setattr(tasks, 'iter_ad_level_insight_pages', endless_pages)
+    monkeypatch.setattr(tasks, '_upsert_account_days', timed_out)
+
+    # 書き込み側で時間切れになっても、満杯のキューで待つワーカーに固まらず抜ける
+    with pytest.raises(SoftTimeLimitExceeded):
+        tasks.run_meta_ad_insights_range('2026-01-01', '2026-01-01', max_workers=2)
+    # 開始前だったアカウントは取得しない
+    assert len(started) <= 2
+
+
+def test_page_stream_prefetches_into_shared_slots_while_waiting_for_writer():
+    import threading
+
+    shared = threading.Semaphore(4)
+    stream = tasks._AccountPageStream(MetaAccount(account_id='act_1'), 1, shared)
+    pages = [[_fake_row(f'ad{i}')] for i in range(4)]
+
+    # 書き込み側が読み始める前に、アカウント枠 1 + 共通枠で最後まで取得できる
+    worker = threading.Thread(target=stream.produce, args=(iter(pages),))
+    worker.start()
+    worker.join(timeout=5)
+    assert not worker.is_alive()
+
+    assert list(stream) == pages
+    # 読んだページの共通枠は返っている
+    assert all(shared.acquire(blocking=False) for _ in range(4))
+
+
+@pytest.mark.django_db
+def test_range_ingest_stops_fetching_account_after_write_failure(user, monkeypatch, settings):
+    settings.META_INSIGHTS_INGEST_PAGE_BUFFER = 1
+    settings.META_INSIGHTS_INGEST_SHARED_PAGE_BUFFER = 2
+    MetaAccount.objects.create(user=user, account_id='act_1', account_name='a1', access_token='tok')
+    fetched = []
+
+    def many_pages(account_id, access_token, since, until, timeout=120):
+        for i in range(1000):
+            fetched.append(i)
+            yield [_fake_row(f'ad{i}')]
+
+    def fail_after_first_page(ma, since_day, until_day, pages, dimensions):
+        next(iter(pages))
+        raise RuntimeError('write failed')
+
+    monkeypatch.setattr(tasks, 'iter_ad_level_insight_pages', many_pages)
+    monkeypatch.setattr(tasks, '_upsert_account_days', fail_after_first_page)
+
+    results = tasks.run_meta_ad_insights_range('2026-01-01', '2026-01-01', max_workers=2)
+
+    assert results['accounts_failed'] == 1
+    # 残りのページは読み捨てずに取得ごと止める
+    assert len(fetched) < 10
+
+@pytest.mark.django_db
+def test_large_account_switches_to_async_report(user, monkeypatch, settings):
+    settings.META_INSIGHTS_ASYNC_AD_THRESHOLD = 4
+    ma = MetaAccount.objects.create(
+        user=user, account_id='act_1', account_name='big', access_token='tok'
+    )
+    for i in range(2):
+        _stored_insight(ma, '2025-12-31', f'ad{i}')
+    # 広告数は最新日のアカウントロールアップから読む
+    refresh_daily_rollups(ma.pk, [date(2025, 12, 31)])
+    used = []
+
+    def fake_async(account_id, access_token, since, until, **kwargs):
+        used.append('async')
+        yield [_fake_row('ad0', day='2026-01-01')]
+
+    monkeypatch.setattr(tasks, 'iter_async_ad_level_insight_pages', fake_async)
+
+    tasks.run_daily_meta_ad_insights('2026-01-01', max_workers=1)
+    assert used == []  # 2 ads x 1 day < 4
+
+    tasks.run_meta_ad_insights_range('2026-01-01', '2026-01-02', max_workers=2)
+    assert used == ['async']  # 2 ads x 2 days >= 4
+
+
+@pytest.mark.django_db
+def test_rollups_follow_ingestion_and_feed_endpoints(user, authenticated_client, monkeypatch):
+    ma = MetaAccount.objects.create(
+        user=user, account_id='act_1', account_name='ok', access_token='tok'
+    )
+    rows = [_fake_row('ad1', spend='2'), _fake_row('ad2', spend='3')]
+    rows[1]['campaign_name'] = 'D'
+    monkeypatch.setattr(tasks, 'iter_ad_level_insight_pages', lambda *a, **k: iter([rows]))
+
+    tasks.run_daily_meta_ad_insights('2026-01-01', max_workers=1)
+
+    account = DailyAccountInsight.objects.get(meta_account=ma, stat_date='2026-01-01')
+    assert (account.ad_count, account.spend, account.impressions) == (2, Decimal('5'), 20)
+    assert DailyCampaignInsight.objects.filter(meta_account=ma).count() == 2
+
+    resp = authenticated_client.get('/api/reporting/daily-insights/campaigns/')
+    assert resp.status_code == 200
+    assert resp.data['summary']['total_spend'] == 5.0
+    assert {r['campaign_name'] for r in resp.data['results']} == {'C', 'D'}
+
+    rows = [_fake_row('ad1', spend='2')]
+    tasks.run_daily_meta_ad_insights('2026-01-01', max_workers=1)
+    account.refresh_from_db()
+    assert (account.ad_count, account.spend) == (1, Decimal('2'))
+    assert not DailyCampaignInsight.objects.filter(meta_account=ma, campaign__name='D').exists()
+
+
+@pytest.mark.django_db
+def test_daily_insights_cursor_pagination_walks_all_rows(user, authenticated_client):
+    ma = MetaAccount.objects.create(
+        user=user, account_id='act_1', account_name='ok', access_token='tok'
+    )
+    for day in ('2026-01-01', '2026-01-02'):
+        for i, name in enumerate(['B', 'A', 'A', 'C']):
+            _stored_insight(ma, day, f'ad{i}', campaign=name)
+    expected = list(
+        DailyAdInsight.objects.order_by('-stat_date', 'campaign_id', 'ad_id', 'id')
+        .values_list('id', flat=True)
+    )
+
+    seen = []
+    url = '/api/reporting/daily-insights/?pagination=cursor&page_size=3'
+    while url:
+        resp = authenticated_client.get(url)
+        assert resp.status_code == 200
+        assert 'count' not in resp.data and 'summary' not in resp.data
+        seen.extend(r['id'] for r in resp.data['results'])
+        url = resp.data['next']
+
+    assert seen == expected
+    assert authenticated_client.get('/api/reporting/daily-insights/?cursor=bogus').status_code == 404
+
+    # ページ番号モード（既定）はキャンペーン名順
+    resp = authenticated_client.get('/api/reporting/daily-insights/?page_size=8')
+    assert [(r['stat_date'], r['campaign_name']) for r in resp.data['results']] == [
+        (day, name) for day in ('2026-01-02', '2026-01-01') for name in ('A', 'A', 'B', 'C')
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('key', [
+    ['2026-01-01', {'a': 1}, 1, 2],
+    ['2026-01-01', 1, [], 2],
+    ['2026-01-01', 1, 2, '3'],
+    ['2026-01-01', True, 1, 2],
+    [20260101, 1, 2, 3],
+])
+def test_daily_insights_cursor_rejects_malformed_components(user, authenticated_client, key):
+    from apps.reporting.pagination import DailyAdInsightKeysetPagination
+
+    cursor = DailyAdInsightKeysetPagination().encode_cursor(key)
+    resp = authenticated_client.get(f'/api/reporting/daily-insights/?cursor={cursor}')
+    assert resp.status_code == 404
+
+
+@pytest.mark.django_db
+def test_daily_insights_cursor_page_orders_on_list_index(user, authenticated_client):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from apps.reporting.pagination import DailyAdInsightKeysetPagination
+
+    ma = MetaAccount.objects.create(
+        user=user, account_id='act_1', account_name='ok', access_token='tok'
+    )
+    for i, name in enumerate(['B', 'A', 'C', 'A']):
+        _stored_insight(ma, '2026-01-01', f'ad{i}', campaign=name)
+
+    # 並び順は索引と同じファクト表の列だけ
+    index = next(i for i in DailyAdInsight._meta.indexes if i.name == 'reporting_dai_list_order_idx')
+    assert [f'{f}_id' if f in ('campaign', 'ad') else f for f in index.fields] == list(
+        DailyAdInsightKeysetPagination.ordering
+    )
+
+    first = authenticated_client.get('/api/reporting/daily-insights/?pagination=cursor&page_size=2')
+    with CaptureQueriesContext(connection) as ctx:
+        second = authenticated_client.get(first.data['next'])
+    assert second.status_code == 200
+
+    # 2 ページ目も 1 クエリ（COUNT なし）で、ORDER BY とカーソル条件はディメンション表を参照しない
+    pages = [q['sql'] for q in ctx.captured_queries if 'reporting_dailyadinsight' in q['sql']]
+    assert len(pages) == 1
+    order_by = pages[0].split('ORDER BY', 1)[1]
+    assert order_by.split('LIMIT')[0].strip() == (
+        '"reporting_dailyadinsight"."stat_date" DESC, "reporting_dailyadinsight"."campaign_id" ASC, '
+        '"reporting_dailyadinsight"."ad_id" ASC, "reporting_dailyadinsight"."id" ASC'
+    )
+    where = pages[0].split('WHERE', 1)[1].split('ORDER BY')[0]
+    assert 'reporting_metacampaigndimension"."name' not in where
+
+
+@pytest.mark.django_db
+def test_ingestion_resolves_names_through_dimensions(user, authenticated_client, monkeypatch):
+    ma = MetaAccount.objects.create(
+        user=user, account_id='act_1', account_name='ok', access_token='tok'
+    )
+
+    def row(ad_id, campaign_name, day):
+        r = _fake_row(ad_id, day=day)
+        r.update(meta_campaign_id='c1', campaign_name=campaign_name, meta_adset_id='s1')
+        return r
+
+    pages = [[row('ad1', 'Old', '2026-01-01'), row('ad2', 'Old', '2026-01-01')]]
+    monkeypatch.setattr(tasks, 'iter_ad_level_insight_pages', lambda *a, **k: iter(pages))
+    tasks.run_daily_meta_ad_insights('2026-01-01', max_workers=1)
+
+    pages = [[row('ad1', 'New', '2026-01-02')]]
+    tasks.run_daily_meta_ad_insights('2026-01-02', max_workers=1)
+    # 古い日の再取り込みでは現在名を巻き戻さない
+    pages = [[row('ad1', 'Old', '2026-01-01'), row('ad2', 'Old', '2026-01-01')]]
+    result = tasks.run_daily_meta_ad_insights('2026-01-01', max_workers=1)
+
+    assert result['rows_unchanged'] == 2
+    assert MetaCampaignDimension.objects.get(meta_id='c1').name == 'New'
+    assert list(
+        MetaObjectNameHistory.objects.filter(object_type='campaign', meta_id='c1')
+        .order_by('first_seen')
+        .values_list('name', flat=True)
+    ) == ['Old', 'New']
+
+    resp = authenticated_client.get('/api/reporting/daily-insights/?start_date=2026-01-02')
+    assert resp.data['results'][0]['campaign_name'] == 'New'
+    assert resp.data['results'][0]['meta_campaign_id'] == 'c1'
+
+    # ロールアップは改名の前後の日も同じキャンペーンにまとまり、名前は現在名で返す
+    rollups = DailyCampaignInsight.objects.filter(meta_account=ma)
+    assert rollups.count() == 2
+    assert set(rollups.values_list('campaign__meta_id', flat=True)) == {'c1'}
+    resp = authenticated_client.get('/api/reporting/daily-insights/campaigns/')
+    assert [(r['stat_date'], r['campaign_name'], r['meta_campaign_id']) for r in resp.data['results']] == [
+        ('2026-01-02', 'New', 'c1'), ('2026-01-01', 'New', 'c1'),
+    ]
+
+
+@pytest.mark.django_db
+def test_daily_insights_export_streams_csv_and_ndjson(user, authenticated_client):
+    ma = MetaAccount.objects.create(
+        user=user, account_id='act_1', account_name='ok', access_token='tok'
+    )
+    _stored_insight(ma, '2026-01-01', 'ad1', campaign='キャンペーン')
+    _stored_insight(ma, '2026-01-02', 'ad2')
+
+    resp = authenticated_client.get(
+        '/api/reporting/daily-insights/export/', {'start_date': '2026-01-02'}
+    )
+    assert resp.status_code == 200
+    lines = b''.join(resp.streaming_content).decode('utf-8-sig').splitlines()
+    assert lines[0].startswith('stat_date,meta_account_id_str')
+    assert len(lines) == 2 and 'ad2' in lines[1]
+
+    resp = authenticated_client.get(
+        '/api/reporting/daily-insights/export/', {'file_format': 'ndjson'}
+    )
+    records = [json.loads(line) for line in b''.join(resp.streaming_content).splitlines()]
+    assert [r['meta_ad_id'] for r in records] == ['ad2', 'ad1']
+    assert records[1]['campaign_name'] == 'キャンペーン'
+
+    bad = authenticated_client.get('/api/reporting/daily-insights/export/', {'file_format': 'xml'})
+    assert bad.status_code == 400
+
+
+@pytest.mark.django_db
+def test_parquet_snapshots_rewrite_only_changed_months(user, monkeypatch, settings, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    from apps.reporting.parquet_snapshots import load_manifest, write_insight_snapshots
+
+    settings.REPORTING_PARQUET_DIR = tmp_path
+    ma = MetaAccount.objects.create(
+        user=user, account_id='act_1', account_name='ok', access_token='tok'
+    )
+    pages = [[_fake_row('ad1', day='2026-01-31'), _fake_row('ad2', spend='2.5', day='2026-01-31')]]
+    monkeypatch.setattr(tasks, 'iter_ad_level_insight_pages', lambda *a, **k: iter(pages))
+    tasks.run_meta_ad_insights_range('2026-01-31', '2026-01-31', max_workers=1)
+
+    first = write_insight_snapshots()
+    jan = f'meta_account={ma.pk}/month=2026-01'
+    assert first['written'] == 1 and first['rows'] == 2
+    table = pq.read_table(tmp_path / jan / 'data.parquet')
+    assert table.num_rows == 2
+    assert sorted(table.column('spend').to_pylist()) == [1.0, 2.5]
+
+    pages = [[_fake_row('ad1', day='2026-02-01')]]
+    tasks.run_meta_ad_insights_range('2026-02-01', '2026-02-01', max_workers=1)
+    second = write_insight_snapshots()
+
+    assert second['written'] == 1 and second['skipped'] == 1
+    manifest = load_manifest(tmp_path)
+    assert set(manifest['partitions']) == {jan, f'meta_account={ma.pk}/month=2026-02'}
+    assert manifest['partitions'][jan]['rows'] == 2
+
+
+@pytest.mark.django_db
+def test_run_meta_ad_insights_range_defers_rate_limited_accounts(user, monkeypatch):
+    from apps.accounts.meta_rate_limit import MetaRateLimited
+
+    MetaAccount.objects.create(user=user, account_id='act_1', account_name='ok', access_token='tok')
+    limited = MetaAccount.objects.create(
+        user=user, account_id='act_2', account_name='limited', access_token='tok2'
+    )
+
+    def fake_pages(account_id, access_token, since, until, timeout=120):
+        if account_id == 'act_2':
+            raise MetaRateLimited(120, 'act:2')
+        yield [_fake_row('ad1')]
+
+    monkeypatch.setattr(tasks, 'iter_ad_level_insight_pages', fake_pages)
+
+    result = tasks.run_meta_ad_insights_range('2026-01-01', '2026-01-01', max_workers=1)
+
+    assert result['accounts_ok'] == 1
+    # レート制限は失敗扱いにせず、再スケジュール対象として返す
+    assert result['accounts_failed'] == 0
+    assert result['rate_limited'] == [{'meta_account_id': limited.id, 'retry_after': 120}]
+
+    only_limited = tasks.run_meta_ad_insights_range(
+        '2026-01-02', '2026-01-02', max_workers=1, meta_account_ids=[limited.id],
+    )
+    assert only_limited['accounts_ok'] == 0
+    assert len(only_limited['rate_limited']) == 1
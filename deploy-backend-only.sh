@@ -141,14 +141,14 @@ gcloud compute ssh "$DEPLOY_HOST" \
   "${GCLOUD_SSH_FLAGS[@]}" \
   --command="set -e; cd $DEPLOY_DIR && \
     export DOCKER_BUILDKIT=1 COMPOSE_DOCKER_CLI_BUILD=1 && \
-    docker compose -f docker-compose.prod.yml build --progress=plain backend celery celery-beat"
+    docker compose -f docker-compose.prod.yml build --progress=plain backend celery-interactive celery-sync celery-bulk celery-ingest celery-beat"
 
 echo -e "${GREEN}[4/7]${NC} VM: docker compose up..."
 gcloud compute ssh "$DEPLOY_HOST" \
   --zone="$DEPLOY_ZONE" \
   "${GCLOUD_SSH_FLAGS[@]}" \
   --command="set -e; cd $DEPLOY_DIR && \
-    docker compose -f docker-compose.prod.yml up -d --no-deps backend celery celery-beat"
+    docker compose -f docker-compose.prod.yml up -d --no-deps backend celery-interactive celery-sync celery-bulk celery-ingest celery-beat"
 
 echo -e "${GREEN}[5/7]${NC} VM: migrate..."
 gcloud compute ssh "$DEPLOY_HOST" \
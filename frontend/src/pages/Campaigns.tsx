@@ -24,7 +24,7 @@ import {
 } from 'antd';
 import { useTranslation } from 'react-i18next';
 import { PlusOutlined, EditOutlined, PauseOutlined, PlayCircleOutlined, DeleteOutlined, SyncOutlined, DownloadOutlined } from '@ant-design/icons';
-import campaignService, { Campaign, CampaignCreate } from '../services/campaignService';
+import campaignService, { Campaign, CampaignCreate, SyncAllProgress } from '../services/campaignService';
 import adSetService, { AdSet } from '../services/adSetService';
 import adService, { Ad } from '../services/adService';
 import metaAccountService, { MetaAccount } from '../services/metaAccountService';
@@ -179,36 +179,38 @@ const Campaigns: React.FC = () => {
 
   useEffect(() => {
     if (!syncRunId) return;
-    let cancelled = false;
-    const timer = window.setInterval(async () => {
+    // 進捗はサーバーから SSE で push される（ポーリングしない）
+    const controller = new AbortController();
+    const applyProgress = (progress: SyncAllProgress) => {
+      setSyncProgressVisible(true);
+      setSyncProgressUnknownTotal(false);
+      setSyncProgressTotal(Number(progress.total || 0));
+      setSyncProgressDone(Number(progress.completed || 0));
+      setSyncAllTaskState(progress.status === 'done' ? 'success' : 'pending');
+      setSyncAllTaskMessage(
+        progress.status === 'done'
+          ? `同期完了: ${progress.completed}/${progress.total} 件（失敗 ${progress.failed}）`
+          : `同期実行中: ${progress.completed}/${progress.total} 件（失敗 ${progress.failed}）`,
+      );
+      if (progress.status === 'done') {
+        setSyncRunId(null);
+        setSyncProgressStuck(false);
+        void fetchCampaigns();
+      }
+    };
+
+    const run = async () => {
       try {
-        const progress = await campaignService.getSyncAllProgress(syncRunId);
-        if (cancelled) return;
-        setSyncProgressVisible(true);
-        setSyncProgressUnknownTotal(false);
-        setSyncProgressTotal(Number(progress.total || 0));
-        setSyncProgressDone(Number(progress.completed || 0));
-        setSyncAllTaskState(progress.status === 'done' ? 'success' : 'pending');
-        setSyncAllTaskMessage(
-          progress.status === 'done'
-            ? `同期完了: ${progress.completed}/${progress.total} 件（失敗 ${progress.failed}）`
-            : `同期実行中: ${progress.completed}/${progress.total} 件（失敗 ${progress.failed}）`,
-        );
-        if (progress.status === 'done') {
-          setSyncRunId(null);
-          setSyncProgressStuck(false);
-          void fetchCampaigns();
-        }
+        const last = await campaignService.streamSyncAllProgress(syncRunId, applyProgress, controller.signal);
+        if (controller.signal.aborted || last?.status === 'done' || last?.status === 'not_found') return;
       } catch {
-        if (cancelled) return;
+        if (controller.signal.aborted) return;
         setSyncAllTaskState('failure');
         setSyncAllTaskMessage('実数進捗の取得に失敗しました');
       }
-    }, SYNC_PROGRESS_POLL_INTERVAL_MS);
-    return () => {
-      cancelled = true;
-      window.clearInterval(timer);
     };
+    void run();
+    return () => controller.abort();
   }, [syncRunId]);
 
   useEffect(() => {
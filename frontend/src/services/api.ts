@@ -58,6 +58,31 @@ const api: AxiosInstance = axios.create({
   },
 });
 
+/**
+ * refresh_token でアクセストークンを取り直して保存する。失敗したらログアウトしてログイン画面へ。
+ * axios のインターセプターと、axios を通らない fetch（SSE のストリームなど）で共用する。
+ */
+export async function refreshAccessToken(): Promise<string | null> {
+  const refreshToken = localStorage.getItem('refresh_token');
+  if (!refreshToken) {
+    return null;
+  }
+  try {
+    const response = await axios.post(`${API_BASE_URL}/accounts/token/refresh/`, {
+      refresh: refreshToken,
+    });
+    const { access } = response.data;
+    localStorage.setItem('access_token', access);
+    return access;
+  } catch (refreshError) {
+    localStorage.removeItem('access_token');
+    localStorage.removeItem('refresh_token');
+    localStorage.removeItem('user');
+    window.location.href = '/login';
+    throw refreshError;
+  }
+}
+
 // リクエストインターセプター
 api.interceptors.request.use(
   (config: InternalAxiosRequestConfig) => {
@@ -100,25 +125,14 @@ api.interceptors.response.use(
       originalRequest._retry = true;
 
       try {
-        const refreshToken = localStorage.getItem('refresh_token');
-        if (refreshToken) {
-          const response = await axios.post(`${API_BASE_URL}/accounts/token/refresh/`, {
-            refresh: refreshToken,
-          });
-
-          const { access } = response.data;
-          localStorage.setItem('access_token', access);
-
+        const access = await refreshAccessToken();
+        if (access) {
           if (originalRequest.headers) {
             originalRequest.headers.Authorization = `Bearer ${access}`;
           }
           return api(originalRequest);
         }
       } catch (refreshError) {
-        localStorage.removeItem('access_token');
-        localStorage.removeItem('refresh_token');
-        localStorage.removeItem('user');
-        window.location.href = '/login';
         return Promise.reject(refreshError);
       }
     }
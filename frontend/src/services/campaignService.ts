@@ -1,4 +1,12 @@
-import api from './api';
+import api, { API_BASE_URL, refreshAccessToken } from './api';
+
+export interface SyncAllProgress {
+  sync_run_id: string;
+  status: 'running' | 'done' | 'not_found' | string;
+  total: number;
+  completed: number;
+  failed: number;
+}
 
 export interface Campaign {
   id: number;
@@ -225,19 +233,79 @@ class CampaignService {
     return response.data;
   }
 
-  async getSyncAllProgress(syncRunId: string): Promise<{
-    sync_run_id: string;
-    status: 'running' | 'done' | 'not_found' | string;
-    total: number;
-    completed: number;
-    failed: number;
-  }> {
+  async getSyncAllProgress(syncRunId: string): Promise<SyncAllProgress> {
     const response = await api.get('/campaigns/campaigns/sync_all_progress/', {
       params: { sync_run_id: syncRunId },
     });
     return response.data;
   }
 
+  /**
+   * sync_all_from_meta の進捗を SSE（sync_all_progress_stream）で受け取る。
+   * 進捗が変わるたびに onProgress を呼び、done / not_found で resolve する。
+   * サーバーは 1 接続を短時間で閉じるので、done / not_found になるまで再接続する。
+   * Authorization ヘッダを付けるため EventSource ではなく fetch のストリームで読み、
+   * 401 のときは axios と同じ refreshAccessToken でトークンを取り直して 1 回だけやり直す。
+   */
+  async streamSyncAllProgress(
+    syncRunId: string,
+    onProgress: (progress: SyncAllProgress) => void,
+    signal?: AbortSignal,
+  ): Promise<SyncAllProgress | null> {
+    const url = `${API_BASE_URL}/campaigns/campaigns/sync_all_progress_stream/?sync_run_id=${encodeURIComponent(syncRunId)}`;
+    const open = (token: string | null) =>
+      fetch(url, {
+        headers: {
+          Accept: 'text/event-stream',
+          ...(token ? { Authorization: `Bearer ${token}` } : {}),
+        },
+        signal,
+      });
+
+    let last: SyncAllProgress | null = null;
+    let retryMs = 3000;
+    while (!signal?.aborted) {
+      let response = await open(localStorage.getItem('access_token'));
+      if (response.status === 401) {
+        const access = await refreshAccessToken();
+        if (access) response = await open(access);
+      }
+      if (!response.ok || !response.body) {
+        throw new Error(`sync progress stream failed: ${response.status}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary = buffer.indexOf('\n\n');
+        while (boundary >= 0) {
+          const block = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          boundary = buffer.indexOf('\n\n');
+          const lines = block.split('\n');
+          const retry = lines.find((line) => line.startsWith('retry: '));
+          if (retry) retryMs = Number(retry.slice('retry: '.length)) || retryMs;
+          if (!lines.includes('event: progress')) continue;
+          const data = lines.find((line) => line.startsWith('data: '));
+          if (!data) continue;
+          last = JSON.parse(data.slice('data: '.length)) as SyncAllProgress;
+          onProgress(last);
+          if (last.status === 'done' || last.status === 'not_found') {
+            await reader.cancel();
+            return last;
+          }
+        }
+      }
+      // サーバー側の接続上限で閉じられた。retry の間隔を空けて再接続する
+      await new Promise((resolve) => window.setTimeout(resolve, retryMs));
+    }
+    return last;
+  }
+
   async getSyncAllCampaignsStatus(taskId: string): Promise<{
     task_id: string;
     state: 'PENDING' | 'STARTED' | 'SUCCESS' | 'FAILURE' | string;
@@ -263,6 +331,9 @@ class CampaignService {
     imported: number;
     skipped: number;
     total: number;
+    // 差分取得だったか / 前回のインポート以降に変更されて取得したキャンペーン数
+    incremental?: boolean;
+    changed?: number;
     message: string;
     per_account?: Array<{
       meta_account_id: number;
@@ -270,6 +341,8 @@ class CampaignService {
       imported: number;
       skipped: number;
       total: number;
+      incremental?: boolean;
+      changed?: number;
       error?: string;
     }>;
   }> {
@@ -107,7 +107,7 @@ echo "[4/4] accounts マイグレーション + コンテナ再起動..."
 gcloud compute ssh "$DEPLOY_HOST" \
   --zone="$DEPLOY_ZONE" \
   "${GCLOUD_SSH_FLAGS[@]}" \
-  --command="set -e; cd \"$DEPLOY_DIR\" && docker compose -f docker-compose.prod.yml exec -T backend python manage.py migrate accounts --noinput && docker compose -f docker-compose.prod.yml restart backend celery celery-beat nginx"
+  --command="set -e; cd \"$DEPLOY_DIR\" && docker compose -f docker-compose.prod.yml exec -T backend python manage.py migrate accounts --noinput && docker compose -f docker-compose.prod.yml restart backend celery-interactive celery-sync celery-bulk celery-ingest celery-beat nginx"
 
 echo ""
 echo "完了。反映した backend パス:"